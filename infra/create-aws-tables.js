@@ -220,6 +220,102 @@ const tables = [
         WriteCapacityUnits: 5
       }
     }
+  },
+  {
+    name: 'email-threads',
+    schema: {
+      TableName: `${TABLE_PREFIX}-email-threads`,
+      KeySchema: [
+        { AttributeName: 'thread_key', KeyType: 'HASH' }
+      ],
+      AttributeDefinitions: [
+        { AttributeName: 'thread_key', AttributeType: 'S' }
+      ],
+      ProvisionedThroughput: {
+        ReadCapacityUnits: 5,
+        WriteCapacityUnits: 5
+      }
+    }
+  },
+  {
+    name: 'email-jobs',
+    schema: {
+      TableName: `${TABLE_PREFIX}-email-jobs`,
+      KeySchema: [
+        { AttributeName: 'job_id', KeyType: 'HASH' }
+      ],
+      AttributeDefinitions: [
+        { AttributeName: 'job_id', AttributeType: 'S' },
+        { AttributeName: 'status', AttributeType: 'S' },
+        { AttributeName: 'visible_at', AttributeType: 'N' }
+      ],
+      GlobalSecondaryIndexes: [
+        {
+          IndexName: 'status-visible_at-index',
+          KeySchema: [
+            { AttributeName: 'status', KeyType: 'HASH' },
+            { AttributeName: 'visible_at', KeyType: 'RANGE' }
+          ],
+          Projection: { ProjectionType: 'ALL' },
+          ProvisionedThroughput: {
+            ReadCapacityUnits: 5,
+            WriteCapacityUnits: 5
+          }
+        }
+      ],
+      ProvisionedThroughput: {
+        ReadCapacityUnits: 5,
+        WriteCapacityUnits: 5
+      }
+    }
+  },
+  {
+    name: 'poll-leases',
+    schema: {
+      TableName: `${TABLE_PREFIX}-poll-leases`,
+      KeySchema: [
+        { AttributeName: 'lease_key', KeyType: 'HASH' }
+      ],
+      AttributeDefinitions: [
+        { AttributeName: 'lease_key', AttributeType: 'S' }
+      ],
+      ProvisionedThroughput: {
+        ReadCapacityUnits: 5,
+        WriteCapacityUnits: 5
+      }
+    }
+  },
+  {
+    name: 'rate-limits',
+    schema: {
+      TableName: `${TABLE_PREFIX}-rate-limits`,
+      KeySchema: [
+        { AttributeName: 'rate_key', KeyType: 'HASH' }
+      ],
+      AttributeDefinitions: [
+        { AttributeName: 'rate_key', AttributeType: 'S' }
+      ],
+      ProvisionedThroughput: {
+        ReadCapacityUnits: 5,
+        WriteCapacityUnits: 5
+      }
+    }
+  },
+  {
+    name: 'token-usage',
+    schema: {
+      TableName: `${TABLE_PREFIX}-token-usage`,
+      KeySchema: [
+        { AttributeName: 'usage_key', KeyType: 'HASH' }
+      ],
+      AttributeDefinitions: [
+        { AttributeName: 'usage_key', AttributeType: 'S' }
+      ],
+      ProvisionedThroughput: {
+        ReadCapacityUnits: 5,
+        WriteCapacityUnits: 5
+      }
+    }
   }
 ];
 
@@ -59,6 +59,38 @@ create_simple_table "$TABLE_PREFIX-email-logs" "message_id_hash"
 create_simple_table "$TABLE_PREFIX-people" "id"
 create_simple_table "$TABLE_PREFIX-companies" "id"
 create_simple_table "$TABLE_PREFIX-gmail-tokens" "user_id"
+create_simple_table "$TABLE_PREFIX-token-usage" "usage_key"
+create_simple_table "$TABLE_PREFIX-email-threads" "thread_key"
+create_simple_table "$TABLE_PREFIX-poll-leases" "lease_key"
+
+# Rate limits: idle keys expire via TTL
+create_simple_table "$TABLE_PREFIX-rate-limits" "rate_key"
+aws dynamodb update-time-to-live \
+    --table-name "$TABLE_PREFIX-rate-limits" \
+    --time-to-live-specification "Enabled=true,AttributeName=expires_at" \
+    --region "$AWS_REGION" \
+    > /dev/null 2>&1 || true
+
+# Job queue: claimed through a status/visible_at index, finished jobs expire via TTL
+echo "Creating table: $TABLE_PREFIX-email-jobs"
+aws dynamodb create-table \
+    --table-name "$TABLE_PREFIX-email-jobs" \
+    --attribute-definitions \
+        AttributeName=job_id,AttributeType=S \
+        AttributeName=status,AttributeType=S \
+        AttributeName=visible_at,AttributeType=N \
+    --key-schema \
+        AttributeName=job_id,KeyType=HASH \
+    --billing-mode PAY_PER_REQUEST \
+    --global-secondary-indexes \
+        "IndexName=status-visible_at-index,KeySchema=[{AttributeName=status,KeyType=HASH},{AttributeName=visible_at,KeyType=RANGE}],Projection={ProjectionType=ALL}" \
+    --region "$AWS_REGION" \
+    > /dev/null 2>&1 && echo "   ✓ Created: $TABLE_PREFIX-email-jobs" || echo "   ⚠️  Already exists or error: $TABLE_PREFIX-email-jobs"
+aws dynamodb update-time-to-live \
+    --table-name "$TABLE_PREFIX-email-jobs" \
+    --time-to-live-specification "Enabled=true,AttributeName=expires_at" \
+    --region "$AWS_REGION" \
+    > /dev/null 2>&1 || true
 
 echo ""
 echo "✅ Table creation complete!"
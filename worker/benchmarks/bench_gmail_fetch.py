@@ -0,0 +1,150 @@
+"""
+Benchmark: bytes downloaded and parse CPU per Gmail message, raw vs. full fetch
+
+Builds messages the way business mail arrives - a text and HTML
+alternative plus PDF / image attachments of configurable size - and
+serves them from a fake Gmail service as the API would answer
+messages.get(format='raw') and messages.get(format='full', fields=...).
+For each fetch mode it reports the response bytes per message and the
+CPU time from response to workflow-ready text and idempotency hash
+(JSON decoding, GmailClient parsing, workflow header parse, body digest
+and text extraction).
+
+Run from the worker directory:
+
+    python -m benchmarks.bench_gmail_fetch [--messages 200] [--attachment-kb 1500]
+"""
+import argparse
+import base64
+import email
+import json
+import logging
+import time
+from email import policy
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict
+
+from src.models import EmailLog
+from src.services.gmail_client import GmailClient
+from src.utils import as_message
+
+
+def make_message(i: int, attachment_kb: int) -> bytes:
+    message = MIMEMultipart("mixed")
+    message["From"] = "Priya Shah <priya@customer.com>"
+    message["To"] = "sales@example.com"
+    message["Subject"] = f"RFQ {i}: steel pipes"
+    message["Message-ID"] = f"<rfq-{i}@customer.com>"
+    for n in range(12):
+        message["Received"] = f"from mx{n}.example.net by mx.google.com with ESMTPS id {i}-{n}"
+    body = f"Hi team,\n\nPlease quote 200 units of 2in steel pipe for order {i}, delivery to Pune by March.\n\nThanks,\nPriya\n"
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText(body, "plain", "utf-8"))
+    alternative.attach(MIMEText("<html><body>" + body.replace("\n", "<br>") * 3 + "</body></html>", "html", "utf-8"))
+    message.attach(alternative)
+    pdf = MIMEApplication(bytes(range(256)) * (attachment_kb * 4), "pdf")
+    pdf.add_header("Content-Disposition", "attachment", filename="specification.pdf")
+    message.attach(pdf)
+    logo = MIMEImage(b"\x89PNG" + b"\x00" * 20000, "png")
+    logo.add_header("Content-Disposition", "inline", filename="logo.png")
+    message.attach(logo)
+    return message.as_bytes()
+
+
+def full_payload(part, attachments: Dict[str, str]) -> Dict:
+    """A part as messages.get(format='full') returns it, restricted to FULL_FORMAT_FIELDS"""
+    result = {"mimeType": part.get_content_type(), "headers": [{"name": k, "value": v} for k, v in part.items()]}
+    if part.is_multipart():
+        result["body"] = {"size": 0}
+        result["parts"] = [full_payload(child, attachments) for child in part.get_payload()]
+        return result
+    data = part.get_payload(decode=True)
+    encoded = base64.urlsafe_b64encode(data).decode()
+    if part.get_filename():
+        # Gmail serves attachment bodies separately
+        attachment_id = f"att-{len(attachments)}"
+        attachments[attachment_id] = encoded
+        result["body"] = {"size": len(data), "attachmentId": attachment_id}
+    else:
+        result["body"] = {"size": len(data), "data": encoded}
+    return result
+
+
+class Response:
+    def __init__(self, service, body: str):
+        self.service, self.body = service, body
+
+    def execute(self):
+        self.service.bytes_downloaded += len(self.body)
+        return json.loads(self.body)
+
+
+class FakeGmailService:
+    """Serves pre-encoded JSON responses and counts response bytes"""
+
+    def __init__(self, messages: Dict[str, bytes]):
+        self.bytes_downloaded = 0
+        self.raw, self.full, self.attachments = {}, {}, {}
+        for message_id, raw in messages.items():
+            self.raw[message_id] = json.dumps(
+                {"id": message_id, "threadId": message_id, "raw": base64.urlsafe_b64encode(raw).decode()}
+            )
+            payload = full_payload(email.message_from_bytes(raw, policy=policy.compat32), self.attachments)
+            self.full[message_id] = json.dumps({"id": message_id, "threadId": message_id, "payload": payload})
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def attachments(self):
+        return self
+
+    def get(self, userId, id, format=None, fields=None, messageId=None):
+        if messageId is not None:
+            return Response(self, json.dumps({"data": self.attachments[id]}))
+        return Response(self, self.raw[id] if format == "raw" else self.full[id])
+
+
+def run(client: GmailClient, service: FakeGmailService, message_ids) -> Dict[str, float]:
+    service.bytes_downloaded = 0
+    started = time.process_time()
+    for message_id in message_ids:
+        email_data = client._fetch_email_content(service, message_id)
+        message = as_message(email_data.get("message") or email_data["mime_content"])
+        EmailLog.generate_message_hash(message.message_id, message.body_digest())
+        message.text_content()
+    elapsed = time.process_time() - started
+    return {"kb": service.bytes_downloaded / len(message_ids) / 1024, "ms": elapsed / len(message_ids) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--attachment-kb", type=int, default=1500)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    messages = {f"m{i}": make_message(i, args.attachment_kb) for i in range(args.messages)}
+    service = FakeGmailService(messages)
+    client = GmailClient()
+
+    print(f"{args.messages} messages with a {args.attachment_kb} KB attachment, per message\n")
+    print(f"{'mode':<8}{'KB downloaded':>15}{'CPU ms':>10}")
+    results = {}
+    for mode in ("raw", "full"):
+        client.fetch_format = mode
+        results[mode] = run(client, service, list(messages))
+        print(f"{mode:<8}{results[mode]['kb']:15.1f}{results[mode]['ms']:10.2f}")
+    print(
+        f"\nfull vs raw: {results['raw']['kb'] / results['full']['kb']:.0f}x fewer bytes, "
+        f"{results['raw']['ms'] / results['full']['ms']:.0f}x less CPU"
+    )
+
+
+if __name__ == "__main__":
+    main()
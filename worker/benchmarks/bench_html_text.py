@@ -0,0 +1,128 @@
+"""
+Benchmark: LLM input tokens for HTML-only emails, raw HTML vs. html_to_text
+
+Builds a synthetic corpus of HTML-only emails - marketing newsletters
+(table layout, inline CSS, hidden preheader, tracking links and pixels)
+and customer quote requests as Outlook and Gmail send them (Mso styles,
+quoted thread, item table) - and reports, per kind, the estimated tokens
+of what the Gmail path used to send (the raw HTML), of the converted
+text, and of the converted text after the prefilter's compaction, plus
+conversion time per email.
+
+Run from the worker directory:
+
+    python -m benchmarks.bench_html_text [--emails 200]
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from src.services.content_compactor import ContentCompactor, estimate_tokens
+from src.utils import LazyMessage
+from src.utils.html_text import html_to_text
+
+TRACK = "https://click.mailer.example.com/ls/click?upn=aHR0cHM6Ly93d3cuZXhhbXBsZS5jb20vcHJvZHVjdHM{i}&utm_source=newsletter"
+PIXEL = '<img src="https://open.mailer.example.com/o/{i}.gif" width="1" height="1" style="display:block" alt="">'
+
+
+def newsletter(rng: random.Random, i: int) -> str:
+    articles = "".join(
+        f'<tr><td style="padding:24px 32px;font-family:Helvetica,Arial,sans-serif;font-size:16px;'
+        f'line-height:24px;color:#333333"><h2 style="margin:0 0 8px;font-size:20px;color:#111">'
+        f'Product update {n}</h2><p style="margin:0 0 16px">We shipped {rng.randint(2, 9)} improvements to '
+        f'order tracking this month, including faster quotes and a new supplier dashboard.</p>'
+        f'<a href="{TRACK.format(i=i * 10 + n)}" style="background:#0a66c2;color:#fff;padding:12px 20px;'
+        f'border-radius:4px;text-decoration:none;display:inline-block">Read more</a></td></tr>'
+        for n in range(rng.randint(3, 6))
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Newsletter</title><style>'
+        + "".join(f".c{n}{{color:#{n:06x};margin:0;padding:0}}@media (max-width:600px){{.c{n}{{width:100%!important}}}}"
+                  for n in range(40))
+        + '</style></head><body style="margin:0;padding:0;background:#f4f4f4">'
+        '<div style="display:none;max-height:0;overflow:hidden">Your monthly update is here'
+        + "&zwnj;&nbsp;" * 80 + '</div>'
+        '<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td align="center">'
+        '<table role="presentation" width="600" cellpadding="0" cellspacing="0" style="background:#ffffff">'
+        f'<tr><td><img src="https://cdn.example.com/logo.png" width="120" alt="Example"></td></tr>{articles}'
+        '<tr><td style="font-size:12px;color:#999;padding:16px 32px">You are receiving this because you signed up. '
+        f'<a href="{TRACK.format(i=i)}&unsub=1">Unsubscribe</a> | <a href="{TRACK.format(i=i)}&prefs=1">'
+        f'Preferences</a></td></tr></table></td></tr></table>{PIXEL.format(i=i)}</body></html>'
+    )
+
+
+def quote_email(rng: random.Random, i: int) -> str:
+    rows = "".join(
+        f'<tr><td style="border:solid #BFBFBF 1.0pt;padding:0in 5.4pt 0in 5.4pt"><p class="MsoNormal">'
+        f'<span style="font-size:11.0pt;font-family:&quot;Calibri&quot;,sans-serif">{item}</span></p></td>'
+        f'<td style="border:solid #BFBFBF 1.0pt;padding:0in 5.4pt 0in 5.4pt"><p class="MsoNormal">'
+        f'<span style="font-size:11.0pt">{rng.randint(10, 500)}</span></p></td></tr>'
+        for item in rng.sample(["Steel pipe 2in", "Flange DN50", "Gasket set", "Valve PN16", "Bolts M12"], 3)
+    )
+    quoted = (
+        '<div style="border:none;border-top:solid #E1E1E1 1.0pt;padding:3.0pt 0in 0in 0in"><p class="MsoNormal">'
+        '<b>From:</b> Sales &lt;sales@supplier.com&gt;<br><b>Sent:</b> Monday<br><b>Subject:</b> Catalogue</p></div>'
+        '<blockquote style="margin-left:.8ex;border-left:1px solid #ccc;padding-left:1ex">'
+        '<p class="MsoNormal">Thank you for your interest. Please find our catalogue attached.</p></blockquote>'
+    )
+    return (
+        '<html xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office">'
+        '<head><meta http-equiv="Content-Type" content="text/html; charset=utf-8"><style><!--'
+        '@font-face{font-family:"Cambria Math";panose-1:2 4 5 3 5 4 6 3 2 4;}'
+        'p.MsoNormal,li.MsoNormal,div.MsoNormal{margin:0in;font-size:11.0pt;font-family:"Calibri",sans-serif;}'
+        'span.EmailStyle17{mso-style-type:personal-compose;font-family:"Calibri",sans-serif;color:windowtext;}'
+        '.MsoChpDefault{mso-style-type:export-only;}@page WordSection1{size:8.5in 11.0in;margin:1.0in;}'
+        '--></style><!--[if gte mso 9]><xml><o:shapedefaults v:ext="edit" spidmax="1026" /></xml><![endif]-->'
+        '</head><body lang="EN-US" link="#0563C1" vlink="#954F72"><div class="WordSection1">'
+        f'<p class="MsoNormal">Hi team,<o:p></o:p></p><p class="MsoNormal">Please send a quotation for order {i}, '
+        f'delivery to Pune by {rng.choice(["March", "April", "May"])}:<o:p></o:p></p>'
+        f'<table class="MsoTableGrid" border="1" cellspacing="0" cellpadding="0" style="border-collapse:collapse">'
+        f'<tr><td><p class="MsoNormal"><b>Item</b></p></td><td><p class="MsoNormal"><b>Qty</b></p></td></tr>{rows}'
+        '</table><p class="MsoNormal">Payment terms net 30.<o:p></o:p></p>'
+        '<p class="MsoNormal">Best regards,<br>Priya Shah<br>Procurement, Acme Industries</p>'
+        f'{quoted}</div></body></html>'
+    )
+
+
+KINDS: Dict[str, Callable[[random.Random, int], str]] = {"newsletter": newsletter, "quote": quote_email}
+
+
+def mime(html: str, i: int) -> str:
+    return (
+        f"From: sender{i}@example.com\nSubject: Email {i}\nMessage-ID: <html-{i}@example.com>\n"
+        f"Content-Type: text/html; charset=utf-8\n\n{html}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--emails", type=int, default=200, help="emails per kind")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    compactor = ContentCompactor()
+    print(f"{args.emails} HTML-only emails per kind, mean estimated tokens per email\n")
+    print(f"{'kind':<12}{'raw html':>10}{'text':>8}{'compacted':>11}{'reduction':>11}{'ms/email':>10}")
+    for kind, build in KINDS.items():
+        corpus: List[str] = [mime(build(rng, i), i) for i in range(args.emails)]
+        raw_tokens = text_tokens = compacted_tokens = 0
+        started = time.perf_counter()
+        texts = [LazyMessage.from_content(content).text_content() for content in corpus]
+        elapsed = time.perf_counter() - started
+        for content, text in zip(corpus, texts):
+            raw_tokens += estimate_tokens(content.split("\n\n", 1)[1])
+            text_tokens += estimate_tokens(text)
+            compacted_tokens += estimate_tokens(compactor.compact(text).content)
+        n = len(corpus)
+        print(
+            f"{kind:<12}{raw_tokens / n:10.0f}{text_tokens / n:8.0f}{compacted_tokens / n:11.0f}"
+            f"{1 - compacted_tokens / raw_tokens:10.1%}{elapsed / n * 1000:10.2f}"
+        )
+
+    sample = html_to_text(quote_email(random.Random(0), 0))
+    print(f"\nSample quote email as text:\n{sample}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark: per-email overhead of the compiled LangGraph vs. the direct runner
+
+Uses the workflow's own pipeline spec (topology and routing functions)
+with the LLM and DynamoDB steps stubbed out, so the difference between
+the runners is pure orchestration overhead:
+
+- noop: every node returns a fixed update
+- stubbed-llm: real PreFilterNode, ConfidenceGateNode and EmitEventNode,
+  instant stub classify/extract/persist
+
+Also checks that both runners produce the same final state.
+
+Run from the worker directory:
+
+    python -m benchmarks.bench_runner_overhead [--emails 2000]
+"""
+import time
+import asyncio
+import argparse
+import logging
+from typing import Any, Dict
+
+from src.graph.workflow import EmailProcessingWorkflow
+from src.graph.direct_runner import DirectRunner
+from src.graph.nodes import PreFilterNode, ConfidenceGateNode, EmitEventNode
+from src.graph.payload_store import get_payload_store, RAW_CONTENT, TEXT_CONTENT
+from src.models import PrefilterResult, ProcessingStatus
+
+MIME = (
+    "From: Buyer <buyer@customer.com>\r\n"
+    "Subject: Pricing proposal for the annual contract\r\n"
+    "Message-ID: <bench@customer.com>\r\n"
+    "Content-Type: text/plain\r\n\r\n"
+    + "Hi, please send a pricing proposal and quote for the annual logistics contract. "
+      "Our budget is 50 lakh and we want to sign the contract this quarter.\r\n" * 20
+)
+
+EXTRACTION = {
+    "tasks": [{"title": "Send pricing proposal", "description": "Send pricing", "priority": "high",
+               "due_date": "", "confidence": 0.9, "snippet": "pricing proposal"}],
+    "deals": [{"title": "Annual contract", "description": "Logistics contract", "value": 5000000.0,
+               "currency": "INR", "stage": "lead", "probability": 40, "confidence": 0.7, "snippet": "contract"}],
+    "agent": "stub", "tokens_used": 900,
+}
+USAGE = {"node": "stub", "model": "stub", "prompt_tokens": 500, "completion_tokens": 100, "total_tokens": 600}
+
+
+async def classify_stub(state):
+    return {"email_category": "sales_lead", "classification_confidence": 0.9,
+            "classification_reasoning": "stub", "llm_usage": [USAGE]}
+
+
+async def extract_stub(state):
+    return {"extraction_result": dict(EXTRACTION), "tokens_used": 900, "llm_usage": [USAGE], "agent_used": "stub"}
+
+
+async def persist_stub(state):
+    return {"tasks_saved": ["task-1"], "deals_saved": ["deal-1"], "status": ProcessingStatus.PROCESSED}
+
+
+def noop(update: Dict[str, Any]):
+    def node(state):
+        return dict(update)
+    return node
+
+
+def make_workflow(scenario: str) -> EmailProcessingWorkflow:
+    """Workflow object carrying only the nodes - the real spec and routing functions are used"""
+    workflow = EmailProcessingWorkflow.__new__(EmailProcessingWorkflow)
+    if scenario == "noop":
+        workflow.classify_node = noop({"email_category": "sales_lead"})
+        workflow.prefilter_node = noop({"prefilter_result": PrefilterResult.PASSED, "business_score": 0.5})
+        workflow.extract_node = noop({"extraction_result": dict(EXTRACTION)})
+        workflow.confidence_gate_node = noop({"high_confidence_tasks": [], "draft_tasks": []})
+        workflow.persist_node = noop({"tasks_saved": [], "deals_saved": []})
+        workflow.emit_event_node = noop({"events_to_emit": []})
+    else:
+        workflow.classify_node = classify_stub
+        workflow.prefilter_node = PreFilterNode()
+        workflow.extract_node = extract_stub
+        workflow.confidence_gate_node = ConfidenceGateNode()
+        workflow.persist_node = persist_stub
+        workflow.emit_event_node = EmitEventNode()
+    workflow.spec = workflow._build_spec()
+    return workflow
+
+
+def initial_state(i: int) -> Dict[str, Any]:
+    store = get_payload_store()
+    key = store.new_key(f"bench{i}")
+    store.put(key, RAW_CONTENT, MIME)
+    store.put(key, TEXT_CONTENT, MIME.split("\r\n\r\n", 1)[1])
+    return {
+        "message_id": f"<bench-{i}@customer.com>", "subject": "Pricing proposal", "sender_email": "buyer@customer.com",
+        "sender_name": None, "payload_key": key, "source": "bench", "user_id": "bench", "thread_keys": [],
+        "is_reply": False, "thread_classification": None, "message_hash": f"hash-{i}", "start_time": time.time(),
+        "processing_time_ms": 0, "prefilter_result": PrefilterResult.PASSED, "business_score": 0.0,
+        "tokens_saved": 0, "extraction_result": {}, "tokens_used": 0, "agent_used": "", "llm_usage": [],
+        "llm_budget_degraded": False, "high_confidence_tasks": [], "draft_tasks": [], "high_confidence_deals": [],
+        "draft_deals": [], "tasks_saved": [], "deals_saved": [], "status": ProcessingStatus.PROCESSED,
+        "error_message": None, "events_to_emit": [],
+    }
+
+
+def comparable(state: Dict[str, Any]) -> Dict[str, Any]:
+    # Event timestamps, stage durations and the per-run key differ between runs
+    state = {key: value for key, value in state.items() if key not in ("payload_key", "start_time")}
+    state["stage_timeline"] = [entry["stage"] for entry in state.get("stage_timeline", [])]
+    state["events_to_emit"] = [
+        {key: value for key, value in event.items() if key not in ("timestamp", "processing_time_ms", "stage_ms")}
+        for event in state.get("events_to_emit", [])
+    ]
+    return state
+
+
+async def measure(invoke, emails: int) -> float:
+    """Microseconds per email, sequential (overhead, not concurrency)"""
+    store = get_payload_store()
+    states = [initial_state(i) for i in range(emails)]
+    started = time.perf_counter()
+    for state in states:
+        await invoke(state)
+    elapsed = time.perf_counter() - started
+    for state in states:
+        store.release(state["payload_key"])
+    return elapsed / emails * 1e6
+
+
+async def main_async(emails: int):
+    print(f"{emails} emails per runner, sequential, microseconds per email\n")
+    print(f"{'scenario':<13}{'langgraph':>11}{'direct':>9}{'saved':>9}{'speedup':>9}")
+    for scenario in ("noop", "stubbed-llm"):
+        workflow = make_workflow(scenario)
+        app = workflow.spec.build_graph().compile()
+        runner = DirectRunner(workflow.spec)
+
+        graph_state = await app.ainvoke(initial_state(-1))
+        direct_state = await runner.ainvoke(initial_state(-1))
+        assert comparable(graph_state) == comparable(direct_state), "runners disagree"
+
+        # Warm up both paths
+        await measure(app.ainvoke, 50)
+        await measure(runner.ainvoke, 50)
+        graph = await measure(app.ainvoke, emails)
+        direct = await measure(runner.ainvoke, emails)
+        print(f"{scenario:<13}{graph:11.1f}{direct:9.1f}{graph - direct:9.1f}{graph / direct:8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--emails", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Node logging would dominate the measurement
+    asyncio.run(main_async(args.emails))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Memory benchmark: peak RSS of a batch with the full vs. the lean workflow state
+
+Pushes a batch of synthetic MIME emails (text body plus a base64
+attachment) through a LangGraph graph with the workflow's shape
+(classify -> prefilter -> extract -> confidence_gate -> persist -> emit)
+and up to --concurrency emails in flight, then reports peak RSS.
+
+- legacy: the previous state design - raw MIME, decoded text, filtered
+  content, full extraction result, Task/Deal objects and the EmailLog are
+  carried in the state of every in-flight email for its whole run, and the
+  caller keeps the parsed message alive while the graph runs.
+- lean: EmailProcessingState with the PayloadStore - the real PreFilterNode,
+  ConfidenceGateNode and EmitEventNode, raw content released after
+  prefiltering, filtered content after extraction.
+
+LLM and DynamoDB calls are replaced by sleeps and in-memory entities.
+Each mode runs in its own subprocess so peak RSS is not shared.
+
+Run from the worker directory:
+
+    python -m benchmarks.bench_state_memory [--emails 1000] [--concurrency 100]
+"""
+import os
+import sys
+import json
+import email
+import asyncio
+import argparse
+import resource
+import subprocess
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, TypedDict
+
+from langgraph.graph import StateGraph, END
+
+from src.graph.state import EmailProcessingState
+from src.graph.nodes import PreFilterNode, ConfidenceGateNode, EmitEventNode
+from src.graph.payload_store import get_payload_store, RAW_CONTENT, TEXT_CONTENT, FILTERED_CONTENT, CREATED_ENTITIES
+from src.models import (
+    Deal, DealStage, DealStatus, EmailLog, PrefilterResult, ProcessingStatus, Task, TaskPriority, TaskStatus
+)
+from src.services.prefilter import PrefilterService
+from src.utils import LazyMessage, extract_text_content
+
+BODY = (
+    "Hi team, following our call I am sharing the requirements for the annual logistics contract. "
+    "Please send a pricing proposal and quote for 40 trucks, and let us know the delivery timeline. "
+    "Our budget for this project is around 50 lakh and we would like to sign the contract this quarter. "
+)
+
+
+def make_email(i: int, body_kb: int, attachment_kb: int) -> str:
+    message = MIMEMultipart()
+    message["From"] = f"Buyer {i} <buyer{i}@customer{i % 50}.com>"
+    message["To"] = "sales@example.com"
+    message["Subject"] = f"Pricing proposal for logistics contract #{i}"
+    message["Message-ID"] = f"<bench-{i}@customer.com>"
+    message.attach(MIMEText((BODY * (body_kb * 1024 // len(BODY) + 1))[:body_kb * 1024], "plain"))
+    if attachment_kb:
+        attachment = MIMEApplication(os.urandom(attachment_kb * 1024), Name="requirements.pdf")
+        attachment["Content-Disposition"] = 'attachment; filename="requirements.pdf"'
+        message.attach(attachment)
+    return message.as_string()
+
+
+def extracted_items(i: int) -> Dict[str, List[Dict[str, Any]]]:
+    tasks = [{
+        "title": f"Send pricing proposal {i}-{n}", "description": "Prospect asked for a pricing proposal",
+        "priority": "high", "due_date": "", "confidence": 0.9 if n == 0 else 0.6, "snippet": BODY[:200]
+    } for n in range(3)]
+    deals = [{
+        "title": f"Annual logistics contract {i}-{n}", "description": "Yearly contract for 40 trucks",
+        "value": 5000000.0, "currency": "INR", "stage": "lead", "probability": 40,
+        "confidence": 0.85 if n == 0 else 0.5, "snippet": BODY[:200]
+    } for n in range(2)]
+    return {"tasks": tasks, "deals": deals}
+
+
+def make_entities(state: Dict[str, Any]) -> Dict[str, list]:
+    tasks = [
+        Task(user_id="bench", title=t["title"], description=t["description"], priority=TaskPriority.HIGH,
+             status=TaskStatus.DRAFT, source_email_id=state["message_hash"], confidence=t["confidence"],
+             agent="bench", audit_snippet=t["snippet"])
+        for t in state["high_confidence_tasks"] + state["draft_tasks"]
+    ]
+    deals = [
+        Deal(user_id="bench", title=d["title"], description=d["description"], value=d["value"],
+             currency=d["currency"], stage=DealStage.LEAD, status=DealStatus.DRAFT,
+             source_email_id=state["message_hash"], confidence=d["confidence"], agent="bench",
+             audit_snippet=d["snippet"])
+        for d in state["high_confidence_deals"] + state["draft_deals"]
+    ]
+    return {"tasks": tasks, "deals": deals}
+
+
+# ============================================================================
+# Legacy state design (as before the PayloadStore)
+# ============================================================================
+
+class LegacyState(TypedDict, total=False):
+    message_id: str
+    message_hash: str
+    subject: str
+    sender_email: str
+    raw_content: str
+    text_content: str
+    email_category: Optional[str]
+    prefilter_result: PrefilterResult
+    filtered_content: str
+    business_score: float
+    extraction_result: Dict[str, Any]
+    high_confidence_tasks: List[Dict[str, Any]]
+    draft_tasks: List[Dict[str, Any]]
+    high_confidence_deals: List[Dict[str, Any]]
+    draft_deals: List[Dict[str, Any]]
+    created_tasks: List[Task]
+    created_deals: List[Deal]
+    tasks_saved: List[str]
+    deals_saved: List[str]
+    email_log: EmailLog
+    status: ProcessingStatus
+    events_to_emit: List[Dict[str, Any]]
+
+
+def build_legacy_graph(latency: float):
+    prefilter = PrefilterService()
+    gate = ConfidenceGateNode()
+
+    async def classify(state):
+        await asyncio.sleep(latency)
+        return {"email_category": "sales_lead"}
+
+    async def prefilter_node(state):
+        email_msg = email.message_from_string(state["raw_content"])
+        content = state.get("text_content") or extract_text_content(email_msg)
+        headers = LazyMessage.from_content(state["raw_content"])
+        result, filtered, _ = await prefilter.process(content, headers)
+        return {"prefilter_result": result, "filtered_content": filtered,
+                "business_score": prefilter._calculate_business_score(content, headers)}
+
+    async def extract(state):
+        await asyncio.sleep(latency)
+        return {"extraction_result": {**extracted_items(len(state["filtered_content"])), "agent": "bench"}}
+
+    def gate_node(state):
+        result = gate({**state, "payload_key": ""})
+        result.pop("extraction_result", None)  # The legacy gate left the full result in the state
+        return result
+
+    async def persist(state):
+        entities = make_entities(state)
+        return {"created_tasks": entities["tasks"], "created_deals": entities["deals"],
+                "tasks_saved": [t.id for t in entities["tasks"]], "deals_saved": [d.id for d in entities["deals"]]}
+
+    def emit(state):
+        return {"events_to_emit": EmitEventNode()(state)["events_to_emit"]}
+
+    return compile_graph(LegacyState, classify, prefilter_node, extract, gate_node, persist, emit)
+
+
+async def run_legacy(app, mime_content: str):
+    email_msg = email.message_from_string(mime_content)
+    content = extract_text_content(email_msg)
+    message_id = email_msg["Message-ID"]
+    message_hash = EmailLog.generate_message_hash(message_id, content)
+    state = {
+        "message_id": message_id, "message_hash": message_hash, "subject": email_msg["Subject"],
+        "sender_email": "buyer@customer.com", "raw_content": mime_content, "text_content": content,
+        "status": ProcessingStatus.PROCESSED,
+        "email_log": EmailLog(message_id_hash=message_hash, original_message_id=message_id, user_id="bench",
+                              subject=email_msg["Subject"], sender_email="buyer@customer.com",
+                              prefilter_result=PrefilterResult.PASSED),
+    }
+    # email_msg and content stay referenced here for the whole run, as before
+    final_state = await app.ainvoke(state)
+    return len(final_state.get("tasks_saved", []))
+
+
+# ============================================================================
+# Lean state design
+# ============================================================================
+
+def build_lean_graph(latency: float):
+    store = get_payload_store()
+
+    async def classify(state):
+        await asyncio.sleep(latency)
+        return {"email_category": "sales_lead"}
+
+    async def extract(state):
+        content = store.pop(state["payload_key"], FILTERED_CONTENT, "")
+        await asyncio.sleep(latency)
+        return {"extraction_result": {**extracted_items(len(content)), "agent": "bench"}}
+
+    async def persist(state):
+        entities = make_entities(state)
+        store.put(state["payload_key"], CREATED_ENTITIES, entities)
+        return {"tasks_saved": [t.id for t in entities["tasks"]], "deals_saved": [d.id for d in entities["deals"]]}
+
+    return compile_graph(
+        EmailProcessingState, classify, PreFilterNode(), extract, ConfidenceGateNode(), persist, EmitEventNode()
+    )
+
+
+async def run_lean(app, mime_content: str):
+    store = get_payload_store()
+    email_msg = email.message_from_string(mime_content)
+    content = extract_text_content(email_msg)
+    message_id = email_msg["Message-ID"]
+    message_hash = EmailLog.generate_message_hash(message_id, content)
+    key = store.new_key(message_hash)
+    store.put(key, RAW_CONTENT, mime_content)
+    store.put(key, TEXT_CONTENT, content)
+    state = {
+        "message_id": message_id, "message_hash": message_hash, "subject": email_msg["Subject"],
+        "sender_email": "buyer@customer.com", "sender_name": None, "payload_key": key, "user_id": "bench",
+        "status": ProcessingStatus.PROCESSED, "tokens_saved": 0, "llm_usage": [],
+    }
+    del mime_content, email_msg, content
+    try:
+        final_state = await app.ainvoke(state)
+        return len(final_state.get("tasks_saved", []))
+    finally:
+        store.release(key)
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+def compile_graph(schema, classify, prefilter, extract, gate, persist, emit):
+    graph = StateGraph(schema)
+    for name, node in [("classify", classify), ("prefilter", prefilter), ("extract", extract),
+                       ("confidence_gate", gate), ("persist", persist), ("emit_event", emit)]:
+        graph.add_node(name, node)
+    graph.set_entry_point("classify")
+    graph.add_edge("classify", "prefilter")
+    graph.add_conditional_edges(
+        "prefilter",
+        lambda state: "continue" if state.get("prefilter_result") == PrefilterResult.PASSED else "skip",
+        {"continue": "extract", "skip": "emit_event"}
+    )
+    graph.add_edge("extract", "confidence_gate")
+    graph.add_edge("confidence_gate", "persist")
+    graph.add_edge("persist", "emit_event")
+    graph.add_edge("emit_event", END)
+    return graph.compile()
+
+
+def rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_mode(args) -> Dict[str, Any]:
+    app = build_legacy_graph(args.latency) if args.mode == "legacy" else build_lean_graph(args.latency)
+    run_one = run_legacy if args.mode == "legacy" else run_lean
+
+    # The batch itself is held by the caller in both designs
+    batch = [make_email(i, args.body_kb, args.attachment_kb) for i in range(args.emails)]
+    baseline = rss_mb()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(mime_content: str):
+        async with semaphore:
+            return await run_one(app, mime_content)
+
+    saved = await asyncio.gather(*[bounded(mime_content) for mime_content in batch])
+    return {
+        "mode": args.mode,
+        "emails": args.emails,
+        "tasks_saved": sum(saved),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+        "workflow_rss_mb": round(rss_mb() - baseline, 1),
+        "payload_store_runs_left": get_payload_store().get_stats()["runs"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["legacy", "lean", "both"], default="both")
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="Emails in flight")
+    parser.add_argument("--body-kb", type=int, default=20)
+    parser.add_argument("--attachment-kb", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    results = []
+    for mode in ("legacy", "lean"):
+        command = [sys.executable, "-m", "benchmarks.bench_state_memory", "--mode", mode,
+                   "--emails", str(args.emails), "--concurrency", str(args.concurrency),
+                   "--body-kb", str(args.body_kb), "--attachment-kb", str(args.attachment_kb),
+                   "--latency", str(args.latency)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.emails} emails, {args.concurrency} in flight, {args.body_kb}KB body + {args.attachment_kb}KB attachment\n")
+    print(f"{'mode':<8}{'tasks saved':>12}{'baseline MB':>13}{'peak MB':>10}{'workflow MB':>13}")
+    for result in results:
+        print(f"{result['mode']:<8}{result['tasks_saved']:>12}{result['baseline_rss_mb']:>13}"
+              f"{result['peak_rss_mb']:>10}{result['workflow_rss_mb']:>13}")
+
+
+if __name__ == "__main__":
+    main()
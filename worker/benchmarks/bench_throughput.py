@@ -0,0 +1,253 @@
+"""
+Benchmark: offline end-to-end throughput of the email pipeline
+
+Drives the real EmailProcessingWorkflow over a synthetic corpus
+(benchmarks/stubs.py), with the LLM answered in-process by a
+deterministic stub with a fixed latency and DynamoDB replaced by
+in-memory tables, so runs are repeatable and cost nothing:
+
+- workflow: process_emails_batch over batches of --batch-size emails,
+  --concurrency batches at a time
+- poller: GmailPoller history syncs (as push notifications trigger them)
+  of --users simulated Gmail mailboxes - triage, fetch, then the workflow
+
+Reports emails/s, pipeline latency percentiles (processing_time_ms of
+the emails that ran the graph), peak RSS, and LLM and DynamoDB calls per
+email. Sizes run smallest first in one process, so peak RSS is the
+process high-water mark up to that run; pass a single size for an
+isolated figure.
+
+--save-baseline writes the results to --baseline; --compare checks a run
+against it and exits 1 if throughput drops, or p95 latency or calls per
+email grow, by more than --tolerance.
+
+Run from the worker directory:
+
+    python -m benchmarks.bench_throughput [--scenario workflow|poller|all] [--emails 100,1000,10000]
+        [--llm-latency-ms 50] [--db-latency-ms 0] [--save-baseline | --compare]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import resource
+import warnings
+from typing import Any, Dict, List
+
+from benchmarks.stubs import StubLLM, install_tables, make_corpus
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "throughput.json")
+
+# Offline defaults; the stub counts calls, so the provider's limits don't apply
+BENCH_ENV = {
+    "OPENROUTER_API_KEY": "stub",
+    "OPENROUTER_BASE_URL": "http://openrouter.stub/api/v1",
+    "LLM_REQUESTS_PER_MINUTE": "1000000",
+    "LLM_TOKENS_PER_MINUTE": "10000000000",
+}
+
+# Metric -> True if higher is better (checked by --compare)
+COMPARED = {"emails_per_second": True, "p95_ms": False, "llm_calls_per_email": False, "db_calls_per_email": False}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_workflow(db_latency: float):
+    from src.graph.workflow import EmailProcessingWorkflow
+    workflow = EmailProcessingWorkflow()
+    db_calls = install_tables(workflow.db_client, workflow.persist_node.db_client, latency_seconds=db_latency)
+
+    # Keep every per-email result, whoever calls the workflow
+    results: List[Dict[str, Any]] = []
+    process_batch = workflow.process_emails_batch
+
+    async def recorded(*args, **kwargs):
+        batch_results = await process_batch(*args, **kwargs)
+        results.extend(result for result in batch_results if result)
+        return batch_results
+
+    workflow.process_emails_batch = recorded
+    return workflow, db_calls, results
+
+
+async def run_workflow(workflow, corpus: List[str], batch_size: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_batch(batch):
+        async with semaphore:
+            await workflow.process_emails_batch(batch, source="bench", user_id="bench")
+
+    await asyncio.gather(*[
+        run_batch(corpus[start:start + batch_size]) for start in range(0, len(corpus), batch_size)
+    ])
+
+
+async def run_poller(workflow, corpus: List[str], batch_size: int, users: int):
+    from src.services.gmail_poller import GmailPoller
+    from src.services.gmail_simulator import GmailPushSimulator
+    from src.services.poll_leases import InMemoryLeaseStore, PollLeaseManager
+
+    simulator = GmailPushSimulator()
+    leases = PollLeaseManager(InMemoryLeaseStore(), partitions=1, lease_ttl=30, heartbeat_interval=10, owner="bench")
+    poller = GmailPoller(workflow, leases=leases)
+    poller.gmail_client.get_service = simulator.service_for
+    poller.batch_size = batch_size
+
+    user_ids = [f"bench-user-{n}" for n in range(users)]
+    for user_id in user_ids:
+        mailbox = simulator.mailbox(user_id)
+        leases.save_watch(user_id, {
+            "email_address": mailbox.email_address, "history_id": str(mailbox.history_id), "expiration": 0
+        })
+    for i, raw in enumerate(corpus):
+        simulator.deliver(user_ids[i % users], raw.encode())
+    # One sync takes a whole mailbox
+    poller.max_emails_per_poll = len(corpus)
+
+    # Each mailbox's notification is handled on its own, as push deliveries are
+    synced = await asyncio.gather(*[poller.sync_history(user_id) for user_id in user_ids])
+    errors = [result for result in synced if result.get("status") != "success"]
+    if errors:
+        raise RuntimeError(f"history sync failed: {errors[0].get('error')}")
+    return sum(sum(result.get("emails_triaged", {}).values()) for result in synced)
+
+
+async def measure(scenario: str, emails: int, args) -> Dict[str, Any]:
+    llm = StubLLM(latency_seconds=args.llm_latency_ms / 1000)
+    llm.install()
+    workflow, db_calls, results = build_workflow(args.db_latency_ms / 1000)
+    corpus = make_corpus(emails)
+
+    started = time.perf_counter()
+    triaged = 0
+    if scenario == "workflow":
+        await run_workflow(workflow, corpus, args.batch_size, args.concurrency)
+    else:
+        triaged = await run_poller(workflow, corpus, args.batch_size, args.users)
+    elapsed = time.perf_counter() - started
+
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result.get("status", "unknown")] = statuses.get(result.get("status", "unknown"), 0) + 1
+    latencies = [result["processing_time_ms"] for result in results if result.get("status") == "success"]
+    return {
+        "emails": emails,
+        "seconds": round(elapsed, 3),
+        "emails_per_second": round(emails / elapsed, 2),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "llm_calls_per_email": round(sum(llm.calls.values()) / emails, 3),
+        "llm_calls": dict(llm.calls),
+        "db_calls_per_email": round(sum(db_calls.values()) / emails, 3),
+        "statuses": {**statuses, **({"triaged": triaged} if triaged else {})},
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against a saved baseline, as printable lines"""
+    regressions = []
+    for key, run in results.items():
+        saved = baseline.get("results", {}).get(key)
+        if saved is None:
+            print(f"  {key}: not in baseline")
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = saved.get(metric), run[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            marker = "REGRESSION" if worse > tolerance else "ok"
+            print(f"  {key:<16}{metric:<22}{old:>10}{new:>10}{change:+9.1%}  {marker}")
+            if worse > tolerance:
+                regressions.append(f"{key} {metric}: {old} -> {new}")
+    return regressions
+
+
+async def main_async(args) -> int:
+    scenarios = ["workflow", "poller"] if args.scenario == "all" else [args.scenario]
+    sizes = sorted(int(size) for size in args.emails.split(","))
+    print(
+        f"stub LLM {args.llm_latency_ms:g}ms/call, DynamoDB {args.db_latency_ms:g}ms/call, "
+        f"batch {args.batch_size}, concurrency {args.concurrency}, users {args.users}\n"
+    )
+    print(f"{'run':<16}{'emails/s':>10}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'RSS MB':>8}{'LLM/email':>11}{'DB/email':>10}  statuses")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for scenario in scenarios:
+        for emails in sizes:
+            run = await measure(scenario, emails, args)
+            key = f"{scenario}-{emails}"
+            results[key] = run
+            print(
+                f"{key:<16}{run['emails_per_second']:10.1f}{run['p50_ms']:8}{run['p95_ms']:8}{run['p99_ms']:8}"
+                f"{run['peak_rss_mb']:8.0f}{run['llm_calls_per_email']:11.2f}{run['db_calls_per_email']:10.2f}  "
+                f"{run['statuses']}"
+            )
+
+    config = {
+        "llm_latency_ms": args.llm_latency_ms, "db_latency_ms": args.db_latency_ms, "batch_size": args.batch_size,
+        "concurrency": args.concurrency, "users": args.users, "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}) != config:
+            print(f"\nWarning: baseline was recorded with {baseline.get('config')}")
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=["workflow", "poller", "all"], default="all")
+    parser.add_argument("--emails", default="100,1000,10000", help="Comma-separated corpus sizes")
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("GMAIL_BATCH_SIZE", "20")))
+    parser.add_argument("--concurrency", type=int, default=4, help="Workflow batches in flight (workflow scenario)")
+    parser.add_argument("--users", type=int, default=4, help="Simulated mailboxes (poller scenario)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    for name, value in BENCH_ENV.items():
+        os.environ.setdefault(name, value)
+    logging.disable(logging.WARNING)  # Per-email logging would dominate the measurement
+    # langchain's include_raw structured output trips pydantic's serializer check on every call
+    warnings.filterwarnings("ignore", message="Pydantic serializer warnings")
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Offline stand-ins for the end-to-end benchmarks
+
+- StubLLM answers OpenRouter chat completions in-process, through an
+  httpx mock transport on the shared LLM clients: deterministic
+  classification (from the subject's keywords) and extraction, with a
+  fixed per-call latency, plain or streamed (SSE) like stub_openrouter.py
+- InMemoryTable stands in for the boto3 Table calls the workflow makes;
+  items go through boto3's TypeSerializer, so marshalling costs (and
+  float rejections) match the real client
+- make_corpus builds a repeatable mix of sales, reply, support, internal
+  and newsletter emails
+"""
+import re
+import json
+import time
+import asyncio
+import hashlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from src.services import llm_rate_controller
+from src.services.http_client import get_http_clients
+
+SUBJECT_LINE = re.compile(r'\*\*Subject:\*\*\s*(.*)')
+
+# First keyword found in the subject decides the category (default: customer_support)
+CATEGORY_KEYWORDS = (
+    ("sales_lead", ("quote", "pricing", "proposal", "contract")),
+    ("internal_operations", ("standup", "payroll", "offsite")),
+    ("spam_noise", ("newsletter", "webinar", "digest")),
+)
+
+EXTRACTION = {
+    "tasks": [{
+        "title": "Send pricing proposal",
+        "description": "Prospect asked for pricing",
+        "priority": "high",
+        "due_date": "",
+        "confidence": 0.9,
+        "snippet": "please send a quote"
+    }],
+    "deals": [{
+        "title": "Annual logistics contract",
+        "description": "Prospect evaluating a yearly contract",
+        "value": 5000000,
+        "currency": "INR",
+        "stage": "lead",
+        "probability": 40,
+        "confidence": 0.7,
+        "snippet": "annual contract"
+    }]
+}
+
+CHUNK_CHARS = 64
+
+
+class StubLLM:
+    """Deterministic OpenRouter stand-in; counts calls by kind (classify, extract)"""
+
+    def __init__(self, latency_seconds: float = 0.05):
+        self.latency = latency_seconds
+        self.calls: Counter = Counter()
+
+    def classify(self, prompt: str) -> Dict[str, Any]:
+        match = SUBJECT_LINE.search(prompt)
+        subject = (match.group(1) if match else "").lower()
+        category = next(
+            (name for name, keywords in CATEGORY_KEYWORDS if any(keyword in subject for keyword in keywords)),
+            "customer_support"
+        )
+        # Same prompt, same confidence
+        spread = int(hashlib.sha1(prompt.encode()).hexdigest()[:4], 16) % 10
+        return {"category": category, "confidence": 0.85 + spread / 100, "reasoning": "Stub classification"}
+
+    def _response(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        model = body.get("model", "stub")
+        prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+        if "Classify this email" in prompt:
+            self.calls["classify"] += 1
+            content = json.dumps(self.classify(prompt))
+        else:
+            self.calls["extract"] += 1
+            content = json.dumps(EXTRACTION)
+
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        created = int(time.time())
+        if not body.get("stream"):
+            return httpx.Response(200, json={
+                "id": f"stub-{created}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def event(delta: Dict[str, Any], finish_reason=None, usage=None) -> str:
+            payload = {
+                "id": f"stub-{created}", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        events = [event({"role": "assistant", "content": ""})]
+        events += [event({"content": content[start:start + CHUNK_CHARS]}) for start in range(0, len(content), CHUNK_CHARS)]
+        events.append(event({}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(event({}, usage=usage))
+        events.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content="".join(events).encode())
+
+    async def _handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency)
+        return self._response(request)
+
+    def _handle_sync(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.latency)
+        return self._response(request)
+
+    def install(self):
+        """
+        Answer every LLM call of this process (call before building the
+        workflow); also starts a fresh shared rate controller, so each run
+        begins from the same concurrency window
+        """
+        clients = get_http_clients()
+        timeout = httpx.Timeout(clients.timeout, connect=10.0)
+        clients._async_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(self._handle_async),
+            event_hooks={"request": [clients._on_async_request]},
+            timeout=timeout
+        )
+        clients._sync_client = httpx.Client(
+            transport=httpx.MockTransport(self._handle_sync),
+            event_hooks={"request": [clients._on_sync_request]},
+            timeout=timeout
+        )
+        llm_rate_controller._shared_controller = None
+
+
+# Partition key per table, as created by the infra scripts
+KEY_SCHEMA = {
+    "tasks": "id",
+    "deals": "id",
+    "people": "id",
+    "companies": "id",
+    "email_log": "message_id_hash",
+    "token_usage": "usage_key",
+    "email_threads": "thread_key",
+    "email_jobs": "job_id",
+    "poll_leases": "lease_key",
+    "rate_limits": "rate_key",
+}
+
+UPDATE_CLAUSE = re.compile(r'\b(SET|ADD|REMOVE)\s+(.*?)(?=\s+\b(?:SET|ADD|REMOVE)\s|$)', re.S)
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class InMemoryTable:
+    """
+    The subset of boto3's Table the pipeline uses: get/put/delete_item,
+    update_item (plain SET, ADD and REMOVE actions), query on equality key
+    conditions (any attribute, so GSIs work; looked up in an index built on
+    first use, so large runs don't slow down on scans) and unfiltered scan.
+    Condition expressions are not supported.
+    """
+
+    def __init__(self, name: str, key: str, calls: Counter, latency_seconds: float = 0.0):
+        self.name = self.table_name = name
+        self.key = key
+        self.calls = calls
+        self.latency = latency_seconds
+        self.items: Dict[Any, Dict[str, Any]] = {}
+        # attribute -> value -> primary keys (dicts keep insertion order)
+        self._indexes: Dict[str, Dict[Any, Dict[Any, None]]] = {}
+
+    def _call(self, operation: str, kwargs: Dict[str, Any]):
+        if "ConditionExpression" in kwargs or "FilterExpression" in kwargs:
+            raise NotImplementedError(f"{operation}: condition and filter expressions are not supported")
+        self.calls[operation] += 1
+        if self.latency:
+            # Blocking, like the sync boto3 calls in the async nodes
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _load(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: _deserializer.deserialize(value) for name, value in item.items()}
+
+    def _index_value(self, stored: Dict[str, Any], attribute: str) -> Any:
+        value = stored.get(attribute)
+        return None if value is None else _deserializer.deserialize(value)
+
+    def _store(self, item: Dict[str, Any]):
+        key = item[self.key]
+        stored = {name: _serializer.serialize(value) for name, value in item.items()}
+        self._remove(key)
+        self.items[key] = stored
+        for attribute, index in self._indexes.items():
+            if attribute in stored:
+                index.setdefault(self._index_value(stored, attribute), {})[key] = None
+
+    def _remove(self, key: Any):
+        stored = self.items.pop(key, None)
+        if stored is None:
+            return
+        for attribute, index in self._indexes.items():
+            if attribute in stored:
+                index.get(self._index_value(stored, attribute), {}).pop(key, None)
+
+    def _index(self, attribute: str) -> Dict[Any, Dict[Any, None]]:
+        if attribute not in self._indexes:
+            index: Dict[Any, Dict[Any, None]] = {}
+            for key, stored in self.items.items():
+                if attribute in stored:
+                    index.setdefault(self._index_value(stored, attribute), {})[key] = None
+            self._indexes[attribute] = index
+        return self._indexes[attribute]
+
+    def put_item(self, Item: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._call("PutItem", kwargs)
+        self._store(Item)
+        return {}
+
+    def get_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._call("GetItem", kwargs)
+        item = self.items.get(Key[self.key])
+        return {"Item": self._load(item)} if item else {}
+
+    def delete_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._call("DeleteItem", kwargs)
+        self._remove(Key[self.key])
+        return {}
+
+    def update_item(
+        self,
+        Key: Dict[str, Any],
+        UpdateExpression: str,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        self._call("UpdateItem", kwargs)
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        stored = self.items.get(Key[self.key])
+        item = self._load(stored) if stored else dict(Key)
+
+        for action, body in UPDATE_CLAUSE.findall(UpdateExpression):
+            for part in body.split(","):
+                part = part.strip()
+                if "(" in part:
+                    raise NotImplementedError(f"update functions are not supported: {part}")
+                if action == "SET":
+                    name, value = (side.strip() for side in part.split("="))
+                    item[names.get(name, name)] = values[value]
+                elif action == "ADD":
+                    name, value = part.split()
+                    name = names.get(name, name)
+                    item[name] = item.get(name, 0) + values[value]
+                else:
+                    item.pop(names.get(part, part), None)
+
+        self._store(item)
+        return {"Attributes": item} if kwargs.get("ReturnValues") else {}
+
+    def _equalities(self, condition) -> List[Tuple[str, Any]]:
+        expression = condition.get_expression()
+        if expression["operator"] == "AND":
+            return [pair for part in expression["values"] for pair in self._equalities(part)]
+        if expression["operator"] != "=":
+            raise NotImplementedError(f"key condition {expression['operator']} is not supported")
+        key, value = expression["values"]
+        return [(key.name, value)]
+
+    def query(self, KeyConditionExpression, IndexName: Optional[str] = None, Limit: Optional[int] = None,
+              **kwargs) -> Dict[str, Any]:
+        self._call("Query", kwargs)
+        (attribute, value), *others = self._equalities(KeyConditionExpression)
+        found = []
+        for key in self._index(attribute).get(value, {}):
+            item = self._load(self.items[key])
+            if all(item.get(name) == other for name, other in others):
+                found.append(item)
+                if Limit and len(found) >= Limit:
+                    break
+        return {"Items": found, "Count": len(found)}
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        self._call("Scan", kwargs)
+        items = [self._load(stored) for stored in self.items.values()]
+        return {"Items": items, "Count": len(items)}
+
+
+def install_tables(*db_clients: Any, latency_seconds: float = 0.0) -> Counter:
+    """
+    Point DynamoDBClients at one shared set of in-memory tables
+
+    Returns:
+        Counter of calls by operation (PutItem, GetItem, ...)
+    """
+    calls: Counter = Counter()
+    tables = {name: InMemoryTable(name, key, calls, latency_seconds) for name, key in KEY_SCHEMA.items()}
+    for db_client in db_clients:
+        db_client.tables = dict(tables)
+    return calls
+
+
+PRODUCTS = ("cold-chain logistics", "warehouse racking", "fleet telematics", "packaging film", "forklift leasing")
+
+
+def make_corpus(count: int, domain_count: int = 50) -> List[str]:
+    """
+    count distinct MIME emails, in a fixed rotation of kinds: sales inquiry,
+    reply in an earlier sales thread, support request, internal note and
+    newsletter (List-Unsubscribe, so Gmail triage drops it)
+    """
+    emails = []
+    for i in range(count):
+        kind = i % 5
+        domain = f"customer{i % domain_count}.com"
+        product = PRODUCTS[i % len(PRODUCTS)]
+        headers = [f"Message-ID: <bench-{i}@{domain}>", "Date: Mon, 19 Oct 2026 09:00:00 +0530"]
+        if kind == 0:
+            headers += [f"From: Buyer {i} <buyer{i}@{domain}>", f"Subject: Request for quote: {product} #{i}"]
+            body = (
+                f"Hi, we are evaluating {product} for our plants and would like pricing for an annual contract. "
+                f"Please send a quote for 40 units by next Friday; our budget is around 50 lakh. Ref {i}.\n"
+            ) * 4
+        elif kind == 1:
+            original = f"<bench-{i - 1}@customer{(i - 1) % domain_count}.com>"
+            headers += [
+                f"From: Buyer {i - 1} <buyer{i - 1}@customer{(i - 1) % domain_count}.com>",
+                f"Subject: Re: Request for quote: {PRODUCTS[(i - 1) % len(PRODUCTS)]} #{i - 1}",
+                f"In-Reply-To: {original}", f"References: {original}",
+            ]
+            body = f"Following up on the quote - can we also get delivery timelines? Ref {i}.\n> earlier message\n"
+        elif kind == 2:
+            headers += [f"From: Ops {i} <ops{i}@{domain}>", f"Subject: Delivery delayed for order {1000 + i}"]
+            body = f"Our shipment for order {1000 + i} has not arrived, please check the status. Ref {i}.\n"
+        elif kind == 3:
+            headers += [f"From: Team <team{i}@ourcompany.com>", f"Subject: Weekly standup notes {i}"]
+            body = f"Notes from the standup: payroll run on Friday, offsite planning continues. Ref {i}.\n"
+        else:
+            headers += [
+                f"From: News <news@vendor{i % 7}.com>", f"Subject: Industry newsletter #{i}",
+                f"List-Unsubscribe: <mailto:unsubscribe@vendor{i % 7}.com>",
+            ]
+            body = f"This week's digest: ten trends in logistics. Issue {i}.\n" * 3
+        emails.append("\r\n".join(headers + ["Content-Type: text/plain; charset=utf-8", "", body]))
+    return emails
@@ -0,0 +1,99 @@
+"""
+Direct pipeline runner
+
+The workflow is almost linear, so the compiled LangGraph's per-step
+channel bookkeeping is pure overhead once LLM calls are fast (cached or
+local). PipelineSpec describes the pipeline once - node objects, fixed
+edges and routing functions - and builds both the LangGraph StateGraph
+and a DirectRunner that walks the same nodes in a plain loop.
+
+DirectRunner keeps LangGraph's semantics: nodes get the current state
+and return partial updates, Annotated reducers (e.g. operator.add)
+combine updates on the same key, everything else is last-value-wins,
+and updates to keys outside the state schema are rejected.
+"""
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple, get_type_hints
+
+from langgraph.graph import StateGraph, END
+
+
+@dataclass
+class PipelineSpec:
+    """Pipeline topology shared by the LangGraph build and the direct runner"""
+    state_schema: type
+    entry_point: str
+    nodes: Dict[str, Callable[[Dict[str, Any]], Any]]
+    edges: Dict[str, str] = field(default_factory=dict)  # node -> next node (or END)
+    routes: Dict[str, Tuple[Callable[[Dict[str, Any]], str], Dict[str, str]]] = field(default_factory=dict)
+
+    def build_graph(self) -> StateGraph:
+        """Uncompiled LangGraph StateGraph for this pipeline"""
+        graph = StateGraph(self.state_schema)
+        for name, node in self.nodes.items():
+            graph.add_node(name, node)
+        graph.set_entry_point(self.entry_point)
+        for name, (router, path_map) in self.routes.items():
+            graph.add_conditional_edges(name, router, path_map)
+        for name, target in self.edges.items():
+            graph.add_edge(name, target)
+        return graph
+
+
+def state_reducers(state_schema: type) -> Dict[str, Optional[Callable[[Any, Any], Any]]]:
+    """Key -> reducer for Annotated[type, reducer] fields, None for last-value fields"""
+    reducers = {}
+    for key, hint in get_type_hints(state_schema, include_extras=True).items():
+        metadata = getattr(hint, "__metadata__", ())
+        reducers[key] = next((item for item in metadata if callable(item)), None)
+    return reducers
+
+
+class DirectRunner:
+    """Runs a PipelineSpec without LangGraph, with the same state semantics"""
+
+    def __init__(self, spec: PipelineSpec, max_steps: int = 25):
+        """
+        Args:
+            spec: Pipeline to run
+            max_steps: Step limit guarding against routing loops (LangGraph's default recursion limit)
+        """
+        self.spec = spec
+        self.max_steps = max_steps
+        self.reducers = state_reducers(spec.state_schema)
+
+    def _apply(self, state: Dict[str, Any], node_name: str, update: Optional[Dict[str, Any]]):
+        if not update:
+            return
+        for key, value in update.items():
+            if key not in self.reducers:
+                raise ValueError(f"Node '{node_name}' returned unknown state key '{key}'")
+            reducer = self.reducers[key]
+            if reducer is not None and key in state:
+                state[key] = reducer(state[key], value)
+            else:
+                state[key] = value
+
+    def _next(self, node_name: str, state: Dict[str, Any]) -> str:
+        if node_name in self.spec.routes:
+            router, path_map = self.spec.routes[node_name]
+            return path_map[router(state)]
+        return self.spec.edges.get(node_name, END)
+
+    async def ainvoke(self, initial_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the pipeline from the entry point; returns the final state"""
+        state = dict(initial_state)
+        node_name = self.spec.entry_point
+        for _ in range(self.max_steps):
+            if node_name == END:
+                return state
+            # Nodes get a snapshot, as under LangGraph, so in-place edits don't leak
+            update = self.spec.nodes[node_name](dict(state))
+            if inspect.isawaitable(update):
+                update = await update
+            self._apply(state, node_name, update)
+            node_name = self._next(node_name, state)
+        if node_name == END:
+            return state
+        raise RuntimeError(f"Pipeline did not finish within {self.max_steps} steps")
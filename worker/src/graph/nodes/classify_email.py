@@ -2,14 +2,19 @@
 Email Classification Node - Uses LLM to classify emails as sales-relevant or not
 """
 import logging
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 import os
 
 from ...models import ProcessingStatus
 from ..state import EmailProcessingState
+from ..payload_store import get_payload_store, TEXT_CONTENT
+from ...services.token_usage import usage_from_message
+from ...services.openrouter_llm import OpenRouterLLM
+from ...services.model_router import model_candidates, get_model_router
+from ...services.content_compactor import ContentCompactor, CompactionResult
+from ...services.prefilter import PrefilterService
 
 logger = logging.getLogger(__name__)
 
@@ -36,17 +41,11 @@ class ClassifyEmailNode:
     def __init__(self):
         """Initialize the classification agent with OpenRouter LLM"""
         api_key = os.getenv("OPENROUTER_API_KEY")
-        model_name = os.getenv("OPENROUTER_MODEL", "mistralai/mistral-small")
 
-        self.llm = ChatOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            model=model_name,
-            temperature=0.1,  # Low temperature for consistent classification
-        )
-
-        # Create structured output LLM
-        self.structured_llm = self.llm.with_structured_output(EmailClassification)
+        self.compactor = ContentCompactor()
+        self.max_content_tokens = int(os.getenv("CLASSIFY_INPUT_TOKEN_BUDGET", "250"))
+        self.prefilter_service = PrefilterService()
+        self.payload_store = get_payload_store()
 
         # Classification prompt
         self.prompt = ChatPromptTemplate.from_messages([
@@ -81,8 +80,90 @@ Provide your classification with confidence score and reasoning."""),
 Classify this email and explain your reasoning.""")
         ])
 
-        # Create the chain
-        self.chain = self.prompt | self.structured_llm
+        # One chain per candidate model; the router picks between them
+        self.models = model_candidates("classify")
+        self.model_name = self.models[0]
+        self.router = get_model_router("classify", self.models)
+        self.chains = {}
+        for model in self.models:
+            # Shares the rate controller with the extraction LLM. With fallbacks
+            # configured, fail over quickly instead of retrying a troubled model.
+            llm = OpenRouterLLM(
+                model=model,
+                api_key=api_key,
+                temperature=0.1,  # Low temperature for consistent classification
+                max_retries=3 if len(self.models) == 1 else 1,
+                json_mode=False,  # Structured output sets its own response format
+            )
+            # include_raw keeps the AIMessage for token accounting
+            structured_llm = llm.with_structured_output(EmailClassification, include_raw=True)
+            self.chains[model] = self.prompt | structured_llm
+
+        # Primary model's chain
+        self.chain = self.chains[self.model_name]
+
+    async def ainvoke(self, chain_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the classification chain through the model router
+
+        Returns:
+            Chain output ({"raw", "parsed", "parsing_error"})
+        """
+        result, _ = await self.router.invoke(lambda model: self.chains[model].ainvoke(chain_input))
+        return result
+
+    def parse_result(self, result: Dict[str, Any]) -> Tuple[EmailClassification, Dict[str, Any]]:
+        """
+        Split a chain result into the classification and its token usage
+
+        Args:
+            result: Output of self.chain ({"raw", "parsed", "parsing_error"})
+
+        Returns:
+            Tuple of (classification, LLMUsage dict)
+        """
+        usage = usage_from_message(result.get("raw"), node="classify", default_model=self.model_name).to_dict()
+        classification = result.get("parsed")
+        if classification is None:
+            raise ValueError(f"Could not parse classification: {result.get('parsing_error')}")
+        return classification, usage
+
+    def inherit_thread_classification(self, thread: Dict[str, Any], content: str, subject: str = "") -> bool:
+        """
+        Decide whether a reply can reuse its thread's classification
+
+        Sales threads stay sales threads. Other threads are only re-classified
+        when the new text carries business signals that could change the
+        category (e.g. a support thread turning into an upsell).
+
+        Args:
+            thread: Thread record from the ThreadIndex
+            content: New (unquoted) text of the reply
+            subject: Reply subject
+
+        Returns:
+            True if the thread's category can be reused without an LLM call
+        """
+        if not thread or thread.get("category") in (None, "unknown"):
+            return False
+        if thread["category"] == "sales_lead":
+            return True
+        return not self.prefilter_service.business_regex.search(f"{subject}\n{content}")
+
+    def build_input(self, sender_email: str, subject: str, content: str) -> Tuple[Dict[str, Any], CompactionResult]:
+        """
+        Build the chain input, compacting content to the classification token budget
+
+        Returns:
+            Tuple of (chain input, compaction result)
+        """
+        compaction = self.compactor.compact(content, max_tokens=self.max_content_tokens)
+        chain_input = {
+            "sender_email": sender_email,
+            "subject": subject,
+            "content": compaction.content
+        }
+        return chain_input, compaction
 
     async def __call__(self, state: EmailProcessingState) -> Dict[str, Any]:
         """
@@ -97,19 +178,39 @@ Classify this email and explain your reasoning.""")
         try:
             sender_email = state.get("sender_email", "unknown@unknown.com")
             subject = state.get("subject", "No subject")
-            content = state.get("filtered_content", state.get("raw_content", ""))
-
-            # Truncate content for classification (don't need full email)
-            content_preview = content[:1000] if len(content) > 1000 else content
+            content = self.payload_store.get(state["payload_key"], TEXT_CONTENT, "")
+
+            # Token budget exhausted - skip the classifier and let prefilter decide (fail-open)
+            if state.get("llm_budget_degraded"):
+                logger.info(f"Token budget exhausted, skipping classification for {sender_email}")
+                return {
+                    "email_category": "sales_lead",
+                    "classification_confidence": 0.0,
+                    "classification_reasoning": "Classification skipped: daily token budget exhausted"
+                }
+
+            # Replies in a known thread reuse the thread's classification
+            thread = state.get("thread_classification")
+            if thread and self.inherit_thread_classification(thread, content, subject):
+                logger.info(f"Inherited thread classification: {thread['category']} for {sender_email}")
+                updates = {
+                    "email_category": thread["category"],
+                    "classification_confidence": float(thread.get("confidence", 0.0)),
+                    "classification_reasoning": f"Inherited from thread: {thread.get('reasoning', '')}"
+                }
+                if thread["category"] != "sales_lead":
+                    updates["status"] = ProcessingStatus.SKIPPED
+                    updates["error_message"] = f"Filtered: {thread['category']} (thread)"
+                return updates
+
+            # Compact content for classification (don't need full email)
+            chain_input, _ = self.build_input(sender_email, subject, content)
 
             logger.info(f"Classifying email from {sender_email}: {subject[:50]}...")
 
             # Run classification
-            classification: EmailClassification = await self.chain.ainvoke({
-                "sender_email": sender_email,
-                "subject": subject,
-                "content": content_preview
-            })
+            result = await self.ainvoke(chain_input)
+            classification, usage = self.parse_result(result)
 
             logger.info(
                 f"Classification: {classification.category} "
@@ -120,7 +221,8 @@ Classify this email and explain your reasoning.""")
             updates = {
                 "email_category": classification.category,
                 "classification_confidence": classification.confidence,
-                "classification_reasoning": classification.reasoning
+                "classification_reasoning": classification.reasoning,
+                "llm_usage": [usage]
             }
 
             # If not a sales lead, mark for skipping
@@ -17,6 +17,10 @@ class ConfidenceGateNode:
             confidence_threshold: Threshold above which items are auto-approved
         """
         self.confidence_threshold = confidence_threshold
+
+    def is_high_confidence(self, item: Dict[str, Any]) -> bool:
+        """Whether a single task or deal is auto-approved"""
+        return item.get("confidence", 0.0) >= self.confidence_threshold
     
     def __call__(self, state: EmailProcessingState) -> Dict[str, Any]:
         """
@@ -48,7 +52,7 @@ class ConfidenceGateNode:
             
             for task in tasks:
                 confidence = task.get("confidence", 0.0)
-                if confidence >= self.confidence_threshold:
+                if self.is_high_confidence(task):
                     high_confidence_tasks.append(task)
                     logger.info(f"High confidence task: {task['title']} ({confidence:.2f})")
                 else:
@@ -61,7 +65,7 @@ class ConfidenceGateNode:
             
             for deal in deals:
                 confidence = deal.get("confidence", 0.0)
-                if confidence >= self.confidence_threshold:
+                if self.is_high_confidence(deal):
                     high_confidence_deals.append(deal)
                     logger.info(f"High confidence deal: {deal['title']} ({confidence:.2f})")
                 else:
@@ -80,7 +84,11 @@ class ConfidenceGateNode:
                 "high_confidence_tasks": high_confidence_tasks,
                 "draft_tasks": draft_tasks,
                 "high_confidence_deals": high_confidence_deals,
-                "draft_deals": draft_deals
+                "draft_deals": draft_deals,
+                # The items now live in the gated lists - keep only the summary
+                "extraction_result": {
+                    key: value for key, value in extraction_result.items() if key not in ("tasks", "deals")
+                }
             }
             
         except Exception as e:
@@ -1,8 +1,10 @@
 from typing import Dict, Any, List
+import time
 import logging
 from datetime import datetime
 
 from ..state import EmailProcessingState
+from ..timeline import stage_durations
 
 logger = logging.getLogger(__name__)
 
@@ -33,13 +35,15 @@ class EmitEventNode:
                 "message_id": state["message_id"],
                 "message_hash": state["message_hash"],
                 "status": state.get("status"),
-                "processing_time_ms": state.get("processing_time_ms", 0),
+                # Time so far - the workflow's total is only known after this node
+                "processing_time_ms": int((time.time() - state["start_time"]) * 1000) if state.get("start_time") else 0,
+                "stage_ms": stage_durations(state.get("stage_timeline", [])),
                 "summary": {
                     "tasks_created": len(state.get("tasks_saved", [])),
                     "deals_created": len(state.get("deals_saved", [])),
                     "high_confidence_tasks": len(state.get("high_confidence_tasks", [])),
                     "high_confidence_deals": len(state.get("high_confidence_deals", [])),
-                    "tokens_used": state.get("tokens_used", 0),
+                    "tokens_used": sum(u.get("total_tokens", 0) for u in state.get("llm_usage", [])),
                     "business_score": state.get("business_score", 0.0)
                 }
             }
@@ -1,46 +1,114 @@
-from typing import Dict, Any, List
+from datetime import date
+from typing import Annotated, Dict, Any, List, Literal, Tuple, Optional, Callable, Awaitable, Type
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 import json
+import time
+import asyncio
 import logging
 import os
 
-from ...models import ProcessingStatus
+from ...models import ProcessingStatus, Task, Deal, TaskPriority, DealStage, VALID_CURRENCIES
 from ..state import EmailProcessingState
+from ..payload_store import get_payload_store, FILTERED_CONTENT, STREAMED_ENTITIES
 from ...services.openrouter_llm import OpenRouterLLM
+from ...services.model_router import model_candidates, get_model_router
+from ...services.token_usage import usage_from_message
+from ...services.streaming_json import IncrementalJSONParser
+from ...services.extraction_normalizer import ExtractionNormalizer
+from ...services.content_compactor import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
 
+def _constrained(model: Type[BaseModel], name: str, annotation: Any = None) -> Any:
+    """Type of a persistence model field, keeping its constraints (lengths, ranges)"""
+    field = model.model_fields[name]
+    annotation = annotation or field.annotation
+    return Annotated[(annotation, *field.metadata)] if field.metadata else annotation
+
+
 class TaskExtraction(BaseModel):
-    """Schema for task extraction"""
-    title: str = Field(description="Clear, actionable task title")
-    description: str = Field(description="Detailed task description")
-    priority: str = Field(description="Task priority: high, medium, or low")
-    due_date: str = Field(default="", description="Due date if mentioned (YYYY-MM-DD)")
-    confidence: float = Field(description="Confidence score between 0.0 and 1.0")
+    """Schema for task extraction (types and constraints come from the Task model)"""
+    model_config = ConfigDict(extra="forbid")
+
+    title: _constrained(Task, "title") = Field(description="Clear, actionable task title")
+    description: _constrained(Task, "description") = Field(description="Detailed task description")
+    priority: _constrained(Task, "priority") = Field(description="Task priority")
+    due_date: Optional[date] = Field(description="Due date if mentioned (YYYY-MM-DD), otherwise null")
+    confidence: _constrained(Task, "confidence") = Field(description="Confidence score between 0.0 and 1.0")
     snippet: str = Field(description="Email snippet that led to this extraction")
 
 
 class DealExtraction(BaseModel):
-    """Schema for deal extraction"""
-    title: str = Field(description="Deal title or opportunity name")
-    description: str = Field(description="Detailed deal description")
-    value: float = Field(default=0.0, description="Estimated deal value")
-    currency: str = Field(default="INR", description="Currency code")
-    stage: str = Field(description="Deal stage: lead, contacted, demo, proposal, negotiation, closed_won")
-    probability: int = Field(description="Win probability between 0 and 100")
-    confidence: float = Field(description="Confidence score between 0.0 and 1.0")
+    """Schema for deal extraction (types and constraints come from the Deal model)"""
+    model_config = ConfigDict(extra="forbid")
+
+    title: _constrained(Deal, "title") = Field(description="Deal title or opportunity name")
+    description: _constrained(Deal, "description") = Field(description="Detailed deal description")
+    value: _constrained(Deal, "value", float) = Field(description="Estimated deal value as a plain number, 0 if unknown")
+    currency: Literal[tuple(VALID_CURRENCIES)] = Field(description="Currency code")
+    stage: _constrained(Deal, "stage") = Field(description="Deal stage")
+    probability: _constrained(Deal, "probability") = Field(description="Win probability between 0 and 100")
+    confidence: _constrained(Deal, "confidence") = Field(description="Confidence score between 0.0 and 1.0")
     snippet: str = Field(description="Email snippet that led to this extraction")
 
 
 class ExtractionResult(BaseModel):
     """Complete extraction result"""
+    model_config = ConfigDict(extra="forbid")
+
     tasks: List[TaskExtraction] = Field(default_factory=list)
     deals: List[DealExtraction] = Field(default_factory=list)
 
 
+# Keywords some providers reject in strict mode - enforced locally by the normalizer instead
+_UNSUPPORTED_STRICT_KEYWORDS = ("minLength", "maxLength", "default")
+
+
+def strict_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    JSON schema for strict structured output
+
+    Strict mode requires every property to be listed as required and
+    additionalProperties to be false on every object.
+    """
+    schema = model.model_json_schema()
+
+    def visit(node: Any):
+        if isinstance(node, dict):
+            for keyword in _UNSUPPORTED_STRICT_KEYWORDS:
+                node.pop(keyword, None)
+            if "$ref" in node:
+                # No sibling keywords next to $ref
+                for keyword in [key for key in node if key != "$ref"]:
+                    node.pop(keyword)
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    visit(schema)
+    return schema
+
+
+def extraction_response_format() -> Dict[str, Any]:
+    """response_format constraining extraction output to ExtractionResult"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "extraction_result",
+            "strict": True,
+            "schema": strict_json_schema(ExtractionResult),
+        },
+    }
+
+
 class ExtractLocalNode:
     """LangGraph node for LLM extraction using OpenRouter"""
 
@@ -58,15 +126,30 @@ class ExtractLocalNode:
         """
         # Use OpenRouter only (removed Ollama support)
         self.provider = "openrouter"
-        model = model_name or os.getenv("OPENROUTER_MODEL", "mistralai/mistral-small")
-        self.llm = OpenRouterLLM(
-            model=model,
-            api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
-            temperature=0.1,
-        )
-        logger.info(f"Using OpenRouter with model: {model}")
+        # Constrain output to the persistence schema (json_object = free-form JSON)
+        self.response_format_type = os.getenv("EXTRACT_RESPONSE_FORMAT", "json_schema")
+        response_format = extraction_response_format() if self.response_format_type == "json_schema" else None
+        self.models = model_candidates("extract", primary=model_name)
+        self.router = get_model_router("extract", self.models)
+        self.llms = {
+            model: OpenRouterLLM(
+                model=model,
+                api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
+                temperature=0.1,
+                # With fallbacks configured, fail over instead of retrying a troubled model
+                max_retries=3 if len(self.models) == 1 else 1,
+                response_format=response_format,
+            )
+            for model in self.models
+        }
+        # Primary model
+        self.llm = self.llms[self.models[0]]
+        logger.info(f"Using OpenRouter with models: {', '.join(self.models)}")
 
         self.parser = JsonOutputParser(pydantic_object=ExtractionResult)
+        # Repairs and normalizes raw output for every extraction path
+        self.normalizer = ExtractionNormalizer()
+        self.payload_store = get_payload_store()
 
         # Create extraction prompt
         self.prompt = ChatPromptTemplate.from_messages([
@@ -74,8 +157,25 @@ class ExtractLocalNode:
             ("human", "Analyze this email:\n\nSUBJECT: {subject}\nFROM: {sender}\n\nCONTENT:\n{content}")
         ])
 
-        # Create extraction chain
-        self.chain = self.prompt | self.llm | self.parser
+        # Streaming mode hands each entity to entity_sink (set by the workflow)
+        # as soon as it is complete, instead of waiting for the whole response
+        self.streaming = os.getenv("EXTRACT_STREAMING", "true").lower() == "true"
+        self.entity_sink: Optional[Callable[[Dict[str, Any], str, Dict[str, Any]], Awaitable[Any]]] = None
+
+        # Create extraction chains - the parser runs separately so the raw
+        # AIMessage (and its token usage metadata) is still available
+        self.llm_chains = {model: self.prompt | llm for model, llm in self.llms.items()}
+        self.llm_chain = self.llm_chains[self.models[0]]
+        self.chain = self.llm_chain | self.parser
+
+    async def invoke_llm(self, llm_input: Dict[str, Any]) -> Tuple[Any, str]:
+        """
+        Run the extraction prompt through the model router
+
+        Returns:
+            Tuple of (AIMessage, model that answered)
+        """
+        return await self.router.invoke(lambda model: self.llm_chains[model].ainvoke(llm_input))
 
     async def __call__(self, state: EmailProcessingState) -> Dict[str, Any]:
         """
@@ -92,86 +192,41 @@ class ExtractLocalNode:
             return {}
 
         try:
-            # Prepare input for LLM
+            # Prepare input for LLM - the filtered content is not needed after this step
             llm_input = {
                 "subject": state["subject"],
                 "sender": state["sender_email"],
-                "content": state["filtered_content"]
+                "content": self.payload_store.pop(state["payload_key"], FILTERED_CONTENT, "")
             }
 
             logger.info(f"Starting {self.provider} LLM extraction for email: {state['message_id']}")
 
+            if self.streaming:
+                return await self._stream_extraction(state, llm_input)
+
             # Call LLM
-            result = await self.chain.ainvoke(llm_input)
-
-            # Extract token usage (if available)
-            tokens_used = 0  # Would need to implement token counting
-
-            logger.info(f"LLM returned: {type(result)} - {result}")
-
-            # Handle both dict and Pydantic model results
-            if isinstance(result, dict):
-                # LLM returned dict - extract tasks and deals
-                tasks_data = []
-                deals_data = []
-
-                for task_raw in result.get("tasks", []):
-                    # Convert simplified format to full task format
-                    # Extract title and description from available fields
-                    # LLM returns 'task' field, use that as title if available
-                    title = task_raw.get("task", task_raw.get("title", task_raw.get("text", task_raw.get("snippet", "Unknown task"))))
-                    description = task_raw.get("snippet", task_raw.get("description", task_raw.get("text", title)))
-
-                    task_data = {
-                        "title": title,
-                        "description": description if description else title,  # Ensure description is not empty
-                        "priority": task_raw.get("priority", "medium"),
-                        "due_date": task_raw.get("due_date", ""),
-                        "confidence": task_raw.get("confidence", 0.5),
-                        "snippet": task_raw.get("snippet", task_raw.get("text", title))
-                    }
-                    tasks_data.append(task_data)
-
-                for deal_raw in result.get("deals", []):
-                    # Convert simplified format to full deal format
-                    # Extract title and description from available fields
-                    title = deal_raw.get("title", deal_raw.get("text", deal_raw.get("snippet", "Unknown deal")))
-                    description = deal_raw.get("description", deal_raw.get("snippet", deal_raw.get("text", title)))
-
-                    deal_data = {
-                        "title": title,
-                        "description": description if description else title,  # Ensure description is not empty
-                        "value": deal_raw.get("value", 0.0),
-                        "currency": deal_raw.get("currency", "INR"),
-                        "stage": deal_raw.get("stage", "lead"),
-                        "probability": deal_raw.get("probability", 50),
-                        "confidence": deal_raw.get("confidence", 0.5),
-                        "snippet": deal_raw.get("snippet", deal_raw.get("text", title))
-                    }
-                    deals_data.append(deal_data)
-
-                # Create extraction data
-                extraction_data = {
-                    "tasks": tasks_data,
-                    "deals": deals_data,
-                    "agent": getattr(self.llm, 'model', getattr(self.llm, 'model_name', self.provider)),
-                    "tokens_used": tokens_used
-                }
-            else:
-                # Pydantic model result
-                extraction_data = {
-                    "tasks": [task.dict() for task in result.tasks],
-                    "deals": [deal.dict() for deal in result.deals],
-                    "agent": getattr(self.llm, 'model', getattr(self.llm, 'model_name', self.provider)),
-                    "tokens_used": tokens_used
-                }
+            message, model = await self.invoke_llm(llm_input)
+            usage = usage_from_message(message, node="extract", default_model=model).to_dict()
+            tokens_used = usage["total_tokens"]
+            # Unrecoverable output raises and marks the extraction failed
+            result = self.normalizer.normalize(self.normalizer.parse(self._message_text(message)))
+
+            logger.info(f"LLM returned: {result}")
+
+            extraction_data = {
+                "tasks": result["tasks"],
+                "deals": result["deals"],
+                "agent": model,
+                "tokens_used": tokens_used
+            }
 
             logger.info(f"{self.provider} extraction complete. Tasks: {len(extraction_data['tasks'])}, Deals: {len(extraction_data['deals'])}")
 
             return {
                 "extraction_result": extraction_data,
                 "tokens_used": tokens_used,
-                "agent_used": getattr(self.llm, 'model', getattr(self.llm, 'model_name', self.provider))
+                "llm_usage": [usage],
+                "agent_used": model
             }
 
         except Exception as e:
@@ -184,6 +239,129 @@ class ExtractLocalNode:
                 "agent_used": "failed"
             }
 
+    @staticmethod
+    def _message_text(message: Any) -> str:
+        content = getattr(message, "content", message)
+        return content if isinstance(content, str) else ""
+
+    async def _stream_extraction(self, state: EmailProcessingState, llm_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stream the extraction and hand each task/deal to the entity sink as soon as it is complete
+
+        The stream is closed as soon as the top-level JSON object closes.
+        Falls back to parsing the full text if the output wasn't a clean
+        streamed object. Hedging is disabled (a duplicate stream would emit
+        duplicate entities), and failover only applies until the first entity
+        is saved. A stream that fails after that keeps what it saved instead
+        of failing the email, so a retry doesn't save the entities again.
+
+        Returns:
+            State updates, same shape as the non-streaming path; entities saved
+            while streaming are put in the payload store (STREAMED_ENTITIES)
+        """
+        tasks_data: List[Dict[str, Any]] = []
+        deals_data: List[Dict[str, Any]] = []
+        streamed_entities: Dict[str, Any] = {}
+        seen = set()
+        first_entity_ms = None
+        streamed_by = None
+
+        async def emit(kind: str, raw: Dict[str, Any], model: str):
+            nonlocal first_entity_ms, streamed_by
+            data = self.normalizer.normalize_task(raw) if kind == "task" else self.normalizer.normalize_deal(raw)
+            if data is None:
+                return
+            # A failover to another model may repeat entities already emitted (only
+            # possible before the first one is saved - see fail_over below)
+            key = (kind, str(data["title"]).strip().lower())
+            if key in seen:
+                return
+            seen.add(key)
+            (tasks_data if kind == "task" else deals_data).append(data)
+
+            if self.entity_sink is None:
+                return
+            entity = await self.entity_sink({**state, "agent_used": model}, kind, data)
+            if entity is not None:
+                data["persisted_id"] = entity.id
+                streamed_entities[entity.id] = entity
+                streamed_by = model
+                if first_entity_ms is None and state.get("start_time"):
+                    first_entity_ms = int((time.time() - state["start_time"]) * 1000)
+                    logger.info(f"First entity persisted after {first_entity_ms}ms for email: {state['message_id']}")
+
+        async def attempt(model: str):
+            parser = IncrementalJSONParser()
+            message = None
+            emitted = {"tasks": 0, "deals": 0}
+            stream = self.llm_chains[model].astream(llm_input)
+            try:
+                async for chunk in stream:
+                    message = chunk if message is None else message + chunk
+                    for key, element in parser.feed(chunk.content if isinstance(chunk.content, str) else ""):
+                        if key in emitted:
+                            emitted[key] += 1
+                            await emit(key[:-1], element, model)
+                    if parser.done:
+                        break  # Early finish - don't wait for trailing tokens
+            finally:
+                await stream.aclose()
+
+            if not parser.done:
+                # Not a clean streamed object (fenced, truncated...) - parse what we got
+                try:
+                    result = self.normalizer.parse(parser.text)
+                except ValueError as e:
+                    logger.warning(f"Streamed extraction output unparseable: {e}")
+                    result = {}
+                for key in emitted:
+                    for element in result.get(key, [])[emitted[key]:]:
+                        await emit(key[:-1], element, model)
+            return message, parser.done
+
+        try:
+            # Another model would word its entities differently - no failover once any is saved
+            (message, finished_early), model = await self.router.invoke(
+                attempt, hedging=False, fail_over=lambda error: not streamed_entities
+            )
+        except Exception as e:
+            if not streamed_entities:
+                raise
+            logger.warning(
+                f"Streaming extraction failed after {len(streamed_entities)} entities were saved, "
+                f"keeping them for email {state['message_id']}: {e}"
+            )
+            message, finished_early, model = None, False, streamed_by
+
+        if streamed_entities:
+            self.payload_store.put(state["payload_key"], STREAMED_ENTITIES, streamed_entities)
+
+        usage = usage_from_message(message, node="extract", default_model=model)
+        if not usage.total_tokens:
+            # Usage arrives in the final chunk, which an early finish skips - estimate it
+            prompt = self.prompt.format_messages(**llm_input)
+            usage.prompt_tokens = sum(estimate_tokens(str(m.content)) for m in prompt)
+            usage.completion_tokens = estimate_tokens(str(message.content) if message else "")
+        usage = usage.to_dict()
+
+        logger.info(
+            f"{self.provider} streaming extraction complete. Tasks: {len(tasks_data)}, Deals: {len(deals_data)}, "
+            f"persisted while streaming: {len(streamed_entities)}, early finish: {finished_early}"
+        )
+
+        return {
+            "extraction_result": {
+                "tasks": tasks_data,
+                "deals": deals_data,
+                "agent": model,
+                "tokens_used": usage["total_tokens"],
+                "first_entity_ms": first_entity_ms
+            },
+            "tokens_used": usage["total_tokens"],
+            "llm_usage": [usage],
+            "agent_used": model
+        }
+
     def _get_system_prompt(self) -> str:
         """Get the system prompt for extraction"""
         return """You are a business email analyzer. Extract actionable tasks and potential deals from email content.
@@ -192,6 +370,8 @@ TASK EXTRACTION RULES:
 - Only extract clear, actionable tasks with specific action verbs
 - Must be specific enough to be actionable (not vague references)
 - Examples: "Send proposal by Friday", "Schedule follow-up call", "Review contract terms"
+- Priority: {priorities}
+- Due date: YYYY-MM-DD if a date is mentioned, otherwise null
 - Set confidence based on clarity and actionability (0.0-1.0)
 
 DEAL EXTRACTION RULES:
@@ -204,8 +384,8 @@ DEAL EXTRACTION RULES:
   - Examples: "₹50L" → value: 5000000, "₹1.5 Cr" → value: 15000000, "₹2.5 lakhs" → value: 250000
   - If range given (e.g., "₹50L to ₹1Cr"), use the lower value
   - If multi-year total given (e.g., "₹50L first year, ₹1.5Cr over 3 years"), use first year value
-- Currency: Always "INR" for Indian Rupee deals
-- Deal stages: lead, contacted, demo, proposal, negotiation, closed_won
+- Currency: Always "INR" for Indian Rupee deals (allowed: {currencies})
+- Deal stages: {stages}
 - Set confidence based on buying signals strength (0.0-1.0)
 
 OUTPUT REQUIREMENTS:
@@ -222,11 +402,15 @@ CONFIDENCE SCORING:
 - 0.3-0.4: Weakly implied
 - 0.0-0.2: Very uncertain
 
-Respond only with valid JSON. No additional text."""
+Respond only with valid JSON. No additional text.""".format(
+            priorities=", ".join(priority.value for priority in TaskPriority),
+            stages=", ".join(stage.value for stage in DealStage),
+            currencies=", ".join(VALID_CURRENCIES),
+        )
 
     async def extract_batch(self, emails_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Extract tasks and deals from multiple emails using LangChain's batch processing
+        Extract tasks and deals from multiple emails concurrently through the model router
 
         Args:
             emails_data: List of dicts with keys: subject, sender, content
@@ -235,7 +419,7 @@ Respond only with valid JSON. No additional text."""
             List of extraction results matching input order: [{tasks: [], deals: []}, ...]
         """
         try:
-            logger.info(f"Starting batch LLM extraction for {len(emails_data)} emails using LangChain abatch")
+            logger.info(f"Starting batch LLM extraction for {len(emails_data)} emails")
 
             # Prepare batch inputs
             batch_inputs = [
@@ -247,53 +431,19 @@ Respond only with valid JSON. No additional text."""
                 for email in emails_data
             ]
 
-            # Use LangChain's abatch for parallel processing
-            results = await self.chain.abatch(batch_inputs)
+            # Run concurrently (the shared rate controller bounds concurrency)
+            responses = await asyncio.gather(*[self.invoke_llm(llm_input) for llm_input in batch_inputs])
 
             # Process results
             processed_results = []
-            for idx, result in enumerate(results):
-                if isinstance(result, dict):
-                    # Extract tasks and deals
-                    tasks_data = []
-                    for task_raw in result.get("tasks", []):
-                        title = task_raw.get("task", task_raw.get("title", task_raw.get("snippet", "Unknown task")))
-                        description = task_raw.get("snippet", task_raw.get("description", title))
-
-                        task_data = {
-                            "title": title,
-                            "description": description if description else title,
-                            "priority": task_raw.get("priority", "medium"),
-                            "due_date": task_raw.get("due_date", ""),
-                            "confidence": task_raw.get("confidence", 0.5),
-                            "snippet": task_raw.get("snippet", title)
-                        }
-                        tasks_data.append(task_data)
-
-                    deals_data = []
-                    for deal_raw in result.get("deals", []):
-                        title = deal_raw.get("title", deal_raw.get("snippet", "Unknown deal"))
-                        description = deal_raw.get("description", deal_raw.get("snippet", title))
-
-                        deal_data = {
-                            "title": title,
-                            "description": description if description else title,
-                            "value": deal_raw.get("value", 0.0),
-                            "currency": deal_raw.get("currency", "INR"),
-                            "stage": deal_raw.get("stage", "lead"),
-                            "probability": deal_raw.get("probability", 50),
-                            "confidence": deal_raw.get("confidence", 0.5),
-                            "snippet": deal_raw.get("snippet", title)
-                        }
-                        deals_data.append(deal_data)
-
-                    processed_results.append({
-                        "tasks": tasks_data,
-                        "deals": deals_data
-                    })
-                else:
-                    # Empty result
-                    processed_results.append({"tasks": [], "deals": []})
+            for idx, (message, model) in enumerate(responses):
+                usage = usage_from_message(message, node="extract", default_model=model).to_dict()
+                result = self.normalizer.parse_and_normalize(self._message_text(message))
+                processed_results.append({
+                    "tasks": result["tasks"],
+                    "deals": result["deals"],
+                    "llm_usage": [usage]
+                })
 
             logger.info(f"Batch extraction complete. Processed {len(processed_results)} emails")
             return processed_results
@@ -6,6 +6,7 @@ from datetime import datetime
 from ...models import Task, Deal, Person, TaskStatus, DealStatus, TaskPriority, DealStage, ProcessingStatus
 from ...services.dynamodb_client import DynamoDBClient
 from ..state import EmailProcessingState
+from ..payload_store import get_payload_store, STREAMED_ENTITIES, CREATED_ENTITIES
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +25,11 @@ class PersistNode:
             table_prefix=table_prefix,
             endpoint_url=endpoint_url
         )
+        self.payload_store = get_payload_store()
     
     async def __call__(self, state: EmailProcessingState) -> Dict[str, Any]:
         """
-        Persist tasks and deals to database
+        Persist tasks and deals to database (a dry run only builds them)
         
         Args:
             state: Current processing state
@@ -47,9 +49,15 @@ class PersistNode:
             deals_saved = []
             people_saved = []
 
+            # Entities already saved while the extraction was streaming
+            streamed = self.payload_store.pop(state["payload_key"], STREAMED_ENTITIES) or {}
+
             # Create and persist high-confidence tasks (auto-accepted)
             high_conf_tasks = state.get("high_confidence_tasks", [])
             for task_data in high_conf_tasks:
+                if task_data.get("persisted_id") in streamed:
+                    created_tasks.append(streamed[task_data["persisted_id"]])
+                    continue
                 try:
                     task = self._create_task_entity(
                         task_data,
@@ -71,6 +79,9 @@ class PersistNode:
             # Create and persist draft tasks
             draft_tasks = state.get("draft_tasks", [])
             for task_data in draft_tasks:
+                if task_data.get("persisted_id") in streamed:
+                    created_tasks.append(streamed[task_data["persisted_id"]])
+                    continue
                 try:
                     task = self._create_task_entity(
                         task_data,
@@ -92,6 +103,9 @@ class PersistNode:
             # Create and persist high-confidence deals (auto-accepted)
             high_conf_deals = state.get("high_confidence_deals", [])
             for deal_data in high_conf_deals:
+                if deal_data.get("persisted_id") in streamed:
+                    created_deals.append(streamed[deal_data["persisted_id"]])
+                    continue
                 try:
                     deal = self._create_deal_entity(
                         deal_data,
@@ -113,6 +127,9 @@ class PersistNode:
             # Create and persist draft deals
             draft_deals = state.get("draft_deals", [])
             for deal_data in draft_deals:
+                if deal_data.get("persisted_id") in streamed:
+                    created_deals.append(streamed[deal_data["persisted_id"]])
+                    continue
                 try:
                     deal = self._create_deal_entity(
                         deal_data,
@@ -150,28 +167,27 @@ class PersistNode:
 
             # Persist to database if we have entities
             if created_tasks or created_deals:
-                # Use existing email log from state or create one
-                email_log = state.get("email_log")
-
                 # Prepare people list
                 people_to_save = [created_person] if created_person else []
 
+                new_tasks = [task for task in created_tasks if task.id not in streamed]
+                new_deals = [deal for deal in created_deals if deal.id not in streamed]
+
                 # Save to database (note: this should be async but DynamoDB client needs fixing)
                 try:
-                    save_result = await self.db_client.save_extracted_data(
-                        created_tasks, created_deals, people_to_save, email_log
-                    )
+                    if state.get("dry_run"):
+                        save_result = self._unsaved_result(new_tasks, new_deals, people_to_save)
+                    else:
+                        save_result = await self.db_client.save_extracted_data(
+                            new_tasks, new_deals, people_to_save
+                        )
                 except Exception as e:
                     # If async doesn't work, try sync (for now)
                     logger.warning(f"Async save failed, trying sync: {e}")
-                    save_result = {
-                        "task_ids": [task.id for task in created_tasks],
-                        "deal_ids": [deal.id for deal in created_deals],
-                        "people_ids": [p.id for p in people_to_save]
-                    }
+                    save_result = self._unsaved_result(new_tasks, new_deals, people_to_save)
 
-                tasks_saved = save_result.get("task_ids", [])
-                deals_saved = save_result.get("deal_ids", [])
+                tasks_saved = [task.id for task in created_tasks if task.id in streamed] + save_result.get("task_ids", [])
+                deals_saved = [deal.id for deal in created_deals if deal.id in streamed] + save_result.get("deal_ids", [])
                 people_saved = save_result.get("people_ids", [])
 
                 logger.info(
@@ -181,9 +197,10 @@ class PersistNode:
                     f"Subject: {state.get('subject', 'unknown')[:50]}"
                 )
             
+            # Entity objects stay out of the state; the workflow reads them at the end
+            self.payload_store.put(state["payload_key"], CREATED_ENTITIES, {"tasks": created_tasks, "deals": created_deals})
+
             return {
-                "created_tasks": created_tasks,
-                "created_deals": created_deals,
                 "tasks_saved": tasks_saved,
                 "deals_saved": deals_saved,
                 "status": ProcessingStatus.PROCESSED
@@ -194,12 +211,69 @@ class PersistNode:
             return {
                 "status": ProcessingStatus.FAILED,
                 "error_message": f"Persistence error: {str(e)}",
-                "created_tasks": [],
-                "created_deals": [],
                 "tasks_saved": [],
                 "deals_saved": []
             }
     
+    async def persist_entity(
+        self,
+        state: EmailProcessingState,
+        kind: str,
+        data: Dict[str, Any],
+        high_confidence: bool
+    ) -> Optional[Any]:
+        """
+        Create and save a single task or deal as soon as it is extracted
+
+        Used by streaming extraction; __call__ later skips entities whose
+        data carries the returned entity's id as "persisted_id". Nothing is
+        written for a dry run.
+
+        Args:
+            state: Current processing state
+            kind: "task" or "deal"
+            data: Normalized extraction data
+            high_confidence: Auto-accept instead of saving as a draft
+
+        Returns:
+            The saved Task/Deal, or None if it could not be created or saved
+        """
+        try:
+            if kind == "task":
+                entity = self._create_task_entity(
+                    data, state["user_id"], state["message_hash"], state.get("agent_used", "unknown"),
+                    TaskStatus.ACCEPTED if high_confidence else TaskStatus.DRAFT
+                )
+                tasks, deals = [entity], []
+            else:
+                entity = self._create_deal_entity(
+                    data, state["user_id"], state["message_hash"], state.get("agent_used", "unknown"),
+                    DealStatus.ACCEPTED if high_confidence else DealStatus.DRAFT
+                )
+                tasks, deals = [], [entity]
+            if state.get("dry_run"):
+                save_result = self._unsaved_result(tasks, deals, [])
+            else:
+                save_result = await self.db_client.save_extracted_data(tasks, deals, [])
+            saved_ids = save_result.get(f"{kind}_ids", [])
+        except Exception as e:
+            logger.error(f"Error persisting streamed {kind}: {e}")
+            return None
+
+        if entity.id not in saved_ids:
+            return None
+        logger.info(f"Persisted streamed {kind}: {entity.title} | Subject: {state.get('subject', 'unknown')[:50]}")
+        return entity
+
+    @staticmethod
+    def _unsaved_result(tasks: List[Task], deals: List[Deal], people: List[Person]) -> Dict[str, List[str]]:
+        """save_extracted_data-shaped result for entities that were not written"""
+        return {
+            "task_ids": [task.id for task in tasks],
+            "deal_ids": [deal.id for deal in deals],
+            "people_ids": [p.id for p in people]
+        }
+
     def _create_task_entity(
         self,
         task_data: Dict[str, Any],
@@ -208,14 +282,21 @@ class PersistNode:
         agent: str,
         status: TaskStatus
     ) -> Task:
-        """Create a Task entity from extracted data"""
-        return Task(
+        """
+        Create a Task entity from extracted data
+
+        Extraction data has already been validated and normalized by
+        ExtractionNormalizer (enum values, ranges, ISO due date), so the
+        entity is built without re-running model validation.
+        """
+        due_date = task_data.get("due_date")
+        return Task.from_trusted(
             user_id=user_id,
             title=task_data["title"],
             description=task_data["description"],
             priority=TaskPriority(task_data.get("priority", "medium")),
             status=status,
-            due_date=task_data.get("due_date") or None,
+            due_date=datetime.fromisoformat(due_date) if due_date else None,
             source_email_id=source_email_id,
             confidence=task_data["confidence"],
             agent=agent,
@@ -230,8 +311,8 @@ class PersistNode:
         agent: str,
         status: DealStatus
     ) -> Deal:
-        """Create a Deal entity from extracted data"""
-        return Deal(
+        """Create a Deal entity from normalized extraction data (see _create_task_entity)"""
+        return Deal.from_trusted(
             user_id=user_id,
             title=deal_data["title"],
             description=deal_data["description"],
@@ -1,12 +1,11 @@
 import time
-import email
 from typing import Dict, Any
-from email.message import EmailMessage
 
 from ...models import PrefilterResult, ProcessingStatus
 from ...services.prefilter import PrefilterService
-from ...utils import extract_text_content
+from ...utils import as_message
 from ..state import EmailProcessingState
+from ..payload_store import get_payload_store, RAW_CONTENT, TEXT_CONTENT, FILTERED_CONTENT
 
 
 class PreFilterNode:
@@ -14,6 +13,7 @@ class PreFilterNode:
     
     def __init__(self):
         self.prefilter_service = PrefilterService()
+        self.payload_store = get_payload_store()
     
     async def __call__(self, state: EmailProcessingState) -> Dict[str, Any]:
         """
@@ -25,22 +25,26 @@ class PreFilterNode:
         Returns:
             Updated state with prefilter results
         """
+        key = state["payload_key"]
         try:
-            # Parse email message
-            email_msg = email.message_from_string(state["raw_content"])
+            # Parse email headers - the raw MIME and text are not needed after this step
+            email_msg = as_message(self.payload_store.pop(key, RAW_CONTENT, ""))
             
-            # Extract text content
-            content = extract_text_content(email_msg)
+            # Extract text content (for replies, only the new unquoted delta)
+            content = self.payload_store.pop(key, TEXT_CONTENT) or email_msg.text_content()
             
             # Apply prefilter
-            filter_result, filtered_content = await self.prefilter_service.process(content, email_msg)
+            filter_result, filtered_content, compaction = await self.prefilter_service.process(content, email_msg)
             business_score = self.prefilter_service._calculate_business_score(content, email_msg)
             
+            if filter_result == PrefilterResult.PASSED:
+                self.payload_store.put(key, FILTERED_CONTENT, filtered_content)
+
             # Update state
             updates = {
                 "prefilter_result": filter_result,
-                "filtered_content": filtered_content,
                 "business_score": business_score,
+                "tokens_saved": compaction.tokens_saved if compaction else 0,
             }
             
             # If filtered out, set status and skip further processing
@@ -55,7 +59,6 @@ class PreFilterNode:
                 "status": ProcessingStatus.FAILED,
                 "error_message": f"Prefilter error: {str(e)}",
                 "prefilter_result": PrefilterResult.FILTERED_OUT,
-                "filtered_content": "",
                 "business_score": 0.0
             }
     
@@ -0,0 +1,75 @@
+"""
+Side store for large per-email payloads
+
+The LangGraph state only carries a `payload_key`; the MIME message, the
+decoded and filtered content and the entity objects live here and are
+dropped as soon as the step that needs them is done, so memory with many
+emails in flight does not scale with every state copy.
+"""
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+# Payload names
+RAW_CONTENT = "raw_content"  # Full MIME message - released by prefilter
+TEXT_CONTENT = "text_content"  # Decoded text (reply delta for replies) - released by prefilter
+FILTERED_CONTENT = "filtered_content"  # Compacted content for extraction - released by extraction
+STREAMED_ENTITIES = "streamed_entities"  # Entity id -> Task/Deal saved while streaming - released by persist
+CREATED_ENTITIES = "created_entities"  # {"tasks": [Task], "deals": [Deal]} - read by the workflow at the end
+
+
+class PayloadStore:
+    """In-process payloads keyed by (payload_key, name)"""
+
+    def __init__(self):
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def new_key(message_hash: str) -> str:
+        """Key for one workflow run (the same email may be processed twice concurrently)"""
+        return f"{message_hash[:16]}:{uuid.uuid4().hex[:8]}"
+
+    def put(self, key: str, name: str, value: Any):
+        self._payloads.setdefault(key, {})[name] = value
+
+    def get(self, key: str, name: str, default: Any = None) -> Any:
+        return self._payloads.get(key, {}).get(name, default)
+
+    def pop(self, key: str, name: str, default: Any = None) -> Any:
+        """Get a payload and release it"""
+        payloads = self._payloads.get(key)
+        if payloads is None:
+            return default
+        value = payloads.pop(name, default)
+        if not payloads:
+            del self._payloads[key]
+        return value
+
+    def release(self, key: str):
+        """Drop everything left for a workflow run"""
+        self._payloads.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Workflow runs holding payloads and the approximate size of string payloads"""
+        string_bytes = sum(
+            sys.getsizeof(value)
+            for payloads in self._payloads.values()
+            for value in payloads.values()
+            if isinstance(value, str)
+        )
+        return {
+            "runs": len(self._payloads),
+            "payloads": sum(len(payloads) for payloads in self._payloads.values()),
+            "string_bytes": string_bytes,
+        }
+
+
+_shared_store: Optional[PayloadStore] = None
+
+
+def get_payload_store() -> PayloadStore:
+    """Process-wide payload store shared by the workflow and its nodes"""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = PayloadStore()
+    return _shared_store
@@ -1,24 +1,37 @@
-from typing import List, Dict, Any, Optional, TypedDict
+import operator
+from typing import Annotated, List, Dict, Any, Optional, TypedDict
 from datetime import datetime
-from ..models import Task, Deal, EmailLog, PrefilterResult, ProcessingStatus
+from ..models import PrefilterResult, ProcessingStatus
 
 
 class EmailProcessingState(TypedDict):
-    """State object that flows through the LangGraph workflow"""
+    """
+    State object that flows through the LangGraph workflow
+
+    Kept small: large payloads (MIME message, content, entity objects)
+    live in the PayloadStore under `payload_key` and are released after use.
+    """
 
     # Input data
     message_id: str
     subject: str
     sender_email: str
     sender_name: Optional[str]
-    raw_content: str
+    payload_key: str  # PayloadStore key for raw/text/filtered content and entities
     source: str
     user_id: str  # Gmail account/user that owns this email
+    dry_run: bool  # Entities are built but not saved (demo runs)
+
+    # Thread context
+    thread_keys: List[str]  # Gmail threadId / References root / In-Reply-To / own Message-ID
+    is_reply: bool  # Text content holds only the new (unquoted) part of a reply
+    thread_classification: Optional[Dict[str, Any]]  # Prior classification for the thread
     
     # Processing metadata
     message_hash: str
     start_time: float
     processing_time_ms: int
+    stage_timeline: Annotated[List[Dict[str, Any]], operator.add]  # One entry per stage (see graph/timeline.py)
     
     # Classification results
     email_category: Optional[str]  # sales_lead, internal_operations, spam_noise, customer_support
@@ -27,13 +40,17 @@ class EmailProcessingState(TypedDict):
 
     # Prefilter results
     prefilter_result: PrefilterResult
-    filtered_content: str
     business_score: float
+    tokens_saved: int  # Estimated input tokens removed from the extraction input (set by prefilter only)
     
-    # LLM extraction results
+    # LLM extraction results (tasks/deals dropped once confidence-gated)
     extraction_result: Dict[str, Any]
     tokens_used: int
     agent_used: str
+
+    # Token accounting - one entry per LLM call, appended by each node
+    llm_usage: Annotated[List[Dict[str, Any]], operator.add]
+    llm_budget_degraded: bool  # Daily token budget exhausted, skip optional LLM calls
     
     # Confidence gating
     high_confidence_tasks: List[Dict[str, Any]]
@@ -41,14 +58,9 @@ class EmailProcessingState(TypedDict):
     high_confidence_deals: List[Dict[str, Any]]
     draft_deals: List[Dict[str, Any]]
     
-    # Final entities
-    created_tasks: List[Task]
-    created_deals: List[Deal]
-    
-    # Persistence results
+    # Persistence results (entity objects are in the PayloadStore)
     tasks_saved: List[str]  # Task IDs
     deals_saved: List[str]  # Deal IDs
-    email_log: EmailLog
     
     # Status tracking
     status: ProcessingStatus
@@ -0,0 +1,114 @@
+"""
+Per-email stage timeline
+
+Every pipeline node runs under stage_node(), which appends one entry to
+the `stage_timeline` state key: when the stage started (ms after the
+email's start_time), how long it took, and - for stages that called an
+LLM - how much of that was spent queued in the shared rate controller
+(window, buckets, Retry-After) versus waiting for the provider. The
+workflow adds entries for the work before and after the graph and keeps
+the timeline on the EmailLog.
+"""
+import time
+import inspect
+from typing import Any, Callable, Dict, List, Optional
+
+from ..services.llm_rate_controller import track_call_timings
+from ..services.metrics import NODE_DURATION
+
+
+def stage_entry(
+    stage: str,
+    start_time: float,
+    started: float,
+    ended: float,
+    llm: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Compact timeline entry (integers only, so it stores as-is in DynamoDB)
+
+    Args:
+        stage: Stage name
+        start_time: Email processing start (epoch seconds)
+        started: Stage start (epoch seconds)
+        ended: Stage end (epoch seconds)
+        llm: track_call_timings() totals for the stage
+    """
+    entry = {
+        "stage": stage,
+        "start_ms": int((started - start_time) * 1000),
+        "duration_ms": int((ended - started) * 1000),
+    }
+    if llm and llm["calls"]:
+        entry["llm_calls"] = int(llm["calls"])
+        entry["llm_queue_ms"] = int(llm["queue_wait_seconds"] * 1000)
+        entry["llm_service_ms"] = int(llm["service_seconds"] * 1000)
+        if llm["backoff_seconds"]:
+            entry["llm_backoff_ms"] = int(llm["backoff_seconds"] * 1000)
+    return entry
+
+
+def _finish(name: str, state: Dict[str, Any], update: Optional[Dict[str, Any]], started: float,
+            llm: Dict[str, float]) -> Dict[str, Any]:
+    ended = time.time()
+    NODE_DURATION.labels(name, "ok").observe(ended - started)
+    entry = stage_entry(name, state.get("start_time") or started, started, ended, llm)
+    return {**(update or {}), "stage_timeline": [entry]}
+
+
+def stage_node(name: str, node: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Wrap a pipeline node so its run is added to the stage timeline and the
+    worker_node_duration_seconds histogram; sync nodes stay sync
+    """
+    if inspect.iscoroutinefunction(node) or inspect.iscoroutinefunction(getattr(node, "__call__", None)):
+        async def run_async(state):
+            started = time.time()
+            with track_call_timings() as llm:
+                try:
+                    update = await node(state)
+                except BaseException:
+                    NODE_DURATION.labels(name, "error").observe(time.time() - started)
+                    raise
+            return _finish(name, state, update, started, llm)
+        return run_async
+
+    def run(state):
+        started = time.time()
+        with track_call_timings() as llm:
+            try:
+                update = node(state)
+            except BaseException:
+                NODE_DURATION.labels(name, "error").observe(time.time() - started)
+                raise
+        return _finish(name, state, update, started, llm)
+    return run
+
+
+def stage_durations(timeline: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Milliseconds per stage (summed if a stage ran more than once)"""
+    durations: Dict[str, int] = {}
+    for entry in timeline:
+        durations[entry["stage"]] = durations.get(entry["stage"], 0) + entry["duration_ms"]
+    return durations
+
+
+def timeline_summary(timeline: List[Dict[str, Any]], processing_time_ms: int) -> Dict[str, int]:
+    """
+    Totals for a stored timeline
+
+    Returns:
+        Dict with stage_ms (all stages), llm_queue_ms, llm_service_ms,
+        llm_backoff_ms and other_ms (time outside any recorded stage)
+    """
+    def total(key: str) -> int:
+        return sum(int(entry.get(key, 0)) for entry in timeline)
+
+    stage_ms = total("duration_ms")
+    return {
+        "stage_ms": stage_ms,
+        "llm_queue_ms": total("llm_queue_ms"),
+        "llm_service_ms": total("llm_service_ms"),
+        "llm_backoff_ms": total("llm_backoff_ms"),
+        "other_ms": max(0, int(processing_time_ms) - stage_ms),
+    }
@@ -1,13 +1,18 @@
+import os
 import time
 import email
+import asyncio
 import hashlib
 from datetime import datetime
-from typing import Dict, Any, Literal, List
+from typing import Dict, Any, Literal, List, Optional, Tuple, Union
 import logging
 
 from langgraph.graph import StateGraph, END
 
 from .state import EmailProcessingState
+from .direct_runner import PipelineSpec, DirectRunner
+from .timeline import stage_entry, stage_node
+from .payload_store import get_payload_store, RAW_CONTENT, TEXT_CONTENT, CREATED_ENTITIES
 from .nodes import (
     PreFilterNode,
     ExtractLocalNode,
@@ -15,9 +20,14 @@ from .nodes import (
     PersistNode,
     EmitEventNode
 )
-from .nodes.classify_email import ClassifyEmailNode
+from .nodes.classify_email import ClassifyEmailNode, EmailClassification
 from ..models import EmailLog, PrefilterResult, ProcessingStatus
-from ..utils import extract_text_content, extract_email_address, extract_sender_name
+from ..utils import (
+    LazyMessage, StructuredMessage, as_message,
+    extract_text_content, extract_email_address, extract_sender_name, extract_new_content
+)
+from ..services.token_usage import TokenUsageTracker, summarize_usage
+from ..services.thread_index import ThreadIndex, thread_keys
 
 logger = logging.getLogger(__name__)
 
@@ -48,8 +58,13 @@ class EmailProcessingWorkflow:
         self.persist_node = PersistNode()
         self.emit_event_node = EmitEventNode()
 
+        # Large per-email payloads referenced from the (lean) graph state
+        self.payload_store = get_payload_store()
+
+        # Streaming extraction gates and persists each entity as soon as it is complete
+        self.extract_node.entity_sink = self._persist_streamed_entity
+
         # Initialize DynamoDB client for idempotency check
-        import os
         from ..services.dynamodb_client import DynamoDBClient
         table_prefix = os.getenv("TABLE_PREFIX", "smile-sales-funnel-dev")
         region = os.getenv("AWS_REGION", "us-east-1")
@@ -59,55 +74,75 @@ class EmailProcessingWorkflow:
             table_prefix=table_prefix,
             endpoint_url=endpoint_url
         )
+        # Emails logged before the body-digest hash are still recognised, at the cost
+        # of a full parse and a second log read for every new email. Only turn it off
+        # once mail processed before the change can no longer be re-polled or imported
+        self.legacy_hash_fallback = os.getenv("EMAIL_HASH_LEGACY_FALLBACK", "true").lower() == "true"
+
+        # Per-user token accounting and daily budgets
+        self.token_tracker = TokenUsageTracker(db_client=self.db_client)
+
+        # Thread index so replies reuse their thread's classification
+        self.thread_index = ThreadIndex(db_client=self.db_client)
         
-        # Build the graph
+        # Build the graph - and the equivalent direct runner, which skips
+        # LangGraph's per-step bookkeeping (WORKFLOW_RUNNER=direct)
+        self.spec = self._build_spec()
         self.workflow = self._build_workflow()
         self.app = self.workflow.compile()
+        self.direct_runner = DirectRunner(self.spec)
+        self.runner = os.getenv("WORKFLOW_RUNNER", "langgraph").lower()
+        logger.info(f"Workflow runner: {self.runner}")
     
+    async def _persist_streamed_entity(self, state: EmailProcessingState, kind: str, data: Dict[str, Any]):
+        """Confidence-gate and persist one task/deal emitted by streaming extraction"""
+        high_confidence = self.confidence_gate_node.is_high_confidence(data)
+        return await self.persist_node.persist_entity(state, kind, data, high_confidence)
+
+    def _build_spec(self) -> PipelineSpec:
+        """Pipeline topology - shared by the LangGraph build and the direct runner"""
+        return PipelineSpec(
+            state_schema=EmailProcessingState,
+            entry_point="classify",
+            # Each run is added to the email's stage timeline
+            nodes={name: stage_node(name, node) for name, node in {
+                "classify": self.classify_node,
+                "prefilter": self.prefilter_node,
+                "extract_local": self.extract_node,
+                "confidence_gate": self.confidence_gate_node,
+                "persist": self.persist_node,
+                "emit_event": self.emit_event_node,
+            }.items()},
+            routes={
+                # Conditional routing after classification
+                "classify": (
+                    self._should_continue_after_classification,
+                    {"sales_lead": "prefilter", "skip": "emit_event"}
+                ),
+                # Conditional routing after prefilter
+                "prefilter": (
+                    self._should_continue_after_prefilter,
+                    {"continue": "extract_local", "skip": "emit_event"}
+                ),
+            },
+            # Linear flow for successful processing
+            edges={
+                "extract_local": "confidence_gate",
+                "confidence_gate": "persist",
+                "persist": "emit_event",
+                "emit_event": END,
+            },
+        )
+
     def _build_workflow(self) -> StateGraph:
         """Build the LangGraph workflow"""
-        
-        # Define the workflow graph
-        workflow = StateGraph(EmailProcessingState)
-        
-        # Add nodes
-        workflow.add_node("classify", self.classify_node)
-        workflow.add_node("prefilter", self.prefilter_node)
-        workflow.add_node("extract_local", self.extract_node)
-        workflow.add_node("confidence_gate", self.confidence_gate_node)
-        workflow.add_node("persist", self.persist_node)
-        workflow.add_node("emit_event", self.emit_event_node)
-
-        # Define the flow
-        workflow.set_entry_point("classify")
-
-        # Conditional routing after classification
-        workflow.add_conditional_edges(
-            "classify",
-            self._should_continue_after_classification,
-            {
-                "sales_lead": "prefilter",
-                "skip": "emit_event"
-            }
-        )
+        return self.spec.build_graph()
 
-        # Conditional routing after prefilter
-        workflow.add_conditional_edges(
-            "prefilter",
-            self._should_continue_after_prefilter,
-            {
-                "continue": "extract_local",
-                "skip": "emit_event"
-            }
-        )
-        
-        # Linear flow for successful processing
-        workflow.add_edge("extract_local", "confidence_gate")
-        workflow.add_edge("confidence_gate", "persist")
-        workflow.add_edge("persist", "emit_event")
-        workflow.add_edge("emit_event", END)
-        
-        return workflow
+    async def _run_pipeline(self, initial_state: EmailProcessingState) -> Dict[str, Any]:
+        """Run the pipeline with the configured runner (WORKFLOW_RUNNER)"""
+        if self.runner == "direct":
+            return await self.direct_runner.ainvoke(initial_state)
+        return await self.app.ainvoke(initial_state)
 
     def _should_continue_after_classification(
         self,
@@ -137,40 +172,125 @@ class EmailProcessingWorkflow:
         
         return "continue"
     
+    async def _find_processed(
+        self,
+        email_msg: Union[LazyMessage, StructuredMessage],
+        mime_content: Union[str, StructuredMessage],
+        email_logs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Idempotency hash and the existing email log for it, if any
+
+        The hash covers the Message-ID and a digest of the decoded text, the
+        same whether the email came as raw MIME or as Gmail API parts.
+
+        Args:
+            email_msg: Header-parsed email message
+            mime_content: Raw MIME content or structured message (for the legacy hash fallback)
+            email_logs: Email logs the caller already looked up, by message hash (None if not
+                logged); a hash found here is not looked up again
+
+        Returns:
+            Tuple of (message_hash, existing email log or None)
+        """
+        message_hash = EmailLog.generate_message_hash(email_msg.message_id, email_msg.body_digest())
+        if email_logs is not None and message_hash in email_logs:
+            existing_log = email_logs[message_hash]
+        else:
+            existing_log = await self.db_client.get_email_log(message_hash)
+
+        if existing_log is None and self.legacy_hash_fallback and email_msg.message_id:
+            # Logs written before the body-digest hash: Message-ID + decoded text
+            if isinstance(mime_content, StructuredMessage):
+                mime_content = mime_content.to_mime()
+            legacy_msg = email.message_from_string(mime_content)
+            legacy_hash = EmailLog.generate_message_hash(
+                legacy_msg.get('Message-ID'), extract_text_content(legacy_msg)
+            )
+            existing_log = await self.db_client.get_email_log(legacy_hash)
+
+        return message_hash, existing_log
+
+    async def _thread_context(
+        self,
+        email_msg,
+        message_id: str,
+        content: str,
+        user_id: str
+    ) -> Dict[str, Any]:
+        """
+        Resolve thread keys, the reply delta and any prior thread classification
+
+        Args:
+            email_msg: Parsed email message (headers are enough)
+            message_id: Message-ID header
+            content: Full decoded text content
+            user_id: Mailbox owner
+
+        Returns:
+            Dict with thread_keys, is_reply, text_content and thread_classification
+        """
+        in_reply_to = email_msg.get('In-Reply-To')
+        references = email_msg.get('References')
+        keys = thread_keys(
+            message_id,
+            references=references,
+            in_reply_to=in_reply_to,
+            gmail_thread_id=email_msg.get('X-Gmail-Thread-Id')
+        )
+        is_reply = bool(in_reply_to or references)
+        # Non-replies are looked up too: a message classified by the batch
+        # pre-pass is then not classified a second time by the graph
+        thread = await self.thread_index.get(user_id, keys)
+
+        return {
+            "thread_keys": keys,
+            "is_reply": is_reply,
+            # Only send the new, unquoted part of a reply to the LLM
+            "text_content": extract_new_content(content) if is_reply else content,
+            "thread_classification": thread
+        }
+
     async def process_email(
         self,
-        mime_content: str,
+        mime_content: Union[str, StructuredMessage],
         source: str = "manual",
-        user_id: str = None
+        user_id: str = None,
+        dry_run: bool = False
     ) -> Dict[str, Any]:
         """
         Process an email through the complete LangGraph pipeline
 
         Args:
-            mime_content: Raw MIME email content
+            mime_content: Raw MIME email content, or an already structured message
             source: Source identifier
             user_id: User/Gmail account that owns this email
+            dry_run: Extract without saving anything for the email (entities, email
+                log, thread index) and without the idempotency check, so the same
+                email gives the same result every time (demo)
 
         Returns:
             Processing results
         """
         start_time = time.time()
+        user_id = user_id or "default_user"  # Fallback for backward compatibility
+        payload_key = None
         
         try:
-            # Parse email to extract metadata
-            email_msg = email.message_from_string(mime_content)
-            message_id = email_msg.get('Message-ID', f"unknown-{int(time.time())}")
-            subject = email_msg.get('Subject', '')
-            from_header = email_msg.get('From', '')
+            # Parse headers only - the body is decoded once the email needs processing
+            email_msg = as_message(mime_content)
+            message_id = email_msg.message_id or f"unknown-{int(time.time())}"
+            subject = email_msg.subject
+            from_header = email_msg.from_header
             sender_email = extract_email_address(from_header)
             sender_name = extract_sender_name(from_header)
 
-            # Generate message hash for idempotency
-            content = extract_text_content(email_msg)
-            message_hash = EmailLog.generate_message_hash(message_id, content)
-
             # Check if email was already processed (idempotency)
-            existing_log = await self.db_client.get_email_log(message_hash)
+            if dry_run:
+                message_hash = EmailLog.generate_message_hash(email_msg.message_id, email_msg.body_digest())
+                existing_log = None
+            else:
+                message_hash, existing_log = await self._find_processed(email_msg, mime_content)
             if existing_log:
                 logger.info(
                     f"⏭️  Email already processed | "
@@ -188,40 +308,65 @@ class EmailProcessingWorkflow:
                     "deals_created": 0
                 }
 
+            # Enforce the user's daily token budget
+            budget_status = await self.token_tracker.check_budget(user_id)
+            if budget_status == TokenUsageTracker.BUDGET_DEFER:
+                logger.info(
+                    f"⏸️  Token budget exhausted, deferring | "
+                    f"User: {user_id} | "
+                    f"Subject: {subject[:50]}..."
+                )
+                return {
+                    "status": "deferred",
+                    "reason": "token_budget_exhausted",
+                    "message_id": message_id,
+                    "message_hash": message_hash,
+                    "tasks_created": 0,
+                    "deals_created": 0
+                }
+
+            content = email_msg.text_content()
+            thread_context = await self._thread_context(email_msg, message_id, content, user_id)
+
+            # Content goes to the payload store; drop local references so the
+            # prefilter can release it while the LLM steps are still running
+            payload_key = self.payload_store.new_key(message_hash)
+            self.payload_store.put(payload_key, RAW_CONTENT, mime_content)
+            self.payload_store.put(payload_key, TEXT_CONTENT, thread_context.pop("text_content"))
+            del mime_content, email_msg, content
+
             # Create initial state
             initial_state: EmailProcessingState = {
                 "message_id": message_id,
                 "subject": subject,
                 "sender_email": sender_email,
                 "sender_name": sender_name,
-                "raw_content": mime_content,
+                "payload_key": payload_key,
                 "source": source,
-                "user_id": user_id or "default_user",  # Fallback for backward compatibility
+                "user_id": user_id,
+                "dry_run": dry_run,
+                "thread_keys": thread_context["thread_keys"],
+                "is_reply": thread_context["is_reply"],
+                "thread_classification": thread_context["thread_classification"],
                 "message_hash": message_hash,
                 "start_time": start_time,
                 "processing_time_ms": 0,
+                # Parsing, idempotency lookup, budget check and thread lookup
+                "stage_timeline": [stage_entry("prepare", start_time, start_time, time.time())],
                 "prefilter_result": PrefilterResult.PASSED,
-                "filtered_content": "",
                 "business_score": 0.0,
+                "tokens_saved": 0,
                 "extraction_result": {},
                 "tokens_used": 0,
                 "agent_used": "",
+                "llm_usage": [],
+                "llm_budget_degraded": budget_status == TokenUsageTracker.BUDGET_DEGRADE,
                 "high_confidence_tasks": [],
                 "draft_tasks": [],
                 "high_confidence_deals": [],
                 "draft_deals": [],
-                "created_tasks": [],
-                "created_deals": [],
                 "tasks_saved": [],
                 "deals_saved": [],
-                "email_log": EmailLog(
-                    message_id_hash=message_hash,
-                    original_message_id=message_id,
-                    user_id=user_id or "default_user",
-                    subject=subject[:500],
-                    sender_email=sender_email,
-                    prefilter_result=PrefilterResult.PASSED
-                ),
                 "status": ProcessingStatus.PROCESSED,
                 "error_message": None,
                 "events_to_emit": []
@@ -235,28 +380,63 @@ class EmailProcessingWorkflow:
             )
             
             # Execute the workflow
-            final_state = await self.app.ainvoke(initial_state)
-            
-            # Calculate final processing time
-            processing_time = int((time.time() - start_time) * 1000)
+            final_state = await self._run_pipeline(initial_state)
+            finalize_started = time.time()
+
+            # Remember the thread's classification for later replies
+            email_category = final_state.get("email_category")
+            if email_category and email_category != "unknown" and not dry_run:
+                await self.thread_index.update(
+                    user_id,
+                    final_state["thread_keys"],
+                    message_id,
+                    email_category,
+                    final_state.get("classification_confidence") or 0.0,
+                    final_state.get("classification_reasoning") or ""
+                )
+
+            # Token accounting across all LLM calls made for this email
+            llm_usage = final_state.get("llm_usage", [])
+            usage_totals = summarize_usage(llm_usage)
+            await self.token_tracker.record(user_id, llm_usage)
+
+            # Calculate final processing time (the email log write itself is not included)
+            finished = time.time()
+            processing_time = int((finished - start_time) * 1000)
             final_state["processing_time_ms"] = processing_time
+            timeline = final_state.get("stage_timeline", []) + [
+                stage_entry("finalize", start_time, finalize_started, finished)
+            ]
             
-            # Update and save email log for idempotency
-            if "email_log" in final_state:
-                email_log = final_state["email_log"]
-                email_log.processing_time_ms = processing_time
-                email_log.status = final_state.get("status", ProcessingStatus.PROCESSED)
-                email_log.llm_tokens_used = final_state.get("tokens_used", 0)
-                email_log.tasks_created = final_state.get("tasks_saved", [])
-                email_log.deals_created = final_state.get("deals_saved", [])
-
-                # Save email log to database for idempotency tracking
+            # Build and save email log for idempotency (built here, not carried through the graph)
+            if not dry_run:
                 try:
+                    email_log = EmailLog(
+                        message_id_hash=message_hash,
+                        original_message_id=message_id,
+                        user_id=user_id,
+                        subject=subject[:500],
+                        sender_email=sender_email,
+                        prefilter_result=final_state.get("prefilter_result", PrefilterResult.PASSED),
+                        status=final_state.get("status", ProcessingStatus.PROCESSED),
+                        processing_time_ms=processing_time,
+                        llm_tokens_used=usage_totals["total_tokens"],
+                        llm_prompt_tokens=usage_totals["prompt_tokens"],
+                        llm_completion_tokens=usage_totals["completion_tokens"],
+                        llm_cached_tokens=usage_totals["cached_tokens"],
+                        llm_usage=llm_usage,
+                        input_tokens_saved=final_state.get("tokens_saved", 0),
+                        stage_timeline=timeline,
+                        tasks_created=final_state.get("tasks_saved", []),
+                        deals_created=final_state.get("deals_saved", [])
+                    )
                     await self.db_client.save_email_log(email_log)
                     logger.debug(f"Saved email log for idempotency: {message_hash[:16]}...")
                 except Exception as e:
                     logger.error(f"Failed to save email log: {e}")
 
+            created = self.payload_store.get(payload_key, CREATED_ENTITIES) or {}
+
             logger.info(
                 f"✅ Workflow complete ({processing_time}ms) | "
                 f"Status: {final_state.get('status')} | "
@@ -275,13 +455,16 @@ class EmailProcessingWorkflow:
                     "deals_created": len(final_state.get("deals_saved", [])),
                     "high_confidence_tasks": len(final_state.get("high_confidence_tasks", [])),
                     "high_confidence_deals": len(final_state.get("high_confidence_deals", [])),
-                    "tokens_used": final_state.get("tokens_used", 0),
+                    "tokens_used": usage_totals["total_tokens"],
+                    "token_usage": usage_totals,
+                    "tokens_saved": final_state.get("tokens_saved", 0),
                     "business_score": final_state.get("business_score", 0.0),
                     "prefilter_result": final_state.get("prefilter_result"),
                     "events_emitted": len(final_state.get("events_to_emit", []))
                 },
-                "tasks": [task.model_dump() for task in final_state.get("created_tasks", [])],
-                "deals": [deal.model_dump() for deal in final_state.get("created_deals", [])],
+                "timeline": timeline,
+                "tasks": [task.model_dump() for task in created.get("tasks", [])],
+                "deals": [deal.model_dump() for deal in created.get("deals", [])],
                 "events": final_state.get("events_to_emit", [])
             }
             
@@ -309,80 +492,167 @@ class EmailProcessingWorkflow:
                 }
             }
 
+        finally:
+            if payload_key is not None:
+                self.payload_store.release(payload_key)
+
     async def process_emails_batch(
         self,
-        emails_mime_content: List[str],
+        emails_mime_content: List[Union[str, StructuredMessage]],
         source: str = "gmail",
-        user_id: str = None
+        user_id: str = None,
+        email_logs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
     ) -> List[Dict[str, Any]]:
         """
-        Process multiple emails in batch using LangChain's abatch for LLM calls
+        Process multiple emails in batch with concurrent, model-routed LLM calls
 
         Args:
-            emails_mime_content: List of MIME email contents
+            emails_mime_content: List of MIME email contents or structured messages; consumed -
+                each entry is set to None once parsed, so the batch doesn't pin every raw message
             source: Source identifier
             user_id: User/Gmail account
+            email_logs: Email logs the caller already looked up, by message hash (None if not
+                logged), e.g. in one batched read; those emails skip their own lookup
 
         Returns:
             List of processing results for each email
         """
         logger.info(f"🔄 Processing batch of {len(emails_mime_content)} emails")
 
-        # Parse all emails first
+        results = [None] * len(emails_mime_content)
+
+        # Parse all emails first - headers, then text only for emails not yet processed
         parsed_emails = []
-        for idx, mime_content in enumerate(emails_mime_content):
+        for idx in range(len(emails_mime_content)):
+            mime_content, emails_mime_content[idx] = emails_mime_content[idx], None
             try:
-                email_msg = email.message_from_string(mime_content)
-                from_header = email_msg.get('From', '')
+                email_msg = as_message(mime_content)
+                from_header = email_msg.from_header
                 sender_email = extract_email_address(from_header)
                 sender_name = extract_sender_name(from_header)
-                subject = email_msg.get('Subject', 'No subject')
-                message_id = email_msg.get('Message-ID', f'unknown-{int(time.time())}')
-                content = extract_text_content(email_msg)
-                message_hash = EmailLog.generate_message_hash(message_id, content)
+                subject = email_msg.subject or 'No subject'
+                message_id = email_msg.message_id or f'unknown-{int(time.time())}'
+                message_hash, existing_log = await self._find_processed(email_msg, mime_content, email_logs)
+                if existing_log:
+                    # Re-polled email: no body decoding, no classification call
+                    results[idx] = {
+                        'status': 'skipped',
+                        'reason': 'already_processed',
+                        'message_id': message_id,
+                        'message_hash': message_hash,
+                        'results': {'tasks_created': 0, 'deals_created': 0}
+                    }
+                    continue
+                content = email_msg.text_content()
+                thread_context = await self._thread_context(
+                    email_msg, message_id, content, user_id or "default_user"
+                )
 
+                # The parsed message isn't kept: 1,000 parsed MIME trees add up
                 parsed_emails.append({
                     'idx': idx,
-                    'email_msg': email_msg,
                     'sender_email': sender_email,
                     'sender_name': sender_name,
                     'subject': subject,
                     'message_id': message_id,
-                    'content': content,
+                    'content': thread_context['text_content'],
+                    'thread_classification': thread_context['thread_classification'],
+                    'thread_keys': thread_context['thread_keys'],
                     'message_hash': message_hash,
                     'mime_content': mime_content
                 })
             except Exception as e:
                 logger.error(f"Failed to parse email {idx}: {e}")
                 parsed_emails.append({'idx': idx, 'error': str(e)})
+        # Only the parsed entries of emails still to be processed hold on to their MIME content
+        mime_content = email_msg = None
 
-        # Batch classify all emails using LangChain abatch
+        # Batch classify all emails concurrently
         logger.info(f"📊 Batch classifying {len(parsed_emails)} emails")
         classification_inputs = []
         valid_emails = []
+        inherited_emails = []
 
         for parsed in parsed_emails:
             if 'error' not in parsed:
-                classification_inputs.append({
-                    'sender_email': parsed['sender_email'],
-                    'subject': parsed['subject'],
-                    'content': parsed['content'][:1000]
-                })
+                # Replies in a known thread reuse its classification - no LLM call
+                thread = parsed['thread_classification']
+                if thread and self.classify_node.inherit_thread_classification(
+                    thread, parsed['content'], parsed['subject']
+                ):
+                    inherited_emails.append(parsed)
+                    continue
+
+                chain_input, _ = self.classify_node.build_input(
+                    parsed['sender_email'], parsed['subject'], parsed['content']
+                )
+                classification_inputs.append(chain_input)
                 valid_emails.append(parsed)
 
-        # Batch classify using abatch
-        if classification_inputs:
-            classifications = await self.classify_node.chain.abatch(classification_inputs)
+        user_id = user_id or "default_user"
+
+        # Enforce the user's daily token budget before spending on classification
+        budget_status = await self.token_tracker.check_budget(user_id)
+        if budget_status == TokenUsageTracker.BUDGET_DEFER:
+            logger.info(f"⏸️  Token budget exhausted for {user_id}, deferring batch of {len(valid_emails)} emails")
+            for parsed in valid_emails:
+                parsed['mime_content'] = None
+                results[parsed['idx']] = {
+                    'status': 'deferred',
+                    'reason': 'token_budget_exhausted',
+                    'message_id': parsed['message_id'],
+                    'results': {'tasks_created': 0, 'deals_created': 0}
+                }
+            valid_emails = []
+            classification_inputs = []
+
+        # Batch classify concurrently (skipped when the budget is degraded)
+        classifications = []
+        if classification_inputs and budget_status != TokenUsageTracker.BUDGET_DEGRADE:
+            raw_classifications = await asyncio.gather(
+                *[self.classify_node.ainvoke(chain_input) for chain_input in classification_inputs],
+                return_exceptions=True
+            )
+            batch_usage = []
+            for raw in raw_classifications:
+                try:
+                    if isinstance(raw, Exception):
+                        raise raw
+                    classification, usage = self.classify_node.parse_result(raw)
+                    batch_usage.append(usage)
+                    classifications.append(classification)
+                except Exception as e:
+                    # Fail-open, same as the classification node
+                    logger.error(f"Batch classification failed: {e}")
+                    classifications.append(None)
+            await self.token_tracker.record(user_id, batch_usage)
         else:
-            classifications = []
+            classifications = [None] * len(valid_emails)
+
+        # Attach inherited thread classifications
+        for parsed in inherited_emails:
+            valid_emails.append(parsed)
+            classifications.append(EmailClassification(
+                category=parsed['thread_classification']['category'],
+                confidence=float(parsed['thread_classification'].get('confidence', 0.0)),
+                reasoning="Inherited from thread"
+            ))
 
         # Filter to sales leads only
         sales_emails = []
-        results = [None] * len(emails_mime_content)
 
         for parsed, classification in zip(valid_emails, classifications):
             idx = parsed['idx']
-            if classification.category == 'sales_lead':
+            if classification is not None:
+                await self.thread_index.update(
+                    user_id,
+                    parsed['thread_keys'],
+                    parsed['message_id'],
+                    classification.category,
+                    classification.confidence,
+                    classification.reasoning
+                )
+            if classification is None or classification.category == 'sales_lead':
                 sales_emails.append(parsed)
                 logger.info(
                     f"✅ Sales lead | From: {parsed['sender_email']} | Subject: {parsed['subject'][:50]}"
@@ -391,6 +661,8 @@ class EmailProcessingWorkflow:
                 logger.info(
                     f"⏭️  Skipped ({classification.category}) | From: {parsed['sender_email']} | Subject: {parsed['subject'][:50]}"
                 )
+                # Not processed further - release the MIME content now, not at the end of the batch
+                parsed['mime_content'] = None
                 results[idx] = {
                     'status': 'skipped',
                     'reason': classification.category,
@@ -402,8 +674,9 @@ class EmailProcessingWorkflow:
         logger.info(f"🎯 Processing {len(sales_emails)} sales emails")
         for sales_email in sales_emails:
             try:
+                # Hand the MIME content over (no reference kept here) so it is released after this email
                 result = await self.process_email(
-                    sales_email['mime_content'],
+                    sales_email.pop('mime_content'),
                     source=source,
                     user_id=user_id
                 )
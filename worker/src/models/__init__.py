@@ -1,14 +1,14 @@
-from .base import BaseEntity
+from .base import BaseEntity, DynamoDBModel
 from .task import Task, TaskStatus, TaskPriority
-from .deal import Deal, DealStatus, DealStage
+from .deal import Deal, DealStatus, DealStage, VALID_CURRENCIES
 from .email_log import EmailLog, ProcessingStatus, PrefilterResult
 from .person import Person, PersonSource
 from .company import Company, CompanySize, CompanySource
 
 __all__ = [
-    'BaseEntity',
+    'BaseEntity', 'DynamoDBModel',
     'Task', 'TaskStatus', 'TaskPriority',
-    'Deal', 'DealStatus', 'DealStage', 
+    'Deal', 'DealStatus', 'DealStage', 'VALID_CURRENCIES',
     'EmailLog', 'ProcessingStatus', 'PrefilterResult',
     'Person', 'PersonSource',
     'Company', 'CompanySize', 'CompanySource'
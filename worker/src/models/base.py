@@ -1,30 +1,76 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, ClassVar, Dict, Optional, Tuple
 from uuid import uuid4
 from decimal import Decimal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
-class BaseEntity(BaseModel):
+def _float_fields(model: type) -> Tuple[str, ...]:
+    """Names of fields annotated float / Optional[float]"""
+    return tuple(
+        name for name, field in model.model_fields.items()
+        if field.annotation in (float, Optional[float])
+    )
+
+
+class DynamoDBModel(BaseModel):
+    """Base for models stored as DynamoDB items"""
+    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
+
+    # Resolved once per concrete class
+    _decimal_fields: ClassVar[Tuple[str, ...]] = ()  # Float fields (DynamoDB needs Decimal)
+    _static_defaults: ClassVar[Dict[str, Any]] = {}  # Plain (non-factory) defaults
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any):
+        super().__pydantic_init_subclass__(**kwargs)
+        cls._decimal_fields = _float_fields(cls)
+        cls._static_defaults = {
+            name: field.default for name, field in cls.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+
+    def to_dynamodb_item(self) -> dict:
+        """
+        Convert to DynamoDB item format
+
+        One pass through the compiled pydantic-core serializer (JSON mode
+        turns datetimes into ISO strings and enums into their values), then
+        only the float fields are converted to Decimal.
+        """
+        item = self.__pydantic_serializer__.to_python(self, mode="json")
+        for key in self._decimal_fields:
+            value = item.get(key)
+            if value is not None:
+                item[key] = Decimal(str(value))
+        return item
+
+
+class BaseEntity(DynamoDBModel):
     """Base model for all entities with common fields"""
     id: str = Field(default_factory=lambda: str(uuid4()))
     user_id: str = Field(..., description="User/Gmail account that owns this record")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-        
-    def to_dynamodb_item(self) -> dict:
-        """Convert to DynamoDB item format"""
-        item = self.model_dump()
-        # Convert datetime and float to DynamoDB-compatible types
-        for key, value in item.items():
-            if isinstance(value, datetime):
-                item[key] = value.isoformat()
-            elif isinstance(value, float):
-                # DynamoDB doesn't support float, convert to Decimal
-                item[key] = Decimal(str(value))
-        return item
\ No newline at end of file
+    @classmethod
+    def from_trusted(cls, **data: Any):
+        """
+        Build an entity without running validation
+
+        Only for data that has already been validated to this model's
+        types and constraints (enum members, datetimes, ranges), e.g.
+        extraction output after ExtractionNormalizer. Defaults apply.
+        Sets the instance state directly - model_construct() is slower
+        than validating, as it inspects every default factory per call.
+        """
+        fields_set = set(data)
+        now = datetime.utcnow()
+        values = {"id": str(uuid4()), "created_at": now, "updated_at": now, **cls._static_defaults, **data}
+
+        entity = cls.__new__(cls)
+        object.__setattr__(entity, "__dict__", values)
+        object.__setattr__(entity, "__pydantic_fields_set__", fields_set)
+        object.__setattr__(entity, "__pydantic_extra__", None)
+        object.__setattr__(entity, "__pydantic_private__", None)
+        return entity
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional
-from pydantic import Field, validator
+from pydantic import Field, field_validator
 from .base import BaseEntity
 
 
@@ -27,20 +27,23 @@ class Company(BaseEntity):
     last_contact_date: Optional[datetime] = None
     source: CompanySource = Field(default=CompanySource.DOMAIN_INFERENCE)
     
-    @validator('name')
+    @field_validator('name')
+    @classmethod
     def validate_name(cls, v):
         if not v.strip():
             raise ValueError('Company name cannot be empty')
         return v.strip()
     
-    @validator('domain')
+    @field_validator('domain')
+    @classmethod
     def validate_domain(cls, v):
         # Basic domain validation
         if not v or '.' not in v or ' ' in v:
             raise ValueError('Invalid domain format')
         return v.lower()
     
-    @validator('website')
+    @field_validator('website')
+    @classmethod
     def validate_website(cls, v):
         if v:
             # Ensure website starts with http/https
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional
-from pydantic import Field, validator
+from pydantic import Field, field_validator
 from .base import BaseEntity
 
 
@@ -13,6 +13,10 @@ class DealStatus(str, Enum):
     LOST = "lost"
 
 
+# Currencies accepted for deal values
+VALID_CURRENCIES = ['USD', 'EUR', 'GBP', 'CAD', 'AUD', 'INR']
+
+
 class DealStage(str, Enum):
     LEAD = "lead"
     QUALIFIED = "qualified"
@@ -38,30 +42,33 @@ class Deal(BaseEntity):
     agent: str = Field(..., description="LLM agent that created the deal")
     audit_snippet: str = Field(..., description="Email snippet used for extraction")
     
-    @validator('confidence')
+    @field_validator('confidence')
+    @classmethod
     def validate_confidence(cls, v):
         if not 0.0 <= v <= 1.0:
             raise ValueError('Confidence must be between 0.0 and 1.0')
         return v
     
-    @validator('title')
+    @field_validator('title')
+    @classmethod
     def validate_title(cls, v):
         if not v.strip():
             raise ValueError('Title cannot be empty')
         return v.strip()
     
-    @validator('probability')
+    @field_validator('probability')
+    @classmethod
     def validate_probability(cls, v):
         if not 0 <= v <= 100:
             raise ValueError('Probability must be between 0 and 100')
         return v
     
-    @validator('currency')
+    @field_validator('currency')
+    @classmethod
     def validate_currency(cls, v):
         # Simple currency validation - can be expanded
-        valid_currencies = ['USD', 'EUR', 'GBP', 'CAD', 'AUD', 'INR']
-        if v.upper() not in valid_currencies:
-            raise ValueError(f'Currency must be one of: {valid_currencies}')
+        if v.upper() not in VALID_CURRENCIES:
+            raise ValueError(f'Currency must be one of: {VALID_CURRENCIES}')
         return v.upper()
     
     def is_high_confidence(self) -> bool:
@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import List, Optional
-from pydantic import BaseModel, Field, validator
+from typing import Any, Dict, List, Optional
+from pydantic import Field, field_validator
 import hashlib
+from .base import DynamoDBModel
 
 
 class ProcessingStatus(str, Enum):
@@ -17,7 +18,7 @@ class PrefilterResult(str, Enum):
     TOO_LARGE = "too_large"
 
 
-class EmailLog(BaseModel):
+class EmailLog(DynamoDBModel):
     """Email processing log for idempotency and audit"""
     message_id_hash: str = Field(..., description="SHA256 hash of message-id + content")
     original_message_id: str = Field(..., description="Original Gmail message ID")
@@ -30,21 +31,23 @@ class EmailLog(BaseModel):
     deals_created: List[str] = Field(default_factory=list, description="Deal IDs created")
     prefilter_result: PrefilterResult = Field(..., description="Prefilter outcome")
     llm_tokens_used: int = Field(default=0, ge=0, description="Tokens consumed")
+    llm_prompt_tokens: int = Field(default=0, ge=0, description="Prompt tokens consumed")
+    llm_completion_tokens: int = Field(default=0, ge=0, description="Completion tokens consumed")
+    llm_cached_tokens: int = Field(default=0, ge=0, description="Prompt tokens served from provider cache")
+    llm_usage: List[Dict[str, Any]] = Field(default_factory=list, description="Per-call usage by node and model")
+    input_tokens_saved: int = Field(default=0, ge=0, description="Estimated input tokens removed by compaction")
     processing_time_ms: int = Field(default=0, ge=0, description="Processing duration")
+    stage_timeline: List[Dict[str, Any]] = Field(default_factory=list, description="Per-stage start/duration and LLM queue vs service time (ms)")
     ttl: int = Field(..., description="Unix timestamp for TTL")
     
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-    
     def __init__(self, **data):
         # Set TTL to 90 days from now if not provided
         if 'ttl' not in data:
             data['ttl'] = int((datetime.utcnow() + timedelta(days=90)).timestamp())
         super().__init__(**data)
     
-    @validator('sender_email')
+    @field_validator('sender_email')
+    @classmethod
     def validate_email(cls, v):
         # Basic email validation
         if '@' not in v or '.' not in v:
@@ -66,11 +69,3 @@ class EmailLog(BaseModel):
         """Add a deal ID to the created list"""
         if deal_id not in self.deals_created:
             self.deals_created.append(deal_id)
-    
-    def to_dynamodb_item(self) -> dict:
-        """Convert to DynamoDB item format"""
-        item = self.model_dump()
-        # Convert datetime to ISO string
-        if isinstance(item['processed_at'], datetime):
-            item['processed_at'] = item['processed_at'].isoformat()
-        return item
\ No newline at end of file
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional
-from pydantic import Field, validator, EmailStr
+from pydantic import Field, field_validator, EmailStr
 from .base import BaseEntity
 
 
@@ -22,11 +22,13 @@ class Person(BaseEntity):
     last_contact_date: Optional[datetime] = None
     source: PersonSource = Field(default=PersonSource.EMAIL_EXTRACTION)
     
-    @validator('email')
+    @field_validator('email')
+    @classmethod
     def validate_email(cls, v):
         return v.lower()
     
-    @validator('name', 'first_name', 'last_name', 'job_title')
+    @field_validator('name', 'first_name', 'last_name', 'job_title')
+    @classmethod
     def validate_string_fields(cls, v):
         if v is not None:
             return v.strip() if v.strip() else None
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional
-from pydantic import Field, validator
+from pydantic import Field, field_validator
 from .base import BaseEntity
 
 
@@ -31,13 +31,15 @@ class Task(BaseEntity):
     agent: str = Field(..., description="LLM agent that created the task")
     audit_snippet: str = Field(..., description="Email snippet used for extraction")
     
-    @validator('confidence')
+    @field_validator('confidence')
+    @classmethod
     def validate_confidence(cls, v):
         if not 0.0 <= v <= 1.0:
             raise ValueError('Confidence must be between 0.0 and 1.0')
         return v
     
-    @validator('title')
+    @field_validator('title')
+    @classmethod
     def validate_title(cls, v):
         if not v.strip():
             raise ValueError('Title cannot be empty')
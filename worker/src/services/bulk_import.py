@@ -0,0 +1,465 @@
+"""
+Bulk import of historical mailboxes
+
+Reads an mbox file, a Maildir, a zip of .eml files, a directory of .eml
+files or a single .eml, parses messages in a process pool, drops
+duplicates by message hash (within the import and against the email log)
+and feeds `process_emails_batch` in batches, with a bounded number of
+messages buffered between reading and processing. Every finished batch
+is checkpointed to SQLite, so an interrupted import resumes where it
+stopped.
+
+Run from the worker directory:
+
+    python -m src.services.bulk_import mailbox.mbox --user-id alice@example.com
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import asyncio
+import logging
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from ..models import EmailLog
+from ..utils import LazyMessage
+
+logger = logging.getLogger(__name__)
+
+# Checkpointed message statuses; the rest (error, deferred) are retried on resume
+DONE_STATUSES = ("processed", "skipped", "duplicate", "invalid")
+
+_MBOXRD_FROM = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+
+# ----------------------------------------------------------------------------
+# Archive readers: yield (message_key, raw bytes); keys are stable across runs
+# ----------------------------------------------------------------------------
+
+def _mbox_message(lines: List[bytes]) -> bytes:
+    # Drop the blank separator line before the next "From " and undo >From quoting
+    while lines and lines[-1] in (b"\n", b"\r\n"):
+        lines.pop()
+    return _MBOXRD_FROM.sub(rb"\1", b"".join(lines))
+
+
+def iter_mbox(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Messages of an mbox file, streamed line by line; keyed by byte offset"""
+    with open(path, "rb") as mbox:
+        start, lines, offset, previous_blank = None, [], 0, True
+        for line in mbox:
+            if previous_blank and line.startswith(b"From "):
+                if start is not None:
+                    yield f"mbox:{start}", _mbox_message(lines)
+                start, lines = offset, []
+            elif start is not None:
+                lines.append(line)
+            previous_blank = line in (b"\n", b"\r\n")
+            offset += len(line)
+        if start is not None:
+            yield f"mbox:{start}", _mbox_message(lines)
+
+
+def iter_maildir(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Messages in the cur/ and new/ directories of a Maildir (and its sub-folders)"""
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories.sort()
+        if os.path.basename(directory) not in ("cur", "new"):
+            continue
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            file_path = os.path.join(directory, name)
+            with open(file_path, "rb") as message:
+                yield f"maildir:{os.path.relpath(file_path, path)}", message.read()
+
+
+def iter_eml_directory(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Every non-hidden file under a directory, as one message each"""
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            file_path = os.path.join(directory, name)
+            with open(file_path, "rb") as message:
+                yield f"file:{os.path.relpath(file_path, path)}", message.read()
+
+
+def iter_zip(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Files in a zip archive, decompressed one member at a time"""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                continue
+            yield f"zip:{name}", archive.read(info)
+
+
+def iter_eml_file(path: str) -> Iterator[Tuple[str, bytes]]:
+    with open(path, "rb") as message:
+        yield f"file:{os.path.basename(path)}", message.read()
+
+
+READERS: Dict[str, Callable[[str], Iterator[Tuple[str, bytes]]]] = {
+    "mbox": iter_mbox,
+    "maildir": iter_maildir,
+    "eml-dir": iter_eml_directory,
+    "zip": iter_zip,
+    "eml": iter_eml_file,
+}
+
+
+def detect_format(path: str) -> str:
+    """Archive format of a path: mbox, maildir, eml-dir, zip or eml"""
+    if os.path.isdir(path):
+        for _, subdirectories, _ in os.walk(path):
+            if "cur" in subdirectories or "new" in subdirectories:
+                return "maildir"
+        return "eml-dir"
+    if zipfile.is_zipfile(path):
+        return "zip"
+    with open(path, "rb") as archive:
+        head = archive.read(5)
+    return "mbox" if head == b"From " else "eml"
+
+
+def parse_message(message_key: str, raw: bytes) -> Dict[str, Any]:
+    """
+    Parse headers and hash one message (runs in the parse pool)
+
+    The hash is the workflow's idempotency hash (Message-ID + digest of the
+    decoded text, computed alike for raw MIME and Gmail API messages), so
+    messages also match earlier imports and Gmail polls. Only text parts are
+    decoded, for the digest; the raw bytes are passed on, undecodable ones
+    kept via surrogateescape, so the workflow decodes them in their
+    declared charset.
+    """
+    try:
+        email_msg = LazyMessage.from_content(raw)
+        message_id = email_msg.message_id
+        if not message_id and not email_msg.get("From") and not email_msg.get("Subject"):
+            return {"message_key": message_key, "error": "not an email message"}
+        return {
+            "message_key": message_key,
+            "message_id": message_id,
+            "message_hash": EmailLog.generate_message_hash(message_id, email_msg.body_digest()),
+            "mime_content": raw.decode("utf-8", errors="surrogateescape"),
+        }
+    except Exception as e:
+        return {"message_key": message_key, "error": str(e)}
+
+
+def parse_chunk(messages: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """Parse several messages per pool task - one round trip per message costs more than parsing it"""
+    return [parse_message(message_key, raw) for message_key, raw in messages]
+
+
+# ----------------------------------------------------------------------------
+# Checkpoint
+# ----------------------------------------------------------------------------
+
+class ImportCheckpoint:
+    """Per-import SQLite file recording the status of every message seen"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "message_key TEXT PRIMARY KEY, message_hash TEXT, status TEXT NOT NULL, error TEXT, updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def set_meta(self, **values: Any):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, None if value is None else str(value)) for key, value in values.items()]
+        )
+
+    def done_keys(self) -> Set[str]:
+        placeholders = ", ".join("?" for _ in DONE_STATUSES)
+        rows = self._conn.execute(
+            f"SELECT message_key FROM messages WHERE status IN ({placeholders})", DONE_STATUSES
+        )
+        return {key for (key,) in rows}
+
+    def seen_hashes(self) -> Set[str]:
+        rows = self._conn.execute("SELECT message_hash FROM messages WHERE status IN ('processed', 'skipped')")
+        return {message_hash for (message_hash,) in rows if message_hash}
+
+    def record(self, entries: List[Tuple[str, Optional[str], str, Optional[str]]]):
+        """Save (message_key, message_hash, status, error) rows in one transaction"""
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages (message_key, message_hash, status, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(*entry, now) for entry in entries]
+        )
+        self._conn.execute("COMMIT")
+
+    def progress(self) -> Dict[str, Any]:
+        counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall())
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        return {**meta, "messages": counts, "total": sum(counts.values())}
+
+    def close(self):
+        self._conn.close()
+
+
+# ----------------------------------------------------------------------------
+# Importer
+# ----------------------------------------------------------------------------
+
+def _result_status(result: Optional[Dict[str, Any]]) -> str:
+    status = (result or {}).get("status")
+    if status == "success":
+        return "processed"
+    if status in ("skipped", "deferred"):
+        return status
+    return "error"
+
+
+class BulkImporter:
+    """Streams an archive through the workflow in checkpointed batches"""
+
+    def __init__(
+        self,
+        workflow: Any,
+        user_id: str,
+        checkpoint_path: str,
+        batch_size: Optional[int] = None,
+        parse_workers: Optional[int] = None,
+        max_buffered: Optional[int] = None,
+        parse_chunk_size: Optional[int] = None,
+        source: str = "import",
+        check_email_log: bool = True
+    ):
+        """
+        Initialize importer
+
+        Args:
+            workflow: EmailProcessingWorkflow (None for a parse-and-deduplicate dry run)
+            user_id: User the imported emails belong to
+            checkpoint_path: SQLite checkpoint file; reusing it resumes the import
+            batch_size: Emails per process_emails_batch call (IMPORT_BATCH_SIZE)
+            parse_workers: Parse processes (IMPORT_PARSE_WORKERS, default CPU count)
+            max_buffered: Messages read ahead of processing (IMPORT_MAX_BUFFERED)
+            parse_chunk_size: Messages per parse task (IMPORT_PARSE_CHUNK)
+            source: Source recorded on the processed emails
+            check_email_log: Also skip messages already in the email log (earlier imports, polling)
+        """
+        self.workflow = workflow
+        self.user_id = user_id
+        self.checkpoint = ImportCheckpoint(checkpoint_path)
+        self.batch_size = batch_size or int(os.getenv("IMPORT_BATCH_SIZE", "20"))
+        self.parse_workers = parse_workers or int(os.getenv("IMPORT_PARSE_WORKERS") or os.cpu_count() or 2)
+        self.max_buffered = max_buffered or int(os.getenv("IMPORT_MAX_BUFFERED", str(self.batch_size * 4)))
+        self.parse_chunk_size = parse_chunk_size or int(os.getenv("IMPORT_PARSE_CHUNK", "32"))
+        self.source = source
+        self.check_email_log = check_email_log and workflow is not None
+        self.stats = {
+            "messages_read": 0, "resumed": 0, "duplicates": 0, "invalid": 0, "processed": 0, "skipped": 0,
+            "deferred": 0, "errors": 0, "tasks_created": 0, "deals_created": 0,
+        }
+
+    async def _split_duplicates(
+        self, chunk: List[Dict[str, Any]], seen: Set[str]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(new, duplicate) messages of a parsed chunk, with one email log read for the whole chunk"""
+        new, duplicates = [], []
+        for parsed in chunk:
+            if parsed["message_hash"] in seen:
+                duplicates.append(parsed)
+            else:
+                seen.add(parsed["message_hash"])
+                new.append(parsed)
+        if self.check_email_log and new:
+            logged = await self.workflow.db_client.get_email_logs([parsed["message_hash"] for parsed in new])
+            duplicates.extend(parsed for parsed in new if parsed["message_hash"] in logged)
+            new = [parsed for parsed in new if parsed["message_hash"] not in logged]
+        return new, duplicates
+
+    async def _process_batch(self, batch: List[Dict[str, Any]]):
+        if self.workflow is None:
+            results = [{"status": "skipped"} for _ in batch]
+        else:
+            mime_contents = [parsed.pop("mime_content") for parsed in batch]
+            # Already checked against the email log, so the workflow doesn't look them up again
+            email_logs = {parsed["message_hash"]: None for parsed in batch} if self.check_email_log else None
+            results = await self.workflow.process_emails_batch(
+                mime_contents, source=self.source, user_id=self.user_id, email_logs=email_logs
+            )
+            del mime_contents
+        entries = []
+        for parsed, result in zip(batch, results):
+            status = _result_status(result)
+            self.stats["errors" if status == "error" else status] += 1
+            counts = (result or {}).get("results", {})
+            self.stats["tasks_created"] += counts.get("tasks_created", 0)
+            self.stats["deals_created"] += counts.get("deals_created", 0)
+            error = (result or {}).get("message") if status == "error" else None
+            entries.append((parsed["message_key"], parsed["message_hash"], status, error))
+        self.checkpoint.record(entries)
+
+    async def _read(self, path: str, fmt: str, pool: ProcessPoolExecutor, pending: asyncio.Queue, done: Set[str]):
+        loop = asyncio.get_running_loop()
+        try:
+            chunk: List[Tuple[str, bytes]] = []
+            for message_key, raw in READERS[fmt](path):
+                self.stats["messages_read"] += 1
+                if message_key in done:
+                    self.stats["resumed"] += 1
+                    continue
+                chunk.append((message_key, raw))
+                if len(chunk) >= self.parse_chunk_size:
+                    # Blocks once max_buffered messages are waiting to be parsed or processed
+                    await pending.put(loop.run_in_executor(pool, parse_chunk, chunk))
+                    chunk = []
+            if chunk:
+                await pending.put(loop.run_in_executor(pool, parse_chunk, chunk))
+        finally:
+            await pending.put(None)
+
+    async def run(self, path: str, progress: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+        """
+        Import an archive
+
+        Args:
+            path: mbox file, Maildir, directory of .eml files, zip of .eml files or a single .eml
+            progress: Called with the running stats after every batch
+
+        Returns:
+            Import statistics
+        """
+        fmt = detect_format(path)
+        started = time.time()
+        done = self.checkpoint.done_keys()
+        seen = self.checkpoint.seen_hashes()
+        self.checkpoint.set_meta(
+            source_path=path, format=fmt, user_id=self.user_id,
+            started_at=datetime.now(timezone.utc).isoformat(), finished_at=None
+        )
+        logger.info(f"📥 Importing {fmt} {path} for {self.user_id} ({len(done)} messages already done)")
+
+        pending: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.max_buffered // self.parse_chunk_size))
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            reader = asyncio.create_task(self._read(path, fmt, pool, pending, done))
+            batch: List[Dict[str, Any]] = []
+            skipped: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+            try:
+                while True:
+                    future = await pending.get()
+                    if future is None:
+                        break
+                    chunk = []
+                    for parsed in await future:
+                        if "error" in parsed:
+                            self.stats["invalid"] += 1
+                            skipped.append((parsed["message_key"], None, "invalid", parsed["error"]))
+                        else:
+                            chunk.append(parsed)
+                    new, duplicates = await self._split_duplicates(chunk, seen)
+                    for parsed in duplicates:
+                        self.stats["duplicates"] += 1
+                        skipped.append((parsed["message_key"], parsed["message_hash"], "duplicate", None))
+                    for parsed in new:
+                        batch.append(parsed)
+                        if len(batch) >= self.batch_size:
+                            await self._process_batch(batch)
+                            batch = []
+                            if progress:
+                                progress(self.get_stats(started))
+                    if len(skipped) >= self.batch_size:
+                        self.checkpoint.record(skipped)
+                        skipped = []
+                if batch:
+                    await self._process_batch(batch)
+                if skipped:
+                    self.checkpoint.record(skipped)
+                await reader
+            finally:
+                if not reader.done():
+                    reader.cancel()
+
+        stats = self.get_stats(started)
+        self.checkpoint.set_meta(finished_at=datetime.now(timezone.utc).isoformat())
+        if progress:
+            progress(stats)
+        logger.info(
+            f"✅ Import complete: {stats['processed']} processed, {stats['skipped']} skipped, "
+            f"{stats['duplicates']} duplicates, {stats['errors']} errors "
+            f"({stats['messages_per_second']:.1f} msg/s)"
+        )
+        return stats
+
+    def get_stats(self, started: float) -> Dict[str, Any]:
+        elapsed = time.time() - started
+        handled = self.stats["messages_read"] - self.stats["resumed"]
+        return {
+            **self.stats,
+            "elapsed_seconds": round(elapsed, 2),
+            "messages_per_second": handled / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def close(self):
+        self.checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a historical mailbox (mbox, Maildir, zip of .eml, .eml files)")
+    parser.add_argument("path", help="mbox file, Maildir, directory or zip of .eml files")
+    parser.add_argument("--user-id", required=True, help="User the emails belong to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.import.db); rerun to resume")
+    parser.add_argument("--batch-size", type=int, help="Emails per workflow batch")
+    parser.add_argument("--parse-workers", type=int, help="Parse processes")
+    parser.add_argument("--parse-chunk", type=int, help="Messages per parse task")
+    parser.add_argument("--dry-run", action="store_true", help="Only parse and deduplicate, no LLM calls or writes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    workflow = None
+    if not args.dry_run:
+        from ..graph.workflow import EmailProcessingWorkflow
+        workflow = EmailProcessingWorkflow(
+            confidence_threshold=float(os.getenv("CONFIDENCE_THRESHOLD", "0.8")),
+            llm_model=os.getenv("OPENROUTER_MODEL", "mistralai/mistral-small-3.2-24b-instruct:free")
+        )
+
+    importer = BulkImporter(
+        workflow,
+        args.user_id,
+        args.checkpoint or f"{args.path.rstrip(os.sep)}.import.db",
+        batch_size=args.batch_size,
+        parse_workers=args.parse_workers,
+        parse_chunk_size=args.parse_chunk
+    )
+
+    def report(stats: Dict[str, Any]):
+        print(
+            f"\r{stats['messages_read']} read | {stats['processed']} processed | {stats['skipped']} skipped | "
+            f"{stats['duplicates']} duplicates | {stats['errors']} errors | {stats['messages_per_second']:.1f} msg/s",
+            end="", file=sys.stderr
+        )
+
+    try:
+        stats = asyncio.run(importer.run(args.path, progress=report))
+    finally:
+        importer.close()
+    print(file=sys.stderr)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
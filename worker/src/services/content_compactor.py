@@ -0,0 +1,165 @@
+"""
+Token-aware email content compaction
+
+Strips boilerplate that costs LLM input tokens but carries no business
+signal (signatures, legal disclaimers, tracking footers, long URLs,
+whitespace runs) and then fits what is left into a token budget.
+"""
+import re
+from dataclasses import dataclass
+from typing import List
+
+# Rough average for English business email with the tokenizers we use via
+# OpenRouter. Good enough for budgeting - billing uses the provider counts.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in a piece of text"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class CompactionResult:
+    """Outcome of compacting one piece of content"""
+    content: str
+    original_tokens: int
+    compacted_tokens: int
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.compacted_tokens)
+
+
+class ContentCompactor:
+    """Remove email boilerplate and budget content by estimated tokens"""
+
+    # Everything after an RFC 3676 signature separator or a mobile client tag is signature
+    SIGNATURE_SEPARATOR = re.compile(r'^(--|__)\s*$|^Sent from my \w+|^Get Outlook for \w+', re.IGNORECASE)
+
+    # Valedictions in the last few lines - only a couple of lines after these are kept (name, title)
+    VALEDICTION = re.compile(
+        r'^(best|kind|warm|warmest)?\s*(regards|wishes)[,!.]?\s*$|'
+        r'^(thanks|thank you|many thanks|cheers|sincerely|yours (truly|sincerely))[,!.]?\s*$',
+        re.IGNORECASE
+    )
+    VALEDICTION_KEEP_LINES = 2
+    MAX_SIGNATURE_LINES = 6
+
+    # Trailing paragraphs matching these are dropped entirely, matching lines elsewhere
+    BOILERPLATE_PATTERNS = [
+        # Legal disclaimers
+        r'confidentiality notice',
+        r'^\s*(legal )?disclaimer\b',
+        r'this (e-?mail|message)( and any (files|attachments)[\w\s]*)? (is|are) (confidential|intended (solely|only))',
+        r'if you (are not|have received this)[\w\s,]* (intended recipient|in error)',
+        r'please consider the environment before printing',
+        # Tracking / marketing footers
+        r'\bunsubscribe\b',
+        r'view (this (e-?mail|message) )?in (your )?browser',
+        r'manage (your )?(e-?mail )?preferences',
+        r'you (are )?receiv(ed|ing) this (e-?mail|message) because',
+    ]
+
+    URL_PATTERN = re.compile(r'https?://([^/\s<>"\')]+)[^\s<>"\')]*', re.IGNORECASE)
+    MAX_URL_LENGTH = 40
+
+    SEPARATOR_LINE = re.compile(r'^\s*[-_=*~#]{3,}\s*$')
+    INLINE_WHITESPACE = re.compile(r'[ \t\u00a0]+')
+    BLANK_LINES = re.compile(r'\n{3,}')
+
+    TRUNCATION_MARKER = "\n\n[... content truncated ...]\n\n"
+
+    def __init__(self):
+        self.boilerplate_regex = re.compile('|'.join(self.BOILERPLATE_PATTERNS), re.IGNORECASE)
+
+    def compact(self, content: str, max_tokens: int = 0) -> CompactionResult:
+        """
+        Compact email text and fit it into a token budget
+
+        Args:
+            content: Plain text email body
+            max_tokens: Token budget for the result (0 = no budget)
+
+        Returns:
+            CompactionResult with the compacted text and token estimates
+        """
+        original_tokens = estimate_tokens(content)
+
+        text = content.replace('\r\n', '\n').replace('\r', '\n')
+        text = self._shorten_urls(text)
+        lines = [self.INLINE_WHITESPACE.sub(' ', line).strip() for line in text.split('\n')]
+        lines_before_stripping = lines
+        text = self._strip_boilerplate_paragraphs('\n'.join(lines))
+        lines = self._strip_signature(text.split('\n'))
+        text = '\n'.join(line for line in lines if not self.SEPARATOR_LINE.match(line))
+        text = self.BLANK_LINES.sub('\n\n', text).strip()
+        if not text:
+            # Everything looked like boilerplate - better to send it all than nothing
+            text = self.BLANK_LINES.sub('\n\n', '\n'.join(lines_before_stripping)).strip()
+
+        truncated = False
+        if max_tokens and estimate_tokens(text) > max_tokens:
+            text = self._truncate_to_budget(text, max_tokens)
+            truncated = True
+
+        return CompactionResult(
+            content=text,
+            original_tokens=original_tokens,
+            compacted_tokens=estimate_tokens(text),
+            truncated=truncated
+        )
+
+    def _shorten_urls(self, text: str) -> str:
+        """Replace long (usually tracking) URLs with their domain"""
+        def replace(match: re.Match) -> str:
+            url = match.group(0)
+            if len(url) <= self.MAX_URL_LENGTH:
+                return url
+            return f"[link: {match.group(1).lower()}]"
+
+        return self.URL_PATTERN.sub(replace, text)
+
+    def _strip_signature(self, lines: List[str]) -> List[str]:
+        """Drop signature blocks at the end of the message"""
+        for idx, line in enumerate(lines):
+            if self.SIGNATURE_SEPARATOR.match(line):
+                lines = lines[:idx]
+                break
+
+        # Keep the valediction and name, drop the contact block below it. Only
+        # a valediction in the last few lines, after the body, counts - an
+        # opening "Thanks!" is not a signature
+        for idx in range(len(lines) - 1, -1, -1):
+            if self.VALEDICTION.match(lines[idx]):
+                tail = [line for line in lines[idx + 1:] if line]
+                if len(tail) <= self.MAX_SIGNATURE_LINES and any(lines[:idx]):
+                    lines = lines[:idx + 1] + tail[:self.VALEDICTION_KEEP_LINES]
+                break
+
+        return lines
+
+    def _strip_boilerplate_paragraphs(self, text: str) -> str:
+        """Drop the trailing disclaimer/footer paragraphs, and boilerplate lines elsewhere"""
+        paragraphs = text.split('\n\n')
+        while paragraphs and (not paragraphs[-1].strip() or self.boilerplate_regex.search(paragraphs[-1])):
+            paragraphs.pop()
+        kept = [
+            '\n'.join(line for line in paragraph.split('\n') if not self.boilerplate_regex.search(line))
+            for paragraph in paragraphs
+        ]
+        return '\n\n'.join(kept)
+
+    def _truncate_to_budget(self, text: str, max_tokens: int) -> str:
+        """Keep the beginning (75%) and end (25%) of the text within the token budget"""
+        budget_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(self.TRUNCATION_MARKER))
+        head_chars = int(budget_chars * 0.75)
+        tail_chars = budget_chars - head_chars
+
+        # Cut on word boundaries so we don't send half words
+        head = text[:head_chars].rsplit(' ', 1)[0] if head_chars else ""
+        tail = text[-tail_chars:].split(' ', 1)[-1] if tail_chars else ""
+        return head.rstrip() + self.TRUNCATION_MARKER + tail.lstrip()
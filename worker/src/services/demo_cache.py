@@ -0,0 +1,310 @@
+"""
+Result cache for the public demo endpoint
+
+Most demo visitors submit the sample emails the UI and docs ship, so demo
+results are cached by a hash of the normalized email text (line endings,
+runs of spaces and blank lines, and Unicode form do not change the key).
+Visitor entries expire after DEMO_CACHE_TTL_SECONDS, and beyond
+DEMO_CACHE_MAX_ENTRIES the least recently used one is dropped.
+Concurrent requests for the same uncached email share one workflow run.
+
+The bundled samples (samples/, DEMO-EMAILS.md and the UI's demoData.ts)
+are pre-warmed at startup and pinned. Their results come from the
+snapshot file when it has them for the current model, and from a
+dry run of the workflow otherwise (nothing is saved, so no run is ever
+skipped as already processed). Build the snapshot ahead of a deploy with:
+
+    python -m src.services.demo_cache [--snapshot data/demo-cache.json]
+"""
+import os
+import re
+import json
+import argparse
+import time
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Repository root (worker/src/services -> repo); sample paths are relative to it
+REPO_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_SAMPLE_PATHS = "samples,DEMO-EMAILS.md,ui/src/data/demoData.ts"
+
+# demoData.ts entries: from, fromName, subject and a template-literal body
+UI_SAMPLE = re.compile(
+    r"from:\s*'(?P<from>[^']*)',\s*fromName:\s*'(?P<name>[^']*)',\s*subject:\s*'(?P<subject>[^']*)',\s*body:\s*`(?P<body>[^`]*)`"
+)
+# DEMO-EMAILS.md sections ("## Email N"): **Subject:**, optional **From:** and a fenced **Body:**
+MARKDOWN_SUBJECT = re.compile(r"\*\*Subject:\*\*\s*(.+)")
+MARKDOWN_FROM = re.compile(r"\*\*From:\*\*\s*(\S+)")
+MARKDOWN_BODY = re.compile(r"\*\*Body:\*\*\s*\n```\n(.*?)\n```", re.DOTALL)
+SPACES = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_email_text(text: str) -> str:
+    """Canonical form of submitted email text for the cache key"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha256(normalize_email_text(text).encode("utf-8")).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def load_samples(paths: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """
+    Email texts of the bundled demo samples, as the demo UI submits them
+
+    Args:
+        paths: Files or directories relative to the repository root (DEMO_CACHE_SAMPLE_PATHS)
+
+    Returns:
+        List of (label, email text)
+    """
+    if paths is None:
+        paths = os.getenv("DEMO_CACHE_SAMPLE_PATHS", DEFAULT_SAMPLE_PATHS).split(",")
+    samples = []
+    for entry in (path.strip() for path in paths if path.strip()):
+        path = Path(entry) if Path(entry).is_absolute() else REPO_ROOT / entry
+        if path.is_dir():
+            for file in sorted(path.glob("*.txt")) + sorted(path.glob("*.eml")):
+                samples.append((f"{entry}/{file.name}", file.read_text(encoding="utf-8", errors="replace")))
+        elif path.suffix == ".ts" and path.is_file():
+            for i, match in enumerate(UI_SAMPLE.finditer(path.read_text(encoding="utf-8")), 1):
+                # Same text DemoEmailInput builds from a sample
+                text = f"From: {match['name']} <{match['from']}>\nSubject: {match['subject']}\n\n{match['body']}"
+                samples.append((f"{entry}#{i}", text))
+        elif path.suffix == ".md" and path.is_file():
+            for i, section in enumerate(path.read_text(encoding="utf-8").split("\n## ")):
+                subject, body = MARKDOWN_SUBJECT.search(section), MARKDOWN_BODY.search(section)
+                if subject and body:
+                    sender = MARKDOWN_FROM.search(section)
+                    headers = f"From: {sender[1]}\n" if sender else ""
+                    samples.append((f"{entry}#{i}", f"{headers}Subject: {subject[1].strip()}\n\n{body[1]}"))
+        else:
+            logger.info(f"Demo sample path {path} not found, skipped")
+    return samples
+
+
+class DemoResultCache:
+    """Demo results by normalized content hash, with TTL, size bound and pinned samples"""
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        snapshot_path: Optional[str] = None,
+        model: str = ""
+    ):
+        """
+        Initialize demo result cache
+
+        Args:
+            ttl_seconds: Lifetime of visitor entries (DEMO_CACHE_TTL_SECONDS)
+            max_entries: Visitor entries kept (DEMO_CACHE_MAX_ENTRIES); pinned samples do not count
+            snapshot_path: Precomputed sample results (DEMO_CACHE_SNAPSHOT, empty = none)
+            model: LLM model the results come from; snapshots of other models are ignored
+        """
+        self.ttl_seconds = ttl_seconds or float(os.getenv("DEMO_CACHE_TTL_SECONDS", "86400"))
+        self.max_entries = max_entries or int(os.getenv("DEMO_CACHE_MAX_ENTRIES", "500"))
+        if snapshot_path is None:
+            snapshot_path = os.getenv("DEMO_CACHE_SNAPSHOT", "data/demo-cache.json")
+        self.snapshot_path = snapshot_path
+        self.model = model
+
+        # key -> (serialized result, expires_at); results are stored as JSON so every hit is a fresh copy
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._pinned: Dict[str, str] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "joined": 0, "stored": 0, "evicted": 0, "expired": 0}
+
+    @staticmethod
+    def key(email_text: str) -> str:
+        return content_key(email_text)
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Cached result (a fresh copy), or None"""
+        now = now if now is not None else time.time()
+        serialized = self._pinned.get(key)
+        if serialized is None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            serialized = entry[0]
+        self._stats["hits"] += 1
+        return json.loads(serialized)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._in_flight
+
+    def put(self, key: str, result: Dict[str, Any], pinned: bool = False, now: Optional[float] = None):
+        """Store a successful result; errors and skipped emails are not cached"""
+        if result.get("status") != "success":
+            return
+        serialized = json.dumps(result, default=_json_default)
+        self._stats["stored"] += 1
+        if pinned:
+            self._pinned[key] = serialized
+            self._entries.pop(key, None)
+            return
+        now = now if now is not None else time.time()
+        self._entries[key] = (serialized, now + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evicted"] += 1
+
+    async def compute(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[Dict[str, Any]]],
+        pinned: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run `produce` for an uncached email and cache its result; concurrent
+        calls for the same key wait for the first one instead of running again
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._stats["joined"] += 1
+            return json.loads(json.dumps(await asyncio.shield(future), default=_json_default))
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await produce()
+            self.put(key, result, pinned=pinned)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so an unawaited future does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _load_snapshot(self) -> Dict[str, Any]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return {}
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable demo cache snapshot {self.snapshot_path}: {e}")
+            return {}
+        if snapshot.get("model") != self.model:
+            logger.info(f"Demo cache snapshot is for model {snapshot.get('model')}, not {self.model}; recomputing")
+            return {}
+        return snapshot.get("results", {})
+
+    def _save_snapshot(self):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        snapshot = {
+            "model": self.model,
+            "created_at": time.time(),
+            "results": {key: json.loads(serialized) for key, serialized in self._pinned.items()}
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def prewarm(
+        self,
+        process: Callable[[str], Awaitable[Dict[str, Any]]],
+        samples: Optional[List[Tuple[str, str]]] = None
+    ) -> Dict[str, int]:
+        """
+        Pin results for the bundled samples, from the snapshot or by running them
+
+        Args:
+            process: Runs the demo workflow for an email text; it must not persist
+                anything, or the next boot would get "already processed" back
+            samples: (label, email text) pairs (default: load_samples())
+
+        Returns:
+            Counts of samples loaded from the snapshot, computed and failed
+        """
+        samples = samples if samples is not None else load_samples()
+        snapshot = self._load_snapshot()
+        counts = {"samples": len(samples), "from_snapshot": 0, "computed": 0, "failed": 0}
+
+        for label, text in samples:
+            key = self.key(text)
+            if key in self._pinned:
+                continue
+            if key in snapshot:
+                self.put(key, snapshot[key], pinned=True)
+                counts["from_snapshot"] += 1
+                continue
+            try:
+                result = await self.compute(key, lambda text=text: process(text), pinned=True)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            if key in self._pinned:
+                counts["computed"] += 1
+            else:
+                counts["failed"] += 1
+                logger.warning(f"Demo sample {label} not cached: {result.get('message') or result.get('status')}")
+
+        if counts["computed"] and self.snapshot_path:
+            try:
+                self._save_snapshot()
+            except OSError as e:
+                logger.warning(f"Failed to write demo cache snapshot {self.snapshot_path}: {e}")
+        logger.info(f"✅ Demo cache pre-warmed: {counts}")
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["joined"]
+        return {
+            "pinned": len(self._pinned),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            **self._stats
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute demo results for the bundled samples")
+    parser.add_argument("--snapshot", default=os.getenv("DEMO_CACHE_SNAPSHOT", "data/demo-cache.json"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from ..graph.workflow import EmailProcessingWorkflow
+    model = os.getenv("OPENROUTER_MODEL", "mistralai/mistral-small-3.2-24b-instruct:free")
+    workflow = EmailProcessingWorkflow(
+        confidence_threshold=float(os.getenv("CONFIDENCE_THRESHOLD", "0.8")),
+        llm_model=model
+    )
+    cache = DemoResultCache(snapshot_path=args.snapshot, model=model)
+    counts = asyncio.run(cache.prewarm(lambda text: workflow.process_email(text, source="demo", dry_run=True)))
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
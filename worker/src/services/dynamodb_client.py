@@ -3,10 +3,13 @@ from boto3.dynamodb.conditions import Key, Attr
 from typing import Dict, Any, List, Optional
 import logging
 import os
+import time
 from datetime import datetime, timedelta
+from decimal import Decimal
 from botocore.exceptions import ClientError
 
 from ..models import Task, Deal, EmailLog, Person, Company
+from .metrics import instrument_dynamodb_client
 from botocore.exceptions import ClientError as BotoClientError
 
 logger = logging.getLogger(__name__)
@@ -41,13 +44,21 @@ class DynamoDBClient:
             logger.info(f"Using AWS DynamoDB in region {self.region}")
             self.dynamodb = boto3.resource('dynamodb', region_name=self.region)
 
+        # Per-operation latency in worker_dynamodb_request_duration_seconds
+        instrument_dynamodb_client(self.dynamodb.meta.client)
+
         # Table references
         self.tables = {
             'tasks': self.dynamodb.Table(f"{self.table_prefix}-tasks"),
             'deals': self.dynamodb.Table(f"{self.table_prefix}-deals"),
             'email_log': self.dynamodb.Table(f"{self.table_prefix}-email-logs"),
             'people': self.dynamodb.Table(f"{self.table_prefix}-people"),
-            'companies': self.dynamodb.Table(f"{self.table_prefix}-companies")
+            'companies': self.dynamodb.Table(f"{self.table_prefix}-companies"),
+            'token_usage': self.dynamodb.Table(f"{self.table_prefix}-token-usage"),
+            'email_threads': self.dynamodb.Table(f"{self.table_prefix}-email-threads"),
+            'email_jobs': self.dynamodb.Table(f"{self.table_prefix}-email-jobs"),
+            'poll_leases': self.dynamodb.Table(f"{self.table_prefix}-poll-leases"),
+            'rate_limits': self.dynamodb.Table(f"{self.table_prefix}-rate-limits")
         }
     
     async def save_extracted_data(
@@ -55,7 +66,7 @@ class DynamoDBClient:
         tasks: List[Task],
         deals: List[Deal],
         people: List[Person],
-        email_log: EmailLog
+        email_log: Optional[EmailLog] = None
     ) -> Dict[str, Any]:
         """
         Save extracted tasks, deals, and people to DynamoDB
@@ -64,7 +75,7 @@ class DynamoDBClient:
             tasks: List of extracted tasks
             deals: List of extracted deals
             people: List of extracted people/contacts
-            email_log: Email processing log
+            email_log: Email processing log (unused; saved separately by save_email_log)
 
         Returns:
             Save operation results
@@ -149,6 +160,84 @@ class DynamoDBClient:
             logger.error(f"Error getting email log: {e}")
             return None
     
+    async def get_email_logs(self, message_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Email logs for several message hashes, 100 per BatchGetItem call; hashes not logged are left out"""
+        table = self.tables['email_log']
+        hashes = list(dict.fromkeys(message_hashes))
+        found: Dict[str, Dict[str, Any]] = {}
+        try:
+            for start in range(0, len(hashes), 100):
+                request = {table.name: {'Keys': [{'message_id_hash': h} for h in hashes[start:start + 100]]}}
+                attempt = 0
+                while request:
+                    if attempt:
+                        # Throttled keys come back unprocessed - back off before asking again
+                        time.sleep(min(1.0, 0.05 * 2 ** attempt))
+                    response = self.dynamodb.batch_get_item(RequestItems=request)
+                    for item in response.get('Responses', {}).get(table.name, []):
+                        found[item['message_id_hash']] = item
+                    request = response.get('UnprocessedKeys')
+                    attempt += 1
+        except Exception as e:
+            logger.error(f"Error getting email logs: {e}")
+        return found
+
+    async def increment_token_usage(self, user_id: str, day: str, usage: Dict[str, int]) -> bool:
+        """Atomically add token counts to a user's daily usage record"""
+        try:
+            fields = ["prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "llm_calls"]
+            self.tables['token_usage'].update_item(
+                Key={'usage_key': f"{user_id}#{day}"},
+                UpdateExpression="SET user_id = :user_id, #day = :day ADD " + ", ".join(
+                    f"{field} :{field}" for field in fields
+                ),
+                ExpressionAttributeNames={'#day': 'day'},
+                ExpressionAttributeValues={
+                    ':user_id': user_id,
+                    ':day': day,
+                    **{f":{field}": int(usage.get(field, 0)) for field in fields}
+                }
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error updating token usage for {user_id}: {e}")
+            return False
+
+    async def get_token_usage(self, user_id: str, day: str) -> Optional[Dict[str, Any]]:
+        """Get a user's token usage record for a day"""
+        try:
+            response = self.tables['token_usage'].get_item(
+                Key={'usage_key': f"{user_id}#{day}"}
+            )
+            return response.get('Item')
+        except Exception as e:
+            logger.error(f"Error getting token usage for {user_id}: {e}")
+            return None
+
+    async def get_email_thread(self, thread_key: str) -> Optional[Dict[str, Any]]:
+        """Get a thread classification record by thread key"""
+        try:
+            response = self.tables['email_threads'].get_item(
+                Key={'thread_key': thread_key}
+            )
+            return response.get('Item')
+        except Exception as e:
+            logger.error(f"Error getting email thread {thread_key}: {e}")
+            return None
+
+    async def save_email_thread(self, record: Dict[str, Any]) -> bool:
+        """Save a thread classification record"""
+        try:
+            item = {
+                key: Decimal(str(value)) if isinstance(value, float) else value
+                for key, value in record.items()
+            }
+            self.tables['email_threads'].put_item(Item=item)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving email thread {record.get('thread_key')}: {e}")
+            return False
+
     async def get_tasks(
         self, 
         status: Optional[str] = None, 
@@ -0,0 +1,466 @@
+"""
+Extraction output repair and normalization
+
+One place that turns whatever the extraction LLM returned into clean
+task/deal dicts:
+- fast JSON parsing (orjson when installed)
+- tolerant repair of fenced, truncated or slightly malformed JSON
+- pydantic TypeAdapter validation with field aliases (task/text -> title,
+  details -> description, ...) and value coercion ("80%", "₹50L")
+- near-miss enum values mapped onto TaskPriority/DealStage/VALID_CURRENCIES
+  ("urgent" -> high, "Closed Won" -> closed, "$" -> USD), so output from
+  models without schema-constrained decoding still persists
+
+Items are validated one by one, so one bad item doesn't cost the rest.
+"""
+import re
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, field_validator, model_validator
+
+from ..models import DealStage, TaskPriority, VALID_CURRENCIES
+
+try:
+    import orjson
+
+    def _loads(text: str) -> Any:
+        return orjson.loads(text)
+except ImportError:
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# JSON repair
+# ============================================================================
+
+_PYTHON_LITERALS = (("True", "true"), ("False", "false"), ("None", "null"))
+
+
+def _scan(text: str) -> Tuple[str, bool, List[Tuple[int, Tuple[str, ...]]], Tuple[str, ...]]:
+    """
+    Single pass over the text from the first '{' or '['
+
+    Drops trailing commas, converts Python literals and stops at the end of
+    the top-level value. Records safe cut points (before commas, after
+    opening/closing brackets) with the open-bracket stack at that point so
+    truncated output can be closed.
+
+    Returns:
+        (scanned text, still inside a string, cut points, open stack at end)
+    """
+    match = re.search(r'[{\[]', text)
+    if not match:
+        return "", False, [], ()
+
+    out: List[str] = []
+    stack: List[str] = []
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = False
+    escaped = False
+    i = match.start()
+    n = len(text)
+
+    while i < n:
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+            cut_points.append((len(out), tuple(stack)))
+        elif char in "}]":
+            # Trailing comma before a closing bracket
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if stack:
+                out.append(stack.pop())
+            cut_points.append((len(out), tuple(stack)))
+            if not stack:
+                return "".join(out), False, cut_points, ()
+        elif char == ",":
+            cut_points.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            for python_literal, json_literal in _PYTHON_LITERALS:
+                if text.startswith(python_literal, i) and not (out and (out[-1].isalnum() or out[-1] == "_")):
+                    out.append(json_literal)
+                    i += len(python_literal)
+                    break
+            else:
+                out.append(char)
+                i += 1
+            continue
+        i += 1
+
+    return "".join(out), in_string, cut_points, tuple(stack)
+
+
+def _close(text: str, stack: Tuple[str, ...]) -> str:
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def parse_json_lenient(text: str) -> Any:
+    """
+    Parse LLM JSON output, repairing it if needed
+
+    Handles ```json fences, text around the JSON, trailing commas, Python
+    literals and output truncated mid-string/object (the last incomplete
+    item is dropped and open brackets are closed).
+
+    Raises:
+        ValueError if nothing parseable could be recovered
+    """
+    if not text or not text.strip():
+        raise ValueError("Empty LLM output")
+
+    try:
+        return _loads(text)
+    except ValueError:
+        pass
+
+    scanned, in_string, cut_points, stack = _scan(text)
+    if not scanned:
+        raise ValueError("No JSON object found in LLM output")
+
+    if not stack:
+        candidates = [scanned]
+    else:
+        # Truncated: drop the incomplete tail back to the latest safe point
+        # (keeps complete fields, loses a half-written value), finally try
+        # closing the open string as is
+        candidates = [_close(scanned[:position], stack_at_cut) for position, stack_at_cut in reversed(cut_points)]
+        candidates.append(_close(scanned + ('"' if in_string else ""), stack))
+
+    for candidate in candidates:
+        try:
+            return _loads(candidate)
+        except ValueError:
+            continue
+
+    raise ValueError("Could not repair LLM JSON output")
+
+
+# ============================================================================
+# Value coercion
+# ============================================================================
+
+_AMOUNT_MULTIPLIERS = {
+    "k": 1e3, "thousand": 1e3,
+    "l": 1e5, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "m": 1e6, "mn": 1e6, "million": 1e6,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+}
+_AMOUNT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*([a-z]+)?', re.IGNORECASE)
+
+
+def parse_amount(value: Any) -> float:
+    """Parse a deal value such as 5000000, "5,000,000", "₹50L" or "1.5 Cr" (first amount wins)"""
+    if value is None or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _AMOUNT_PATTERN.search(str(value).replace(",", ""))
+    if not match:
+        return 0.0
+    amount = float(match.group(1))
+    suffix = (match.group(2) or "").lower().rstrip(".")
+    return amount * _AMOUNT_MULTIPLIERS.get(suffix, 1)
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'-?\d+(?:\.\d+)?', str(value))
+    if not match:
+        return None
+    number = float(match.group(0))
+    return number / 100 if "%" in str(value) else number
+
+
+def parse_confidence(value: Any, default: float = 0.5) -> float:
+    """Confidence in [0, 1] from 0.8, "0.8", "80%" or 80"""
+    number = _number(value)
+    if number is None:
+        return default
+    if number > 1:
+        number /= 100
+    return min(1.0, max(0.0, number))
+
+
+def parse_probability(value: Any, default: int = 50) -> int:
+    """Win probability in [0, 100] from 40, "40%", 0.4 or "0.4" (fractions are scaled up)"""
+    number = _number(value)
+    if number is None:
+        return default
+    # Fractions ("40%" is already 0.4 here) - but an integer 1 means 1%
+    if number <= 1 and (isinstance(value, float) or "%" in str(value) or "." in str(value)):
+        number *= 100
+    return int(min(100, max(0, round(number))))
+
+
+# Near-miss labels seen from models that ignore the listed enum values
+_PRIORITY_ALIASES = {
+    "urgent": TaskPriority.HIGH, "critical": TaskPriority.HIGH, "asap": TaskPriority.HIGH, "important": TaskPriority.HIGH,
+    "normal": TaskPriority.MEDIUM, "moderate": TaskPriority.MEDIUM, "med": TaskPriority.MEDIUM,
+    "minor": TaskPriority.LOW, "trivial": TaskPriority.LOW,
+}
+_STAGE_ALIASES = {
+    "new": DealStage.LEAD, "prospect": DealStage.LEAD, "inquiry": DealStage.LEAD, "enquiry": DealStage.LEAD,
+    "contacted": DealStage.QUALIFIED, "demo": DealStage.QUALIFIED, "discovery": DealStage.QUALIFIED,
+    "proposal_sent": DealStage.PROPOSAL, "quote": DealStage.PROPOSAL, "quoted": DealStage.PROPOSAL,
+    "negotiating": DealStage.NEGOTIATION,
+    "closed_won": DealStage.CLOSED, "won": DealStage.CLOSED, "closed_lost": DealStage.CLOSED, "lost": DealStage.CLOSED,
+}
+_CURRENCY_ALIASES = {
+    "$": "USD", "US$": "USD", "DOLLAR": "USD", "DOLLARS": "USD",
+    "€": "EUR", "EURO": "EUR", "EUROS": "EUR",
+    "£": "GBP", "POUND": "GBP", "POUNDS": "GBP",
+    "C$": "CAD", "A$": "AUD",
+    "₹": "INR", "RS": "INR", "RS.": "INR", "RUPEE": "INR", "RUPEES": "INR",
+}
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y")
+
+
+def parse_priority(value: Any) -> str:
+    """TaskPriority value for a priority label ("High", "urgent", ...); unknown -> medium"""
+    label = str(value).strip().lower()
+    try:
+        return TaskPriority(label).value
+    except ValueError:
+        return _PRIORITY_ALIASES.get(label, TaskPriority.MEDIUM).value
+
+
+def parse_stage(value: Any) -> str:
+    """DealStage value for a stage label ("Closed Won", "demo", ...); unknown -> lead"""
+    label = str(value).strip().lower().replace(" ", "_").replace("-", "_")
+    try:
+        return DealStage(label).value
+    except ValueError:
+        return _STAGE_ALIASES.get(label, DealStage.LEAD).value
+
+
+def parse_currency(value: Any) -> str:
+    """Supported currency code for a code or symbol ("usd", "€", "Rs"); unknown -> INR"""
+    code = str(value).strip().upper()
+    code = _CURRENCY_ALIASES.get(code, code)
+    if code not in VALID_CURRENCIES:
+        logger.warning(f"Unsupported currency {value!r}, defaulting to INR")
+        return "INR"
+    return code
+
+
+def parse_due_date(value: Any) -> str:
+    """ISO date (YYYY-MM-DD) from a date or common date string; "" if unparseable"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value).strip()
+    try:
+        # Also accepts full ISO timestamps
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return ""
+
+
+# ============================================================================
+# Schemas
+# ============================================================================
+
+class _LenientModel(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra="ignore", coerce_numbers_to_str=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_nulls(cls, data: Any) -> Any:
+        # Models often emit null for "not mentioned" - let defaults apply
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None and value != ""}
+        return data
+
+
+class NormalizedTask(_LenientModel):
+    """Task as produced by the extraction LLM, normalized"""
+    title: str = Field(default="Unknown task", validation_alias=AliasChoices("title", "task", "name", "action", "text", "snippet"))
+    description: str = Field(default="", validation_alias=AliasChoices("description", "details", "snippet", "text"))
+    priority: str = "medium"
+    due_date: str = Field(default="", validation_alias=AliasChoices("due_date", "dueDate", "due", "deadline"))
+    confidence: float = 0.5
+    snippet: str = Field(default="", validation_alias=AliasChoices("snippet", "quote", "evidence", "text"))
+
+    @field_validator("title", mode="after")
+    @classmethod
+    def _title(cls, value: str) -> str:
+        return value.strip()[:200] or "Unknown task"
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def _priority(cls, value: Any) -> str:
+        return parse_priority(value)
+
+    @field_validator("due_date", mode="before")
+    @classmethod
+    def _due_date(cls, value: Any) -> str:
+        return parse_due_date(value)
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value: Any) -> float:
+        return parse_confidence(value)
+
+    @model_validator(mode="after")
+    def _fill_text(self) -> "NormalizedTask":
+        self.description = self.description or self.snippet or self.title
+        self.snippet = self.snippet or self.title
+        return self
+
+
+class NormalizedDeal(_LenientModel):
+    """Deal as produced by the extraction LLM, normalized"""
+    title: str = Field(default="Unknown deal", validation_alias=AliasChoices("title", "deal", "name", "opportunity", "text", "snippet"))
+    description: str = Field(default="", validation_alias=AliasChoices("description", "details", "snippet", "text"))
+    value: float = Field(default=0.0, validation_alias=AliasChoices("value", "amount", "deal_value", "dealValue"))
+    currency: str = "INR"
+    stage: str = "lead"
+    probability: int = Field(default=50, validation_alias=AliasChoices("probability", "win_probability", "likelihood"))
+    confidence: float = 0.5
+    snippet: str = Field(default="", validation_alias=AliasChoices("snippet", "quote", "evidence", "text"))
+
+    @field_validator("value", mode="before")
+    @classmethod
+    def _value(cls, value: Any) -> float:
+        return parse_amount(value)
+
+    @field_validator("title", mode="after")
+    @classmethod
+    def _title(cls, value: str) -> str:
+        return value.strip()[:200] or "Unknown deal"
+
+    @field_validator("currency", mode="before")
+    @classmethod
+    def _currency(cls, value: Any) -> str:
+        return parse_currency(value)
+
+    @field_validator("stage", mode="before")
+    @classmethod
+    def _stage(cls, value: Any) -> str:
+        return parse_stage(value)
+
+    @field_validator("probability", mode="before")
+    @classmethod
+    def _probability(cls, value: Any) -> int:
+        return parse_probability(value)
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value: Any) -> float:
+        return parse_confidence(value)
+
+    @model_validator(mode="after")
+    def _fill_text(self) -> "NormalizedDeal":
+        self.description = self.description or self.snippet or self.title
+        self.snippet = self.snippet or self.title
+        return self
+
+
+# Built once at import - validation is compiled by pydantic-core
+TASK_ADAPTER = TypeAdapter(NormalizedTask)
+DEAL_ADAPTER = TypeAdapter(NormalizedDeal)
+
+TASK_KEYS = ("tasks", "action_items", "todos", "task")
+DEAL_KEYS = ("deals", "opportunities", "deal")
+
+
+class ExtractionNormalizer:
+    """Parse, repair and normalize extraction LLM output"""
+
+    def parse(self, text: str) -> Dict[str, List[Any]]:
+        """
+        Parse raw LLM text into {"tasks": [...], "deals": [...]} (raw items)
+
+        Raises:
+            ValueError if the text can't be parsed even after repair
+        """
+        payload = parse_json_lenient(text)
+        if isinstance(payload, list):
+            # Bare list - items with deal-only fields are deals
+            deals = [item for item in payload if isinstance(item, dict) and ("value" in item or "stage" in item)]
+            tasks = [item for item in payload if isinstance(item, dict) and item not in deals]
+            return {"tasks": tasks, "deals": deals}
+        if not isinstance(payload, dict):
+            raise ValueError(f"Unexpected extraction output type: {type(payload).__name__}")
+        return {"tasks": self._items(payload, TASK_KEYS), "deals": self._items(payload, DEAL_KEYS)}
+
+    @staticmethod
+    def _items(payload: Dict[str, Any], keys: Tuple[str, ...]) -> List[Any]:
+        for key in keys:
+            items = payload.get(key)
+            if items is not None:
+                return items if isinstance(items, list) else [items]
+        return []
+
+    def normalize_task(self, raw: Any) -> Optional[Dict[str, Any]]:
+        """Normalized task dict, or None if the item is unusable"""
+        return self._validate(TASK_ADAPTER, raw, "task")
+
+    def normalize_deal(self, raw: Any) -> Optional[Dict[str, Any]]:
+        """Normalized deal dict, or None if the item is unusable"""
+        return self._validate(DEAL_ADAPTER, raw, "deal")
+
+    @staticmethod
+    def _validate(adapter: TypeAdapter, raw: Any, kind: str) -> Optional[Dict[str, Any]]:
+        if isinstance(raw, str):
+            raw = {"title": raw}
+        if not isinstance(raw, dict):
+            logger.warning(f"Dropping non-object {kind}: {raw!r}")
+            return None
+        if not any(value not in (None, "") for value in raw.values()):
+            # Nothing left of an item cut off by truncation
+            return None
+        try:
+            return adapter.validate_python(raw).model_dump()
+        except ValidationError as e:
+            logger.warning(f"Dropping invalid {kind}: {e.errors()[0]['msg']}")
+            return None
+
+    def normalize(self, payload: Dict[str, List[Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Normalize every item of a parsed payload, dropping unusable ones"""
+        tasks = [task for task in map(self.normalize_task, payload.get("tasks", [])) if task]
+        deals = [deal for deal in map(self.normalize_deal, payload.get("deals", [])) if deal]
+        return {"tasks": tasks, "deals": deals}
+
+    def parse_and_normalize(self, text: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Parse raw LLM text and normalize it; empty lists if nothing is recoverable"""
+        try:
+            payload = self.parse(text)
+        except ValueError as e:
+            logger.warning(f"Extraction output unparseable: {e}")
+            return {"tasks": [], "deals": []}
+        return self.normalize(payload)
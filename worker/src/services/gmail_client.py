@@ -1,23 +1,52 @@
 """Gmail API client for fetching and processing emails."""
 
+import os
+import re
 import base64
-import email
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
+from googleapiclient.errors import HttpError
+
 from .gmail_oauth import GmailOAuthService
 from .gmail_token_storage import GmailTokenStorage
+from .metrics import GMAIL_DURATION
+from ..utils import BodyPart, LazyMessage, StructuredMessage
 
 logger = logging.getLogger(__name__)
 
 
+def _part_fields(depth: int) -> str:
+    fields = "mimeType,headers,body(size,data,attachmentId)"
+    return fields if depth == 0 else f"{fields},parts({_part_fields(depth - 1)})"
+
+
+# Response fields used from messages.get(format='full'): multipart trees up to five levels deep
+FULL_FORMAT_FIELDS = f"id,threadId,payload({_part_fields(4)})"
+
+# Response fields used from messages.get(format='metadata')
+METADATA_FIELDS = "id,threadId,sizeEstimate,payload/headers"
+
+CHARSET_PARAM = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+
+class HistoryExpired(Exception):
+    """The start history id is older than Gmail keeps history for; a full sync is needed."""
+
+
 class GmailClient:
     """Fetch emails from Gmail API."""
 
     def __init__(self):
         self.oauth_service = GmailOAuthService()
         self.token_storage = GmailTokenStorage()
+        # full: headers and text parts only (field mask); raw: whole messages, as before
+        self.fetch_format = os.getenv("GMAIL_FETCH_FORMAT", "full").lower()
+        # Text bodies Gmail serves separately (large HTML) are downloaded up to this size
+        self.max_part_bytes = int(os.getenv("GMAIL_MAX_PART_BYTES", "262144"))
+        # Metadata requests per batch HTTP request (Gmail allows up to 100)
+        self.metadata_batch_size = int(os.getenv("GMAIL_METADATA_BATCH_SIZE", "50"))
 
     def get_service(self, user_id: str):
         """Get Gmail API service for a user."""
@@ -72,60 +101,294 @@ class GmailClient:
         """
         try:
             service = self.get_service(user_id)
+            messages = self.list_messages(service, label_ids, max_results, after_date)
+            return self.fetch_messages(service, [msg['id'] for msg in messages])
+
+        except Exception as e:
+            logger.error(f"Failed to fetch emails for {user_id}: {e}")
+            raise
+
+    def list_messages(
+        self,
+        service,
+        label_ids: List[str],
+        max_results: int = 10,
+        after_date: Optional[datetime] = None
+    ) -> List[Dict[str, str]]:
+        """
+        List message ids (and thread ids) matching labels and date.
+
+        Args:
+            service: Gmail API service
+            label_ids: List of Gmail label IDs to filter by
+            max_results: Maximum number of messages
+            after_date: Only list messages after this date
+
+        Returns:
+            List of {"id", "threadId"} dictionaries
+        """
+        # Build query
+        query_parts = []
+        if label_ids:
+            for label_id in label_ids:
+                query_parts.append(f"label:{label_id}")
+
+        if after_date:
+            # Gmail uses format: after:YYYY/MM/DD
+            date_str = after_date.strftime("%Y/%m/%d")
+            query_parts.append(f"after:{date_str}")
+
+        query = " ".join(query_parts) if query_parts else ""
+
+        # List messages with pagination
+        logger.info(f"Listing messages with query: {query}")
+        messages = []
+        page_token = None
+
+        while len(messages) < max_results:
+            results = service.users().messages().list(
+                userId='me',
+                q=query,
+                maxResults=min(500, max_results - len(messages)),
+                pageToken=page_token
+            ).execute()
 
-            # Build query
-            query_parts = []
-            if label_ids:
-                for label_id in label_ids:
-                    query_parts.append(f"label:{label_id}")
+            page_messages = results.get('messages', [])
+            messages.extend(page_messages)
 
-            if after_date:
-                # Gmail uses format: after:YYYY/MM/DD
-                date_str = after_date.strftime("%Y/%m/%d")
-                query_parts.append(f"after:{date_str}")
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
 
-            query = " ".join(query_parts) if query_parts else ""
+        logger.info(f"Found {len(messages)} messages")
+        return messages
 
-            # List messages with pagination
-            logger.info(f"Fetching emails for {user_id} with query: {query}")
-            messages = []
-            page_token = None
+    def list_history(
+        self,
+        service,
+        start_history_id: str,
+        label_id: Optional[str] = None,
+        max_results: int = 500
+    ) -> Tuple[List[Dict[str, str]], str, bool]:
+        """
+        List messages added to the mailbox since a history id (users.history.list).
+
+        History records are taken whole, so a listing that stops at max_results
+        ends after the last record it consumed; its id is returned as the cursor,
+        and the records after it are listed by the next call.
+
+        Args:
+            service: Gmail API service
+            start_history_id: History id of the last sync (or of the watch)
+            label_id: Only messages with this label (e.g. INBOX)
+            max_results: Maximum number of messages (exceeded only by a record's own messages)
 
-            while len(messages) < max_results:
-                results = service.users().messages().list(
+        Returns:
+            Tuple of ({"id", "threadId"} dictionaries, history id to resume from,
+            whether the history was listed to its end)
+
+        Raises:
+            HistoryExpired: start_history_id is too old (Gmail answers 404)
+        """
+        messages: List[Dict[str, str]] = []
+        seen = set()
+        history_id = start_history_id
+        page_token = None
+
+        while True:
+            try:
+                results = service.users().history().list(
                     userId='me',
-                    q=query,
-                    maxResults=min(500, max_results - len(messages)),
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId=label_id,
                     pageToken=page_token
                 ).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    raise HistoryExpired(start_history_id) from e
+                raise
+
+            for record in results.get('history', []):
+                if len(messages) >= max_results:
+                    return messages, history_id, False
+                for added in record.get('messagesAdded', []):
+                    message = added['message']
+                    if label_id and label_id not in message.get('labelIds', [label_id]):
+                        continue
+                    if message['id'] not in seen:
+                        seen.add(message['id'])
+                        messages.append({'id': message['id'], 'threadId': message.get('threadId')})
+                history_id = record['id']
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                # Everything listed: resume from the mailbox's latest id, past non-message changes too
+                return messages, results.get('historyId', history_id), True
+            if len(messages) >= max_results:
+                return messages, history_id, False
+
+    def watch(self, service, topic_name: str, label_ids: List[str]) -> Dict[str, Any]:
+        """
+        Start (or renew) push notifications for a mailbox (users.watch).
 
-                page_messages = results.get('messages', [])
-                messages.extend(page_messages)
+        Returns:
+            {"historyId", "expiration"} - expiration in epoch milliseconds
+        """
+        return service.users().watch(
+            userId='me',
+            body={'topicName': topic_name, 'labelIds': label_ids, 'labelFilterBehavior': 'include'}
+        ).execute()
 
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
+    def stop_watch(self, service):
+        """Stop push notifications for a mailbox (users.stop)."""
+        service.users().stop(userId='me').execute()
 
-            logger.info(f"Found {len(messages)} messages")
+    def get_profile(self, service) -> Dict[str, Any]:
+        """Mailbox address (as push notifications name it) and current historyId (users.getProfile)."""
+        return service.users().getProfile(userId='me').execute()
 
-            emails = []
-            for msg in messages:
-                try:
-                    email_data = self._fetch_email_content(service, msg['id'])
-                    if email_data:
-                        emails.append(email_data)
-                except Exception as e:
-                    logger.error(f"Failed to fetch message {msg['id']}: {e}")
-                    continue
+    def fetch_metadata(self, service, message_ids: List[str], headers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch selected headers and sizeEstimate for many messages (format='metadata').
 
-            return emails
+        Requests go out in batch HTTP requests of metadata_batch_size, so a
+        page of messages costs a few round trips instead of one per message.
 
-        except Exception as e:
-            logger.error(f"Failed to fetch emails for {user_id}: {e}")
-            raise
+        Args:
+            service: Gmail API service
+            message_ids: Gmail message ids
+            headers: Header names to return (metadataHeaders)
+
+        Returns:
+            Responses by message id; messages whose request failed are missing
+        """
+        responses: Dict[str, Dict[str, Any]] = {}
+
+        def collect(request_id, response, exception):
+            if exception is not None:
+                logger.warning(f"Failed to fetch metadata for {request_id}: {exception}")
+            else:
+                responses[request_id] = response
+
+        for start in range(0, len(message_ids), self.metadata_batch_size):
+            batch = service.new_batch_http_request(callback=collect)
+            for message_id in message_ids[start:start + self.metadata_batch_size]:
+                batch.add(
+                    service.users().messages().get(
+                        userId='me',
+                        id=message_id,
+                        format='metadata',
+                        metadataHeaders=headers,
+                        fields=METADATA_FIELDS
+                    ),
+                    request_id=message_id
+                )
+            with GMAIL_DURATION.labels("batch").time():
+                batch.execute()
+
+        return responses
+
+    def fetch_messages(self, service, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch and parse messages; messages that fail are logged and left out."""
+        emails = []
+        for message_id in message_ids:
+            try:
+                email_data = self._fetch_email_content(service, message_id)
+                if email_data:
+                    emails.append(email_data)
+            except Exception as e:
+                logger.error(f"Failed to fetch message {message_id}: {e}")
+                continue
+
+        return emails
 
     def _fetch_email_content(self, service, message_id: str) -> Optional[Dict[str, Any]]:
         """Fetch and parse individual email content."""
+        if self.fetch_format == "raw":
+            return self._fetch_raw_email(service, message_id)
+        return self._fetch_structured_email(service, message_id)
+
+    def _fetch_structured_email(self, service, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch headers and text parts only (format='full' with a field mask).
+
+        Attachment bodies are never downloaded; text bodies Gmail serves
+        separately are fetched only up to max_part_bytes. The workflow gets
+        the resulting StructuredMessage directly, without a MIME round trip.
+        """
+        try:
+            msg = service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='full',
+                fields=FULL_FORMAT_FIELDS
+            ).execute()
+
+            payload = msg.get('payload', {})
+            thread_id = msg.get('threadId')
+            headers = [(header['name'], header['value']) for header in payload.get('headers', [])]
+            if thread_id:
+                headers.append(('X-Gmail-Thread-Id', thread_id))
+
+            parts: List[BodyPart] = []
+            self._collect_parts(service, message_id, payload, parts)
+            email_msg = StructuredMessage(headers, parts)
+
+            return {
+                'id': message_id,
+                'from': email_msg.get('From'),
+                'to': email_msg.get('To'),
+                'subject': email_msg.get('Subject'),
+                'date': email_msg.get('Date'),
+                'message_id': email_msg.get('Message-ID'),
+                'body': email_msg.body(),
+                'message': email_msg,
+                'gmail_id': message_id,
+                'thread_id': thread_id
+            }
+
+        except Exception as e:
+            logger.error(f"Failed to parse email {message_id}: {e}")
+            return None
+
+    def _collect_parts(self, service, message_id: str, part: Dict[str, Any], parts: List[BodyPart]):
+        """Flatten a format='full' payload into leaf BodyParts, downloading text bodies only."""
+        mime_type = (part.get('mimeType') or 'text/plain').lower()
+        if mime_type.startswith('multipart/'):
+            for child in part.get('parts', []):
+                self._collect_parts(service, message_id, child, parts)
+            return
+
+        part_headers = {header['name'].lower(): header['value'] for header in part.get('headers', [])}
+        charset = CHARSET_PARAM.search(part_headers.get('content-type', ''))
+        is_attachment = part_headers.get('content-disposition', '').strip().lower().startswith('attachment')
+        body = part.get('body', {})
+        size = body.get('size', 0)
+        data = None
+
+        if not is_attachment and mime_type in ('text/plain', 'text/html'):
+            data = body.get('data')
+            if data is None and body.get('attachmentId'):
+                if size <= self.max_part_bytes:
+                    data = service.users().messages().attachments().get(
+                        userId='me',
+                        messageId=message_id,
+                        id=body['attachmentId']
+                    ).execute().get('data')
+                else:
+                    logger.info(f"Skipping {size} byte {mime_type} part of {message_id}")
+
+        parts.append(BodyPart(
+            mime_type,
+            base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)) if data else b"",
+            charset=charset.group(1) if charset else None,
+            is_attachment=is_attachment,
+            size=size
+        ))
+
+    def _fetch_raw_email(self, service, message_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch the whole message (format='raw') and rebuild a plain-text MIME string from it."""
         try:
             # Get full message
             msg = service.users().messages().get(
@@ -134,29 +397,37 @@ class GmailClient:
                 format='raw'
             ).execute()
 
-            # Decode raw message
-            msg_str = base64.urlsafe_b64decode(msg['raw']).decode('utf-8')
-
-            # Parse email
-            email_msg = email.message_from_string(msg_str)
+            # Parse headers from the raw bytes - bodies are decoded per part charset
+            email_msg = LazyMessage.from_content(base64.urlsafe_b64decode(msg['raw']))
 
             # Extract headers
-            from_header = email_msg['From']
-            to_header = email_msg['To']
-            subject = email_msg['Subject']
-            date_header = email_msg['Date']
-            message_id_header = email_msg['Message-ID']
+            from_header = email_msg.get('From')
+            to_header = email_msg.get('To')
+            subject = email_msg.get('Subject')
+            date_header = email_msg.get('Date')
+            message_id_header = email_msg.get('Message-ID')
+            in_reply_to = email_msg.get('In-Reply-To')
+            references = email_msg.get('References')
+            thread_id = msg.get('threadId')
 
             # Extract body
             body = self._get_email_body(email_msg)
 
             # Build MIME format (for compatibility with existing ingestion pipeline)
+            thread_headers = ""
+            if in_reply_to:
+                thread_headers += f"In-Reply-To: {in_reply_to}\n"
+            if references:
+                thread_headers += f"References: {' '.join(str(references).split())}\n"
+            if thread_id:
+                thread_headers += f"X-Gmail-Thread-Id: {thread_id}\n"
+
             mime_content = f"""From: {from_header}
 To: {to_header}
 Subject: {subject}
 Date: {date_header}
 Message-ID: {message_id_header}
-
+{thread_headers}
 {body}"""
 
             return {
@@ -168,36 +439,17 @@ Message-ID: {message_id_header}
                 'message_id': message_id_header,
                 'body': body,
                 'mime_content': mime_content,
-                'gmail_id': message_id
+                'gmail_id': message_id,
+                'thread_id': thread_id
             }
 
         except Exception as e:
             logger.error(f"Failed to parse email {message_id}: {e}")
             return None
 
-    def _get_email_body(self, email_msg) -> str:
-        """Extract email body from message."""
-        body = ""
-
-        if email_msg.is_multipart():
-            for part in email_msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-
-                # Skip attachments
-                if "attachment" in content_disposition:
-                    continue
-
-                # Get text/plain or text/html
-                if content_type == "text/plain":
-                    body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                    break
-                elif content_type == "text/html" and not body:
-                    body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-        else:
-            body = email_msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-
-        return body.strip()
+    def _get_email_body(self, email_msg: LazyMessage) -> str:
+        """Extract email body from message (text/plain parts, else text/html converted to text)."""
+        return email_msg.text_content().strip()
 
     def mark_as_read(self, user_id: str, message_id: str) -> bool:
         """Mark an email as read."""
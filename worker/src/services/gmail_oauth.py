@@ -8,6 +8,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from .metrics import InstrumentedHttpRequest
 import logging
 
 logger = logging.getLogger(__name__)
@@ -122,7 +123,7 @@ class GmailOAuthService:
             scopes=token_data.get('scopes')
         )
 
-        return build('gmail', 'v1', credentials=credentials)
+        return build('gmail', 'v1', credentials=credentials, requestBuilder=InstrumentedHttpRequest)
 
     def is_token_expired(self, token_data: Dict[str, Any]) -> bool:
         """Check if access token is expired."""
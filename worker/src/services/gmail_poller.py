@@ -1,14 +1,19 @@
 """Background polling service for Gmail emails."""
 
+import time
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import os
 from zoneinfo import ZoneInfo
 
-from .gmail_client import GmailClient
+from .gmail_client import GmailClient, HistoryExpired
+from .gmail_push import GmailPushHandler
 from .gmail_token_storage import GmailTokenStorage
+from .gmail_triage import GmailTriage, TRIAGE_HEADERS, DUPLICATE
+from .poll_leases import PollLeaseManager, create_lease_manager
+from .metrics import GMAIL_BACKLOG
 from ..graph.workflow import EmailProcessingWorkflow
 
 logger = logging.getLogger(__name__)
@@ -17,18 +22,31 @@ logger = logging.getLogger(__name__)
 class GmailPoller:
     """Poll Gmail and process new emails automatically."""
 
-    def __init__(self, workflow: EmailProcessingWorkflow):
+    def __init__(self, workflow: EmailProcessingWorkflow, leases: Optional[PollLeaseManager] = None):
         self.gmail_client = GmailClient()
         self.token_storage = GmailTokenStorage()
         self.workflow = workflow
 
+        # Partition leases: with several replicas, each polls only the users in its partitions
+        self.leases = leases or create_lease_manager(getattr(workflow, "db_client", None))
+
         # Polling configuration
         self.poll_interval_minutes = int(os.getenv("GMAIL_POLL_INTERVAL_MINUTES", "15"))
         self.max_emails_per_poll = int(os.getenv("GMAIL_MAX_EMAILS_PER_POLL", "100"))
         self.batch_size = int(os.getenv("GMAIL_BATCH_SIZE", "20"))  # Process N emails per LLM API call
 
+        # Metadata-first triage: only messages that pass header rules are downloaded in full
+        triage_enabled = os.getenv("GMAIL_TRIAGE_ENABLED", "true").lower() == "true"
+        self.triage: Optional[GmailTriage] = GmailTriage() if triage_enabled else None
+
+        # Push notifications (users.watch + Pub/Sub): watched users are synced on notification
+        self.push: Optional[GmailPushHandler] = GmailPushHandler(self) if os.getenv("GMAIL_PUSH_TOPIC") else None
+
         # Track last sync time per user
         self.last_sync: Dict[str, datetime] = {}
+        # Epoch seconds of each user's last completed poll or history sync, empty or
+        # deferring ones too (worker_gmail_poll_lag_seconds); last_sync is the fetch cursor
+        self.last_poll: Dict[str, float] = {}
 
         # Track if polling is active
         self.is_polling = False
@@ -43,6 +61,7 @@ class GmailPoller:
             return
 
         self.is_polling = True
+        await self.leases.start()
         self.poll_task = asyncio.create_task(self._polling_loop())
         logger.info("✅ Gmail polling started")
 
@@ -58,6 +77,9 @@ class GmailPoller:
                 await self.poll_task
             except asyncio.CancelledError:
                 pass
+        if self.push is not None:
+            await self.push.stop()
+        await self.leases.stop()
 
         logger.info("🛑 Gmail polling stopped")
 
@@ -81,11 +103,23 @@ class GmailPoller:
             logger.debug("No connected Gmail accounts to poll")
             return
 
-        logger.info(f"🔄 Polling {len(connected_users)} Gmail accounts...")
+        # Only users in partitions this replica holds a lease on
+        owned_users = [user_id for user_id in connected_users if self.leases.owns(user_id)]
+
+        logger.info(
+            f"🔄 Polling {len(owned_users)}/{len(connected_users)} Gmail accounts "
+            f"({len(self.leases.held_partitions())}/{self.leases.partitions} partitions leased)..."
+        )
+
+        # Watched users get a fallback history sync instead of a scan
+        watched = await self.push.renew_watches(owned_users) if self.push is not None else set()
 
-        for user_id in connected_users:
+        for user_id in owned_users:
             try:
-                await self.poll_user(user_id)
+                if user_id in watched:
+                    await self.push.fallback_sync(user_id)
+                else:
+                    await self.poll_user(user_id)
             except Exception as e:
                 logger.error(f"Failed to poll user {user_id}: {e}")
 
@@ -109,8 +143,8 @@ class GmailPoller:
             if not label_ids:
                 label_ids = ["INBOX"]
 
-            # Get last sync time
-            last_sync = self.last_sync.get(user_id)
+            # Get last sync time - the shared cursor first, another replica may have polled this user since
+            last_sync = self.leases.get_cursor(user_id) or self.last_sync.get(user_id)
 
             # For first connection, fetch all emails from today (00:00 AM IST)
             # For subsequent polls, use timestamp to get only new emails
@@ -120,65 +154,151 @@ class GmailPoller:
                 now_ist = datetime.now(ist)
                 today_midnight_ist = now_ist.replace(hour=0, minute=0, second=0, microsecond=0)
                 logger.info(f"📧 First sync for {user_id} (labels: {label_ids}), fetching emails since today 00:00 IST")
-                emails = self.gmail_client.fetch_emails_by_label(
-                    user_id=user_id,
-                    label_ids=label_ids,
-                    max_results=self.max_emails_per_poll,
-                    after_date=today_midnight_ist
-                )
+                after_date = today_midnight_ist
             else:
                 logger.info(f"📧 Polling {user_id} (labels: {label_ids}, since: {last_sync.isoformat()})")
-                emails = self.gmail_client.fetch_emails_by_label(
-                    user_id=user_id,
-                    label_ids=label_ids,
-                    max_results=self.max_emails_per_poll,
-                    after_date=last_sync
-                )
-
-            if not emails:
-                logger.info(f"  No new emails for {user_id}")
-                return {
-                    "user_id": user_id,
-                    "emails_fetched": 0,
-                    "emails_processed": 0,
-                    "tasks_extracted": 0,
-                    "deals_extracted": 0,
-                    "status": "success"
-                }
-
-            logger.info(f"  Found {len(emails)} new emails")
-
-            # Process emails in batches
-            results = {
+                after_date = last_sync
+
+            emails, triaged = self._fetch_new_emails(user_id, label_ids, after_date)
+            return await self._process_emails(user_id, emails, triaged)
+
+        except Exception as e:
+            logger.error(f"Failed to poll user {user_id}: {e}", exc_info=True)
+            return {
+                "user_id": user_id,
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def sync_history(self, user_id: str, label_id: str = "INBOX", full: bool = False) -> Dict[str, Any]:
+        """
+        Process only the messages added since the user's watch history id.
+
+        Without a stored history id, when Gmail no longer has history that
+        old, or with full=True, runs poll_user instead and moves the history
+        id to the mailbox state from before that poll.
+
+        Args:
+            user_id: User identifier
+            label_id: Label whose additions are synced
+            full: Time-based poll instead of history (catch-up after start-up)
+
+        Returns:
+            Results as poll_user returns them, with the new history_id, and
+            history_more when max_emails_per_poll left history to list
+        """
+        try:
+            watch = self.leases.get_watch(user_id)
+            service = self.gmail_client.get_service(user_id)
+
+            listed = None
+            complete = True
+            if watch and watch.get("history_id") and not full:
+                try:
+                    listed, history_id, complete = self.gmail_client.list_history(
+                        service, watch["history_id"], label_id, self.max_emails_per_poll
+                    )
+                except HistoryExpired:
+                    logger.warning(f"History {watch['history_id']} of {user_id} expired, polling instead")
+
+            if listed is None:
+                # History id first, so messages arriving during the poll are in the next sync
+                history_id = str(self.gmail_client.get_profile(service)["historyId"])
+                results = await self.poll_user(user_id, [label_id])
+            else:
+                logger.info(f"📧 History sync for {user_id}: {len(listed)} new messages")
+                emails, triaged = self._triage_and_fetch(service, user_id, listed)
+                results = await self._process_emails(user_id, emails, triaged)
+
+            # Keep the old history id if emails were deferred, so they are listed again
+            if watch and results.get("status") == "success" and not results.get("deferred"):
+                cursor = watch.get("history_id")
+                if history_id != cursor:
+                    watch["history_id"] = history_id
+                    if not self.leases.save_watch(user_id, watch, if_history_id=cursor):
+                        # Another sync moved the cursor since it was read; keep its cursor
+                        logger.warning(f"History cursor of {user_id} moved during the sync, not overwritten")
+                        watch = self.leases.get_watch(user_id)
+            results["history_id"] = watch.get("history_id") if watch else None
+            if not complete:
+                # Stopped at max_emails_per_poll; the cursor is the last record listed
+                results["history_more"] = True
+            return results
+
+        except Exception as e:
+            logger.error(f"Failed to sync history for {user_id}: {e}", exc_info=True)
+            return {
+                "user_id": user_id,
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def _process_emails(
+        self,
+        user_id: str,
+        emails: List[Dict[str, Any]],
+        triaged: Dict[str, int]
+    ) -> Dict[str, Any]:
+        """Run fetched emails through the workflow in batches and advance the sync cursor."""
+        if triaged:
+            logger.info(f"  Triaged out on headers: {triaged}")
+
+        if not emails:
+            logger.info(f"  No new emails for {user_id}")
+            self.last_poll[user_id] = time.time()
+            return {
                 "user_id": user_id,
-                "emails_fetched": len(emails),
+                "emails_fetched": 0,
                 "emails_processed": 0,
+                "emails_triaged": triaged,
                 "tasks_extracted": 0,
                 "deals_extracted": 0,
-                "errors": []
+                "status": "success"
             }
 
+        logger.info(f"  Found {len(emails)} new emails")
+
+        # Process emails in batches
+        results = {
+            "user_id": user_id,
+            "emails_fetched": len(emails),
+            "emails_processed": 0,
+            "emails_triaged": triaged,
+            "tasks_extracted": 0,
+            "deals_extracted": 0,
+            "deferred": 0,
+            "errors": []
+        }
+
+        # Fetched emails waiting for the workflow (worker_gmail_backlog_emails)
+        GMAIL_BACKLOG.inc(len(emails))
+        backlog = len(emails)
+        try:
             # Process in batches of self.batch_size
             for i in range(0, len(emails), self.batch_size):
                 batch = emails[i:i + self.batch_size]
                 batch_num = (i // self.batch_size) + 1
                 total_batches = (len(emails) + self.batch_size - 1) // self.batch_size
 
-                logger.info(f"  Processing batch {batch_num}/{total_batches} ({len(batch)} emails) using LangChain abatch")
+                logger.info(f"  Processing batch {batch_num}/{total_batches} ({len(batch)} emails)")
 
-                # Prepare batch for workflow
-                batch_mime_contents = [email_data['mime_content'] for email_data in batch]
+                # Prepare batch for workflow (structured messages, or MIME from the raw fetch);
+                # handed over, so each message is released once the workflow has parsed it
+                batch_contents = [
+                    email_data.pop('message', None) or email_data.pop('mime_content') for email_data in batch
+                ]
 
-                # Process entire batch with LangChain abatch for classification
+                # Process entire batch (classification runs concurrently)
                 try:
                     batch_results = await self.workflow.process_emails_batch(
-                        batch_mime_contents,
+                        batch_contents,
                         source="gmail",
                         user_id=user_id
                     )
 
                     # Aggregate results
                     for email_data, result in zip(batch, batch_results):
+                        self._mark_handled(user_id, email_data, result)
                         if result and result.get('status') == 'success':
                             results['emails_processed'] += 1
                             result_data = result.get('results', {})
@@ -186,6 +306,8 @@ class GmailPoller:
                             results['deals_extracted'] += result_data.get('deals_created', 0)
                         elif result and result.get('status') == 'skipped':
                             results['emails_processed'] += 1  # Count as processed (classified and skipped)
+                        elif result and result.get('status') == 'deferred':
+                            results['deferred'] += 1  # Token budget exhausted, retry on a later poll
                         else:
                             results['errors'].append({
                                 "email_id": email_data.get('gmail_id'),
@@ -200,26 +322,114 @@ class GmailPoller:
                             "error": str(e)
                         })
 
-            # Update last sync time (IST)
-            ist = ZoneInfo("Asia/Kolkata")
+                GMAIL_BACKLOG.dec(len(batch))
+                backlog -= len(batch)
+        finally:
+            GMAIL_BACKLOG.dec(backlog)
+
+        # Update last sync time (IST) - keep the old one if emails were deferred
+        # so they are fetched again once the token budget resets
+        ist = ZoneInfo("Asia/Kolkata")
+        if results['deferred']:
+            logger.info(f"  ⏸️  {results['deferred']} emails deferred (token budget exhausted)")
+        else:
             self.last_sync[user_id] = datetime.now(ist)
+            self.leases.save_cursor(user_id, self.last_sync[user_id])
+
+        logger.info(
+            f"  ✅ Processed {results['emails_processed']}/{results['emails_fetched']} emails "
+            f"({results['tasks_extracted']} tasks, {results['deals_extracted']} deals)"
+        )
 
-            logger.info(
-                f"  ✅ Processed {results['emails_processed']}/{results['emails_fetched']} emails "
-                f"({results['tasks_extracted']} tasks, {results['deals_extracted']} deals)"
+        self.last_poll[user_id] = time.time()
+        results['status'] = 'success'
+        results['last_sync'] = self.last_sync[user_id].isoformat() if user_id in self.last_sync else None
+        return results
+
+    def _fetch_new_emails(
+        self,
+        user_id: str,
+        label_ids: List[str],
+        after_date: datetime
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        List, triage on headers, then download only the survivors in full.
+
+        Returns:
+            Tuple of (fetched emails, dropped message counts by triage reason)
+        """
+        if self.triage is None:
+            emails = self.gmail_client.fetch_emails_by_label(
+                user_id=user_id,
+                label_ids=label_ids,
+                max_results=self.max_emails_per_poll,
+                after_date=after_date
             )
+            return emails, {}
 
-            results['status'] = 'success'
-            results['last_sync'] = self.last_sync[user_id].isoformat()
-            return results
+        service = self.gmail_client.get_service(user_id)
+        listed = self.gmail_client.list_messages(service, label_ids, self.max_emails_per_poll, after_date)
+        return self._triage_and_fetch(service, user_id, listed)
 
-        except Exception as e:
-            logger.error(f"Failed to poll user {user_id}: {e}", exc_info=True)
-            return {
-                "user_id": user_id,
-                "status": "error",
-                "error": str(e)
-            }
+    def _triage_and_fetch(
+        self,
+        service,
+        user_id: str,
+        listed: List[Dict[str, str]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Triage listed messages on headers and download only the survivors in full."""
+        if self.triage is None:
+            return self.gmail_client.fetch_messages(service, [message['id'] for message in listed]), {}
+
+        dropped: Dict[str, int] = {}
+        candidates = []
+        for message in listed:
+            if self.triage.is_seen(user_id, message['id']):
+                dropped[DUPLICATE] = dropped.get(DUPLICATE, 0) + 1
+            else:
+                candidates.append(message['id'])
+
+        metadata = self.gmail_client.fetch_metadata(service, candidates, TRIAGE_HEADERS)
+        survivors = []
+        for message_id in candidates:
+            # Fail open: messages whose metadata could not be fetched are downloaded
+            reason = self.triage.check(user_id, metadata[message_id]) if message_id in metadata else None
+            if reason:
+                dropped[reason] = dropped.get(reason, 0) + 1
+                self.triage.mark_seen(user_id, message_id)
+            else:
+                survivors.append(message_id)
+
+        emails = self.gmail_client.fetch_messages(service, survivors)
+        self.triage.record(len(listed), len(survivors), dropped)
+        return emails, dropped
+
+    def _mark_handled(self, user_id: str, email_data: Dict[str, Any], result: Optional[Dict[str, Any]]):
+        """Remember finished emails so later polls drop them before any download."""
+        if self.triage is None or not result or result.get('status') not in ('success', 'skipped'):
+            return
+        self.triage.mark_seen(
+            user_id,
+            email_data['gmail_id'],
+            email_data.get('thread_id'),
+            sales_lead=result.get('status') == 'success'
+        )
+
+    def forget_user(self, user_id: str):
+        """Drop a user's sync cursor and watch so a reconnect starts with a fresh sync."""
+        self.last_sync.pop(user_id, None)
+        self.last_poll.pop(user_id, None)
+        self.leases.delete_cursor(user_id)
+        # The Gmail watch itself lapses within 7 days; its notifications are ignored until then
+        self.leases.delete_watch(user_id)
+        if self.push is not None:
+            self.push.forget_user(user_id)
+        if self.triage is not None:
+            self.triage.forget_user(user_id)
+
+    def owned_poll_times(self) -> Dict[str, float]:
+        """Last completed poll of each user this replica still holds the lease for"""
+        return {user_id: polled_at for user_id, polled_at in self.last_poll.items() if self.leases.owns(user_id)}
 
     def get_polling_status(self) -> Dict[str, Any]:
         """Get current polling status."""
@@ -231,5 +441,8 @@ class GmailPoller:
             "last_sync_times": {
                 user_id: sync_time.isoformat()
                 for user_id, sync_time in self.last_sync.items()
-            }
+            },
+            "leases": self.leases.get_stats(),
+            "triage": self.triage.get_stats() if self.triage is not None else None,
+            "push": self.push.get_stats() if self.push is not None else None
         }
@@ -0,0 +1,276 @@
+"""
+Gmail push notifications
+
+With GMAIL_PUSH_TOPIC set, connected mailboxes are watched (users.watch on
+INBOX): Gmail publishes {emailAddress, historyId} to that Cloud Pub/Sub
+topic on every mailbox change and a push subscription delivers it to
+POST /gmail/push. A notification triggers a history sync of just that
+user - users.history.list from the stored history id, then the usual
+triage, fetch and workflow - so new mail is processed within seconds.
+Notifications for a user whose sync is already running are coalesced
+into one follow-up sync. Only the replica holding the user's poll lease
+syncs it: a notification reaching any other replica is refused, and
+Pub/Sub redelivers it until it lands on the owner.
+
+Watches expire after 7 days; the polling loop renews them
+GMAIL_WATCH_RENEW_HOURS ahead. Watched users are no longer scanned every
+GMAIL_POLL_INTERVAL_MINUTES: a history sync every GMAIL_PUSH_FALLBACK_MINUTES
+catches lost notifications and costs a single history.list call for an
+idle mailbox. Users whose watch cannot be set up keep the regular poll.
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def decode_push_envelope(envelope: Any) -> Tuple[str, int]:
+    """
+    Read a Pub/Sub push request body
+
+    Args:
+        envelope: {"message": {"data": base64 JSON, "messageId", ...}, "subscription"}
+
+    Returns:
+        Tuple of (mailbox email address, history id)
+
+    Raises:
+        ValueError: Not a Gmail notification
+    """
+    try:
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        return data["emailAddress"], int(data["historyId"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid Gmail push notification: {e}") from e
+
+
+class GmailPushHandler:
+    """Watch renewal, notification handling and per-user history syncs for a GmailPoller"""
+
+    def __init__(
+        self,
+        poller: Any,
+        topic_name: Optional[str] = None,
+        label_id: Optional[str] = None,
+        renew_hours: Optional[float] = None,
+        fallback_minutes: Optional[float] = None,
+        verification_token: Optional[str] = None
+    ):
+        """
+        Initialize push handler
+
+        Args:
+            poller: GmailPoller whose client, leases and workflow the syncs use
+            topic_name: Pub/Sub topic Gmail publishes to (GMAIL_PUSH_TOPIC, projects/<project>/topics/<topic>)
+            label_id: Watched label (GMAIL_PUSH_LABEL_ID)
+            renew_hours: Renew a watch this long before it expires (GMAIL_WATCH_RENEW_HOURS)
+            fallback_minutes: History sync interval for watched users without notifications (GMAIL_PUSH_FALLBACK_MINUTES)
+            verification_token: Required ?token= on push requests (GMAIL_PUSH_VERIFICATION_TOKEN, empty = not checked)
+        """
+        self.poller = poller
+        self.topic_name = topic_name or os.getenv("GMAIL_PUSH_TOPIC", "")
+        self.label_id = label_id or os.getenv("GMAIL_PUSH_LABEL_ID", "INBOX")
+        self.renew_seconds = (renew_hours or float(os.getenv("GMAIL_WATCH_RENEW_HOURS", "24"))) * 3600
+        self.fallback_seconds = (fallback_minutes or float(os.getenv("GMAIL_PUSH_FALLBACK_MINUTES", "60"))) * 60
+        if verification_token is None:
+            verification_token = os.getenv("GMAIL_PUSH_VERIFICATION_TOKEN", "")
+        self.verification_token = verification_token
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._pending: Set[str] = set()
+        self._last_synced: Dict[str, float] = {}
+        self._stats = {
+            "notifications": 0, "stale": 0, "unknown_mailbox": 0, "not_owner": 0, "invalid": 0, "syncs": 0,
+            "coalesced": 0,
+            "fallback_syncs": 0, "watches_renewed": 0, "watch_errors": 0
+        }
+
+    def verify_token(self, token: Optional[str]) -> bool:
+        if not self.verification_token:
+            return True
+        return hmac.compare_digest(token or "", self.verification_token)
+
+    async def handle_envelope(self, envelope: Any) -> Dict[str, Any]:
+        """
+        Handle one push request and return at once; the sync runs in the background
+
+        Returns:
+            {"status": scheduled | coalesced | stale | unknown_mailbox | not_owner | invalid, ...};
+            not_owner is not to be acknowledged, so Pub/Sub retries it
+        """
+        try:
+            email_address, history_id = decode_push_envelope(envelope)
+        except ValueError as e:
+            # Acknowledged anyway: Pub/Sub would redeliver a malformed message forever
+            self._stats["invalid"] += 1
+            logger.warning(str(e))
+            return {"status": "invalid"}
+
+        self._stats["notifications"] += 1
+        user_id = await asyncio.to_thread(self.poller.leases.find_watch_user, email_address)
+        if user_id is None:
+            # Disconnected user whose watch has not expired yet
+            self._stats["unknown_mailbox"] += 1
+            logger.info(f"Push for unwatched mailbox {email_address} ignored")
+            return {"status": "unknown_mailbox"}
+
+        if not self.poller.leases.owns(user_id):
+            # Another replica polls this user; syncing here too would race its history cursor
+            self._stats["not_owner"] += 1
+            return {"status": "not_owner", "user_id": user_id}
+
+        watch = await asyncio.to_thread(self.poller.leases.get_watch, user_id)
+        if watch and watch.get("history_id") and history_id <= int(watch["history_id"]):
+            # Redelivered or out-of-order notification, already covered by a sync
+            self._stats["stale"] += 1
+            return {"status": "stale", "user_id": user_id}
+
+        coalesced = self.sync_running(user_id)
+        self.trigger_sync(user_id)
+        logger.info(f"📨 Gmail push for {user_id} (history {history_id})")
+        return {"status": "coalesced" if coalesced else "scheduled", "user_id": user_id}
+
+    def sync_running(self, user_id: str) -> bool:
+        task = self._tasks.get(user_id)
+        return task is not None and not task.done()
+
+    def trigger_sync(self, user_id: str, full: bool = False) -> asyncio.Task:
+        """
+        Start a history sync of a user, or queue one more after the running one
+
+        Args:
+            user_id: User to sync
+            full: Run a time-based poll first (catch-up after start-up)
+
+        Returns:
+            The user's sync task; its result is the last sync's result
+        """
+        if self.sync_running(user_id):
+            self._pending.add(user_id)
+            self._stats["coalesced"] += 1
+            return self._tasks[user_id]
+        task = asyncio.create_task(self._sync_loop(user_id, full))
+        self._tasks[user_id] = task
+        return task
+
+    async def _sync_loop(self, user_id: str, full: bool) -> Optional[Dict[str, Any]]:
+        result = None
+        while True:
+            self._pending.discard(user_id)
+            self._stats["syncs"] += 1
+            try:
+                result = await self.poller.sync_history(user_id, self.label_id, full=full)
+            except Exception as e:
+                logger.error(f"Gmail history sync failed for {user_id}: {e}", exc_info=True)
+                result = {"user_id": user_id, "status": "error", "error": str(e)}
+            self._last_synced[user_id] = time.monotonic()
+            full = False
+            if result.get("history_more") and result.get("status") == "success" and not result.get("deferred"):
+                # More history than one sync takes: carry on from the saved cursor
+                self._pending.add(user_id)
+            if user_id not in self._pending:
+                break
+        self._tasks.pop(user_id, None)
+        return result
+
+    async def ensure_watch(self, user_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Start or renew a user's watch when it is missing or expires within the renewal window
+
+        Returns:
+            The stored watch, or None if it could not be set up (the user stays on regular polling)
+        """
+        now = now if now is not None else time.time()
+        leases = self.poller.leases
+        try:
+            watch = await asyncio.to_thread(leases.get_watch, user_id)
+            if watch and watch.get("expiration", 0) / 1000 - now > self.renew_seconds:
+                return watch
+
+            client = self.poller.gmail_client
+            service = await asyncio.to_thread(client.get_service, user_id)
+            response = await asyncio.to_thread(client.watch, service, self.topic_name, [self.label_id])
+            if watch:
+                # Keep the sync cursor: changes since it have not been synced yet. A sync
+                # may move it meanwhile, so renew on top of whatever cursor is stored
+                for _ in range(3):
+                    watch["expiration"] = int(response["expiration"])
+                    if await asyncio.to_thread(leases.save_watch, user_id, watch, watch.get("history_id")):
+                        break
+                    watch = await asyncio.to_thread(leases.get_watch, user_id)
+                    if watch is None:
+                        return None
+                else:
+                    raise RuntimeError("watch kept changing during renewal")
+            else:
+                profile = await asyncio.to_thread(client.get_profile, service)
+                watch = {
+                    "email_address": profile["emailAddress"],
+                    "history_id": str(response["historyId"]),
+                    "expiration": int(response["expiration"])
+                }
+                await asyncio.to_thread(leases.save_watch, user_id, watch)
+            self._stats["watches_renewed"] += 1
+            logger.info(f"👀 Gmail watch for {user_id} ({watch['email_address']}) until {watch['expiration'] // 1000}")
+            return watch
+        except Exception as e:
+            self._stats["watch_errors"] += 1
+            logger.error(f"Failed to watch Gmail for {user_id}: {e}")
+            return None
+
+    async def renew_watches(self, user_ids: Iterable[str]) -> Set[str]:
+        """Ensure watches for the given users; returns those with a live watch"""
+        watched = set()
+        for user_id in user_ids:
+            if await self.ensure_watch(user_id):
+                watched.add(user_id)
+        return watched
+
+    async def fallback_sync(self, user_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Polling-loop sync of a watched user: a full catch-up poll the first
+        time after start-up, then a history sync once notifications have
+        been quiet for the fallback interval
+
+        Returns:
+            The sync result, or None if the user was synced recently
+        """
+        now = now if now is not None else time.monotonic()
+        last_synced = self._last_synced.get(user_id)
+        if last_synced is not None and now - last_synced < self.fallback_seconds:
+            return None
+        if last_synced is not None:
+            self._stats["fallback_syncs"] += 1
+        return await self.trigger_sync(user_id, full=last_synced is None)
+
+    async def wait_for_sync(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Result of the user's running sync (None if none is running)"""
+        task = self._tasks.get(user_id)
+        return await task if task else None
+
+    def forget_user(self, user_id: str):
+        self._last_synced.pop(user_id, None)
+
+    async def stop(self):
+        """Cancel running syncs"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "topic": self.topic_name,
+            "label_id": self.label_id,
+            "fallback_minutes": self.fallback_seconds / 60,
+            "syncs_running": sum(1 for task in self._tasks.values() if not task.done()),
+            **self._stats
+        }
@@ -0,0 +1,298 @@
+"""
+Offline Gmail mailbox and push simulator
+
+SimulatedGmailService answers the Gmail API calls the worker makes
+(messages.list / get in metadata, full and raw format, batch requests,
+history.list, watch, stop, getProfile) from in-memory mailboxes.
+GmailPushSimulator delivers messages into them and builds the Pub/Sub
+push request Gmail would trigger for each delivery.
+
+With GMAIL_PUSH_SIMULATOR=true the worker uses it instead of the Gmail API
+and accepts deliveries on POST /gmail/push/simulate, so the push path -
+watch, notification, history sync, triage, fetch, workflow - runs end to
+end without Google. Deliver .eml files to a running worker with:
+
+    python -m src.services.gmail_simulator rfq.eml --user-id demo [--url http://localhost:8000]
+"""
+import re
+import json
+import time
+import uuid
+import base64
+import email
+import argparse
+from email import policy
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# Watches last 7 days, as on Gmail
+WATCH_SECONDS = 7 * 24 * 3600
+
+QUERY_LABEL = re.compile(r'label:(\S+)')
+QUERY_AFTER = re.compile(r'after:(\d{4}/\d{2}/\d{2})')
+MESSAGE_ID = re.compile(r'<[^>]+>')
+
+
+class _Request:
+    """Deferred API call, like googleapiclient's HttpRequest"""
+
+    def __init__(self, call: Callable[[], Any]):
+        self._call = call
+
+    def execute(self) -> Any:
+        # Responses are JSON on the wire
+        return json.loads(json.dumps(self._call()))
+
+
+class _Batch:
+    def __init__(self, callback: Callable):
+        self.callback = callback
+        self.requests: List[Tuple[str, _Request]] = []
+
+    def add(self, request: _Request, request_id: str):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class SimulatedMailbox:
+    """Messages, history and watch state of one simulated Gmail account"""
+
+    def __init__(self, email_address: str):
+        self.email_address = email_address
+        self.messages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.history: List[Tuple[int, str]] = []
+        self.history_id = 1000
+        self.watch_expiration: Optional[int] = None
+        self._threads: Dict[str, str] = {}
+
+    def add(self, raw: bytes, label_ids: Optional[List[str]] = None) -> Tuple[str, int]:
+        """Store a message; returns (Gmail message id, new history id)"""
+        parsed = email.message_from_bytes(raw, policy=policy.compat32)
+        message_id = f"{uuid.uuid4().int >> 64:016x}"
+
+        # Thread by In-Reply-To / References, like Gmail
+        referenced = MESSAGE_ID.findall(f"{parsed.get('In-Reply-To', '')} {parsed.get('References', '')}")
+        thread_id = next((self._threads[ref] for ref in referenced if ref in self._threads), message_id)
+        own_id = MESSAGE_ID.search(parsed.get("Message-ID", ""))
+        if own_id:
+            self._threads[own_id.group(0)] = thread_id
+
+        self.history_id += 1
+        self.messages[message_id] = {
+            "raw": raw,
+            "parsed": parsed,
+            "threadId": thread_id,
+            "labelIds": label_ids or ["INBOX", "UNREAD"],
+            "internalDate": int(time.time() * 1000),
+        }
+        self.history.append((self.history_id, message_id))
+        return message_id, self.history_id
+
+
+class SimulatedGmailService:
+    """The subset of the Gmail API service the worker uses, over a SimulatedMailbox"""
+
+    def __init__(self, mailbox: SimulatedMailbox):
+        self.mailbox = mailbox
+        self.calls: List[str] = []
+
+    # Resource accessors: service.users().messages().get(...) and friends
+    def users(self):
+        return self
+
+    def messages(self):
+        return _Messages(self)
+
+    def history(self):
+        return _History(self)
+
+    def new_batch_http_request(self, callback: Callable) -> _Batch:
+        return _Batch(callback)
+
+    def watch(self, userId: str, body: Dict[str, Any]) -> _Request:
+        def call():
+            self.calls.append("watch")
+            self.mailbox.watch_expiration = int((time.time() + WATCH_SECONDS) * 1000)
+            return {"historyId": str(self.mailbox.history_id), "expiration": str(self.mailbox.watch_expiration)}
+        return _Request(call)
+
+    def stop(self, userId: str) -> _Request:
+        def call():
+            self.calls.append("stop")
+            self.mailbox.watch_expiration = None
+            return {}
+        return _Request(call)
+
+    def getProfile(self, userId: str) -> _Request:
+        def call():
+            self.calls.append("getProfile")
+            return {
+                "emailAddress": self.mailbox.email_address,
+                "messagesTotal": len(self.mailbox.messages),
+                "historyId": str(self.mailbox.history_id),
+            }
+        return _Request(call)
+
+
+class _History:
+    def __init__(self, service: SimulatedGmailService):
+        self.service = service
+
+    def list(self, userId: str, startHistoryId: str, historyTypes=None, labelId=None, pageToken=None) -> _Request:
+        def call():
+            self.service.calls.append("history.list")
+            mailbox = self.service.mailbox
+            records = []
+            for history_id, message_id in mailbox.history:
+                message = mailbox.messages.get(message_id)
+                if history_id <= int(startHistoryId) or message is None:
+                    continue
+                if labelId and labelId not in message["labelIds"]:
+                    continue
+                records.append({
+                    "id": str(history_id),
+                    "messagesAdded": [{"message": {
+                        "id": message_id, "threadId": message["threadId"], "labelIds": message["labelIds"]
+                    }}]
+                })
+            return {"history": records, "historyId": str(mailbox.history_id)}
+        return _Request(call)
+
+
+class _Messages:
+    def __init__(self, service: SimulatedGmailService):
+        self.service = service
+
+    def attachments(self):
+        return self
+
+    def list(self, userId: str, q: str = "", maxResults: int = 100, pageToken=None) -> _Request:
+        def call():
+            self.service.calls.append("messages.list")
+            labels = QUERY_LABEL.findall(q)
+            after = QUERY_AFTER.search(q)
+            after_ms = 0
+            if after:
+                after_ms = datetime.strptime(after.group(1), "%Y/%m/%d").replace(tzinfo=timezone.utc).timestamp() * 1000
+            found = [
+                {"id": message_id, "threadId": message["threadId"]}
+                for message_id, message in reversed(self.service.mailbox.messages.items())
+                if all(label in message["labelIds"] for label in labels) and message["internalDate"] >= after_ms
+            ]
+            return {"messages": found[:maxResults], "resultSizeEstimate": len(found)}
+        return _Request(call)
+
+    def get(self, userId: str, id: str, format: str = "full", fields=None, metadataHeaders=None, messageId=None) -> _Request:
+        def call():
+            message = self.service.mailbox.messages[messageId or id]
+            if messageId is not None:
+                # attachments().get: id is the attachment id
+                self.service.calls.append("attachments.get")
+                return {"data": message["attachments"][id]}
+            self.service.calls.append(f"messages.get:{format}")
+            response = {"id": id, "threadId": message["threadId"], "labelIds": message["labelIds"]}
+            if format == "raw":
+                response["raw"] = base64.urlsafe_b64encode(message["raw"]).decode()
+            elif format == "metadata":
+                wanted = {name.lower() for name in metadataHeaders or []}
+                response["sizeEstimate"] = len(message["raw"])
+                response["payload"] = {"headers": [
+                    {"name": name, "value": value} for name, value in message["parsed"].items()
+                    if not wanted or name.lower() in wanted
+                ]}
+            else:
+                message.setdefault("attachments", {})
+                response["payload"] = _full_payload(message["parsed"], message["attachments"])
+            return response
+        return _Request(call)
+
+
+def _full_payload(part, attachments: Dict[str, str]) -> Dict[str, Any]:
+    """A MIME part as messages.get(format='full') returns it; attachment bodies are served separately"""
+    result = {"mimeType": part.get_content_type(), "headers": [{"name": k, "value": v} for k, v in part.items()]}
+    if part.is_multipart():
+        result["body"] = {"size": 0}
+        result["parts"] = [_full_payload(child, attachments) for child in part.get_payload()]
+        return result
+    data = part.get_payload(decode=True) or b""
+    encoded = base64.urlsafe_b64encode(data).decode()
+    if part.get_filename():
+        attachment_id = f"att-{len(attachments)}"
+        attachments[attachment_id] = encoded
+        result["body"] = {"size": len(data), "attachmentId": attachment_id}
+    else:
+        result["body"] = {"size": len(data), "data": encoded}
+    return result
+
+
+class GmailPushSimulator:
+    """Simulated mailboxes per user, and the push requests their deliveries trigger"""
+
+    TOPIC = "projects/local/topics/gmail-push-simulator"
+    SUBSCRIPTION = "projects/local/subscriptions/gmail-push-simulator"
+
+    def __init__(self):
+        self.mailboxes: Dict[str, SimulatedMailbox] = {}
+        self.services: Dict[str, SimulatedGmailService] = {}
+
+    def mailbox(self, user_id: str, email_address: Optional[str] = None) -> SimulatedMailbox:
+        if user_id not in self.mailboxes:
+            address = email_address or (user_id if "@" in user_id else f"{user_id}@simulator.local")
+            self.mailboxes[user_id] = SimulatedMailbox(address)
+        return self.mailboxes[user_id]
+
+    def service_for(self, user_id: str) -> SimulatedGmailService:
+        """Drop-in for GmailClient.get_service (one service per user, its calls are recorded)"""
+        if user_id not in self.services:
+            self.services[user_id] = SimulatedGmailService(self.mailbox(user_id))
+        return self.services[user_id]
+
+    def deliver(self, user_id: str, raw: bytes, label_ids: Optional[List[str]] = None) -> Tuple[str, int]:
+        """Add a message to a user's mailbox; returns (Gmail message id, new history id)"""
+        return self.mailbox(user_id).add(raw, label_ids)
+
+    def push_envelope(self, user_id: str) -> Dict[str, Any]:
+        """The Pub/Sub push request body Gmail's notification for the mailbox's current state produces"""
+        mailbox = self.mailbox(user_id)
+        data = {"emailAddress": mailbox.email_address, "historyId": mailbox.history_id}
+        return {
+            "message": {
+                "data": base64.b64encode(json.dumps(data).encode()).decode(),
+                "messageId": uuid.uuid4().hex,
+                "publishTime": datetime.now(timezone.utc).isoformat(),
+            },
+            "subscription": self.SUBSCRIPTION,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver .eml files to a worker running with GMAIL_PUSH_SIMULATOR=true")
+    parser.add_argument("files", nargs="+", help=".eml files")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--email-address", help="Mailbox address (default: the user id)")
+    parser.add_argument("--url", default="http://localhost:8000", help="Worker base URL")
+    args = parser.parse_args()
+
+    params = {"user_id": args.user_id, "wait": "true"}
+    if args.email_address:
+        params["email_address"] = args.email_address
+    for path in args.files:
+        with open(path, "rb") as f:
+            started = time.perf_counter()
+            response = httpx.post(f"{args.url}/gmail/push/simulate", params=params, content=f.read(), timeout=300)
+        response.raise_for_status()
+        print(f"{path}: {time.perf_counter() - started:.2f}s")
+        print(json.dumps(response.json(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Header-only triage of listed Gmail messages
+
+The poller lists message ids, drops those it has already handled, fetches
+`format='metadata'` (selected headers and sizeEstimate) for the rest and
+asks `GmailTriage.check` whether each one is worth downloading in full.
+Notifications, newsletters and auto-replies are dropped here, before
+their bodies are ever downloaded. Mail delivered through a Google Group
+(a sales@ alias, say) carries list headers of its own and is not
+treated as bulk mail.
+
+Messages in a Gmail thread that already produced a sales lead are exempt
+from the sender and automated-mail rules: a customer replying from a
+ticketing tool still reaches the workflow.
+"""
+import os
+import re
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..utils import extract_email_address
+
+logger = logging.getLogger(__name__)
+
+# Headers requested with format='metadata' (metadataHeaders)
+TRIAGE_HEADERS = [
+    "From", "Subject", "Message-ID", "List-Unsubscribe", "Auto-Submitted", "X-Autoreply", "X-Autorespond",
+    "X-Google-Group-Id", "Mailing-List",
+]
+
+# Triage outcomes
+DUPLICATE = "duplicate"
+TOO_LARGE = "too_large"
+SENDER_RULE = "sender_rule"
+AUTOMATED = "automated"
+
+
+class GmailTriage:
+    """Header rules plus per-user memory of handled messages and active threads"""
+
+    # Local parts of machine senders
+    AUTOMATED_SENDER = re.compile(
+        r'^(no-?reply|do-?not-?reply|donotreply|mailer-daemon|postmaster|bounces?|notifications?|notify|'
+        r'alerts?|newsletters?|news|marketing|updates|digest)([+._-].*)?@',
+        re.IGNORECASE
+    )
+    # Added by Google Groups, along with List-Id, Precedence: list and often List-Unsubscribe
+    GROUP_HEADERS = ("x-google-group-id", "mailing-list")
+
+    def __init__(
+        self,
+        max_size_bytes: Optional[int] = None,
+        skip_senders: Optional[List[str]] = None,
+        max_seen: Optional[int] = None
+    ):
+        """
+        Initialize triage
+
+        Args:
+            max_size_bytes: Drop messages with a larger sizeEstimate (GMAIL_TRIAGE_MAX_SIZE_BYTES, default
+                0 = no limit; attachments count towards it, and only text parts are downloaded anyway)
+            skip_senders: Addresses or domains to drop (GMAIL_TRIAGE_SKIP_SENDERS, comma-separated)
+            max_seen: Handled message ids remembered per user (GMAIL_TRIAGE_SEEN_MAX)
+        """
+        if max_size_bytes is None:
+            max_size_bytes = int(os.getenv("GMAIL_TRIAGE_MAX_SIZE_BYTES", "0"))
+        self.max_size_bytes = max_size_bytes
+        if skip_senders is None:
+            skip_senders = os.getenv("GMAIL_TRIAGE_SKIP_SENDERS", "").split(",")
+        self.skip_senders = {sender.strip().lower().lstrip("@") for sender in skip_senders if sender.strip()}
+        self.max_seen = max_seen or int(os.getenv("GMAIL_TRIAGE_SEEN_MAX", "10000"))
+
+        self._seen: Dict[str, "OrderedDict[str, None]"] = {}
+        self._active_threads: Dict[str, "OrderedDict[str, None]"] = {}
+        self.stats = {"listed": 0, "fetched": 0, DUPLICATE: 0, TOO_LARGE: 0, SENDER_RULE: 0, AUTOMATED: 0}
+
+    def _remember(self, store: Dict[str, "OrderedDict[str, None]"], user_id: str, key: str):
+        entries = store.setdefault(user_id, OrderedDict())
+        entries[key] = None
+        entries.move_to_end(key)
+        while len(entries) > self.max_seen:
+            entries.popitem(last=False)
+
+    def is_seen(self, user_id: str, message_id: str) -> bool:
+        """Whether a Gmail message was already handled (processed, skipped or triaged out)"""
+        return message_id in self._seen.get(user_id, ())
+
+    def mark_seen(self, user_id: str, message_id: str, thread_id: Optional[str] = None, sales_lead: bool = False):
+        """
+        Remember a handled message
+
+        Args:
+            user_id: Mailbox owner
+            message_id: Gmail message id
+            thread_id: Gmail thread id
+            sales_lead: The message went through extraction - later messages in its thread skip the header rules
+        """
+        self._remember(self._seen, user_id, message_id)
+        if sales_lead and thread_id:
+            self._remember(self._active_threads, user_id, thread_id)
+
+    def forget_user(self, user_id: str):
+        self._seen.pop(user_id, None)
+        self._active_threads.pop(user_id, None)
+
+    def _sender_rule(self, sender: str) -> bool:
+        if not sender:
+            return False
+        if self.AUTOMATED_SENDER.match(sender):
+            return True
+        return sender in self.skip_senders or sender.rsplit("@", 1)[-1] in self.skip_senders
+
+    def _automated(self, headers: Dict[str, str]) -> bool:
+        if headers.get("auto-submitted", "no").strip().lower() != "no":
+            return True
+        if "x-autoreply" in headers or "x-autorespond" in headers:
+            return True
+        # Bulk senders; a customer writing to a group alias gets the group's list headers too
+        return "list-unsubscribe" in headers and not any(name in headers for name in self.GROUP_HEADERS)
+
+    def check(self, user_id: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        Decide from a format='metadata' response whether to download the message
+
+        Args:
+            user_id: Mailbox owner
+            metadata: messages.get(format='metadata') response (id, threadId, sizeEstimate, payload.headers)
+
+        Returns:
+            The reason to drop it (duplicate, too_large, sender_rule, automated), or None to fetch it in full
+        """
+        if self.is_seen(user_id, metadata.get("id")):
+            return DUPLICATE
+        if self.max_size_bytes and metadata.get("sizeEstimate", 0) > self.max_size_bytes:
+            return TOO_LARGE
+        if metadata.get("threadId") in self._active_threads.get(user_id, ()):
+            return None
+
+        headers = {
+            header["name"].lower(): header.get("value", "")
+            for header in metadata.get("payload", {}).get("headers", [])
+        }
+        if self._sender_rule(extract_email_address(headers.get("from", ""))):
+            return SENDER_RULE
+        if self._automated(headers):
+            return AUTOMATED
+        return None
+
+    def record(self, listed: int, fetched: int, dropped: Dict[str, int]):
+        """Add one poll's counts to the running totals"""
+        self.stats["listed"] += listed
+        self.stats["fetched"] += fetched
+        for reason, count in dropped.items():
+            self.stats[reason] += count
+
+    def get_stats(self) -> Dict[str, Any]:
+        listed = self.stats["listed"]
+        return {
+            **self.stats,
+            "skipped_ratio": round(1 - self.stats["fetched"] / listed, 3) if listed else 0.0,
+            "users": len(self._seen),
+        }
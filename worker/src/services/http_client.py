@@ -0,0 +1,181 @@
+"""
+Shared pooled HTTP clients for LLM calls
+
+Every LLM wrapper gets the same httpx clients so calls to the OpenRouter
+host reuse one connection pool (HTTP/2 when the `h2` package is
+installed) instead of each ChatOpenAI instance opening its own. The pool
+is warmed at startup so the TLS handshake is not paid by the first email.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    """Counts requests vs. new TCP/TLS connections via httpcore trace events"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    def _on_event(self, event_name: str):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+        elif event_name == "http2.send_request_headers.started":
+            self.http2_requests += 1
+
+    async def atrace(self, event_name: str, info: Dict[str, Any]):
+        self._on_event(event_name)
+
+    def trace(self, event_name: str, info: Dict[str, Any]):
+        self._on_event(event_name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "http2_requests": self.http2_requests,
+        }
+
+
+class SharedHTTPClients:
+    """Process-wide async/sync httpx clients with tuned pool limits"""
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry_seconds: Optional[float] = None,
+        timeout_seconds: Optional[float] = None,
+        http2: Optional[bool] = None
+    ):
+        """
+        Initialize client settings (unset arguments come from LLM_HTTP_* env vars)
+
+        Args:
+            max_connections: Pool size (LLM_HTTP_MAX_CONNECTIONS)
+            max_keepalive_connections: Idle connections kept open (LLM_HTTP_MAX_KEEPALIVE)
+            keepalive_expiry_seconds: Idle connection lifetime (LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS)
+            timeout_seconds: Read timeout for LLM responses (LLM_HTTP_TIMEOUT_SECONDS)
+            http2: Use HTTP/2 if the h2 package is installed (LLM_HTTP2)
+        """
+        self.max_connections = max_connections or int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+        self.max_keepalive = max_keepalive_connections or int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "16"))
+        self.keepalive_expiry = keepalive_expiry_seconds or float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", "120"))
+        self.timeout = timeout_seconds or float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120"))
+        if http2 is None:
+            http2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        self.stats = ConnectionStats()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+
+    def _client_options(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=10.0),
+        }
+
+    async def _on_async_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        request.extensions["trace"] = self.stats.atrace
+
+    def _on_sync_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        request.extensions["trace"] = self.stats.trace
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                event_hooks={"request": [self._on_async_request]},
+                **self._client_options()
+            )
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(
+                event_hooks={"request": [self._on_sync_request]},
+                **self._client_options()
+            )
+        return self._sync_client
+
+    async def warm_up(self, base_url: str, connections: Optional[int] = None):
+        """
+        Open pooled connections to the LLM host ahead of the first email
+
+        Args:
+            base_url: API base URL (any response completes the TLS handshake)
+            connections: Connections to open (LLM_HTTP_WARMUP_CONNECTIONS; 1 is enough for HTTP/2)
+        """
+        if connections is None:
+            connections = int(os.getenv("LLM_HTTP_WARMUP_CONNECTIONS", "2"))
+        if self.http2:
+            connections = min(connections, 1)
+        if connections <= 0:
+            return
+
+        async def probe():
+            try:
+                await self.async_client.head(base_url, timeout=10.0)
+            except httpx.HTTPError as e:
+                logger.warning(f"LLM connection warm-up failed: {e}")
+
+        await asyncio.gather(*[probe() for _ in range(connections)])
+        logger.info(f"Warmed {connections} LLM connection(s) to {base_url} (http2={self.http2})")
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool settings and connection reuse counters"""
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive,
+            "keepalive_expiry_seconds": self.keepalive_expiry,
+            **self.stats.to_dict(),
+        }
+
+
+_shared_clients: Optional[SharedHTTPClients] = None
+
+
+def get_http_clients() -> SharedHTTPClients:
+    """Process-wide HTTP clients shared by every LLM wrapper"""
+    global _shared_clients
+    if _shared_clients is None:
+        _shared_clients = SharedHTTPClients()
+    return _shared_clients
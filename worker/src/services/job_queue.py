@@ -0,0 +1,562 @@
+"""
+Durable job queue for email processing
+
+Ingest endpoints enqueue a job and return its id straight away; a pool of
+worker coroutines claims jobs, runs the workflow and stores the result.
+A claimed job is invisible to other workers for the visibility timeout,
+which the worker keeps extending while the job runs. If the worker dies,
+the lease expires and another worker (in this or another replica) picks
+the job up again; failed jobs are retried with exponential backoff until
+max_attempts is reached.
+
+Backends: SQLite (single host, local development) and a DynamoDB table
+(`${TABLE_PREFIX}-email-jobs`) shared by all replicas in production.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+ALL_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)
+
+# DynamoDB items are limited to 400KB; leave room for the other attributes
+MAX_DYNAMODB_PAYLOAD_BYTES = 350_000
+
+
+class JobQueueFull(Exception):
+    """Raised by submit when JOB_QUEUE_MAX_PENDING jobs are already waiting"""
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteJobStore:
+    """Job store in a local SQLite database (WAL mode, one connection guarded by a lock)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                visible_at REAL NOT NULL,
+                lease_owner TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_visible ON jobs (status, visible_at)")
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, job: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, payload, attempts, max_attempts, visible_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (job["job_id"], job["kind"], JOB_QUEUED, json.dumps(job["payload"]), job["max_attempts"],
+                 job["visible_at"], job["created_at"], job["created_at"])
+            )
+
+    def claim(self, owner: str, visibility_timeout: float, now: float) -> Optional[Dict[str, Any]]:
+        """Lease the next visible job (queued, or running with an expired lease)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Leases that expired on the last attempt: the worker died every time
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated_at = ? "
+                    "WHERE status = ? AND visible_at <= ? AND attempts >= max_attempts",
+                    (JOB_FAILED, "visibility timeout expired on the last attempt", _now_iso(), JOB_RUNNING, now)
+                )
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status IN (?, ?) AND visible_at <= ? ORDER BY visible_at LIMIT 1",
+                    (JOB_QUEUED, JOB_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, visible_at = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (JOB_RUNNING, owner, now + visibility_timeout, _now_iso(), row["job_id"])
+                )
+                claimed = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+                self._conn.execute("COMMIT")
+                return self._to_job(claimed)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _update_leased(self, job_id: str, owner: str, assignments: str, values: tuple) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                (*values, _now_iso(), job_id, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount == 1
+
+    def extend(self, job_id: str, owner: str, visible_at: float) -> bool:
+        return self._update_leased(job_id, owner, "visible_at = ?", (visible_at,))
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        return self._update_leased(
+            job_id, owner, "status = ?, result = ?, error = NULL, lease_owner = NULL",
+            (JOB_SUCCEEDED, json.dumps(result, default=str))
+        )
+
+    def retry(self, job_id: str, owner: str, error: str, visible_at: float) -> bool:
+        return self._update_leased(
+            job_id, owner, "status = ?, error = ?, visible_at = ?, lease_owner = NULL",
+            (JOB_QUEUED, error, visible_at)
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._update_leased(
+            job_id, owner, "status = ?, error = ?, lease_owner = NULL", (JOB_FAILED, error)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def count_by_status(self, statuses: tuple = ALL_STATUSES) -> Dict[str, int]:
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM jobs WHERE status IN ({placeholders}) GROUP BY status", statuses
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def purge_finished(self, before: float) -> int:
+        """Delete succeeded/failed jobs last updated before the given epoch time"""
+        cutoff = datetime.fromtimestamp(before, timezone.utc).isoformat()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (JOB_SUCCEEDED, JOB_FAILED, cutoff)
+            )
+            return cursor.rowcount
+
+
+class DynamoDBJobStore:
+    """
+    Job store in the `email-jobs` DynamoDB table
+
+    Visible jobs are found through the status-visible_at-index GSI and
+    claimed with a conditional update on the (status, visible_at) pair that
+    was read, so two replicas cannot lease the same job. Finished jobs get
+    an expires_at attribute for DynamoDB TTL.
+    """
+
+    def __init__(self, db_client: Any, result_ttl_seconds: int):
+        self.table = db_client.tables['email_jobs']
+        self.result_ttl_seconds = result_ttl_seconds
+
+    @staticmethod
+    def _to_job(item: Dict[str, Any]) -> Dict[str, Any]:
+        job = dict(item)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        job["error"] = job.get("error")
+        job["lease_owner"] = job.get("lease_owner")
+        job["attempts"] = int(job["attempts"])
+        job["max_attempts"] = int(job["max_attempts"])
+        job["visible_at"] = float(job["visible_at"])
+        job.pop("expires_at", None)
+        return job
+
+    def enqueue(self, job: Dict[str, Any]):
+        payload = json.dumps(job["payload"])
+        if len(payload.encode("utf-8")) > MAX_DYNAMODB_PAYLOAD_BYTES:
+            raise ValueError(f"Job payload exceeds {MAX_DYNAMODB_PAYLOAD_BYTES} bytes")
+        self.table.put_item(
+            Item={
+                "job_id": job["job_id"],
+                "kind": job["kind"],
+                "status": JOB_QUEUED,
+                "payload": payload,
+                "attempts": 0,
+                "max_attempts": job["max_attempts"],
+                "visible_at": Decimal(str(job["visible_at"])),
+                "created_at": job["created_at"],
+                "updated_at": job["created_at"]
+            },
+            ConditionExpression="attribute_not_exists(job_id)"
+        )
+
+    def _visible(self, status: str, now: float, limit: int = 10) -> List[Dict[str, Any]]:
+        response = self.table.query(
+            IndexName="status-visible_at-index",
+            KeyConditionExpression=Key("status").eq(status) & Key("visible_at").lte(Decimal(str(now))),
+            Limit=limit
+        )
+        return response.get("Items", [])
+
+
+    def _conditional_update(
+        self,
+        job_id: str,
+        condition: str,
+        update: str,
+        names: Dict[str, str],
+        values: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Apply an update if the condition holds; returns the new item, or None if the condition failed"""
+        try:
+            response = self.table.update_item(
+                Key={"job_id": job_id},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#status": "status", **names},
+                ExpressionAttributeValues={":updated_at": _now_iso(), **values},
+                ReturnValues="ALL_NEW"
+            )
+            return response.get("Attributes")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return None
+            raise
+
+    def claim(self, owner: str, visibility_timeout: float, now: float) -> Optional[Dict[str, Any]]:
+        """Lease the next visible job (queued, or running with an expired lease)"""
+        for status in (JOB_QUEUED, JOB_RUNNING):
+            for item in self._visible(status, now):
+                condition = "#status = :seen_status AND visible_at = :seen_visible"
+                seen = {":seen_status": status, ":seen_visible": item["visible_at"]}
+                if int(item["attempts"]) >= int(item["max_attempts"]):
+                    # Only expired leases get here: the worker died on the last attempt
+                    self._conditional_update(
+                        item["job_id"], condition,
+                        "SET #status = :failed, #error = :error, updated_at = :updated_at, expires_at = :expires "
+                        "REMOVE lease_owner",
+                        {"#error": "error"},
+                        {**seen, ":failed": JOB_FAILED, ":error": "visibility timeout expired on the last attempt",
+                         ":expires": int(now + self.result_ttl_seconds)}
+                    )
+                    continue
+                claimed = self._conditional_update(
+                    item["job_id"], condition,
+                    "SET #status = :running, lease_owner = :owner, visible_at = :visible, updated_at = :updated_at "
+                    "ADD attempts :one",
+                    {},
+                    {**seen, ":running": JOB_RUNNING, ":owner": owner, ":one": 1,
+                     ":visible": Decimal(str(now + visibility_timeout))}
+                )
+                if claimed:
+                    return self._to_job(claimed)
+        return None
+
+    def _update_leased(self, job_id: str, owner: str, update: str, names: Dict[str, str], values: Dict[str, Any]) -> bool:
+        return self._conditional_update(
+            job_id, "#status = :leased AND lease_owner = :owner", update, names,
+            {":leased": JOB_RUNNING, ":owner": owner, **values}
+        ) is not None
+
+    def _expires(self) -> int:
+        return int(time.time() + self.result_ttl_seconds)
+
+    def extend(self, job_id: str, owner: str, visible_at: float) -> bool:
+        return self._update_leased(
+            job_id, owner, "SET visible_at = :visible, updated_at = :updated_at", {},
+            {":visible": Decimal(str(visible_at))}
+        )
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        return self._update_leased(
+            job_id, owner,
+            "SET #status = :succeeded, #result = :result, updated_at = :updated_at, expires_at = :expires "
+            "REMOVE lease_owner, #error",
+            {"#result": "result", "#error": "error"},
+            {":succeeded": JOB_SUCCEEDED, ":result": json.dumps(result, default=str), ":expires": self._expires()}
+        )
+
+    def retry(self, job_id: str, owner: str, error: str, visible_at: float) -> bool:
+        return self._update_leased(
+            job_id, owner,
+            "SET #status = :queued, #error = :error, visible_at = :visible, updated_at = :updated_at REMOVE lease_owner",
+            {"#error": "error"},
+            {":queued": JOB_QUEUED, ":error": error, ":visible": Decimal(str(visible_at))}
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._update_leased(
+            job_id, owner,
+            "SET #status = :failed, #error = :error, updated_at = :updated_at, expires_at = :expires REMOVE lease_owner",
+            {"#error": "error"},
+            {":failed": JOB_FAILED, ":error": error, ":expires": self._expires()}
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        response = self.table.get_item(Key={"job_id": job_id})
+        item = response.get("Item")
+        return self._to_job(item) if item else None
+
+    def count_by_status(self, statuses: tuple = ALL_STATUSES) -> Dict[str, int]:
+        counts = {}
+        for status in statuses:
+            query = {"IndexName": "status-visible_at-index", "KeyConditionExpression": Key("status").eq(status),
+                     "Select": "COUNT"}
+            total = 0
+            while True:
+                response = self.table.query(**query)
+                total += response.get("Count", 0)
+                if "LastEvaluatedKey" not in response:
+                    break
+                query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            if total:
+                counts[status] = total
+        return counts
+
+    def purge_finished(self, before: float) -> int:
+        """Finished jobs expire through the table's TTL on expires_at"""
+        return 0
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """Submits jobs to a store and runs them on a pool of worker coroutines"""
+
+    def __init__(
+        self,
+        store: Any,
+        handler: JobHandler,
+        workers: Optional[int] = None,
+        visibility_timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        retry_base: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        result_ttl: Optional[float] = None,
+        depth_refresh: Optional[float] = None
+    ):
+        """
+        Initialize job queue
+
+        Args:
+            store: SQLiteJobStore or DynamoDBJobStore
+            handler: Coroutine run for each job; its return value is stored as the
+                result, an exception schedules a retry
+            workers: Worker coroutines in this process (JOB_WORKERS)
+            visibility_timeout: Seconds a claimed job stays leased without a heartbeat
+                (JOB_VISIBILITY_TIMEOUT_SECONDS)
+            max_attempts: Attempts before a job is marked failed (JOB_MAX_ATTEMPTS)
+            poll_interval: Idle workers re-check the store this often, for jobs submitted
+                by other replicas or whose retry delay elapsed (JOB_POLL_INTERVAL_SECONDS)
+            retry_base: First retry delay in seconds, doubled per attempt (JOB_RETRY_BASE_SECONDS)
+            max_pending: Queued + running jobs above which submit raises JobQueueFull,
+                0 for no limit (JOB_QUEUE_MAX_PENDING)
+            result_ttl: Seconds finished jobs are kept (JOB_RESULT_TTL_HOURS)
+            depth_refresh: Seconds the pending count checked against max_pending is
+                reused before the store is counted again (JOB_QUEUE_DEPTH_REFRESH_SECONDS)
+        """
+        self.store = store
+        self.handler = handler
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.visibility_timeout = visibility_timeout or float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+        self.retry_base = retry_base if retry_base is not None else float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv("JOB_QUEUE_MAX_PENDING", "10000"))
+        self.result_ttl = result_ttl or float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600
+        self.depth_refresh = (
+            depth_refresh if depth_refresh is not None else float(os.getenv("JOB_QUEUE_DEPTH_REFRESH_SECONDS", "5"))
+        )
+
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self._last_purge = 0.0
+        # Approximate queued + running count for admission control; the store count
+        # is a paginated query on DynamoDB, so it is refreshed at most every depth_refresh
+        # seconds and bumped locally by each submit in between
+        self._depth = 0
+        self._depth_counted_at: Optional[float] = None
+        self._stats = {"submitted": 0, "succeeded": 0, "retried": 0, "failed": 0, "leases_lost": 0}
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Enqueue a job; returns it without waiting for it to run"""
+        if self.max_pending:
+            if self._depth_counted_at is None or time.monotonic() - self._depth_counted_at >= self.depth_refresh:
+                counts = await asyncio.to_thread(self.store.count_by_status, (JOB_QUEUED, JOB_RUNNING))
+                self._depth = counts.get(JOB_QUEUED, 0) + counts.get(JOB_RUNNING, 0)
+                self._depth_counted_at = time.monotonic()
+            if self._depth >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs already pending")
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "max_attempts": self.max_attempts,
+            "visible_at": time.time(),
+            "created_at": _now_iso()
+        }
+        await asyncio.to_thread(self.store.enqueue, job)
+        self._depth += 1
+        self._stats["submitted"] += 1
+        self._wake.set()
+        return {"job_id": job["job_id"], "kind": kind, "status": JOB_QUEUED, "created_at": job["created_at"]}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status, attempts, error and (once succeeded) result"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None:
+            job.pop("payload", None)
+            job.pop("lease_owner", None)
+        return job
+
+    async def start(self):
+        """Start the worker coroutines"""
+        if self._running:
+            return
+        self._running = True
+        self._tasks = [asyncio.create_task(self._worker_loop(index)) for index in range(self.workers)]
+        logger.info(f"✅ Job queue started ({self.workers} workers, owner {self.owner})")
+
+    async def stop(self):
+        """Stop the workers; jobs they were running become visible again when their lease expires"""
+        if not self._running:
+            return
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("🛑 Job queue stopped")
+
+    async def _worker_loop(self, index: int):
+        while self._running:
+            try:
+                self._wake.clear()
+                job = await asyncio.to_thread(self.store.claim, self.owner, self.visibility_timeout, time.time())
+                if job is None:
+                    await self._purge_if_due()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} error: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job_id: str):
+        """Keep extending the lease while the job runs"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            extended = await asyncio.to_thread(
+                self.store.extend, job_id, self.owner, time.time() + self.visibility_timeout
+            )
+            if not extended:
+                self._stats["leases_lost"] += 1
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self.handler(job)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job["attempts"] >= job["max_attempts"]:
+                await asyncio.to_thread(self.store.fail, job_id, self.owner, error)
+                self._stats["failed"] += 1
+                logger.error(f"Job {job_id} failed after {job['attempts']} attempts: {error}")
+            else:
+                delay = self.retry_base * 2 ** (job["attempts"] - 1)
+                await asyncio.to_thread(self.store.retry, job_id, self.owner, error, time.time() + delay)
+                self._stats["retried"] += 1
+                logger.warning(f"Job {job_id} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+        else:
+            if await asyncio.to_thread(self.store.complete, job_id, self.owner, result):
+                self._stats["succeeded"] += 1
+            else:
+                logger.warning(f"Job {job_id} finished after its lease was lost; result discarded")
+        finally:
+            heartbeat.cancel()
+
+    async def _purge_if_due(self):
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        purged = await asyncio.to_thread(self.store.purge_finished, now - self.result_ttl)
+        if purged:
+            logger.info(f"Purged {purged} finished jobs")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Job counts by status plus this process's worker counters"""
+        counts = await asyncio.to_thread(self.store.count_by_status)
+        return {
+            "backend": type(self.store).__name__,
+            "owner": self.owner,
+            "workers": self.workers if self._running else 0,
+            "visibility_timeout_seconds": self.visibility_timeout,
+            "max_attempts": self.max_attempts,
+            "max_pending": self.max_pending,
+            "jobs": {status: counts.get(status, 0) for status in ALL_STATUSES},
+            **self._stats
+        }
+
+
+def create_job_queue(handler: JobHandler, db_client: Any = None) -> JobQueue:
+    """Job queue on the backend selected by JOB_QUEUE_BACKEND (sqlite or dynamodb)"""
+    backend = os.getenv("JOB_QUEUE_BACKEND", "sqlite").lower()
+    result_ttl = float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600
+    if backend == "dynamodb":
+        if db_client is None:
+            from .dynamodb_client import DynamoDBClient
+            db_client = DynamoDBClient()
+        store = DynamoDBJobStore(db_client, int(result_ttl))
+    elif backend == "sqlite":
+        store = SQLiteJobStore(os.getenv("JOB_QUEUE_SQLITE_PATH", "data/jobs.db"))
+    else:
+        raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+    return JobQueue(store, handler, result_ttl=result_ttl)
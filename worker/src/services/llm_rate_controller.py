@@ -0,0 +1,472 @@
+"""
+Adaptive client-side rate and concurrency control for LLM calls
+
+One controller is shared by every LLM call in the process. It combines:
+- token buckets for requests/minute and tokens/minute
+- an AIMD concurrency window (additive increase on healthy responses,
+  multiplicative decrease on 429s and slow responses)
+- a global pause that honours Retry-After
+- jittered exponential backoff for retryable errors
+
+Code that wants to know where its LLM time went (e.g. a pipeline stage)
+runs under track_call_timings(): every call made inside it, including
+from tasks it starts, adds its queue wait, service time and retry
+backoff to the block's totals.
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Totals of the innermost track_call_timings() block, if any
+_call_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("llm_call_timings", default=None)
+
+
+@contextmanager
+def track_call_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect the timings of the LLM calls made inside the block
+
+    Yields:
+        Dict with calls (attempts), queue_wait_seconds, service_seconds
+        and backoff_seconds, updated as calls finish
+    """
+    timings = {"calls": 0, "queue_wait_seconds": 0.0, "service_seconds": 0.0, "backoff_seconds": 0.0}
+    token = _call_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _call_timings.reset(token)
+
+
+def _record_timing(waited: float = 0.0, service: Optional[float] = None, backoff: float = 0.0):
+    timings = _call_timings.get()
+    if timings is None:
+        return
+    timings["queue_wait_seconds"] += waited
+    timings["backoff_seconds"] += backoff
+    if service is not None:
+        timings["calls"] += 1
+        timings["service_seconds"] += service
+
+
+class TokenBucket:
+    """Continuously refilling token bucket (rate expressed per minute)"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def time_until_available(self, amount: float) -> float:
+        """Seconds until `amount` tokens can be consumed (0 if available now)"""
+        self._refill()
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount: float):
+        """Take tokens (may go negative when reconciling actual usage)"""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        """Return unused tokens"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+# Rate limit wording for wrappers that only keep the message; a bare "429" must
+# follow a status label, so IDs, token counts and URLs containing it don't match
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"\b(?:error code|status(?: code)?|http(?:/[\d.]+)?)\s*[:=]?\s*429\b|rate limit|too many requests",
+    re.IGNORECASE
+)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception is a 429 from the provider"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429
+    return bool(_RATE_LIMIT_MESSAGE.search(str(error)))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Rate limits, 5xx responses, timeouts and connection errors are retryable"""
+    if is_rate_limit_error(error):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status in (408, 409)
+    name = type(error).__name__
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or name in (
+        "APITimeoutError", "APIConnectionError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError"
+    )
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Read the provider's requested wait time from an error response
+
+    Supports Retry-After (seconds or HTTP date) and OpenRouter's
+    X-RateLimit-Reset (epoch milliseconds).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = headers.get("x-ratelimit-reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) / 1000.0 - time.time())
+        except ValueError:
+            pass
+
+    return None
+
+
+class LLMRateController:
+    """Shared AIMD concurrency window + token buckets for LLM calls"""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        initial_concurrency: Optional[float] = None,
+        min_concurrency: Optional[float] = None,
+        max_concurrency: Optional[float] = None,
+        target_latency_seconds: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0
+    ):
+        """
+        Initialize controller (unset arguments come from LLM_* env vars)
+
+        Args:
+            requests_per_minute: Request bucket rate (LLM_REQUESTS_PER_MINUTE)
+            tokens_per_minute: Token bucket rate (LLM_TOKENS_PER_MINUTE)
+            initial_concurrency: Starting window size (LLM_INITIAL_CONCURRENCY)
+            min_concurrency: Window floor (LLM_MIN_CONCURRENCY)
+            max_concurrency: Window ceiling (LLM_MAX_CONCURRENCY)
+            target_latency_seconds: Responses slower than this shrink the window (LLM_TARGET_LATENCY_SECONDS)
+            max_retries: Retries for retryable errors (LLM_MAX_RETRIES)
+            base_backoff_seconds: First backoff delay
+            max_backoff_seconds: Backoff ceiling
+        """
+        def env(name: str, value: Optional[float], default: str) -> float:
+            return float(value if value is not None else os.getenv(name, default))
+
+        self.requests_per_minute = env("LLM_REQUESTS_PER_MINUTE", requests_per_minute, "60")
+        self.tokens_per_minute = env("LLM_TOKENS_PER_MINUTE", tokens_per_minute, "200000")
+        self.min_concurrency = env("LLM_MIN_CONCURRENCY", min_concurrency, "1")
+        self.max_concurrency = env("LLM_MAX_CONCURRENCY", max_concurrency, "16")
+        self.window = min(self.max_concurrency, env("LLM_INITIAL_CONCURRENCY", initial_concurrency, "4"))
+        self.target_latency = env("LLM_TARGET_LATENCY_SECONDS", target_latency_seconds, "20")
+        self.max_retries = int(env("LLM_MAX_RETRIES", max_retries, "3"))
+        self.base_backoff = base_backoff_seconds
+        self.max_backoff = max_backoff_seconds
+
+        self.request_bucket = TokenBucket(self.requests_per_minute)
+        self.token_bucket = TokenBucket(self.tokens_per_minute)
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: "deque[asyncio.Future]" = deque()  # Callers waiting for a window slot
+        self._lock = threading.Lock()  # Guards buckets for the sync path
+
+        self.stats_counters = {
+            "requests": 0,
+            "successes": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "failures": 0,
+            "queue_wait_seconds": 0.0,
+        }
+
+    def _wait_time(self, estimated_tokens: int) -> float:
+        """Seconds to wait before a request may start (0 = go now)"""
+        now = time.monotonic()
+        return max(
+            self.paused_until - now,
+            self.request_bucket.time_until_available(1),
+            self.token_bucket.time_until_available(estimated_tokens),
+        )
+
+    async def _acquire(self, estimated_tokens: int) -> float:
+        """Wait for a window slot and bucket capacity; returns time spent waiting"""
+        started = time.monotonic()
+        # Single-threaded event loop: nothing runs between the checks and the increment
+        while True:
+            if self.in_flight < int(self.window):
+                wait = self._wait_time(estimated_tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await waiter
+                finally:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+        self.in_flight += 1
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(estimated_tokens)
+
+        waited = time.monotonic() - started
+        self.stats_counters["queue_wait_seconds"] += waited
+        return waited
+
+    def _release(self):
+        # Synchronous so it is safe in finally blocks of closing generators
+        self.in_flight -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _on_success(self, latency: float):
+        self.stats_counters["successes"] += 1
+        if latency > self.target_latency:
+            self._decrease(0.9, "slow response")
+        else:
+            # Additive increase: roughly +1 slot per window's worth of successes
+            self.window = min(self.max_concurrency, self.window + 1.0 / max(self.window, 1.0))
+
+    def _on_rate_limited(self, retry_after: Optional[float]):
+        self.stats_counters["rate_limited"] += 1
+        self._decrease(0.5, "429")
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def _decrease(self, factor: float, reason: str):
+        # One burst of 429s from the same window only halves it once
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        old = self.window
+        self.window = max(self.min_concurrency, self.window * factor)
+        logger.info(f"LLM concurrency window {old:.1f} → {self.window:.1f} ({reason})")
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, retry_after + random.uniform(0, self.base_backoff))
+        return delay
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Run an LLM call under the controller, retrying retryable errors
+
+        Args:
+            call: Zero-argument coroutine factory making the request
+            estimated_tokens: Expected prompt + completion tokens (for the token bucket)
+            max_retries: Override the controller's retry count for this call
+
+        Returns:
+            The call's result
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            waited = await self._acquire(estimated_tokens)
+            self.stats_counters["requests"] += 1
+            started = time.monotonic()
+            error: Optional[Exception] = None
+            try:
+                result = await call()
+            except Exception as e:
+                error = e
+            finally:
+                # Also when the call is cancelled (a lost hedge, a client gone away);
+                # released before any backoff, so retries don't hold a slot
+                self._release()
+            latency = time.monotonic() - started
+            _record_timing(waited, latency)
+
+            if error is None:
+                self._on_success(latency)
+                return result
+
+            retry_after = retry_after_seconds(error)
+            if is_rate_limit_error(error):
+                self._on_rate_limited(retry_after)
+            # The request didn't go through - give its tokens back
+            self.token_bucket.refund(estimated_tokens)
+
+            if is_retryable_error(error) and attempt < max_retries:
+                delay = self._backoff(attempt, retry_after)
+                _record_timing(backoff=delay)
+                self.stats_counters["retries"] += 1
+                logger.warning(
+                    f"LLM call failed ({type(error).__name__}, attempt {attempt + 1}/{max_retries + 1}). "
+                    f"Retrying in {delay:.1f}s..."
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self.stats_counters["failures"] += 1
+            raise error
+
+        raise RuntimeError("unreachable")
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Hold a concurrency slot for a call the caller drives itself (streaming)
+
+        Applies the buckets, window and Retry-After pause like run(), but
+        does not retry - a stream that already produced output can't be
+        replayed transparently.
+        """
+        waited = await self._acquire(estimated_tokens)
+        self.stats_counters["requests"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self._on_rate_limited(retry_after_seconds(e))
+            self.stats_counters["failures"] += 1
+            raise
+        finally:
+            self._release()
+            _record_timing(waited, time.monotonic() - started)
+        self._on_success(time.monotonic() - started)
+
+    def run_sync(
+        self,
+        call: Callable[[], T],
+        estimated_tokens: int = 0,
+        max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Blocking variant for sync LLM calls
+
+        Honours the buckets, the Retry-After pause and backoff, but not the
+        concurrency window (sync calls are only used from scripts).
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            waiting_since = time.monotonic()
+            while True:
+                with self._lock:
+                    wait = self._wait_time(estimated_tokens)
+                    if wait <= 0:
+                        self.request_bucket.consume(1)
+                        self.token_bucket.consume(estimated_tokens)
+                        break
+                time.sleep(min(wait, 1.0))
+
+            self.stats_counters["requests"] += 1
+            started = time.monotonic()
+            waited = started - waiting_since
+            try:
+                result = call()
+            except Exception as e:
+                _record_timing(waited, time.monotonic() - started)
+                retry_after = retry_after_seconds(e)
+                if is_rate_limit_error(e):
+                    self._on_rate_limited(retry_after)
+                with self._lock:
+                    self.token_bucket.refund(estimated_tokens)
+                if is_retryable_error(e) and attempt < max_retries:
+                    self.stats_counters["retries"] += 1
+                    delay = self._backoff(attempt, retry_after)
+                    _record_timing(backoff=delay)
+                    time.sleep(delay)
+                    continue
+                self.stats_counters["failures"] += 1
+                raise
+
+            latency = time.monotonic() - started
+            self._on_success(latency)
+            _record_timing(waited, latency)
+            return result
+
+        raise RuntimeError("unreachable")
+
+    def record_actual_tokens(self, estimated_tokens: int, actual_tokens: int):
+        """Reconcile the token bucket once the provider reports real usage"""
+        if not actual_tokens:
+            return
+        difference = actual_tokens - estimated_tokens
+        with self._lock:
+            if difference > 0:
+                self.token_bucket.consume(difference)
+            elif difference < 0:
+                self.token_bucket.refund(-difference)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current window, in-flight count and counters"""
+        return {
+            "concurrency_window": round(self.window, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            **{key: round(value, 3) if isinstance(value, float) else value
+               for key, value in self.stats_counters.items()},
+        }
+
+
+_shared_controller: Optional[LLMRateController] = None
+
+
+def get_rate_controller() -> LLMRateController:
+    """Process-wide controller shared by every LLM wrapper"""
+    global _shared_controller
+    if _shared_controller is None:
+        _shared_controller = LLMRateController()
+    return _shared_controller
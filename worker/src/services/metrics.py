@@ -0,0 +1,186 @@
+"""
+Prometheus metrics for the worker's hot paths
+
+Latency histograms are recorded where the work happens: pipeline nodes
+(by the stage timeline wrapper, graph/timeline.py), LLM calls (per attempt,
+inside the rate controller), DynamoDB calls (botocore call events on each
+DynamoDBClient) and Gmail API calls (the googleapiclient request class).
+Queue depths and per-user poll lag are point-in-time values, set from
+the live objects when GET /metrics is scraped (see observe_state).
+
+Everything goes to prometheus_client's default registry, which also
+carries the process and GC collectors.
+"""
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from prometheus_client import Counter, Gauge, Histogram
+
+from .llm_rate_controller import is_rate_limit_error
+
+NODE_DURATION = Histogram(
+    "worker_node_duration_seconds",
+    "Pipeline node latency",
+    ["node", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+)
+LLM_DURATION = Histogram(
+    "worker_llm_request_duration_seconds",
+    "LLM call latency per attempt (status: ok, rate_limited, error, cancelled)",
+    ["model", "status"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+DYNAMODB_DURATION = Histogram(
+    "worker_dynamodb_request_duration_seconds",
+    "DynamoDB call latency, including botocore retries (status: ok or error code)",
+    ["operation", "status"],
+    buckets=(0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+GMAIL_DURATION = Histogram(
+    "worker_gmail_api_request_duration_seconds",
+    "Gmail API call latency (batch: one batch HTTP request)",
+    ["method"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+GMAIL_REQUESTS = Counter(
+    "worker_gmail_api_requests_total",
+    "Gmail API calls by HTTP status (calls inside batch requests included)",
+    ["method", "status"]
+)
+GMAIL_RESPONSE_BYTES = Counter(
+    "worker_gmail_api_response_bytes_total",
+    "Gmail API response body bytes",
+    ["method"]
+)
+JOB_QUEUE_JOBS = Gauge("worker_job_queue_jobs", "Jobs in the job queue by status", ["status"])
+LLM_IN_FLIGHT = Gauge("worker_llm_in_flight", "LLM calls running")
+LLM_WAITING = Gauge("worker_llm_waiting", "LLM calls waiting for a concurrency slot")
+LLM_CONCURRENCY_WINDOW = Gauge("worker_llm_concurrency_window", "LLM rate controller concurrency window")
+GMAIL_BACKLOG = Gauge("worker_gmail_backlog_emails", "Fetched Gmail emails not yet through the workflow")
+POLL_LAG = Gauge(
+    "worker_gmail_poll_lag_seconds",
+    "Seconds since this replica last completed a poll of the user's mailbox (users it holds the lease for)",
+    ["user_id"]
+)
+
+
+@contextmanager
+def track_llm_call(model: str):
+    """Observe one LLM call attempt in LLM_DURATION"""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        # Lost a hedge race, or the caller went away
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status = "rate_limited" if is_rate_limit_error(e) else "error"
+        raise
+    finally:
+        LLM_DURATION.labels(model, status).observe(time.perf_counter() - started)
+
+
+def _before_call(model, context, **kwargs):
+    context["metrics_operation"] = model.name
+    context["metrics_started"] = time.perf_counter()
+
+
+def _observe_call(context: Dict[str, Any], status: str):
+    started = context.pop("metrics_started", None)
+    if started is not None:
+        DYNAMODB_DURATION.labels(context.get("metrics_operation", "unknown"), status).observe(
+            time.perf_counter() - started
+        )
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    status = "ok" if http_response.status_code < 300 else parsed.get("Error", {}).get("Code", "error")
+    _observe_call(context, status)
+
+
+def _after_call_error(exception, context, **kwargs):
+    _observe_call(context, type(exception).__name__)
+
+
+def instrument_dynamodb_client(client: Any):
+    """Observe every call of a boto3 DynamoDB client in DYNAMODB_DURATION (via botocore call events)"""
+    events = client.meta.events
+    # Client-wide and first, so the timer starts even when another before-call
+    # handler answers the call itself (e.g. botocore's Stubber)
+    events.register_first("before-call.*.*", _before_call, unique_id="worker-metrics-before-call")
+    events.register("after-call.*.*", _after_call, unique_id="worker-metrics-after-call")
+    events.register("after-call-error.*.*", _after_call_error, unique_id="worker-metrics-after-call-error")
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """
+    googleapiclient request class (build(requestBuilder=...)) feeding the Gmail metrics
+
+    Successful calls and their response bytes are counted in postproc,
+    which batch requests also run for each of their parts (failed parts of
+    a batch are not counted); latency is observed per execute().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # e.g. gmail.users.messages.get -> messages.get
+        self.metric_method = (self.methodId or "unknown").split("users.", 1)[-1]
+        postproc = self.postproc
+
+        def counted_postproc(resp, content):
+            GMAIL_REQUESTS.labels(self.metric_method, str(resp.status)).inc()
+            GMAIL_RESPONSE_BYTES.labels(self.metric_method).inc(len(content or b""))
+            return postproc(resp, content)
+
+        self.postproc = counted_postproc
+
+    def execute(self, http=None, num_retries=0):
+        started = time.perf_counter()
+        try:
+            return super().execute(http=http, num_retries=num_retries)
+        except HttpError as e:
+            # Error responses are raised before postproc
+            GMAIL_REQUESTS.labels(self.metric_method, str(e.resp.status)).inc()
+            GMAIL_RESPONSE_BYTES.labels(self.metric_method).inc(len(e.content or b""))
+            raise
+        except Exception:
+            GMAIL_REQUESTS.labels(self.metric_method, "error").inc()
+            raise
+        finally:
+            GMAIL_DURATION.labels(self.metric_method).observe(time.perf_counter() - started)
+
+
+def observe_state(
+    jobs: Optional[Dict[str, int]] = None,
+    llm: Optional[Dict[str, Any]] = None,
+    last_poll: Optional[Dict[str, float]] = None,
+    now: Optional[float] = None
+):
+    """
+    Set the point-in-time gauges (called when /metrics is scraped)
+
+    Args:
+        jobs: Job counts by status (JobQueue.get_stats()["jobs"])
+        llm: LLMRateController.get_stats()
+        last_poll: Epoch seconds of the last completed poll per owned user (GmailPoller.owned_poll_times())
+        now: Current time (epoch seconds)
+    """
+    if jobs is not None:
+        for status, count in jobs.items():
+            JOB_QUEUE_JOBS.labels(status).set(count)
+    if llm is not None:
+        LLM_IN_FLIGHT.set(llm.get("in_flight", 0))
+        LLM_WAITING.set(llm.get("waiting", 0))
+        LLM_CONCURRENCY_WINDOW.set(llm.get("concurrency_window", 0))
+    if last_poll is not None:
+        now = now if now is not None else time.time()
+        # Disconnected users, and users whose lease moved to another replica, drop out
+        POLL_LAG.clear()
+        for user_id, polled_at in last_poll.items():
+            POLL_LAG.labels(user_id).set(max(0.0, now - polled_at))
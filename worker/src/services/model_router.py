@@ -0,0 +1,373 @@
+"""
+Multi-model routing for LLM nodes
+
+Each workflow node gets an ordered list of candidate models. The router
+sends a call to the first model whose circuit breaker is closed, fails
+over to the next candidate on errors, and - once a call has been running
+longer than the node's observed p95 latency - sends a hedged duplicate to
+the next candidate and keeps whichever answer arrives first.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MODEL = "mistralai/mistral-small"
+
+
+def model_candidates(node: str, primary: Optional[str] = None) -> List[str]:
+    """
+    Ordered candidate models for a node
+
+    <NODE>_MODELS (e.g. CLASSIFY_MODELS, EXTRACT_MODELS) takes precedence.
+    Otherwise the primary model (OPENROUTER_MODEL) is followed by
+    OPENROUTER_FALLBACK_MODELS.
+
+    Args:
+        node: Workflow node name ("classify", "extract")
+        primary: Explicit primary model (overrides OPENROUTER_MODEL)
+
+    Returns:
+        De-duplicated list of model IDs, most preferred first
+    """
+    def split(value: str) -> List[str]:
+        return [model.strip() for model in value.split(",") if model.strip()]
+
+    configured = split(os.getenv(f"{node.upper()}_MODELS", ""))
+    if configured and not primary:
+        return list(dict.fromkeys(configured))
+
+    models = [primary or os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL)]
+    models.extend(configured or split(os.getenv("OPENROUTER_FALLBACK_MODELS", "")))
+    return list(dict.fromkeys(models))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker over a rolling window of outcomes
+
+    Opens when the error rate or the share of slow calls (slower than
+    latency_threshold_seconds, or beaten by a hedge) crosses its threshold.
+    After cooldown_seconds one trial call is let through (half-open); its
+    outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        model: str,
+        window_size: Optional[int] = None,
+        min_requests: Optional[int] = None,
+        error_rate_threshold: Optional[float] = None,
+        slow_rate_threshold: Optional[float] = None,
+        latency_threshold_seconds: Optional[float] = None,
+        cooldown_seconds: Optional[float] = None
+    ):
+        def env(name: str, value: Optional[float], default: str) -> float:
+            return float(value if value is not None else os.getenv(name, default))
+
+        self.model = model
+        self.window_size = int(env("ROUTER_BREAKER_WINDOW", window_size, "20"))
+        self.min_requests = int(env("ROUTER_BREAKER_MIN_REQUESTS", min_requests, "5"))
+        self.error_rate_threshold = env("ROUTER_BREAKER_ERROR_RATE", error_rate_threshold, "0.5")
+        self.slow_rate_threshold = env("ROUTER_BREAKER_SLOW_RATE", slow_rate_threshold, "0.5")
+        self.latency_threshold = env("ROUTER_BREAKER_LATENCY_SECONDS", latency_threshold_seconds, "30")
+        self.cooldown = env("ROUTER_BREAKER_COOLDOWN_SECONDS", cooldown_seconds, "30")
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        # "ok", "slow" or "error"
+        self.outcomes: Deque[str] = deque(maxlen=self.window_size)
+
+    def is_available(self) -> bool:
+        """Whether allow_request would let a call through, without claiming the half-open trial"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not self._trial_in_flight
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent to this model now (claims the trial call when half-open)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency: float):
+        self._record("slow" if latency > self.latency_threshold else "ok")
+
+    def record_slow(self):
+        """The call lost a hedge race (it was cancelled while still running)"""
+        self._record("slow")
+
+    def record_failure(self):
+        self._record("error")
+
+    def release_trial(self):
+        """The half-open trial call was cancelled before it had an outcome - let another one through"""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def _record(self, outcome: str):
+        if self.state == self.HALF_OPEN:
+            if outcome == "ok":
+                self._close()
+            else:
+                self._open()
+            return
+
+        self.outcomes.append(outcome)
+        if len(self.outcomes) < self.min_requests:
+            return
+        total = len(self.outcomes)
+        if self.outcomes.count("error") / total >= self.error_rate_threshold:
+            self._open()
+        elif self.outcomes.count("slow") / total >= self.slow_rate_threshold:
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            logger.warning(f"Circuit breaker opened for model {self.model}")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self.outcomes.clear()
+
+    def _close(self):
+        logger.info(f"Circuit breaker closed for model {self.model}")
+        self.state = self.CLOSED
+        self._trial_in_flight = False
+        self.outcomes.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self.outcomes),
+            "recent_errors": self.outcomes.count("error"),
+            "recent_slow": self.outcomes.count("slow"),
+        }
+
+
+class ModelRouter:
+    """Route one node's LLM calls across candidate models"""
+
+    def __init__(
+        self,
+        node: str,
+        models: List[str],
+        hedging: Optional[bool] = None,
+        max_hedges: Optional[int] = None,
+        initial_hedge_delay_seconds: Optional[float] = None,
+        min_hedge_delay_seconds: Optional[float] = None,
+        latency_samples: int = 100,
+        breaker_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize router
+
+        Args:
+            node: Workflow node name (for logs and stats)
+            models: Candidate models, most preferred first
+            hedging: Send hedged requests (defaults to ROUTER_HEDGING, on)
+            max_hedges: Hedged duplicates per call (ROUTER_MAX_HEDGES)
+            initial_hedge_delay_seconds: Hedge delay until enough latencies are observed (ROUTER_HEDGE_DELAY_SECONDS)
+            min_hedge_delay_seconds: Floor for the p95-based hedge delay (ROUTER_MIN_HEDGE_DELAY_SECONDS)
+            latency_samples: Successful call latencies kept for the p95
+            breaker_options: Keyword arguments for each model's CircuitBreaker
+        """
+        if not models:
+            raise ValueError(f"No models configured for node '{node}'")
+
+        self.node = node
+        self.models = list(models)
+        if hedging is None:
+            hedging = os.getenv("ROUTER_HEDGING", "true").lower() == "true"
+        self.hedging = hedging and len(self.models) > 1
+        self.max_hedges = max_hedges if max_hedges is not None else int(os.getenv("ROUTER_MAX_HEDGES", "1"))
+        self.initial_hedge_delay = (
+            initial_hedge_delay_seconds if initial_hedge_delay_seconds is not None
+            else float(os.getenv("ROUTER_HEDGE_DELAY_SECONDS", "10"))
+        )
+        self.min_hedge_delay = (
+            min_hedge_delay_seconds if min_hedge_delay_seconds is not None
+            else float(os.getenv("ROUTER_MIN_HEDGE_DELAY_SECONDS", "1"))
+        )
+
+        self.breakers = {model: CircuitBreaker(model, **(breaker_options or {})) for model in self.models}
+        self.latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.stats_counters = {"calls": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self.wins_by_model: Dict[str, int] = {model: 0 for model in self.models}
+
+    @property
+    def hedge_delay(self) -> float:
+        """Observed p95 latency of this node (initial delay until 20 samples exist)"""
+        if len(self.latencies) < 20:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, percentile(list(self.latencies), 95))
+
+    def _candidates(self) -> List[str]:
+        available = [model for model in self.models if self.breakers[model].is_available()]
+        if available:
+            return available
+        # Every breaker is open - still try the preferred model rather than fail outright
+        return self.models[:1]
+
+    async def invoke(
+        self,
+        call: Callable[[str], Awaitable[T]],
+        hedging: Optional[bool] = None,
+        fail_over: Optional[Callable[[BaseException], bool]] = None
+    ) -> Tuple[T, str]:
+        """
+        Run a call on the best available model
+
+        Args:
+            call: Coroutine factory taking a model ID
+            hedging: Override hedging for this call (e.g. off for calls with side effects)
+            fail_over: Checked on each failure; returning False raises it instead of
+                trying the next model (e.g. once a failed call had side effects)
+
+        Returns:
+            Tuple of (result, model that produced it)
+
+        Raises:
+            The last model's exception if every candidate failed
+        """
+        self.stats_counters["calls"] += 1
+        candidates = self._candidates()
+        # Every breaker open: the preferred model is tried anyway
+        forced = not self.breakers[candidates[0]].is_available()
+        if hedging is None:
+            hedging = self.hedging
+        else:
+            hedging = hedging and len(candidates) > 1
+        pending: Dict[asyncio.Future, Tuple[str, float, bool]] = {}
+        next_index = 0
+        hedges_sent = 0
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool) -> bool:
+            nonlocal next_index
+            while next_index < len(candidates):
+                model = candidates[next_index]
+                next_index += 1
+                # Claims a recovering model's half-open trial; a concurrent call may have taken it since
+                if self.breakers[model].allow_request() or forced:
+                    task = asyncio.ensure_future(call(model))
+                    pending[task] = (model, time.monotonic(), hedge)
+                    return True
+            return False
+
+        launch(hedge=False)
+        try:
+            while pending:
+                can_hedge = (
+                    hedging
+                    and hedges_sent < self.max_hedges
+                    and next_index < len(candidates)
+                )
+                done, _ = await asyncio.wait(
+                    list(pending),
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Slower than p95 - race a duplicate on the next model
+                    hedges_sent += 1
+                    if launch(hedge=True):
+                        self.stats_counters["hedges"] += 1
+                        logger.info(f"[{self.node}] Hedging after {self.hedge_delay:.1f}s with {candidates[next_index - 1]}")
+                    continue
+
+                for task in done:
+                    model, started, hedge = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        latency = time.monotonic() - started
+                        self.breakers[model].record_success(latency)
+                        self.latencies.append(latency)
+                        self.wins_by_model[model] = self.wins_by_model.get(model, 0) + 1
+                        if hedge:
+                            self.stats_counters["hedge_wins"] += 1
+                        # The losers are cancelled on the way out
+                        for loser, (loser_model, _, _) in pending.items():
+                            if not loser.done():
+                                self.breakers[loser_model].record_slow()
+                        return task.result(), model
+
+                    last_error = error
+                    self.breakers[model].record_failure()
+                    logger.warning(f"[{self.node}] Model {model} failed: {type(error).__name__}: {error}")
+                    if fail_over is not None and not fail_over(error):
+                        next_index = len(candidates)
+
+                if not pending and launch(hedge=False):
+                    self.stats_counters["failovers"] += 1
+        finally:
+            for task, (model, _, _) in pending.items():
+                task.cancel()
+                # No outcome to record; a half-open breaker must not wait for one forever
+                self.breakers[model].release_trial()
+            # Wait for the cancellations, so the losers' rate controller slots
+            # are released before the caller moves on
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        self.stats_counters["failures"] += 1
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Candidate models, breaker states and hedge/failover counters"""
+        return {
+            "models": self.models,
+            "hedging": self.hedging,
+            "hedge_delay_seconds": round(self.hedge_delay, 3),
+            "p95_latency_seconds": round(percentile(list(self.latencies), 95), 3),
+            **self.stats_counters,
+            "wins_by_model": dict(self.wins_by_model),
+            "breakers": {model: breaker.get_stats() for model, breaker in self.breakers.items()},
+        }
+
+
+_routers: Dict[str, ModelRouter] = {}
+
+
+def get_model_router(node: str, models: List[str]) -> ModelRouter:
+    """Process-wide router for a node (recreated if its model list changes)"""
+    router = _routers.get(node)
+    if router is None or router.models != models:
+        router = ModelRouter(node, models)
+        _routers[node] = router
+    return router
+
+
+def get_router_stats() -> Dict[str, Any]:
+    """Stats for every node's router"""
+    return {node: router.get_stats() for node, router in _routers.items()}
@@ -3,119 +3,49 @@ OpenRouter LLM Integration for LangChain
 
 Provides a ChatOpenAI-compatible wrapper for OpenRouter API
 """
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
 import os
 import logging
-import asyncio
-from functools import wraps
 
-logger = logging.getLogger(__name__)
+from .llm_rate_controller import get_rate_controller
+from .http_client import get_http_clients
+from .content_compactor import estimate_tokens
+from .metrics import track_llm_call
 
+logger = logging.getLogger(__name__)
 
-def retry_with_exponential_backoff(
-    max_retries: int = 3,
-    initial_delay: float = 1.0,
-    max_delay: float = 8.0,
-    exponential_base: float = 2.0
-):
-    """
-    Retry decorator with exponential backoff for rate limits
 
-    Args:
-        max_retries: Maximum number of retry attempts
-        initial_delay: Initial delay in seconds
-        max_delay: Maximum delay between retries
-        exponential_base: Base for exponential backoff calculation
-    """
-    def decorator(func):
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            delay = initial_delay
-            last_exception = None
-
-            for attempt in range(max_retries + 1):
-                try:
-                    return await func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    error_str = str(e).lower()
-
-                    # Check if it's a rate limit error (429)
-                    is_rate_limit = (
-                        "429" in error_str or
-                        "rate limit" in error_str or
-                        "too many requests" in error_str
-                    )
-
-                    # Only retry on rate limit errors
-                    if is_rate_limit and attempt < max_retries:
-                        logger.warning(
-                            f"Rate limit hit (attempt {attempt + 1}/{max_retries + 1}). "
-                            f"Retrying in {delay:.1f}s..."
-                        )
-                        await asyncio.sleep(delay)
-                        delay = min(delay * exponential_base, max_delay)
-                    else:
-                        # Non-retryable error or max retries reached
-                        if attempt == max_retries:
-                            logger.error(f"Max retries ({max_retries}) exceeded for rate limit")
-                        raise
-
-            raise last_exception
-
-        @wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            delay = initial_delay
-            last_exception = None
-
-            for attempt in range(max_retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    error_str = str(e).lower()
-
-                    is_rate_limit = (
-                        "429" in error_str or
-                        "rate limit" in error_str or
-                        "too many requests" in error_str
-                    )
-
-                    if is_rate_limit and attempt < max_retries:
-                        logger.warning(
-                            f"Rate limit hit (attempt {attempt + 1}/{max_retries + 1}). "
-                            f"Retrying in {delay:.1f}s..."
-                        )
-                        import time
-                        time.sleep(delay)
-                        delay = min(delay * exponential_base, max_delay)
-                    else:
-                        if attempt == max_retries:
-                            logger.error(f"Max retries ({max_retries}) exceeded for rate limit")
-                        raise
-
-            raise last_exception
-
-        return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
-
-    return decorator
+def openrouter_base_url() -> str:
+    """OpenRouter API base URL (override to point at a local stub server)"""
+    return os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
 
 class OpenRouterLLM(ChatOpenAI):
     """
     OpenRouter LLM wrapper compatible with LangChain
 
-    Uses ChatOpenAI as base since OpenRouter API is OpenAI-compatible
+    Uses ChatOpenAI as base since OpenRouter API is OpenAI-compatible.
+    Every call goes through the shared LLMRateController, which owns
+    rate limiting, concurrency and retries (the OpenAI client's own
+    retries are disabled), over the shared pooled HTTP clients.
     """
 
+    # Retries performed by the rate controller
+    rate_limit_retries: int = 3
+    # Expected completion size, used for token bucket estimates
+    expected_completion_tokens: int = 500
+
     def __init__(
         self,
         model: str = "mistralai/mistral-small-3.2-24b-instruct:free",
         api_key: Optional[str] = None,
         temperature: float = 0.1,
         max_retries: int = 3,
+        json_mode: bool = True,
+        response_format: Optional[Dict[str, Any]] = None,
         **kwargs
     ):
         """
@@ -125,7 +55,9 @@ class OpenRouterLLM(ChatOpenAI):
             model: OpenRouter model ID (e.g., "mistralai/mistral-small-3.2-24b-instruct:free")
             api_key: OpenRouter API key (or set OPENROUTER_API_KEY env var)
             temperature: Sampling temperature (0.0-2.0)
-            max_retries: Maximum retry attempts for rate limits
+            max_retries: Maximum retry attempts for rate limits and transient errors
+            json_mode: Force JSON object output (disable when using with_structured_output)
+            response_format: Explicit response_format (e.g. a strict json_schema), overrides json_mode
             **kwargs: Additional arguments passed to ChatOpenAI
         """
         # Get API key from env if not provided
@@ -134,7 +66,18 @@ class OpenRouterLLM(ChatOpenAI):
             raise ValueError("OPENROUTER_API_KEY must be set in environment or passed as argument")
 
         # OpenRouter base URL
-        base_url = "https://openrouter.ai/api/v1"
+        base_url = openrouter_base_url()
+
+        # Share one connection pool across every LLM wrapper
+        http_clients = get_http_clients()
+        kwargs.setdefault("http_async_client", http_clients.async_client)
+        kwargs.setdefault("http_client", http_clients.sync_client)
+
+        model_kwargs = kwargs.pop("model_kwargs", {})
+        if response_format:
+            model_kwargs["response_format"] = response_format
+        elif json_mode:
+            model_kwargs["response_format"] = {"type": "json_object"}  # Force JSON output
 
         # Initialize ChatOpenAI with OpenRouter settings
         super().__init__(
@@ -142,24 +85,65 @@ class OpenRouterLLM(ChatOpenAI):
             openai_api_key=api_key,
             openai_api_base=base_url,
             temperature=temperature,
-            model_kwargs={
-                "response_format": {"type": "json_object"},  # Force JSON output
-            },
+            model_kwargs=model_kwargs,
+            max_retries=0,  # Retries are handled by the shared rate controller
+            stream_usage=True,  # Report token usage on streamed responses too
+            rate_limit_retries=max_retries,
             **kwargs
         )
 
-        self.max_retries = max_retries
         logger.info(f"Initialized OpenRouter LLM with model: {model}, max_retries: {max_retries}")
 
-    @retry_with_exponential_backoff(max_retries=3)
-    async def _agenerate(self, *args, **kwargs):
-        """Override async generation with retry logic"""
-        return await super()._agenerate(*args, **kwargs)
+    def _estimate_tokens(self, messages: List[BaseMessage]) -> int:
+        prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+        return prompt + (self.max_tokens or self.expected_completion_tokens)
+
+    @staticmethod
+    def _actual_tokens(result: ChatResult) -> int:
+        token_usage = (result.llm_output or {}).get("token_usage") or {}
+        return int(token_usage.get("total_tokens") or 0)
+
+    async def _agenerate(self, messages: List[BaseMessage], *args, **kwargs) -> ChatResult:
+        """Override async generation to run under the shared rate controller"""
+        controller = get_rate_controller()
+        estimated = self._estimate_tokens(messages)
 
-    @retry_with_exponential_backoff(max_retries=3)
-    def _generate(self, *args, **kwargs):
-        """Override sync generation with retry logic"""
-        return super()._generate(*args, **kwargs)
+        async def attempt() -> ChatResult:
+            with track_llm_call(self.model_name):
+                return await super(OpenRouterLLM, self)._agenerate(messages, *args, **kwargs)
+
+        result = await controller.run(
+            attempt,
+            estimated_tokens=estimated,
+            max_retries=self.rate_limit_retries
+        )
+        controller.record_actual_tokens(estimated, self._actual_tokens(result))
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], *args, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        """Override async streaming to hold a rate controller slot for the whole stream"""
+        controller = get_rate_controller()
+        async with controller.slot(self._estimate_tokens(messages)):
+            with track_llm_call(self.model_name):
+                async for chunk in super()._astream(messages, *args, **kwargs):
+                    yield chunk
+
+    def _generate(self, messages: List[BaseMessage], *args, **kwargs) -> ChatResult:
+        """Override sync generation to run under the shared rate controller"""
+        controller = get_rate_controller()
+        estimated = self._estimate_tokens(messages)
+
+        def attempt() -> ChatResult:
+            with track_llm_call(self.model_name):
+                return super(OpenRouterLLM, self)._generate(messages, *args, **kwargs)
+
+        result = controller.run_sync(
+            attempt,
+            estimated_tokens=estimated,
+            max_retries=self.rate_limit_retries
+        )
+        controller.record_actual_tokens(estimated, self._actual_tokens(result))
+        return result
 
     def __repr__(self) -> str:
         return f"OpenRouterLLM(model={self.model_name})"
@@ -0,0 +1,469 @@
+"""
+Partition leases for Gmail polling across replicas
+
+Connected users are hashed into POLL_PARTITIONS partitions. Each replica
+registers itself in a shared membership record and leases an even share
+of the partitions; leases are renewed on every heartbeat and expire after
+POLL_LEASE_TTL_SECONDS, so the partitions of a replica that dies are
+picked up by the others on their next heartbeat. A replica only polls
+users in partitions it holds, and per-user sync cursors are stored next
+to the leases so the new owner resumes where the previous one stopped.
+Gmail push watches (mailbox address, history id, expiry) are kept there
+too, so any replica can map a push notification to its user.
+
+Backends: in-memory (single process, the default) and the
+`${TABLE_PREFIX}-poll-leases` DynamoDB table, written with conditional
+updates so two replicas cannot hold the same partition.
+"""
+import os
+import math
+import time
+import uuid
+import socket
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Set
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_KEY = "members"
+
+
+def partition_of(user_id: str, partitions: int) -> int:
+    """Stable partition for a user (same on every replica, unlike hash())"""
+    digest = hashlib.sha1(user_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % partitions
+
+
+def _partition_key(partition: int) -> str:
+    return f"partition#{partition:04d}"
+
+
+def _cursor_key(user_id: str) -> str:
+    return f"cursor#{user_id}"
+
+
+def _watch_key(user_id: str) -> str:
+    return f"watch#{user_id}"
+
+
+def _mailbox_key(email_address: str) -> str:
+    return f"mailbox#{email_address.lower()}"
+
+
+class InMemoryLeaseStore:
+    """Lease store for a single process (all partitions always available to it)"""
+
+    def __init__(self):
+        self._members: Dict[str, float] = {}
+        self._leases: Dict[int, Dict[str, Any]] = {}
+        self._cursors: Dict[str, str] = {}
+        self._watches: Dict[str, Dict[str, Any]] = {}
+        self._mailboxes: Dict[str, str] = {}
+
+    def register(self, owner: str, expires_at: float, now: float) -> Dict[str, float]:
+        self._members[owner] = expires_at
+        self._members = {member: expiry for member, expiry in self._members.items() if expiry > now}
+        return dict(self._members)
+
+    def deregister(self, owner: str):
+        self._members.pop(owner, None)
+
+    def get_leases(self, partitions: int) -> Dict[int, Dict[str, Any]]:
+        return {partition: dict(lease) for partition, lease in self._leases.items() if partition < partitions}
+
+    def acquire(self, partition: int, owner: str, expires_at: float, now: float) -> bool:
+        """Take or renew a lease if it is free, expired or already ours"""
+        lease = self._leases.get(partition)
+        if lease and lease["owner"] != owner and lease["expires_at"] > now:
+            return False
+        self._leases[partition] = {"owner": owner, "expires_at": expires_at}
+        return True
+
+    def release(self, partition: int, owner: str) -> bool:
+        lease = self._leases.get(partition)
+        if not lease or lease["owner"] != owner:
+            return False
+        del self._leases[partition]
+        return True
+
+    def get_cursor(self, user_id: str) -> Optional[str]:
+        return self._cursors.get(user_id)
+
+    def save_cursor(self, user_id: str, value: str):
+        self._cursors[user_id] = value
+
+    def delete_cursor(self, user_id: str):
+        self._cursors.pop(user_id, None)
+
+    def get_watch(self, user_id: str) -> Optional[Dict[str, Any]]:
+        watch = self._watches.get(user_id)
+        return dict(watch) if watch else None
+
+    def save_watch(self, user_id: str, watch: Dict[str, Any], if_history_id: Optional[str] = None) -> bool:
+        stored = self._watches.get(user_id)
+        if if_history_id is not None and (stored is None or stored.get("history_id") != if_history_id):
+            return False
+        self._watches[user_id] = dict(watch)
+        self._mailboxes[watch["email_address"].lower()] = user_id
+        return True
+
+    def delete_watch(self, user_id: str):
+        watch = self._watches.pop(user_id, None)
+        if watch:
+            self._mailboxes.pop(watch["email_address"].lower(), None)
+
+    def find_watch_user(self, email_address: str) -> Optional[str]:
+        return self._mailboxes.get(email_address.lower())
+
+
+class DynamoDBLeaseStore:
+    """Lease store in the `poll-leases` table (members, partition#N, cursor#, watch# and mailbox# items)"""
+
+    def __init__(self, db_client: Any):
+        self.table = db_client.tables['poll_leases']
+
+    @staticmethod
+    def _condition_failed(error: ClientError) -> bool:
+        return error.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+    def _set_member(self, owner: str, expires_at: float) -> Dict[str, Any]:
+        return self.table.update_item(
+            Key={"lease_key": MEMBERS_KEY},
+            UpdateExpression="SET #members.#owner = :expires",
+            ConditionExpression="attribute_exists(#members)",
+            ExpressionAttributeNames={"#members": "members", "#owner": owner},
+            ExpressionAttributeValues={":expires": Decimal(str(expires_at))},
+            ReturnValues="ALL_NEW"
+        )["Attributes"]["members"]
+
+    def register(self, owner: str, expires_at: float, now: float) -> Dict[str, float]:
+        """Record this replica as alive until expires_at; returns the live replicas"""
+        try:
+            members = self._set_member(owner, expires_at)
+        except ClientError as e:
+            if not self._condition_failed(e):
+                raise
+            # First replica ever: create the membership record (or lose the race and retry)
+            try:
+                self.table.put_item(
+                    Item={"lease_key": MEMBERS_KEY, "members": {owner: Decimal(str(expires_at))}},
+                    ConditionExpression="attribute_not_exists(lease_key)"
+                )
+                members = {owner: expires_at}
+            except ClientError as put_error:
+                if not self._condition_failed(put_error):
+                    raise
+                members = self._set_member(owner, expires_at)
+
+        members = {member: float(expiry) for member, expiry in members.items()}
+        expired = [member for member, expiry in members.items() if expiry <= now]
+        if expired:
+            # Prune replicas that stopped heartbeating; harmless if two replicas do it at once
+            self.table.update_item(
+                Key={"lease_key": MEMBERS_KEY},
+                UpdateExpression="REMOVE " + ", ".join(f"#members.#m{i}" for i in range(len(expired))),
+                ExpressionAttributeNames={"#members": "members", **{f"#m{i}": m for i, m in enumerate(expired)}}
+            )
+        return {member: expiry for member, expiry in members.items() if expiry > now}
+
+    def deregister(self, owner: str):
+        self.table.update_item(
+            Key={"lease_key": MEMBERS_KEY},
+            UpdateExpression="REMOVE #members.#owner",
+            ExpressionAttributeNames={"#members": "members", "#owner": owner}
+        )
+
+    def get_leases(self, partitions: int) -> Dict[int, Dict[str, Any]]:
+        leases = {}
+        client = self.table.meta.client
+        keys = [{"lease_key": {"S": _partition_key(partition)}} for partition in range(partitions)]
+        for start in range(0, len(keys), 100):  # BatchGetItem limit
+            request = {self.table.name: {"Keys": keys[start:start + 100], "ConsistentRead": True}}
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self.table.name, []):
+                    partition = int(item["lease_key"]["S"].split("#", 1)[1])
+                    leases[partition] = {"owner": item["owner"]["S"], "expires_at": float(item["expires_at"]["N"])}
+                request = response.get("UnprocessedKeys") or None
+        return leases
+
+    def acquire(self, partition: int, owner: str, expires_at: float, now: float) -> bool:
+        """Take or renew a lease if it is free, expired or already ours"""
+        try:
+            self.table.put_item(
+                Item={"lease_key": _partition_key(partition), "owner": owner, "expires_at": Decimal(str(expires_at))},
+                ConditionExpression="attribute_not_exists(lease_key) OR expires_at <= :now OR #owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":now": Decimal(str(now)), ":owner": owner}
+            )
+            return True
+        except ClientError as e:
+            if self._condition_failed(e):
+                return False
+            raise
+
+    def release(self, partition: int, owner: str) -> bool:
+        try:
+            self.table.delete_item(
+                Key={"lease_key": _partition_key(partition)},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": owner}
+            )
+            return True
+        except ClientError as e:
+            if self._condition_failed(e):
+                return False
+            raise
+
+    def get_cursor(self, user_id: str) -> Optional[str]:
+        item = self.table.get_item(Key={"lease_key": _cursor_key(user_id)}, ConsistentRead=True).get("Item")
+        return item.get("last_sync") if item else None
+
+    def save_cursor(self, user_id: str, value: str):
+        self.table.put_item(Item={"lease_key": _cursor_key(user_id), "user_id": user_id, "last_sync": value})
+
+    def delete_cursor(self, user_id: str):
+        self.table.delete_item(Key={"lease_key": _cursor_key(user_id)})
+
+    def get_watch(self, user_id: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={"lease_key": _watch_key(user_id)}, ConsistentRead=True).get("Item")
+        if not item:
+            return None
+        return {
+            "email_address": item["email_address"],
+            "history_id": item.get("history_id"),
+            "expiration": int(item.get("expiration", 0))
+        }
+
+    def save_watch(self, user_id: str, watch: Dict[str, Any], if_history_id: Optional[str] = None) -> bool:
+        condition = {}
+        if if_history_id is not None:
+            condition = {
+                "ConditionExpression": "history_id = :expected",
+                "ExpressionAttributeValues": {":expected": if_history_id}
+            }
+        try:
+            self.table.put_item(Item={
+                "lease_key": _watch_key(user_id),
+                "user_id": user_id,
+                "email_address": watch["email_address"],
+                "history_id": watch.get("history_id"),
+                "expiration": int(watch.get("expiration", 0))
+            }, **condition)
+        except ClientError as e:
+            if self._condition_failed(e):
+                return False
+            raise
+        self.table.put_item(Item={"lease_key": _mailbox_key(watch["email_address"]), "user_id": user_id})
+        return True
+
+    def delete_watch(self, user_id: str):
+        watch = self.get_watch(user_id)
+        self.table.delete_item(Key={"lease_key": _watch_key(user_id)})
+        if watch:
+            self.table.delete_item(Key={"lease_key": _mailbox_key(watch["email_address"])})
+
+    def find_watch_user(self, email_address: str) -> Optional[str]:
+        item = self.table.get_item(Key={"lease_key": _mailbox_key(email_address)}).get("Item")
+        return item.get("user_id") if item else None
+
+
+class PollLeaseManager:
+    """Keeps this replica's share of the polling partitions leased"""
+
+    def __init__(
+        self,
+        store: Any,
+        partitions: Optional[int] = None,
+        lease_ttl: Optional[float] = None,
+        heartbeat_interval: Optional[float] = None,
+        owner: Optional[str] = None
+    ):
+        """
+        Initialize lease manager
+
+        Args:
+            store: InMemoryLeaseStore or DynamoDBLeaseStore
+            partitions: Number of user partitions (POLL_PARTITIONS); must be the same on every replica
+            lease_ttl: Seconds a lease lasts without renewal (POLL_LEASE_TTL_SECONDS)
+            heartbeat_interval: Seconds between renewals (POLL_LEASE_HEARTBEAT_SECONDS)
+            owner: Replica id (defaults to host:pid:random)
+        """
+        self.store = store
+        self.partitions = partitions or int(os.getenv("POLL_PARTITIONS", "16"))
+        self.lease_ttl = lease_ttl or float(os.getenv("POLL_LEASE_TTL_SECONDS", "60"))
+        self.heartbeat_interval = heartbeat_interval or float(
+            os.getenv("POLL_LEASE_HEARTBEAT_SECONDS", str(self.lease_ttl / 3))
+        )
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        # Partitions we hold and until when (our own view; stop polling at expiry even if renewal fails)
+        self._held: Dict[int, float] = {}
+        self._live_replicas = 1
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"heartbeats": 0, "acquired": 0, "released": 0, "lost": 0, "errors": 0}
+
+    def partition_of(self, user_id: str) -> int:
+        return partition_of(user_id, self.partitions)
+
+    def held_partitions(self, now: Optional[float] = None) -> Set[int]:
+        now = now if now is not None else time.time()
+        return {partition for partition, expires_at in self._held.items() if expires_at > now}
+
+    def owns(self, user_id: str) -> bool:
+        """True if this replica currently holds the user's partition"""
+        return self.partition_of(user_id) in self.held_partitions()
+
+    def rebalance(self, now: Optional[float] = None) -> Set[int]:
+        """
+        One heartbeat: register, renew held leases, then release or acquire
+        partitions until this replica holds its fair share
+        """
+        now = now if now is not None else time.time()
+        expires_at = now + self.lease_ttl
+        members = self.store.register(self.owner, expires_at, now)
+        self._live_replicas = max(1, len(members))
+        target = math.ceil(self.partitions / self._live_replicas)
+        leases = self.store.get_leases(self.partitions)
+
+        held = {}
+        for partition, lease in leases.items():
+            if lease["owner"] != self.owner:
+                continue
+            if self.store.acquire(partition, self.owner, expires_at, now):
+                held[partition] = expires_at
+        lost = set(self._held) - set(held)
+        if lost:
+            self._stats["lost"] += len(lost)
+            logger.warning(f"Lost poll leases for partitions {sorted(lost)}")
+
+        # Too many (a replica joined): hand back the highest-numbered extras
+        for partition in sorted(held, reverse=True)[:max(0, len(held) - target)]:
+            if self.store.release(partition, self.owner):
+                del held[partition]
+                self._stats["released"] += 1
+
+        # Too few (start-up, or a replica died): take free or expired partitions
+        if len(held) < target:
+            free = [
+                partition for partition in range(self.partitions)
+                if partition not in held and (partition not in leases or leases[partition]["expires_at"] <= now)
+            ]
+            for partition in free:
+                if len(held) >= target:
+                    break
+                if self.store.acquire(partition, self.owner, expires_at, now):
+                    held[partition] = expires_at
+                    self._stats["acquired"] += 1
+
+        self._held = held
+        self._stats["heartbeats"] += 1
+        return set(held)
+
+    async def start(self):
+        """Take an initial share of partitions, then keep heartbeating in the background"""
+        if self._task:
+            return
+        try:
+            await asyncio.to_thread(self.rebalance)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Initial poll lease acquisition failed: {e}")
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"✅ Poll leases: {len(self._held)}/{self.partitions} partitions held by {self.owner}")
+
+    async def stop(self):
+        """Stop heartbeating and hand our partitions back so others take them over immediately"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            for partition in list(self._held):
+                await asyncio.to_thread(self.store.release, partition, self.owner)
+            await asyncio.to_thread(self.store.deregister, self.owner)
+        except Exception as e:
+            logger.error(f"Failed to release poll leases: {e}")
+        self._held = {}
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await asyncio.to_thread(self.rebalance)
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Poll lease heartbeat failed: {e}")
+
+    def get_cursor(self, user_id: str) -> Optional[datetime]:
+        value = self.store.get_cursor(user_id)
+        return datetime.fromisoformat(value) if value else None
+
+    def save_cursor(self, user_id: str, last_sync: datetime):
+        self.store.save_cursor(user_id, last_sync.isoformat())
+
+    def delete_cursor(self, user_id: str):
+        self.store.delete_cursor(user_id)
+
+    def get_watch(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Push watch of a user: email_address, history_id (sync cursor) and expiration (epoch ms)"""
+        return self.store.get_watch(user_id)
+
+    def save_watch(self, user_id: str, watch: Dict[str, Any], if_history_id: Optional[str] = None) -> bool:
+        """
+        Store a user's push watch
+
+        Args:
+            user_id: User identifier
+            watch: email_address, history_id and expiration
+            if_history_id: Only write if the stored watch still has this history id - another
+                replica may have synced the mailbox since it was read
+
+        Returns:
+            False if the condition did not hold (nothing written)
+        """
+        return self.store.save_watch(user_id, watch, if_history_id)
+
+    def delete_watch(self, user_id: str):
+        self.store.delete_watch(user_id)
+
+    def find_watch_user(self, email_address: str) -> Optional[str]:
+        """User whose mailbox a push notification names"""
+        return self.store.find_watch_user(email_address)
+
+    def get_stats(self) -> Dict[str, Any]:
+        held = self.held_partitions()
+        return {
+            "backend": type(self.store).__name__,
+            "owner": self.owner,
+            "partitions": self.partitions,
+            "held_partitions": sorted(held),
+            "live_replicas": self._live_replicas,
+            "lease_ttl_seconds": self.lease_ttl,
+            "heartbeat_interval_seconds": self.heartbeat_interval,
+            **self._stats
+        }
+
+
+def create_lease_manager(db_client: Any = None) -> PollLeaseManager:
+    """Lease manager on the backend selected by POLL_LEASE_BACKEND (memory or dynamodb)"""
+    backend = os.getenv("POLL_LEASE_BACKEND", "memory").lower()
+    if backend == "dynamodb":
+        if db_client is None:
+            from .dynamodb_client import DynamoDBClient
+            db_client = DynamoDBClient()
+        return PollLeaseManager(DynamoDBLeaseStore(db_client))
+    if backend == "memory":
+        return PollLeaseManager(InMemoryLeaseStore())
+    raise ValueError(f"Unknown POLL_LEASE_BACKEND: {backend}")
@@ -1,15 +1,17 @@
+import os
 import re
-from typing import Tuple
-from email.message import EmailMessage
+from typing import Optional, Tuple, Union
 
 from ..models import PrefilterResult
+from ..utils import LazyMessage, StructuredMessage
+from .content_compactor import ContentCompactor, CompactionResult
 
 
 class PrefilterService:
     """Email prefiltering service to reduce unnecessary LLM processing"""
     
     # Configuration
-    MAX_CONTENT_LENGTH = 5000  # Max characters to send to LLM
+    MAX_CONTENT_TOKENS = 1250  # Max estimated tokens to send to LLM (~5000 chars)
     MIN_CONTENT_LENGTH = 20    # Minimum meaningful content
     
     # Regex patterns for filtering
@@ -40,8 +42,14 @@ class PrefilterService:
     def __init__(self):
         self.spam_regex = re.compile('|'.join(self.SPAM_PATTERNS), re.IGNORECASE)
         self.business_regex = re.compile('|'.join(self.BUSINESS_KEYWORDS), re.IGNORECASE)
+        self.max_content_tokens = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", str(self.MAX_CONTENT_TOKENS)))
+        self.compactor = ContentCompactor()
     
-    async def process(self, content: str, email_msg: EmailMessage) -> Tuple[PrefilterResult, str]:
+    async def process(
+        self,
+        content: str,
+        email_msg: Union[LazyMessage, StructuredMessage]
+    ) -> Tuple[PrefilterResult, str, Optional[CompactionResult]]:
         """
         Process email through prefilters
         
@@ -50,37 +58,38 @@ class PrefilterService:
             email_msg: Parsed email message
             
         Returns:
-            Tuple of (filter_result, processed_content)
+            Tuple of (filter_result, processed_content, compaction) - compaction
+            is None if the email was filtered out before compaction
         """
         # Check content length
         if len(content) < self.MIN_CONTENT_LENGTH:
-            return PrefilterResult.FILTERED_OUT, ""
+            return PrefilterResult.FILTERED_OUT, "", None
         
         # Check for spam patterns
         if self._is_spam(content, email_msg):
-            return PrefilterResult.FILTERED_OUT, ""
+            return PrefilterResult.FILTERED_OUT, "", None
         
-        # Truncate if too long
-        if len(content) > self.MAX_CONTENT_LENGTH:
-            content = self._smart_truncate(content)
-            if len(content) > self.MAX_CONTENT_LENGTH:
-                return PrefilterResult.TOO_LARGE, ""
+        # Strip boilerplate and fit into the LLM input token budget
+        compaction = self.compactor.compact(content, max_tokens=self.max_content_tokens)
+        content = compaction.content
+        if len(content) < self.MIN_CONTENT_LENGTH:
+            return PrefilterResult.FILTERED_OUT, "", compaction
         
         # Check for business relevance (optional scoring)
         business_score = self._calculate_business_score(content, email_msg)
         if business_score < 0.05:  # Very low business relevance (lowered threshold)
-            return PrefilterResult.FILTERED_OUT, ""
+            return PrefilterResult.FILTERED_OUT, "", compaction
         
-        return PrefilterResult.PASSED, content
+        return PrefilterResult.PASSED, content, compaction
     
-    def _is_spam(self, content: str, email_msg: EmailMessage) -> bool:
+    def _is_spam(self, content: str, email_msg: Union[LazyMessage, StructuredMessage]) -> bool:
         """Check if email appears to be spam"""
         # Check content for spam patterns
         if self.spam_regex.search(content):
             return True
         
         # Check subject for spam patterns
-        subject = email_msg.get('Subject', '')
+        subject = email_msg.subject
         if self.spam_regex.search(subject):
             return True
         
@@ -93,7 +102,7 @@ class PrefilterService:
         
         return False
     
-    def _calculate_business_score(self, content: str, email_msg: EmailMessage) -> float:
+    def _calculate_business_score(self, content: str, email_msg: Union[LazyMessage, StructuredMessage]) -> float:
         """Calculate business relevance score (0.0 - 1.0)"""
         score = 0.0
         
@@ -102,44 +111,17 @@ class PrefilterService:
         score += min(business_matches * 0.1, 0.5)  # Max 0.5 from content
         
         # Business keywords in subject
-        subject = email_msg.get('Subject', '')
+        subject = email_msg.subject
         subject_matches = len(self.business_regex.findall(subject))
         score += min(subject_matches * 0.2, 0.3)  # Max 0.3 from subject
         
         # Sender domain reputation (simple check)
-        sender = email_msg.get('From', '')
+        sender = email_msg.from_header
         if any(domain in sender.lower() for domain in self.PRIORITY_DOMAINS):
             score += 0.1
         
         # Has attachments (might indicate business communication)
-        if email_msg.is_multipart():
-            for part in email_msg.walk():
-                if part.get_content_disposition() == 'attachment':
-                    score += 0.1
-                    break
+        if email_msg.has_attachments():
+            score += 0.1
         
         return min(score, 1.0)
-    
-    def _smart_truncate(self, content: str) -> str:
-        """
-        Intelligently truncate content while preserving important parts
-        """
-        # Try to preserve the beginning and end, removing middle
-        if len(content) <= self.MAX_CONTENT_LENGTH:
-            return content
-        
-        # Keep first 60% and last 20%
-        first_part_size = int(self.MAX_CONTENT_LENGTH * 0.6)
-        last_part_size = int(self.MAX_CONTENT_LENGTH * 0.2)
-        
-        first_part = content[:first_part_size]
-        last_part = content[-last_part_size:] if last_part_size > 0 else ""
-        
-        # Add truncation indicator
-        truncated = first_part + "\n\n[... content truncated ...]\n\n" + last_part
-        
-        # If still too long, just take the beginning
-        if len(truncated) > self.MAX_CONTENT_LENGTH:
-            return content[:self.MAX_CONTENT_LENGTH - 20] + "\n[... truncated]"
-        
-        return truncated
\ No newline at end of file
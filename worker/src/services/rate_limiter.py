@@ -0,0 +1,210 @@
+"""
+Request rate limiting for public endpoints (GCRA)
+
+The generic cell rate algorithm keeps one number per key: the theoretical
+arrival time (TAT) of the next request if requests arrived at exactly the
+allowed rate. A request is allowed when it does not push the TAT more than
+one window ahead of now, which allows `limit` requests in a burst and then
+one every `window / limit` seconds - a smooth sliding window without
+per-request timestamps.
+
+A key whose TAT is in the past carries no state (it is back to a full
+burst), so idle keys are dropped: lazily from the in-memory store, and by
+DynamoDB TTL from the `${TABLE_PREFIX}-rate-limits` table. The DynamoDB
+store updates the TAT with a conditional write, so every replica counts
+against the same limit.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RateLimitDecision:
+    """Outcome of one rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0  # Seconds until the next request would be allowed
+    reset_after: float = 0.0  # Seconds until the full burst is available again
+
+    def headers(self) -> Dict[str, str]:
+        """X-RateLimit-* (and Retry-After when denied) response headers"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class InMemoryRateLimitStore:
+    """TATs for a single process; idle keys are evicted as new requests arrive"""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+        # Least recently updated first
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def update(self, key: str, now: float, compute) -> Any:
+        """
+        Read-modify-write a key atomically
+
+        Args:
+            key: Rate limit key
+            now: Current time (epoch seconds)
+            compute: fn(tat or None) -> (new tat or None to leave it, result)
+        """
+        with self._lock:
+            new_tat, result = compute(self._tats.get(key))
+            if new_tat is not None:
+                self._tats[key] = new_tat
+                self._tats.move_to_end(key)
+            self._evict(now)
+            return result
+
+    def _evict(self, now: float):
+        # Keys at the front were updated longest ago; stop at the first one still limiting
+        while self._tats:
+            key, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[key]
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+class DynamoDBRateLimitStore:
+    """TATs shared by all replicas in the `rate-limits` table, expired by TTL"""
+
+    def __init__(self, db_client: Any, max_attempts: int = 5):
+        self.table = db_client.tables['rate_limits']
+        self.max_attempts = max_attempts
+
+    def update(self, key: str, now: float, compute) -> Any:
+        for _ in range(self.max_attempts):
+            item = self.table.get_item(Key={"rate_key": key}, ConsistentRead=True).get("Item")
+            tat = float(item["tat"]) if item else None
+            new_tat, result = compute(tat)
+            if new_tat is None:
+                return result
+            # Compare-and-set: a concurrent update on another replica makes us re-read
+            condition = {"ConditionExpression": "attribute_not_exists(rate_key)"}
+            if item:
+                condition = {"ConditionExpression": "tat = :tat", "ExpressionAttributeValues": {":tat": item["tat"]}}
+            try:
+                self.table.put_item(
+                    Item={"rate_key": key, "tat": str(new_tat), "expires_at": math.ceil(new_tat)},
+                    **condition
+                )
+                return result
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+        raise RuntimeError(f"Rate limit update for {key} kept conflicting")
+
+
+class RateLimiter:
+    """`limit` requests per `window_seconds` per key, with bursts up to `limit`"""
+
+    def __init__(self, name: str, limit: int, window_seconds: float, store: Any = None):
+        """
+        Initialize rate limiter
+
+        Args:
+            name: Key prefix, so limiters can share a store
+            limit: Requests allowed per window (and largest burst)
+            window_seconds: Window length
+            store: InMemoryRateLimitStore (default) or DynamoDBRateLimitStore
+        """
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.interval = window_seconds / limit
+        self.store = store if store is not None else InMemoryRateLimitStore()
+        # Used while the shared store is unreachable
+        self._fallback = InMemoryRateLimitStore() if not isinstance(self.store, InMemoryRateLimitStore) else None
+        self._stats = {"allowed": 0, "denied": 0, "store_errors": 0}
+
+    def _decide(self, tat: Optional[float], now: float, cost: int):
+        tat = max(tat or now, now)
+        if cost == 0:
+            # Report only: nothing is written
+            remaining = max(0, int((self.window_seconds - (tat - now)) / self.interval + 1e-9))
+            return None, RateLimitDecision(remaining > 0, self.limit, remaining, 0.0, tat - now)
+        new_tat = tat + self.interval * cost
+        allow_at = new_tat - self.window_seconds
+        if now < allow_at:
+            # Denied requests leave the state untouched
+            return None, RateLimitDecision(False, self.limit, 0, allow_at - now, tat - now)
+        remaining = int((self.window_seconds - (new_tat - now)) / self.interval + 1e-9)
+        return new_tat, RateLimitDecision(True, self.limit, remaining, 0.0, new_tat - now)
+
+    def check(self, key: str, cost: int = 1, now: Optional[float] = None) -> RateLimitDecision:
+        """
+        Count a request against a key (e.g. a client IP) if it is allowed
+
+        Args:
+            key: Rate limited key
+            cost: Requests to count (0 reports the current state without counting)
+            now: Current time (epoch seconds)
+
+        Returns:
+            RateLimitDecision with allowed, remaining and retry/reset times
+        """
+        now = now if now is not None else time.time()
+        store_key = f"{self.name}#{key}"
+
+        def compute(tat: Optional[float]):
+            return self._decide(tat, now, cost)
+
+        try:
+            decision = self.store.update(store_key, now, compute)
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            self._stats["store_errors"] += 1
+            logger.error(f"Rate limit store failed, limiting per replica: {e}")
+            decision = self._fallback.update(store_key, now, compute)
+        if cost:
+            self._stats["allowed" if decision.allowed else "denied"] += 1
+        return decision
+
+    def get_stats(self) -> Dict[str, Any]:
+        local = self.store if isinstance(self.store, InMemoryRateLimitStore) else self._fallback
+        return {
+            "backend": type(self.store).__name__,
+            "limit": self.limit,
+            "window_seconds": self.window_seconds,
+            "local_keys": len(local),
+            "evicted_keys": local.evicted,
+            **self._stats
+        }
+
+
+def create_rate_limiter(name: str, limit: int, window_seconds: float, db_client: Any = None) -> RateLimiter:
+    """Rate limiter on the backend selected by RATE_LIMIT_BACKEND (memory or dynamodb)"""
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "dynamodb":
+        if db_client is None:
+            from .dynamodb_client import DynamoDBClient
+            db_client = DynamoDBClient()
+        return RateLimiter(name, limit, window_seconds, DynamoDBRateLimitStore(db_client))
+    if backend == "memory":
+        return RateLimiter(name, limit, window_seconds)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
@@ -0,0 +1,115 @@
+"""
+Incremental JSON parsing for streamed LLM output
+
+Scans the extraction response as chunks arrive and yields each element
+of the top-level arrays (``{"tasks": [{...}, ...], "deals": [...]}``) as
+soon as its closing brace is seen, so entities can be gated and persisted
+while the model is still generating the rest.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """
+    Character-level scanner for one streamed JSON object
+
+    feed() returns (array_key, element) pairs for every object element of a
+    top-level array that completed in the new chunk. `done` becomes True
+    once the top-level object closes; anything after it is ignored.
+    Text before the first '{' (e.g. a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        self.position = 0  # Next index of _text to scan
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.done = False
+
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._element_start = -1
+        self._text = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Add streamed text
+
+        Args:
+            chunk: Next piece of model output
+
+        Returns:
+            Completed (array_key, element) pairs, in order
+        """
+        if self.done or not chunk:
+            return []
+
+        self._text += chunk
+        completed = []
+
+        while self.position < len(self._text) and not self.done:
+            index = self.position
+            char = self._text[index]
+            self.position += 1
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self._array_key is None:
+                        # Remember the latest top-level string (the next array's key)
+                        self._last_key = self._text[self._string_start + 1:index]
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self._string_start = index
+            elif char in "{[":
+                self.depth += 1
+                if char == "[" and self.depth == 2:
+                    self._array_key = self._last_key
+                elif char == "{" and self.depth == 3 and self._array_key is not None:
+                    self._element_start = index
+            elif char in "}]":
+                self.depth -= 1
+                if char == "}" and self.depth == 2 and self._element_start >= 0:
+                    element = self._parse_element(self._text[self._element_start:index + 1])
+                    self._element_start = -1
+                    if element is not None:
+                        completed.append((self._array_key, element))
+                elif char == "]" and self.depth == 1:
+                    self._array_key = None
+                    self._last_key = None
+                elif self.depth == 0:
+                    self.done = True
+
+        return completed
+
+    @property
+    def text(self) -> str:
+        """All text received so far"""
+        return self._text
+
+    @staticmethod
+    def _parse_element(raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            element = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed streamed element: {e}")
+            return None
+        return element if isinstance(element, dict) else None
@@ -0,0 +1,137 @@
+"""
+Email thread index
+
+Maps replies to their conversation (Gmail threadId, or the root Message-ID
+from References / In-Reply-To) and remembers the thread's classification,
+so a reply only needs its new text extracted and can reuse the category
+already paid for on an earlier message.
+"""
+import os
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..utils import parse_message_ids
+
+logger = logging.getLogger(__name__)
+
+
+def thread_keys(
+    message_id: str,
+    references: Optional[str] = None,
+    in_reply_to: Optional[str] = None,
+    gmail_thread_id: Optional[str] = None
+) -> List[str]:
+    """
+    Candidate thread keys for a message, most specific first
+
+    Gmail's threadId wins when present. Otherwise the first entry in
+    References is the thread root (RFC 5322), followed by In-Reply-To and
+    finally the message's own Message-ID (the root of a new conversation).
+
+    Args:
+        message_id: Message-ID header of this message
+        references: References header
+        in_reply_to: In-Reply-To header
+        gmail_thread_id: Gmail API threadId, if fetched from Gmail
+
+    Returns:
+        De-duplicated list of thread keys
+    """
+    keys = []
+    if gmail_thread_id:
+        keys.append(f"gmail:{gmail_thread_id}")
+    keys.extend(parse_message_ids(references)[:1])
+    keys.extend(parse_message_ids(in_reply_to)[:1])
+    if message_id:
+        keys.append(message_id)
+    return list(dict.fromkeys(keys))
+
+
+class ThreadIndex:
+    """Thread classification store (in-memory LRU, optionally backed by DynamoDB)"""
+
+    def __init__(self, db_client: Any = None, max_entries: Optional[int] = None):
+        """
+        Initialize thread index
+
+        Args:
+            db_client: DynamoDBClient used when THREAD_INDEX_PERSIST=true
+            max_entries: Max threads kept in memory (defaults to THREAD_INDEX_MAX_ENTRIES)
+        """
+        persist = os.getenv("THREAD_INDEX_PERSIST", "false").lower() == "true"
+        self.db_client = db_client if persist else None
+        self.max_entries = max_entries or int(os.getenv("THREAD_INDEX_MAX_ENTRIES", "10000"))
+        self._threads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def _key(user_id: str, thread_key: str) -> str:
+        return f"{user_id}#{thread_key}"
+
+    def _remember(self, key: str, record: Dict[str, Any]):
+        self._threads[key] = record
+        self._threads.move_to_end(key)
+        while len(self._threads) > self.max_entries:
+            self._threads.popitem(last=False)
+
+    async def get(self, user_id: str, keys: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Look up a known thread
+
+        Args:
+            user_id: Mailbox owner
+            keys: Candidate thread keys, most specific first
+
+        Returns:
+            Thread record, or None if the thread has not been seen
+        """
+        for thread_key in keys:
+            key = self._key(user_id, thread_key)
+            if key in self._threads:
+                self._threads.move_to_end(key)
+                return self._threads[key]
+
+        if self.db_client:
+            for thread_key in keys:
+                key = self._key(user_id, thread_key)
+                record = await self.db_client.get_email_thread(key)
+                if record:
+                    self._remember(key, record)
+                    return record
+
+        return None
+
+    async def update(
+        self,
+        user_id: str,
+        keys: List[str],
+        message_id: str,
+        category: str,
+        confidence: float,
+        reasoning: str
+    ) -> Dict[str, Any]:
+        """
+        Record the latest classification for a thread
+
+        The record is stored under every key so a later reply can find it by
+        Gmail threadId or by any Message-ID it references.
+        """
+        existing = await self.get(user_id, keys) or {}
+        record = {
+            "user_id": user_id,
+            "category": category,
+            "confidence": confidence,
+            "reasoning": reasoning,
+            "message_count": int(existing.get("message_count", 0)) + 1,
+            "last_message_id": message_id,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+
+        for thread_key in keys:
+            key = self._key(user_id, thread_key)
+            self._remember(key, {**record, "thread_key": key})
+            if self.db_client:
+                await self.db_client.save_email_thread({**record, "thread_key": key})
+
+        return record
@@ -0,0 +1,209 @@
+"""
+LLM token accounting
+
+Captures prompt/completion/cached token counts from LangChain response
+metadata, attributes them to a workflow node and model, and keeps daily
+per-user totals so a configurable token budget can be enforced.
+"""
+import os
+import logging
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMUsage:
+    """Token usage for a single LLM call"""
+    node: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["total_tokens"] = self.total_tokens
+        return data
+
+
+def usage_from_message(message: Any, node: str, default_model: str = "unknown") -> LLMUsage:
+    """
+    Build an LLMUsage record from a LangChain AIMessage
+
+    Prefers the normalized ``usage_metadata`` and falls back to the raw
+    OpenAI-style ``token_usage`` block in ``response_metadata``.
+
+    Args:
+        message: AIMessage (or AIMessageChunk) returned by the chat model
+        node: Workflow node that made the call
+        default_model: Model name to use if the response does not report one
+
+    Returns:
+        LLMUsage with zeros for any counts the provider did not report
+    """
+    response_metadata = getattr(message, "response_metadata", None) or {}
+    model = response_metadata.get("model_name") or response_metadata.get("model") or default_model
+
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if usage_metadata:
+        details = usage_metadata.get("input_token_details") or {}
+        return LLMUsage(
+            node=node,
+            model=model,
+            prompt_tokens=int(usage_metadata.get("input_tokens") or 0),
+            completion_tokens=int(usage_metadata.get("output_tokens") or 0),
+            cached_tokens=int(details.get("cache_read") or 0),
+        )
+
+    token_usage = response_metadata.get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return LLMUsage(
+        node=node,
+        model=model,
+        prompt_tokens=int(token_usage.get("prompt_tokens") or 0),
+        completion_tokens=int(token_usage.get("completion_tokens") or 0),
+        cached_tokens=int(details.get("cached_tokens") or 0),
+    )
+
+
+def summarize_usage(usages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Sum a list of LLMUsage dicts into prompt/completion/cached/total counts"""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 0}
+    for usage in usages:
+        for key in totals:
+            totals[key] += int(usage.get(key, 0) or 0)
+    return totals
+
+
+class TokenUsageTracker:
+    """
+    Per-user daily token totals with an optional budget
+
+    Budget modes once a user's daily total reaches TOKEN_BUDGET_DAILY:
+        defer:   don't process the email now (no email log is written, so
+                 it is picked up again on a later poll)
+        degrade: skip the classification LLM call and only run extraction
+    """
+
+    BUDGET_OK = "ok"
+    BUDGET_DEFER = "defer"
+    BUDGET_DEGRADE = "degrade"
+
+    def __init__(
+        self,
+        daily_budget: Optional[int] = None,
+        budget_mode: Optional[str] = None,
+        db_client: Any = None
+    ):
+        """
+        Initialize tracker
+
+        Args:
+            daily_budget: Tokens per user per UTC day (defaults to TOKEN_BUDGET_DAILY, 0 = unlimited)
+            budget_mode: "defer" or "degrade" (defaults to TOKEN_BUDGET_MODE)
+            db_client: Optional DynamoDBClient used to persist totals across replicas
+        """
+        if daily_budget is None:
+            daily_budget = int(os.getenv("TOKEN_BUDGET_DAILY", "0") or 0)
+        self.daily_budget = daily_budget
+        self.budget_mode = (budget_mode or os.getenv("TOKEN_BUDGET_MODE", self.BUDGET_DEFER)).lower()
+        if self.budget_mode not in (self.BUDGET_DEFER, self.BUDGET_DEGRADE):
+            logger.warning(f"Unknown TOKEN_BUDGET_MODE '{self.budget_mode}', using 'defer'")
+            self.budget_mode = self.BUDGET_DEFER
+
+        persist = os.getenv("TOKEN_USAGE_PERSIST", "false").lower() == "true"
+        self.db_client = db_client if persist else None
+
+        # (user_id, day) -> totals
+        self._totals: Dict[tuple, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.utcnow().strftime("%Y-%m-%d")
+
+    async def _load(self, user_id: str, day: str) -> Dict[str, Any]:
+        key = (user_id, day)
+        if key not in self._totals:
+            totals = {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "total_tokens": 0,
+                "llm_calls": 0,
+                "by_model": {},
+                "by_node": {},
+            }
+            if self.db_client:
+                stored = await self.db_client.get_token_usage(user_id, day)
+                if stored:
+                    for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "llm_calls"):
+                        totals[field] = int(stored.get(field, 0))
+            # Only keep today's counters in memory
+            for stale in [k for k in self._totals if k[1] != day]:
+                del self._totals[stale]
+            self._totals[key] = totals
+        return self._totals[key]
+
+    async def record(self, user_id: str, usages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Add LLM usage records to a user's daily totals
+
+        Args:
+            user_id: User the tokens were spent for
+            usages: List of LLMUsage dicts
+
+        Returns:
+            Updated daily totals for the user
+        """
+        if not usages:
+            return await self.get_usage(user_id)
+
+        day = self._today()
+        totals = await self._load(user_id, day)
+        batch = summarize_usage(usages)
+        for field, value in batch.items():
+            totals[field] += value
+        totals["llm_calls"] += len(usages)
+
+        for usage in usages:
+            for bucket, name in (("by_model", usage.get("model", "unknown")), ("by_node", usage.get("node", "unknown"))):
+                totals[bucket][name] = totals[bucket].get(name, 0) + int(usage.get("total_tokens", 0) or 0)
+
+        if self.db_client:
+            await self.db_client.increment_token_usage(user_id, day, {**batch, "llm_calls": len(usages)})
+
+        return totals
+
+    async def get_usage(self, user_id: str) -> Dict[str, Any]:
+        """Get today's token totals and budget status for a user"""
+        totals = await self._load(user_id, self._today())
+        return {
+            "user_id": user_id,
+            "day": self._today(),
+            **totals,
+            "daily_budget": self.daily_budget or None,
+            "budget_remaining": max(0, self.daily_budget - totals["total_tokens"]) if self.daily_budget else None,
+            "budget_status": await self.check_budget(user_id),
+        }
+
+    async def check_budget(self, user_id: str) -> str:
+        """
+        Check whether a user still has token budget for today
+
+        Returns:
+            BUDGET_OK, or the configured budget mode if the budget is exhausted
+        """
+        if not self.daily_budget:
+            return self.BUDGET_OK
+
+        totals = await self._load(user_id, self._today())
+        if totals["total_tokens"] >= self.daily_budget:
+            return self.budget_mode
+        return self.BUDGET_OK
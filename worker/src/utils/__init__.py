@@ -1,5 +1,24 @@
 """Utility modules"""
 
-from .email_parser import extract_text_content, extract_email_address, extract_sender_name
+from .email_parser import (
+    extract_text_content,
+    extract_email_address,
+    extract_sender_name,
+    extract_new_content,
+    parse_message_ids
+)
+from .mime import LazyMessage, MimePart, StructuredMessage, BodyPart, as_message, decode_header_value
 
-__all__ = ["extract_text_content", "extract_email_address", "extract_sender_name"]
\ No newline at end of file
+__all__ = [
+    "extract_text_content",
+    "extract_email_address",
+    "extract_sender_name",
+    "extract_new_content",
+    "parse_message_ids",
+    "LazyMessage",
+    "MimePart",
+    "StructuredMessage",
+    "BodyPart",
+    "as_message",
+    "decode_header_value"
+]
\ No newline at end of file
@@ -1,11 +1,16 @@
 """Email parsing utilities"""
 
+import re
 from email.message import EmailMessage
+from typing import List, Optional
 
 
 def extract_text_content(email_msg: EmailMessage) -> str:
     """
     Extract text content from email message
+
+    Legacy compat32 path (UTF-8 only); still used to recompute idempotency
+    hashes logged before `LazyMessage.text_content`, which new code uses.
     
     Args:
         email_msg: Parsed email message
@@ -85,4 +90,77 @@ def extract_sender_name(from_header: str) -> str:
         if '@' in from_header:
             return None
         # Otherwise treat the whole thing as a name
-        return from_header.strip()
\ No newline at end of file
+        return from_header.strip()
+
+
+# Markers that start the quoted history in a reply
+_REPLY_HEADER = re.compile(r'^On\s.{0,300}\bwrote:\s*$', re.IGNORECASE | re.DOTALL)
+_ORIGINAL_MESSAGE = re.compile(r'^-{2,}\s*Original Message\s*-{2,}', re.IGNORECASE)
+_OUTLOOK_FROM = re.compile(r'^\*?From:\*?\s', re.IGNORECASE)
+_OUTLOOK_SENT = re.compile(r'^\*?(Sent|Date):\*?\s', re.IGNORECASE)
+_MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+
+
+def parse_message_ids(header: Optional[str]) -> List[str]:
+    """
+    Parse Message-IDs from a References or In-Reply-To header
+
+    Examples:
+        "<a@x.com> <b@x.com>" -> ["<a@x.com>", "<b@x.com>"]
+
+    Args:
+        header: Raw header value (may be None)
+
+    Returns:
+        Message-IDs in header order
+    """
+    if not header:
+        return []
+    ids = _MESSAGE_ID.findall(str(header))
+    if not ids and str(header).strip():
+        return [str(header).strip()]
+    return ids
+
+
+def extract_new_content(text: str) -> str:
+    """
+    Strip quoted history from a reply, keeping only the newly written text
+
+    Handles "> " quoted lines, "On <date>, <name> wrote:" headers (also when
+    wrapped over two lines), "-----Original Message-----" blocks and Outlook
+    style "From: / Sent:" header blocks.
+
+    Args:
+        text: Plain text body of a reply
+
+    Returns:
+        The new text, or the original text if nothing remains after stripping
+    """
+    lines = text.replace('\r\n', '\n').split('\n')
+    new_lines = []
+
+    for idx, line in enumerate(lines):
+        stripped = line.strip()
+        next_line = lines[idx + 1].strip() if idx + 1 < len(lines) else ""
+
+        if _REPLY_HEADER.match(stripped) or (
+            stripped.lower().startswith('on ') and _REPLY_HEADER.match(f"{stripped} {next_line}")
+        ):
+            break
+        if _ORIGINAL_MESSAGE.match(stripped):
+            break
+        if _OUTLOOK_FROM.match(stripped) and any(
+            _OUTLOOK_SENT.match(following.strip()) for following in lines[idx + 1:idx + 5]
+        ):
+            break
+        if stripped.startswith('>'):
+            continue
+
+        new_lines.append(line)
+
+    # Drop Outlook's underscore separator left above the quoted header
+    while new_lines and (not new_lines[-1].strip() or set(new_lines[-1].strip()) == {'_'}):
+        new_lines.pop()
+
+    new_text = '\n'.join(new_lines).strip()
+    return new_text if new_text else text
@@ -0,0 +1,220 @@
+"""
+HTML to plain text for HTML-only emails
+
+Drops what costs LLM tokens without carrying content - scripts, styles,
+hidden preheaders, tracking pixels and link URLs - and keeps the
+structure that does: paragraphs and headings are separated by blank lines
+(so the compactor can drop footer paragraphs), list items become "- " /
+"1. " bullets and data table rows become "cell | cell" lines.
+Conversion stops as soon as `max_chars` of text have been produced.
+"""
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+# Elements whose content is never text
+SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template", "svg", "iframe", "object", "map"}
+
+# Elements that start a new line, and those that also start a new paragraph
+BLOCK_TAGS = {
+    "div", "br", "tr", "li", "dt", "dd", "section", "article", "header", "footer", "address", "center", "form",
+    "fieldset",
+}
+PARAGRAPH_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "dl", "blockquote", "pre", "hr"}
+
+# Elements without an end tag
+VOID_TAGS = {"br", "hr", "img", "meta", "link", "input", "col", "area", "base", "wbr", "source", "track", "embed"}
+
+# Inline styles used to hide preheaders and tracking blocks
+HIDDEN_STYLE = re.compile(
+    r"display\s*:\s*none|visibility\s*:\s*hidden|max-height\s*:\s*0(?![.\d])|font-size\s*:\s*0(?![.\d])|"
+    r"opacity\s*:\s*0(?![.\d])",
+    re.IGNORECASE
+)
+
+_SPACES = re.compile("[\\s\u200b\u200c\u034f\ufeff]+")  # includes zero-width preheader padding
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+class _OutputFull(Exception):
+    """Raised inside the parser once enough text has been produced"""
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Collects text chunks while tracking open elements
+
+    Table rows are buffered until they close: a row of several cells
+    becomes one "cell | cell" line, a single-cell row (layout tables, as
+    in most newsletters) keeps its content and ends a paragraph.
+    """
+
+    def __init__(self, max_chars: Optional[int]):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.chunks: List[str] = []
+        self.length = 0
+        # Open elements as (tag, hides content), for skipped and hidden subtrees
+        self.stack: List[tuple] = []
+        self.hidden = 0
+        self.lists: List[List] = []  # [tag, next item number]
+        self.rows: List[Dict] = []   # open table rows: chunks outside the row, finished cells, cell open
+        self.pre = 0
+
+    def _emit(self, text: str):
+        self.chunks.append(text)
+        self.length += len(text)
+        if self.max_chars is not None and self.length >= self.max_chars:
+            raise _OutputFull()
+
+    def _break(self, newlines: int = 1):
+        """End the current line (1) or paragraph (2)"""
+        if not self.chunks:
+            return
+        tail = "".join(self.chunks[-2:])
+        missing = newlines - (len(tail) - len(tail.rstrip("\n")))
+        if missing > 0:
+            self._emit("\n" * missing)
+
+    def _finish_cell(self):
+        row = self.rows[-1]
+        if row["cell_open"]:
+            row["cells"].append("".join(self.chunks))
+            self.chunks = []
+            row["cell_open"] = False
+
+    def _finish_row(self):
+        self._finish_cell()
+        row = self.rows.pop()
+        cells = [cell.strip() for cell in row["cells"] + ["".join(self.chunks)] if cell.strip()]
+        self.chunks = row["outer"]
+        if len(cells) > 1:
+            self._break()
+            self._emit(" | ".join(_SPACES.sub(" ", cell) for cell in cells))
+            self._break()
+        elif cells:
+            self._break(2)
+            self._emit(cells[0])
+            self._break(2)
+
+    def flush(self):
+        """Emit rows left open when the HTML ended (or the output cap was hit)"""
+        self.max_chars = None
+        while self.rows:
+            self._finish_row()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if not self.hidden:
+                if tag == "br":
+                    self._break()
+                elif tag == "hr":
+                    self._break(2)
+            return
+
+        attributes = dict(attrs)
+        hides = (
+            tag in SKIP_TAGS
+            or "hidden" in attributes
+            or (attributes.get("aria-hidden") or "").lower() == "true"
+            or bool(HIDDEN_STYLE.search(attributes.get("style") or ""))
+        )
+        self.stack.append((tag, hides))
+        self.hidden += hides
+        if self.hidden:
+            return
+
+        if tag == "tr":
+            # A row inside an open cell is a nested table; otherwise the previous row was left unclosed
+            if self.rows and not self.rows[-1]["cell_open"]:
+                self._finish_row()
+            self.rows.append({"outer": self.chunks, "cells": [], "cell_open": False})
+            self.chunks = []
+        elif tag in ("td", "th") and self.rows:
+            self._finish_cell()
+            self.rows[-1]["cells"].append("".join(self.chunks))
+            self.chunks = []
+            self.rows[-1]["cell_open"] = True
+        elif tag in ("ul", "ol"):
+            self.lists.append([tag, 1])
+        elif tag == "li":
+            self._break()
+            depth = "  " * max(len(self.lists) - 1, 0)
+            if self.lists and self.lists[-1][0] == "ol":
+                self._emit(f"{depth}{self.lists[-1][1]}. ")
+                self.lists[-1][1] += 1
+            else:
+                self._emit(f"{depth}- ")
+            return
+        elif tag == "pre":
+            self.pre += 1
+
+        if tag in PARAGRAPH_TAGS:
+            # Within lists, nested lists and paragraphs only start a line
+            nested = len(self.lists) > (1 if tag in ("ul", "ol") else 0)
+            self._break(1 if nested else 2)
+        elif tag in BLOCK_TAGS:
+            self._break()
+
+    def _close(self, tag: str):
+        if tag == "tr" and self.rows:
+            self._finish_row()
+        elif tag in ("td", "th") and self.rows:
+            self._finish_cell()
+        elif tag in ("ul", "ol") and self.lists:
+            self.lists.pop()
+        elif tag == "pre":
+            self.pre -= 1
+        if tag in PARAGRAPH_TAGS:
+            self._break(2 if not self.lists else 1)
+        elif tag in BLOCK_TAGS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                break
+        else:
+            return
+        for open_tag, hides in reversed(self.stack[index:]):
+            self.hidden -= hides
+            if not hides and not self.hidden:
+                self._close(open_tag)
+        del self.stack[index:]
+
+    def handle_data(self, data):
+        if self.hidden:
+            return
+        if not self.pre:
+            data = _SPACES.sub(" ", data)
+            if not self.chunks or self.chunks[-1].endswith((" ", "\n")):
+                data = data.lstrip(" ")
+        if data:
+            self._emit(data)
+
+
+def html_to_text(html: str, max_chars: Optional[int] = None) -> str:
+    """
+    Convert an HTML email body to plain text
+
+    Args:
+        html: HTML source
+        max_chars: Stop after about this many characters of text (None: no cap)
+
+    Returns:
+        Text with one paragraph, list item or table row per line
+    """
+    if not html:
+        return ""
+    extractor = _TextExtractor(max_chars)
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except _OutputFull:
+        pass
+    extractor.flush()
+
+    lines = [line.rstrip() for line in "".join(extractor.chunks).split("\n")]
+    text = _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+    return text if max_chars is None else text[:max_chars]
@@ -0,0 +1,296 @@
+"""
+Header-first, lazy MIME parsing
+
+`LazyMessage` parses only the header block up front. Multipart bodies
+are split into parts on first access (headers only again), and a part's
+body is decoded only when its text is asked for - honouring the declared
+Content-Transfer-Encoding and charset, and decoding no more than
+`max_chars` characters per part. HTML-only emails are converted to
+text (see html_text). Idempotency checks need the headers plus a digest
+of the decoded text, which is computed the same way for raw MIME and for
+the structured parts the Gmail API delivers, so a message hashes alike
+whichever way it arrived; attachments are never decoded for it.
+"""
+import os
+import re
+import codecs
+import base64
+import quopri
+import hashlib
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesHeaderParser
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .html_text import html_to_text
+
+# Characters decoded per text part by default (MIME_TEXT_MAX_CHARS)
+DEFAULT_MAX_CHARS = int(os.getenv("MIME_TEXT_MAX_CHARS", "50000"))
+# HTML source decoded per text character wanted - markup outweighs text in email HTML
+HTML_SOURCE_FACTOR = 20
+# Headers StructuredMessage.to_mime renders, in this order
+MIME_HEADERS = ("From", "To", "Subject", "Date", "Message-ID", "In-Reply-To", "References", "X-Gmail-Thread-Id")
+
+_HEADER_END = re.compile(rb"\r?\n\r?\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_header_parser = BytesHeaderParser()
+
+
+def _split_headers(raw: bytes) -> tuple:
+    """(header bytes, body bytes) split at the first blank line"""
+    if raw.startswith((b"\r\n", b"\n")):
+        return b"", raw.split(b"\n", 1)[1]
+    match = _HEADER_END.search(raw)
+    if not match:
+        return raw, b""
+    return raw[:match.start()], raw[match.end():]
+
+
+def _lookup_charset(charset: Optional[str]) -> Optional[str]:
+    if not charset:
+        return None
+    charset = charset.strip().strip('"').lower()
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def decode_header_value(value: Optional[str]) -> str:
+    """Decode RFC 2047 encoded words (=?utf-8?b?...?=) in a header value"""
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(str(value))))
+    except Exception:
+        return str(value)
+
+
+def _split_multipart(body: bytes, boundary: str) -> List[bytes]:
+    """
+    Raw parts between "--boundary" delimiter lines
+
+    Uses bytes.find rather than a regex: a pattern anchored at line starts
+    cannot use a literal prefix search and crawls through large attachments.
+    """
+    marker = b"--" + boundary.encode("utf-8", "surrogateescape")
+    parts, part_start, position = [], None, 0
+    while True:
+        index = body.find(marker, position)
+        if index == -1:
+            break
+        position = index + len(marker)
+        if index and body[index - 1:index] != b"\n":
+            continue
+        line_end = body.find(b"\n", position)
+        suffix = body[position:len(body) if line_end == -1 else line_end].rstrip(b"\r \t")
+        if suffix not in (b"", b"--"):
+            continue
+        if part_start is not None:
+            # The line break before a delimiter belongs to the delimiter
+            end = index - 1 if index else index
+            if end and body[end - 1:end] == b"\r":
+                end -= 1
+            parts.append(body[part_start:max(end, part_start)])
+        if suffix == b"--" or line_end == -1:
+            break
+        part_start = position = line_end + 1
+    return parts
+
+
+class MimePart:
+    """One MIME entity: parsed headers, body bytes kept undecoded until needed"""
+
+    def __init__(self, raw: bytes):
+        header_bytes, self.body = _split_headers(raw)
+        self.headers: Message = _header_parser.parsebytes(header_bytes)
+        self._parts: Optional[List["MimePart"]] = None
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Raw header value (encoded words left as they are), like Message.get"""
+        value = self.headers.get(name)
+        return default if value is None else str(value)
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get_content_type()
+
+    @property
+    def charset(self) -> Optional[str]:
+        return self.headers.get_content_charset()
+
+    @property
+    def is_attachment(self) -> bool:
+        return self.headers.get_content_disposition() == "attachment"
+
+    def is_multipart(self) -> bool:
+        return self.headers.get_content_maintype() == "multipart"
+
+    @property
+    def parts(self) -> List["MimePart"]:
+        """Sub-parts of a multipart entity, split on the boundary (headers parsed, bodies not decoded)"""
+        if self._parts is None:
+            self._parts = []
+            boundary = self.headers.get_boundary()
+            if self.is_multipart() and boundary:
+                self._parts = [MimePart(raw) for raw in _split_multipart(self.body, boundary)]
+        return self._parts
+
+    def walk(self) -> Iterator["MimePart"]:
+        """This entity and all nested parts, depth first"""
+        yield self
+        for part in self.parts:
+            yield from part.walk()
+
+    def decoded_bytes(self, max_bytes: Optional[int] = None) -> bytes:
+        """Body with the transfer encoding removed, decoding at most about max_bytes"""
+        encoding = (self.get("Content-Transfer-Encoding") or "7bit").strip().lower()
+        body = self.body
+        if encoding == "base64":
+            if max_bytes is not None:
+                # 4 base64 characters per 3 bytes, plus line breaks every 76 characters
+                body = body[:max_bytes * 4 // 3 + max_bytes // 38 + 8]
+            data = re.sub(rb"[^A-Za-z0-9+/]", b"", body)
+            # Re-pad the last group; a lone trailing character (cut mid-group) carries no byte
+            if len(data) % 4 == 1:
+                data = data[:-1]
+            decoded = base64.b64decode(data + b"=" * (-len(data) % 4))
+        elif encoding == "quoted-printable":
+            decoded = quopri.decodestring(body if max_bytes is None else body[:max_bytes * 3])
+        else:
+            decoded = body
+        return decoded if max_bytes is None else decoded[:max_bytes]
+
+    def decoded_text(self, max_chars: Optional[int] = DEFAULT_MAX_CHARS) -> str:
+        """Body as text in its declared charset (UTF-8 when undeclared or unknown), capped at max_chars"""
+        # A character is at most 4 bytes in any charset we expect
+        data = self.decoded_bytes(None if max_chars is None else max_chars * 4)
+        text = data.decode(_lookup_charset(self.charset) or "utf-8", errors="replace")
+        return text if max_chars is None else text[:max_chars]
+
+
+class _MessageAccessors:
+    """Header accessors and text extraction shared by the message types (need `get` and `walk`)"""
+
+    @property
+    def message_id(self) -> str:
+        return (self.get("Message-ID") or "").strip()
+
+    @property
+    def subject(self) -> str:
+        return decode_header_value(self.get("Subject"))
+
+    @property
+    def from_header(self) -> str:
+        return decode_header_value(self.get("From"))
+
+    def text_parts(self, max_chars: Optional[int] = DEFAULT_MAX_CHARS) -> List[str]:
+        """Decoded text/plain parts that are not attachments - or, for HTML-only emails, the text/html parts as text"""
+        parts = [part for part in self.walk() if not part.is_attachment and part.content_type == "text/plain"]
+        if parts:
+            return [part.decoded_text(max_chars) for part in parts]
+        return [
+            html_to_text(part.decoded_text(None if max_chars is None else max_chars * HTML_SOURCE_FACTOR), max_chars)
+            for part in self.walk()
+            if not part.is_attachment and part.content_type == "text/html"
+        ]
+
+    def text_content(self, max_chars: Optional[int] = DEFAULT_MAX_CHARS) -> str:
+        """Text of all text/plain (else text/html) parts, each capped at max_chars"""
+        return "\n\n".join(self.text_parts(max_chars))
+
+    def has_attachments(self) -> bool:
+        """Any part with Content-Disposition: attachment (headers only)"""
+        return any(part.is_attachment for part in self.walk())
+
+    def body_digest(self) -> str:
+        """
+        SHA-256 of the whole text (text parts without the MIME_TEXT_MAX_CHARS cap), with line
+        endings, trailing whitespace and blank lines normalized - identical for raw MIME,
+        structured parts and the text-only MIME rebuilt from either
+        """
+        return _text_digest(self.text_parts(max_chars=None))
+
+
+class LazyMessage(_MessageAccessors, MimePart):
+    """A whole email: header accessors plus lazily decoded text"""
+
+    @classmethod
+    def from_content(cls, content: Union[str, bytes]) -> "LazyMessage":
+        """Wrap raw MIME bytes, or a str holding them (as the ingestion endpoints pass them)"""
+        if isinstance(content, str):
+            content = content.encode("utf-8", "surrogateescape")
+        return cls(content)
+
+
+class BodyPart:
+    """A leaf part whose transfer encoding an API already removed (data empty when not downloaded)"""
+
+    def __init__(
+        self,
+        content_type: str,
+        data: bytes = b"",
+        charset: Optional[str] = None,
+        is_attachment: bool = False,
+        size: int = 0
+    ):
+        self.content_type = content_type.lower()
+        self.data = data
+        self.charset = charset
+        self.is_attachment = is_attachment
+        self.size = size or len(data)
+
+    def decoded_text(self, max_chars: Optional[int] = DEFAULT_MAX_CHARS) -> str:
+        data = self.data if max_chars is None else self.data[:max_chars * 4]
+        text = data.decode(_lookup_charset(self.charset) or "utf-8", errors="replace")
+        return text if max_chars is None else text[:max_chars]
+
+
+class StructuredMessage(_MessageAccessors):
+    """
+    An email delivered as headers plus decoded leaf parts (Gmail API
+    format=full) - the same interface as LazyMessage, without any MIME
+
+    Its body digest is the one LazyMessage computes for the same email, so
+    both Gmail fetch modes and raw MIME produce the same idempotency hash.
+    """
+
+    def __init__(self, headers: List[Tuple[str, str]], parts: List[BodyPart]):
+        self.headers = headers
+        self.parts = parts
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        name = name.lower()
+        for header, value in self.headers:
+            if header.lower() == name:
+                return value
+        return default
+
+    def walk(self) -> Iterator[BodyPart]:
+        return iter(self.parts)
+
+    def body(self) -> str:
+        return self.text_content().strip()
+
+    def to_mime(self) -> str:
+        """Plain-text MIME with the headers the pipeline reads, for APIs and stores that take MIME strings"""
+        lines = [f"{name}: {' '.join(self.get(name).split())}" for name in MIME_HEADERS if self.get(name)]
+        return "\n".join(lines) + "\n\n" + self.body()
+
+
+def _text_digest(parts: List[str]) -> str:
+    normalized = []
+    for text in parts:
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        # Runs of blank lines count as one, so the parts may also arrive flattened into one text
+        text = _BLANK_LINES.sub("\n\n", "\n".join(line.rstrip() for line in lines)).strip()
+        if text:
+            normalized.append(text)
+    return hashlib.sha256("\n\n".join(normalized).encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def as_message(content: Union[str, bytes, LazyMessage, StructuredMessage]) -> Union[LazyMessage, StructuredMessage]:
+    """A message object for raw MIME content; message objects are returned as they are"""
+    if isinstance(content, (LazyMessage, StructuredMessage)):
+        return content
+    return LazyMessage.from_content(content)
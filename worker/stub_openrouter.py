@@ -0,0 +1,168 @@
+"""
+Local stub of the OpenRouter chat completions API
+
+Used to exercise model routing, failover and hedging without real model
+calls. Point the worker at it with:
+
+    OPENROUTER_BASE_URL=http://localhost:8100/v1
+    OPENROUTER_API_KEY=stub
+    OPENROUTER_MODEL=stub/slow
+    OPENROUTER_FALLBACK_MODELS=stub/fast
+
+Per-model behaviour is configured with environment variables:
+
+    STUB_LATENCY=stub/slow=30,stub/fast=0.5     seconds per response
+    STUB_ERROR_RATE=stub/flaky=0.5             fraction of 503 responses
+    STUB_RATE_LIMIT_RATE=stub/busy=0.3         fraction of 429 responses
+    STUB_CHUNK_DELAY=0.05                      seconds between streamed chunks
+
+Run with:  python stub_openrouter.py  (port from STUB_PORT, default 8100)
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_model_map(value: str) -> Dict[str, float]:
+    """Parse 'model=value,model=value'"""
+    result = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, number = item.rsplit("=", 1)
+            result[model.strip()] = float(number)
+    return result
+
+
+LATENCY = parse_model_map(os.getenv("STUB_LATENCY", ""))
+ERROR_RATE = parse_model_map(os.getenv("STUB_ERROR_RATE", ""))
+RATE_LIMIT_RATE = parse_model_map(os.getenv("STUB_RATE_LIMIT_RATE", ""))
+DEFAULT_LATENCY = float(os.getenv("STUB_DEFAULT_LATENCY", "0.2"))
+CHUNK_DELAY = float(os.getenv("STUB_CHUNK_DELAY", "0.05"))
+CHUNK_CHARS = 16
+
+CLASSIFICATION = {
+    "category": "sales_lead",
+    "confidence": 0.9,
+    "reasoning": "Stub classification"
+}
+
+EXTRACTION = {
+    "tasks": [{
+        "title": "Send pricing proposal",
+        "description": "Prospect asked for pricing",
+        "priority": "high",
+        "due_date": "",
+        "confidence": 0.9,
+        "snippet": "Can you share pricing?"
+    }],
+    "deals": [{
+        "title": "Annual logistics contract",
+        "description": "Prospect evaluating a yearly contract",
+        "value": 5000000,
+        "currency": "INR",
+        "stage": "lead",
+        "probability": 40,
+        "confidence": 0.7,
+        "snippet": "yearly contract"
+    }]
+}
+
+app = FastAPI(title="OpenRouter stub")
+stats: Dict[str, Dict[str, int]] = {}
+
+
+def completion(model: str, content: Dict[str, Any], prompt_chars: int) -> Dict[str, Any]:
+    text = json.dumps(content)
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(text) // 4
+    return {
+        "id": f"stub-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+async def stream_completion(model: str, content: Dict[str, Any], prompt_chars: int, include_usage: bool):
+    """Server-sent events in the OpenAI streaming format"""
+    final = completion(model, content, prompt_chars)
+    text = final["choices"][0]["message"]["content"]
+
+    def event(delta: Dict[str, Any], finish_reason=None, usage=None) -> str:
+        payload = {
+            "id": final["id"],
+            "object": "chat.completion.chunk",
+            "created": final["created"],
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    yield event({"role": "assistant", "content": ""})
+    for start in range(0, len(text), CHUNK_CHARS):
+        await asyncio.sleep(CHUNK_DELAY)
+        yield event({"content": text[start:start + CHUNK_CHARS]})
+    yield event({}, finish_reason="stop")
+    if include_usage:
+        yield event({}, usage=final["usage"])
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "unknown")
+    model_stats = stats.setdefault(model, {"requests": 0, "errors": 0, "rate_limited": 0})
+    model_stats["requests"] += 1
+
+    await asyncio.sleep(LATENCY.get(model, DEFAULT_LATENCY))
+
+    if random.random() < RATE_LIMIT_RATE.get(model, 0.0):
+        model_stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "1"},
+            content={"error": {"message": "Rate limit exceeded", "code": 429}}
+        )
+    if random.random() < ERROR_RATE.get(model, 0.0):
+        model_stats["errors"] += 1
+        return JSONResponse(status_code=503, content={"error": {"message": "Upstream unavailable", "code": 503}})
+
+    messages = body.get("messages", [])
+    prompt = " ".join(str(message.get("content", "")) for message in messages)
+    content = CLASSIFICATION if "Classify this email" in prompt else EXTRACTION
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            stream_completion(model, content, len(prompt), include_usage),
+            media_type="text/event-stream"
+        )
+    return completion(model, content, len(prompt))
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("STUB_PORT", "8100")))
@@ -1,5 +1,10 @@
 """
 Load test batch processing with 100 emails
+
+Calls the real LLM API. For repeatable offline numbers (stub LLM,
+in-memory DynamoDB, 100 to 10k emails) use:
+
+    python -m benchmarks.bench_throughput
 """
 import asyncio
 import os
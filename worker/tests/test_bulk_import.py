@@ -0,0 +1,147 @@
+import os
+import asyncio
+import zipfile
+
+from src.models import EmailLog
+from src.services.bulk_import import (
+    BulkImporter, ImportCheckpoint, detect_format, iter_mbox, iter_maildir, iter_zip, parse_message
+)
+from src.utils import BodyPart, StructuredMessage
+
+
+def make_email(i, body="Please send a quote."):
+    return (
+        f"From: buyer{i}@customer.com\nSubject: Quote {i}\nMessage-ID: <msg-{i}@customer.com>\n\n{body}\n"
+    ).encode()
+
+
+def write_mbox(path, messages):
+    with open(path, "wb") as mbox:
+        for message in messages:
+            mbox.write(b"From sender@example.com Mon Jan  1 00:00:00 2025\n" + message + b"\n")
+
+
+class FakeDBClient:
+    def __init__(self, logged=()):
+        self.logged = set(logged)
+
+        self.lookups = []
+
+    async def get_email_logs(self, message_hashes):
+        self.lookups.append(list(message_hashes))
+        return {h: {"message_id_hash": h} for h in message_hashes if h in self.logged}
+
+
+class FakeWorkflow:
+    def __init__(self, fail_subjects=(), logged=()):
+        self.db_client = FakeDBClient(logged)
+        self.fail_subjects = set(fail_subjects)
+        self.batches = []
+
+    async def process_emails_batch(self, mime_contents, source="gmail", user_id=None, email_logs=None):
+        self.batches.append(len(mime_contents))
+        self.email_logs = email_logs
+        results = []
+        for mime in mime_contents:
+            subject = mime.split("Subject: ", 1)[1].split("\n", 1)[0]
+            if subject in self.fail_subjects:
+                results.append({"status": "error", "message": "LLM unavailable"})
+            else:
+                results.append({"status": "success", "results": {"tasks_created": 1, "deals_created": 0}})
+        return results
+
+
+class TestReaders:
+    def test_mbox_split_and_unescape(self, tmp_path):
+        path = tmp_path / "inbox.mbox"
+        write_mbox(path, [make_email(1, "Hi\n>From the team"), make_email(2)])
+        messages = list(iter_mbox(str(path)))
+        assert len(messages) == 2
+        assert messages[0][0] == "mbox:0"
+        assert b"\nFrom the team" in messages[0][1]
+        assert messages[1][1].startswith(b"From: buyer2@")
+        assert detect_format(str(path)) == "mbox"
+
+    def test_maildir_and_zip(self, tmp_path):
+        maildir = tmp_path / "Maildir"
+        for sub in ("cur", "new", "tmp"):
+            (maildir / sub).mkdir(parents=True)
+        (maildir / "cur" / "1:2,S").write_bytes(make_email(1))
+        (maildir / "new" / "2").write_bytes(make_email(2))
+        assert detect_format(str(maildir)) == "maildir"
+        assert [key for key, _ in iter_maildir(str(maildir))] == ["maildir:cur/1:2,S", "maildir:new/2"]
+
+        archive = tmp_path / "mail.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("a.eml", make_email(1))
+            zf.writestr("__MACOSX/._a.eml", b"junk")
+        assert detect_format(str(archive)) == "zip"
+        assert [key for key, _ in iter_zip(str(archive))] == ["zip:a.eml"]
+
+
+class TestBulkImporter:
+    def test_import_dedupes_and_resumes(self, tmp_path):
+        mbox = tmp_path / "inbox.mbox"
+        # Message 2 appears twice, message 3 was already processed by the poller
+        write_mbox(mbox, [make_email(i) for i in (1, 2, 2, 3, 4, 5)] + [b"not an email at all"])
+        checkpoint = str(tmp_path / "import.db")
+        first = FakeWorkflow(fail_subjects={"Quote 5"})
+        logged = parse_message("k", make_email(3))["message_hash"]
+        first.db_client.logged.add(logged)
+
+        importer = BulkImporter(first, "u1", checkpoint, batch_size=2, parse_workers=2, max_buffered=3, parse_chunk_size=2)
+        stats = asyncio.run(importer.run(str(mbox)))
+        importer.close()
+        assert stats["messages_read"] == 7
+        assert stats["duplicates"] == 2
+        assert stats["invalid"] == 1
+        assert stats["processed"] == 3
+        assert stats["errors"] == 1
+        assert stats["tasks_created"] == 3
+        assert max(first.batches) <= 2
+        # One email log read per parse chunk with new messages, not one per message
+        assert len(first.db_client.lookups) == 3
+        assert all(len(hashes) <= 2 for hashes in first.db_client.lookups)
+
+        # Resume: only the failed message is sent again
+        second = FakeWorkflow()
+        importer = BulkImporter(second, "u1", checkpoint, batch_size=2, parse_workers=2)
+        stats = asyncio.run(importer.run(str(mbox)))
+        importer.close()
+        assert stats["resumed"] == 6
+        assert stats["processed"] == 1
+        assert second.batches == [1]
+        # The workflow is told the log was already checked
+        assert second.email_logs == {parse_message("k", make_email(5))["message_hash"]: None}
+
+        progress = ImportCheckpoint(checkpoint).progress()
+        assert progress["messages"] == {"processed": 4, "duplicate": 2, "invalid": 1}
+        assert progress["format"] == "mbox"
+        assert progress["finished_at"]
+
+    def test_messages_logged_by_gmail_polling_are_duplicates(self, tmp_path):
+        # Message 1 was polled through the Gmail API (format=full: decoded parts, CRLF line ends)
+        polled = StructuredMessage(
+            [("From", "buyer1@customer.com"), ("Message-ID", "<msg-1@customer.com>")],
+            [BodyPart("text/plain", b"Please send a quote.\r\n", charset="utf-8")]
+        )
+        workflow = FakeWorkflow(logged={EmailLog.generate_message_hash(polled.message_id, polled.body_digest())})
+        importer = BulkImporter(workflow, "u1", str(tmp_path / "import.db"), batch_size=10, parse_workers=1)
+
+        chunk = [parse_message(f"k{i}", make_email(i)) for i in (1, 2)]
+        new, duplicates = asyncio.run(importer._split_duplicates(chunk, set()))
+        importer.close()
+        assert [parsed["message_key"] for parsed in duplicates] == ["k1"]
+        assert [parsed["message_key"] for parsed in new] == ["k2"]
+
+    def test_dry_run_without_workflow(self, tmp_path):
+        directory = tmp_path / "emls"
+        directory.mkdir()
+        for i in range(3):
+            (directory / f"{i}.eml").write_bytes(make_email(i))
+        importer = BulkImporter(None, "u1", str(tmp_path / "dry.db"), batch_size=10, parse_workers=1)
+        stats = asyncio.run(importer.run(str(directory)))
+        importer.close()
+        assert stats["messages_read"] == 3
+        assert stats["skipped"] == 3
+        assert os.path.exists(tmp_path / "dry.db")
@@ -0,0 +1,85 @@
+from src.services.content_compactor import ContentCompactor, estimate_tokens
+
+
+EMAIL_BODY = """Hi team,
+
+We are looking for a logistics partner for 40 containers a month.
+Please send a proposal with pricing by Friday.
+Details: https://tracking.example-mailer.com/c/eyJhbGciOiJIUzI1NiJ9.eyJ1cmwiOiJodHRwcz
+
+Best regards,
+Rahul Sharma
+Head of Procurement
+Acme Logistics Pvt Ltd
++91 98765 43210
+www.acme-logistics.in
+Plot 12, MIDC, Pune
+
+
+
+CONFIDENTIALITY NOTICE: This e-mail and any attachments are confidential and
+intended solely for the addressee. If you are not the intended recipient,
+please delete it.
+
+To unsubscribe from these updates click here.
+"""
+
+
+class TestContentCompactor:
+    def test_strips_boilerplate(self):
+        result = ContentCompactor().compact(EMAIL_BODY)
+
+        assert "40 containers" in result.content
+        assert "proposal with pricing" in result.content
+        assert "Rahul Sharma" in result.content
+        assert "[link: tracking.example-mailer.com]" in result.content
+        assert "CONFIDENTIALITY" not in result.content
+        assert "unsubscribe" not in result.content
+        assert "MIDC" not in result.content
+        assert "\n\n\n" not in result.content
+        assert result.tokens_saved > 0
+        assert result.compacted_tokens == estimate_tokens(result.content)
+
+    def test_signature_separator(self):
+        body = "Can we meet Tuesday to review the contract?\n-- \nJohn\nSent via CRM"
+        result = ContentCompactor().compact(body)
+        assert result.content == "Can we meet Tuesday to review the contract?"
+
+    def test_token_budget(self):
+        body = " ".join(f"word{i}" for i in range(2000))
+        result = ContentCompactor().compact(body, max_tokens=100)
+
+        assert result.truncated
+        assert result.compacted_tokens <= 100
+        assert result.content.startswith("word0 ")
+        assert result.content.endswith("word1999")
+        assert "[... content truncated ...]" in result.content
+
+    def test_short_content_unchanged(self):
+        body = "Please schedule a follow-up call next week."
+        result = ContentCompactor().compact(body, max_tokens=100)
+        assert result.content == body
+        assert result.tokens_saved == 0
+        assert not result.truncated
+
+    def test_leading_valediction_is_not_a_signature(self):
+        body = (
+            "Thanks!\n"
+            "We would like a quote for 500 pallets of packaging film.\n"
+            "Delivery to our Chennai plant by March.\n"
+            "Please include freight."
+        )
+        result = ContentCompactor().compact(body)
+        assert result.content == body
+
+    def test_boilerplate_words_in_the_body_are_kept(self):
+        body = "We want to unsubscribe from our current vendor and need pricing for 40 containers a month."
+        result = ContentCompactor().compact(body)
+        assert result.content == body
+
+        body = (
+            "Please send a proposal for 40 containers.\nManage your email preferences here.\n\n"
+            "Regards,\nAsha\n\nTo unsubscribe click here."
+        )
+        result = ContentCompactor().compact(body)
+        assert result.content == "Please send a proposal for 40 containers.\n\nRegards,\nAsha"
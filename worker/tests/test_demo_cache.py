@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+from src.services.demo_cache import DemoResultCache, content_key, load_samples
+
+
+def success(n):
+    return {"status": "success", "results": {"tasks_created": n}, "tasks": [{"title": f"Task {n}"}]}
+
+
+class TestCacheKey:
+    def test_formatting_does_not_change_the_key(self):
+        text = "From: a@b.com\nSubject: Quote\n\nPlease quote 200 units.\n\nThanks"
+        assert content_key(text) == content_key("From: a@b.com\r\nSubject:  Quote \r\n\r\n\r\nPlease quote 200\tunits.\r\n\r\nThanks\n")
+        assert content_key(text) != content_key(text.replace("200", "300"))
+
+    def test_bundled_samples_are_found(self):
+        samples = dict(load_samples())
+        ui = [text for label, text in samples.items() if label.startswith("ui/src/data/demoData.ts")]
+        assert len(ui) == 5
+        assert ui[0].startswith("From: Priya Sharma <priya.sharma@techcorp.in>\nSubject: Budget approval for enterprise project\n\nHi Aniket,")
+        assert any(label.startswith("samples/") for label in samples)
+        assert any(label.startswith("DEMO-EMAILS.md") for label in samples)
+
+
+class TestDemoResultCache:
+    def test_ttl_size_bound_and_pinned_entries(self):
+        cache = DemoResultCache(ttl_seconds=60, max_entries=2, snapshot_path="")
+        cache.put("pinned", success(0), pinned=True)
+        for n in range(1, 4):
+            cache.put(f"k{n}", success(n), now=1000)
+        cache.put("error", {"status": "error", "message": "LLM down"}, now=1000)
+
+        assert cache.get("k1", now=1001) is None
+        assert cache.get("k3", now=1001)["tasks"] == [{"title": "Task 3"}]
+        assert cache.get("error", now=1001) is None
+        assert cache.get("k3", now=1061) is None
+        assert cache.get("pinned", now=10 ** 9)["results"] == {"tasks_created": 0}
+
+        # Hits are copies
+        cache.get("pinned")["tasks"].clear()
+        assert cache.get("pinned")["tasks"] == [{"title": "Task 0"}]
+
+    def test_concurrent_misses_share_one_run(self):
+        async def scenario():
+            cache = DemoResultCache(snapshot_path="")
+            runs = []
+
+            async def produce():
+                runs.append(1)
+                await asyncio.sleep(0.01)
+                return success(1)
+
+            results = await asyncio.gather(*(cache.compute("k", produce) for _ in range(5)))
+            assert len(runs) == 1
+            assert all(result["tasks"] == [{"title": "Task 1"}] for result in results)
+            assert cache.get_stats()["joined"] == 4
+            assert cache.get("k") is not None
+
+        asyncio.run(scenario())
+
+    def test_prewarm_uses_and_writes_the_snapshot(self, tmp_path):
+        samples = [("a", "From: a@b.com\n\nFirst sample"), ("b", "From: b@b.com\n\nSecond sample")]
+        snapshot = tmp_path / "demo-cache.json"
+        processed = []
+
+        async def process(text):
+            processed.append(text)
+            return success(len(processed))
+
+        cache = DemoResultCache(snapshot_path=str(snapshot), model="m1")
+        assert asyncio.run(cache.prewarm(process, samples))["computed"] == 2
+        assert set(json.loads(snapshot.read_text())["results"]) == {content_key(text) for _, text in samples}
+
+        # A restart serves the samples from the snapshot without the LLM
+        processed.clear()
+        restarted = DemoResultCache(snapshot_path=str(snapshot), model="m1")
+        assert asyncio.run(restarted.prewarm(process, samples))["from_snapshot"] == 2
+        assert processed == []
+        assert restarted.get(restarted.key("From: a@b.com\n\nFirst  sample\n"))["status"] == "success"
+
+        # Results of another model are recomputed
+        other = DemoResultCache(snapshot_path=str(snapshot), model="m2")
+        assert asyncio.run(other.prewarm(process, samples))["computed"] == 2
+
+
+class FakeDBClient:
+    """Email log and entity writes, with one email already logged by an earlier boot"""
+
+    def __init__(self, logged=()):
+        self.email_logs = {message_hash: {"created_at": "2026-01-01T00:00:00"} for message_hash in logged}
+        self.saved = []
+
+    async def get_email_log(self, message_hash):
+        return self.email_logs.get(message_hash)
+
+    async def save_email_log(self, email_log):
+        self.saved.append(email_log)
+        self.email_logs[email_log.message_id_hash] = {"created_at": email_log.created_at}
+
+    async def save_extracted_data(self, tasks, deals, people):
+        self.saved.extend(tasks + deals + people)
+        return {"task_ids": [t.id for t in tasks], "deal_ids": [d.id for d in deals], "people_ids": [p.id for p in people]}
+
+
+class FakeTokenTracker:
+    async def check_budget(self, user_id):
+        return "ok"
+
+    async def record(self, user_id, usage):
+        pass
+
+
+class TestDemoPrewarmRestart:
+    def test_samples_already_processed_are_cached_on_every_boot(self, monkeypatch):
+        monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+        from src.graph.workflow import EmailProcessingWorkflow
+        from src.models import EmailLog
+        from src.utils import as_message
+
+        text = "From: Priya <priya@example.com>\nSubject: Quote\n\nPlease quote 200 units by Friday."
+        message = as_message(text)
+        db = FakeDBClient(logged={EmailLog.generate_message_hash(message.message_id, message.body_digest())})
+        workflow = EmailProcessingWorkflow()
+        workflow.db_client = workflow.persist_node.db_client = db
+        workflow.token_tracker = FakeTokenTracker()
+
+        async def run_pipeline(state):
+            # Stands in for the LLM steps: one auto-accepted task reaches persist
+            state = {**state, "agent_used": "m1", "high_confidence_tasks": [{
+                "title": "Send quote for 200 units", "description": "Quote requested", "priority": "high",
+                "due_date": None, "confidence": 0.95, "snippet": "Please quote 200 units"
+            }]}
+            return {**state, **await workflow.persist_node(state)}
+
+        workflow._run_pipeline = run_pipeline
+
+        async def process(email_text):
+            return await workflow.process_email(email_text, source="demo", dry_run=True)
+
+        for _ in range(2):
+            cache = DemoResultCache(snapshot_path="", model="m1")
+            assert asyncio.run(cache.prewarm(process, [("a", text)]))["computed"] == 1
+            result = cache.get(cache.key(text))
+            assert [task["title"] for task in result["tasks"]] == ["Send quote for 200 units"]
+            assert result["results"]["tasks_created"] == 1
+
+        # Nothing was written, not even an email log for the next boot to find
+        assert db.saved == []
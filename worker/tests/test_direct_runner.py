@@ -0,0 +1,78 @@
+import asyncio
+import operator
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+
+import pytest
+from langgraph.graph import END
+
+from src.graph.direct_runner import DirectRunner, PipelineSpec, state_reducers
+
+
+class DemoState(TypedDict):
+    text: str
+    category: Optional[str]
+    words: int
+    steps: Annotated[List[str], operator.add]
+    total: Annotated[int, operator.add]
+    result: Dict[str, Any]
+
+
+def classify(state):
+    category = "long" if len(state["text"]) > 10 else "short"
+    return {"category": category, "steps": ["classify"], "total": 1}
+
+
+async def count(state):
+    await asyncio.sleep(0)
+    return {"words": len(state["text"].split()), "steps": ["count"], "total": 10}
+
+
+def finish(state):
+    return {"result": {"category": state["category"], "words": state.get("words", 0)}, "steps": ["finish"]}
+
+
+def make_spec(**overrides) -> PipelineSpec:
+    spec = dict(
+        state_schema=DemoState,
+        entry_point="classify",
+        nodes={"classify": classify, "count": count, "finish": finish},
+        routes={"classify": (lambda state: state["category"], {"long": "count", "short": "finish"})},
+        edges={"count": "finish", "finish": END},
+    )
+    spec.update(overrides)
+    return PipelineSpec(**spec)
+
+
+class TestDirectRunner:
+    @pytest.mark.parametrize("text", ["hi", "a much longer text here"])
+    def test_matches_langgraph(self, text):
+        spec = make_spec()
+        initial = {"text": text, "steps": [], "total": 0}
+        expected = asyncio.run(spec.build_graph().compile().ainvoke(initial))
+        actual = asyncio.run(DirectRunner(spec).ainvoke(initial))
+        assert actual == expected
+
+    def test_reducers_from_annotations(self):
+        reducers = state_reducers(DemoState)
+        assert reducers["steps"] is operator.add
+        assert reducers["text"] is None
+
+    def test_unknown_key_rejected(self):
+        spec = make_spec(nodes={"classify": lambda state: {"category": "short", "bogus": 1},
+                                "count": count, "finish": finish})
+        with pytest.raises(ValueError, match="bogus"):
+            asyncio.run(DirectRunner(spec).ainvoke({"text": "x"}))
+
+    def test_node_edits_do_not_leak(self):
+        def mutating(state):
+            state["text"] = "changed"
+            return {"category": "short"}
+
+        spec = make_spec(nodes={"classify": mutating, "count": count, "finish": finish})
+        final = asyncio.run(DirectRunner(spec).ainvoke({"text": "original", "steps": []}))
+        assert final["text"] == "original"
+
+    def test_routing_loop_guard(self):
+        spec = make_spec(routes={"classify": (lambda state: "again", {"again": "classify"})})
+        with pytest.raises(RuntimeError):
+            asyncio.run(DirectRunner(spec, max_steps=5).ainvoke({"text": "x", "steps": [], "total": 0}))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import types
+
+from langchain_core.messages import AIMessageChunk
+
+from src.graph.nodes.extract_local import ExtractLocalNode
+from src.graph.payload_store import FILTERED_CONTENT, STREAMED_ENTITIES
+from src.models import ProcessingStatus
+from src.services.model_router import ModelRouter
+
+
+def task(title):
+    return {
+        "title": title,
+        "description": f"{title} for the customer",
+        "priority": "high",
+        "due_date": None,
+        "confidence": 0.9,
+        "snippet": title,
+    }
+
+
+class FakeChain:
+    """Streams a JSON extraction in small chunks, optionally failing after a prefix"""
+
+    def __init__(self, tasks, fail_after=None):
+        self.text = json.dumps({"tasks": tasks, "deals": []})
+        self.fail_after = fail_after
+
+    async def astream(self, llm_input):
+        for start in range(0, len(self.text), 16):
+            if self.fail_after is not None and start >= self.fail_after:
+                raise RuntimeError("stream reset")
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=self.text[start:start + 16])
+
+
+def make_node(monkeypatch, chains):
+    monkeypatch.setenv("EXTRACT_MODELS", "model-a,model-b")
+    monkeypatch.setenv("EXTRACT_STREAMING", "true")
+    node = ExtractLocalNode(api_key="test")
+    node.router = ModelRouter("extract", ["model-a", "model-b"], hedging=False)
+    node.llm_chains = chains
+    saved = []
+
+    async def sink(state, kind, data):
+        entity = types.SimpleNamespace(id=f"{kind}-{len(saved)}", title=data["title"], agent=state["agent_used"])
+        saved.append(entity)
+        return entity
+
+    node.entity_sink = sink
+    return node, saved
+
+
+def make_state(node, key):
+    node.payload_store.put(key, FILTERED_CONTENT, "Please send the proposal and book a call.")
+    return {
+        "message_id": "<m1@example.com>",
+        "subject": "Proposal",
+        "sender_email": "a@example.com",
+        "payload_key": key,
+    }
+
+
+class TestStreamingFailover:
+    def test_no_failover_after_an_entity_was_saved(self, monkeypatch):
+        first = task("Send the proposal")
+        failing = FakeChain([first, task("Book a call")])
+        failing.fail_after = failing.text.index("Book a call")
+        # The fallback words the same task slightly differently
+        fallback = FakeChain([task("Send proposal"), task("Book a call")])
+        node, saved = make_node(monkeypatch, {"model-a": failing, "model-b": fallback})
+
+        result = asyncio.run(node(make_state(node, "stream-1")))
+
+        assert result.get("status") != ProcessingStatus.FAILED
+        assert [entity.title for entity in saved] == ["Send the proposal"]
+        assert [data["title"] for data in result["extraction_result"]["tasks"]] == ["Send the proposal"]
+        assert result["agent_used"] == "model-a"
+        # Kept for persist to link to the email log
+        assert list(node.payload_store.pop("stream-1", STREAMED_ENTITIES)) == ["task-0"]
+        assert node.router.stats_counters["failovers"] == 0
+
+    def test_failover_before_anything_was_saved(self, monkeypatch):
+        failing = FakeChain([task("Send the proposal")], fail_after=0)
+        fallback = FakeChain([task("Send proposal")])
+        node, saved = make_node(monkeypatch, {"model-a": failing, "model-b": fallback})
+
+        result = asyncio.run(node(make_state(node, "stream-2")))
+
+        assert [(entity.title, entity.agent) for entity in saved] == [("Send proposal", "model-b")]
+        assert result["agent_used"] == "model-b"
+        assert node.router.stats_counters["failovers"] == 1
+
+    def test_every_model_failing_before_a_save_fails_the_email(self, monkeypatch):
+        chains = {model: FakeChain([task("Send the proposal")], fail_after=0) for model in ("model-a", "model-b")}
+        node, saved = make_node(monkeypatch, chains)
+
+        result = asyncio.run(node(make_state(node, "stream-3")))
+
+        assert result["status"] == ProcessingStatus.FAILED
+        assert saved == []
+        assert node.payload_store.pop("stream-3", STREAMED_ENTITIES) is None
@@ -0,0 +1,211 @@
+import json
+import random
+
+import pytest
+
+from src.graph.nodes.extract_local import extraction_response_format
+from src.models import DealStage, TaskPriority, VALID_CURRENCIES
+from src.services.extraction_normalizer import (
+    ExtractionNormalizer, parse_json_lenient, parse_amount, parse_confidence, parse_probability,
+    parse_priority, parse_stage, parse_currency, parse_due_date
+)
+
+
+VALID = {
+    "tasks": [
+        {"title": "Send proposal", "description": "Send the pricing proposal", "priority": "high",
+         "due_date": "2026-11-02", "confidence": 0.9, "snippet": "send us a proposal by Monday"},
+        {"title": "Schedule demo", "description": "Book a product demo", "priority": "medium",
+         "due_date": "", "confidence": 0.7, "snippet": "we'd like a demo"}
+    ],
+    "deals": [
+        {"title": "Warehouse contract", "description": "Annual warehousing", "value": 5000000,
+         "currency": "INR", "stage": "proposal", "probability": 60, "confidence": 0.8,
+         "snippet": "budget of 50L approved"}
+    ]
+}
+VALID_TEXT = json.dumps(VALID)
+
+# Malformed outputs seen from (or plausible for) the extraction models
+CORPUS = [
+    "```json\n" + VALID_TEXT + "\n```",
+    "Here is the extraction:\n" + VALID_TEXT + "\nLet me know if you need anything else.",
+    VALID_TEXT.replace("}]", "},]").replace('"snippet"', ' "snippet"'),
+    VALID_TEXT[:-2],
+    VALID_TEXT[:len(VALID_TEXT) // 2],
+    '{"tasks": [{"task": "Call back", "confidence": "80%"}], "deals": []}',
+    '{"tasks": [{"text": "Share brochure", "priority": "High", "due_date": null}]}',
+    "{'tasks': [], 'deals': []}",
+    '{"tasks": [{"title": "Follow up", "urgent": True, "confidence": None}], "deals": []}',
+    '{"deals": [{"name": "Fleet deal", "amount": "₹1.5 Cr", "probability": "40%"}]}',
+    '[{"title": "Bare list task"}, {"title": "Bare list deal", "value": 100000}]',
+    '{"tasks": "Send invoice"}',
+    '{"tasks": [null, 42, "Plain string task", {}]}',
+    "",
+    "No tasks or deals found.",
+    "{",
+    '{"tasks": [{"title": "Unicode \\u20b9 ✓", "snippet": "quote with \\" and { and ["}]}',
+]
+
+
+class TestParseJsonLenient:
+    def test_valid(self):
+        assert parse_json_lenient(VALID_TEXT) == VALID
+
+    def test_fenced_and_trailing_text(self):
+        assert parse_json_lenient(CORPUS[0]) == VALID
+        assert parse_json_lenient(CORPUS[1]) == VALID
+
+    def test_trailing_commas(self):
+        assert parse_json_lenient('{"tasks": [{"title": "a",},], "deals": [],}') == {
+            "tasks": [{"title": "a"}], "deals": []
+        }
+
+    def test_truncated_keeps_complete_items(self):
+        cut = VALID_TEXT.index('"Schedule demo"') + 5
+        result = parse_json_lenient(VALID_TEXT[:cut])
+        assert result["tasks"][0] == VALID["tasks"][0]
+
+    def test_unrecoverable(self):
+        with pytest.raises(ValueError):
+            parse_json_lenient("No tasks or deals found.")
+
+
+class TestValueCoercion:
+    def test_amounts(self):
+        assert parse_amount(5000000) == 5000000
+        assert parse_amount("5,000,000") == 5000000
+        assert parse_amount("₹50L") == 5000000
+        assert parse_amount("1.5 Cr") == 15000000
+        assert parse_amount("unknown") == 0
+
+    def test_confidence_and_probability(self):
+        assert parse_confidence("80%") == 0.8
+        assert parse_confidence(90) == 0.9
+        assert parse_confidence("high") == 0.5
+        assert parse_probability(0.4) == 40
+        assert parse_probability("40%") == 40
+        assert parse_probability(75) == 75
+
+
+class TestEnumMapping:
+    def test_priority(self):
+        assert parse_priority("High") == "high"
+        assert parse_priority("urgent") == "high"
+        assert parse_priority("normal") == "medium"
+        assert parse_priority("minor") == "low"
+        assert parse_priority("whenever") == "medium"
+
+    def test_stage(self):
+        assert parse_stage("Negotiation") == "negotiation"
+        assert parse_stage("Closed Won") == "closed"
+        assert parse_stage("closed-lost") == "closed"
+        assert parse_stage("demo") == "qualified"
+        assert parse_stage("proposal sent") == "proposal"
+        assert parse_stage("???") == "lead"
+
+    def test_currency(self):
+        assert parse_currency("usd") == "USD"
+        assert parse_currency("€") == "EUR"
+        assert parse_currency("Rs.") == "INR"
+        assert parse_currency("JPY") == "INR"
+
+    def test_due_date(self):
+        assert parse_due_date("2026-03-05") == "2026-03-05"
+        assert parse_due_date("2026-03-05T10:00:00Z") == "2026-03-05"
+        assert parse_due_date("5 March 2026") == "2026-03-05"
+        assert parse_due_date("next Friday") == ""
+
+
+class TestExtractionSchema:
+    def setup_method(self):
+        response_format = extraction_response_format()
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["strict"] is True
+        self.schema = response_format["json_schema"]["schema"]
+        self.defs = self.schema["$defs"]
+
+    def test_enums_match_models(self):
+        assert self.defs["DealStage"]["enum"] == [stage.value for stage in DealStage]
+        assert self.defs["TaskPriority"]["enum"] == [priority.value for priority in TaskPriority]
+        currency = self.defs["DealExtraction"]["properties"]["currency"]
+        assert currency["enum"] == VALID_CURRENCIES
+
+    def test_ranges_and_dates(self):
+        deal = self.defs["DealExtraction"]["properties"]
+        assert (deal["probability"]["minimum"], deal["probability"]["maximum"]) == (0, 100)
+        assert (deal["confidence"]["minimum"], deal["confidence"]["maximum"]) == (0, 1)
+        due_date = self.defs["TaskExtraction"]["properties"]["due_date"]
+        assert {"type": "string", "format": "date"} in due_date["anyOf"]
+
+    def test_strict_mode_requirements(self):
+        for node in [self.schema, self.defs["TaskExtraction"], self.defs["DealExtraction"]]:
+            assert node["additionalProperties"] is False
+            assert set(node["required"]) == set(node["properties"])
+
+
+class TestExtractionNormalizer:
+    def setup_method(self):
+        self.normalizer = ExtractionNormalizer()
+
+    def test_aliases_and_defaults(self):
+        result = self.normalizer.parse_and_normalize(CORPUS[5])
+        task = result["tasks"][0]
+        assert task["title"] == "Call back"
+        assert task["confidence"] == 0.8
+        assert task["description"] == "Call back"
+        assert task["priority"] == "medium"
+
+        deal = self.normalizer.parse_and_normalize(CORPUS[9])["deals"][0]
+        assert deal["title"] == "Fleet deal"
+        assert deal["value"] == 15000000
+        assert deal["probability"] == 40
+        assert deal["currency"] == "INR"
+
+    def test_null_fields_use_defaults(self):
+        task = self.normalizer.parse_and_normalize(CORPUS[6])["tasks"][0]
+        assert task["title"] == "Share brochure"
+        assert task["priority"] == "high"
+        assert task["due_date"] == ""
+
+    def test_bad_items_dropped_individually(self):
+        result = self.normalizer.parse_and_normalize(CORPUS[12])
+        assert [task["title"] for task in result["tasks"]] == ["Plain string task"]
+
+    def test_bare_list(self):
+        result = self.normalizer.parse_and_normalize(CORPUS[10])
+        assert [t["title"] for t in result["tasks"]] == ["Bare list task"]
+        assert [d["title"] for d in result["deals"]] == ["Bare list deal"]
+
+    def test_corpus_never_raises(self):
+        for text in CORPUS:
+            result = self.normalizer.parse_and_normalize(text)
+            assert set(result) == {"tasks", "deals"}
+            for task in result["tasks"]:
+                assert 0.0 <= task["confidence"] <= 1.0
+                assert task["title"]
+
+    def test_fuzz_truncation_and_mutation(self):
+        rng = random.Random(1234)
+        first_task_end = VALID_TEXT.index("}") + 1
+        for _ in range(500):
+            text = VALID_TEXT
+            if rng.random() < 0.5:
+                # Truncate anywhere
+                text = text[:rng.randint(0, len(text))]
+            else:
+                # Delete, duplicate or insert a structural character
+                pos = rng.randint(0, len(text) - 1)
+                op = rng.choice(["delete", "duplicate", "insert"])
+                if op == "delete":
+                    text = text[:pos] + text[pos + 1:]
+                elif op == "duplicate":
+                    text = text[:pos] + text[pos] + text[pos:]
+                else:
+                    text = text[:pos] + rng.choice(',:{}[]"') + text[pos:]
+
+            result = self.normalizer.parse_and_normalize(text)
+            assert set(result) == {"tasks", "deals"}
+            if text == VALID_TEXT[:len(text)] and len(text) > first_task_end:
+                # Any truncation after the first task still recovers it
+                assert result["tasks"] and result["tasks"][0]["title"] == "Send proposal"
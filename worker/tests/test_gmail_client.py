@@ -0,0 +1,129 @@
+import base64
+import email
+import json
+from email import policy
+
+from src.models import EmailLog
+from src.services.gmail_client import FULL_FORMAT_FIELDS, GmailClient
+from src.utils import as_message
+
+MIME = (
+    b"From: =?utf-8?q?J=C3=BCrgen?= <j@example.de>\n"
+    b"To: sales@example.com\n"
+    b"Subject: Quote\n"
+    b"Message-ID: <q1@example.de>\n"
+    b"In-Reply-To: <q0@example.com>\n"
+    b'Content-Type: multipart/mixed; boundary="m"\n\n'
+    b"--m\n"
+    b'Content-Type: multipart/alternative; boundary="a"\n\n'
+    b"--a\n"
+    b"Content-Type: text/plain; charset=iso-8859-1\n"
+    b"Content-Transfer-Encoding: quoted-printable\n\n"
+    b"Bitte 200 St=FCck anbieten.\n"
+    b"--a\n"
+    b"Content-Type: text/html; charset=utf-8\n\n"
+    b"<p>Bitte 200 St\xc3\xbcck anbieten.</p>\n"
+    b"--a--\n"
+    b"--m\n"
+    b"Content-Type: application/pdf\n"
+    b'Content-Disposition: attachment; filename="spec.pdf"\n'
+    b"Content-Transfer-Encoding: base64\n\n" + base64.encodebytes(b"%PDF" * 5000) +
+    b"--m--\n"
+)
+
+
+def gmail_part(part, attachments, text_inline=True):
+    """A MIME part in the shape messages.get(format='full') returns"""
+    result = {"mimeType": part.get_content_type(), "headers": [{"name": k, "value": v} for k, v in part.items()]}
+    if part.is_multipart():
+        result["body"] = {"size": 0}
+        result["parts"] = [gmail_part(child, attachments, text_inline) for child in part.get_payload()]
+        return result
+    data = part.get_payload(decode=True)
+    encoded = base64.urlsafe_b64encode(data).decode().rstrip("=")
+    if part.get_filename() or not text_inline:
+        attachment_id = f"att-{len(attachments)}"
+        attachments[attachment_id] = encoded
+        result["body"] = {"size": len(data), "attachmentId": attachment_id}
+    else:
+        result["body"] = {"size": len(data), "data": encoded}
+    return result
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        # Responses are JSON on the wire
+        return json.loads(json.dumps(self.response))
+
+
+class FakeGmailService:
+    def __init__(self, raw, text_inline=True):
+        self.raw = raw
+        self.attachments_store = {}
+        self.payload = gmail_part(email.message_from_bytes(raw, policy=policy.compat32), self.attachments_store, text_inline)
+        self.calls = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def attachments(self):
+        return self
+
+    def get(self, **kwargs):
+        self.calls.append(kwargs)
+        if "messageId" in kwargs:
+            return FakeRequest({"size": 0, "data": self.attachments_store[kwargs["id"]]})
+        if kwargs["format"] == "raw":
+            return FakeRequest({"id": kwargs["id"], "threadId": "t1", "raw": base64.urlsafe_b64encode(self.raw).decode()})
+        return FakeRequest({"id": kwargs["id"], "threadId": "t1", "payload": self.payload})
+
+
+def make_client(fetch_format="full", max_part_bytes=262144):
+    client = GmailClient()
+    client.fetch_format = fetch_format
+    client.max_part_bytes = max_part_bytes
+    return client
+
+
+def workflow_hash(email_data):
+    message = as_message(email_data.get("message") or email_data["mime_content"])
+    return EmailLog.generate_message_hash(message.message_id, message.body_digest())
+
+
+class TestStructuredFetch:
+    def test_fetches_text_parts_only(self):
+        service = FakeGmailService(MIME)
+        email_data = make_client()._fetch_email_content(service, "g1")
+
+        assert service.calls == [{"userId": "me", "id": "g1", "format": "full", "fields": FULL_FORMAT_FIELDS}]
+        message = email_data["message"]
+        assert message.subject == "Quote"
+        assert message.from_header == "Jürgen <j@example.de>"
+        assert message.get("X-Gmail-Thread-Id") == "t1"
+        assert message.text_content() == "Bitte 200 Stück anbieten."
+        assert message.has_attachments()
+        assert email_data["body"] == "Bitte 200 Stück anbieten."
+
+    def test_separately_served_text_is_fetched_up_to_the_limit(self):
+        service = FakeGmailService(MIME, text_inline=False)
+        email_data = make_client()._fetch_email_content(service, "g1")
+        fetched = [call["id"] for call in service.calls if "messageId" in call]
+        # Both text parts, never the PDF
+        assert fetched == ["att-0", "att-1"]
+        assert email_data["body"] == "Bitte 200 Stück anbieten."
+
+        service = FakeGmailService(MIME, text_inline=False)
+        email_data = make_client(max_part_bytes=10)._fetch_email_content(service, "g1")
+        assert not [call for call in service.calls if "messageId" in call]
+        assert email_data["body"] == ""
+
+    def test_same_idempotency_hash_as_raw_fetch(self):
+        full = make_client("full")._fetch_email_content(FakeGmailService(MIME), "g1")
+        raw = make_client("raw")._fetch_email_content(FakeGmailService(MIME), "g1")
+        assert workflow_hash(full) == workflow_hash(raw)
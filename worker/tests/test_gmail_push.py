@@ -0,0 +1,194 @@
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+from src.services.gmail_poller import GmailPoller
+from src.services.gmail_push import GmailPushHandler, decode_push_envelope
+from src.services.gmail_simulator import GmailPushSimulator
+from src.services.gmail_triage import GmailTriage
+from src.services.poll_leases import InMemoryLeaseStore, PollLeaseManager
+
+
+def rfq(n, sender="buyer@customer.com", **headers):
+    extra = "".join(f"{name.replace('_', '-')}: {value}\n" for name, value in headers.items())
+    return (
+        f"From: Buyer <{sender}>\nTo: sales@example.com\nSubject: RFQ {n}\nMessage-ID: <rfq-{n}@customer.com>\n"
+        f"{extra}Content-Type: text/plain; charset=utf-8\n\nPlease quote {n}00 units.\n"
+    ).encode()
+
+
+class FakeWorkflow:
+    db_client = None
+
+    def __init__(self, delay=0):
+        self.received = []
+        self.delay = delay
+
+    async def process_emails_batch(self, contents, source="gmail", user_id=None):
+        await asyncio.sleep(self.delay)
+        self.received.extend(content.subject for content in contents)
+        return [{"status": "success", "results": {"tasks_created": 1, "deals_created": 0}} for _ in contents]
+
+
+def make_push(delay=0):
+    simulator = GmailPushSimulator()
+    leases = PollLeaseManager(InMemoryLeaseStore(), partitions=1, lease_ttl=30, heartbeat_interval=10, owner="a")
+    leases.rebalance()
+    poller = GmailPoller(FakeWorkflow(delay), leases=leases)
+    poller.triage = GmailTriage(max_size_bytes=1_000_000, skip_senders=[])
+    poller.gmail_client.get_service = simulator.service_for
+    poller.gmail_client.fetch_format = "full"
+    push = GmailPushHandler(poller, topic_name=simulator.TOPIC, fallback_minutes=60, verification_token="s3cret")
+    poller.push = push
+    return simulator, poller, push
+
+
+class TestPushEnvelope:
+    def test_decode(self):
+        data = base64.b64encode(json.dumps({"emailAddress": "a@b.com", "historyId": 4321}).encode()).decode()
+        assert decode_push_envelope({"message": {"data": data, "messageId": "1"}}) == ("a@b.com", 4321)
+        for envelope in (None, {}, {"message": {"data": "not base64!"}}, {"message": {"data": base64.b64encode(b"{}").decode()}}):
+            with pytest.raises(ValueError):
+                decode_push_envelope(envelope)
+
+    def test_verification_token(self):
+        _, _, push = make_push()
+        assert push.verify_token("s3cret")
+        assert not push.verify_token("wrong")
+        assert not push.verify_token(None)
+
+
+class TestPushSync:
+    def test_notification_syncs_only_new_messages(self):
+        async def scenario():
+            simulator, poller, push = make_push()
+            simulator.deliver("u1", rfq(1))
+            watch = await push.ensure_watch("u1")
+            assert watch["email_address"] == "u1@simulator.local"
+
+            simulator.deliver("u1", rfq(2))
+            simulator.deliver("u1", rfq(3, sender="noreply@tool.example"))
+            envelope = simulator.push_envelope("u1")
+            assert (await push.handle_envelope(envelope))["status"] == "scheduled"
+            result = await push.wait_for_sync("u1")
+
+            # Only what arrived after the watch; the machine sender is triaged out on headers
+            assert poller.workflow.received == ["RFQ 2"]
+            assert result["emails_triaged"] == {"sender_rule": 1}
+            assert result["history_id"] == str(simulator.mailbox("u1").history_id)
+            assert "messages.list" not in simulator.service_for("u1").calls
+
+            # Pub/Sub redelivery, and mail for a mailbox nobody watches
+            assert (await push.handle_envelope(envelope))["status"] == "stale"
+            assert (await push.handle_envelope(simulator.push_envelope("stranger")))["status"] == "unknown_mailbox"
+            assert (await push.handle_envelope({"message": {}}))["status"] == "invalid"
+
+        asyncio.run(scenario())
+
+    def test_notifications_during_a_sync_are_coalesced(self):
+        async def scenario():
+            simulator, poller, push = make_push(delay=0.05)
+            await push.ensure_watch("u1")
+            statuses = []
+            for n in range(1, 5):
+                simulator.deliver("u1", rfq(n))
+                statuses.append((await push.handle_envelope(simulator.push_envelope("u1")))["status"])
+            await push.wait_for_sync("u1")
+
+            assert statuses == ["scheduled", "coalesced", "coalesced", "coalesced"]
+            assert simulator.service_for("u1").calls.count("history.list") == 2
+            assert sorted(poller.workflow.received) == ["RFQ 1", "RFQ 2", "RFQ 3", "RFQ 4"]
+
+        asyncio.run(scenario())
+
+
+    def test_history_beyond_max_emails_is_synced_without_skipping(self):
+        async def scenario():
+            simulator, poller, push = make_push()
+            poller.max_emails_per_poll = 2
+            await push.ensure_watch("u1")
+            start = simulator.mailbox("u1").history_id
+            for n in range(1, 6):
+                simulator.deliver("u1", rfq(n))
+
+            # One listing stops at max_results, with the cursor on the last record it took
+            service = simulator.service_for("u1")
+            listed, cursor, complete = poller.gmail_client.list_history(service, str(start), "INBOX", 2)
+            assert len(listed) == 2 and not complete
+            assert int(cursor) < simulator.mailbox("u1").history_id
+            rest, _, complete = poller.gmail_client.list_history(service, cursor, "INBOX", 10)
+            assert len(rest) == 3 and complete
+
+            # A notification syncs in max_emails_per_poll steps until the history is exhausted
+            await push.handle_envelope(simulator.push_envelope("u1"))
+            result = await push.wait_for_sync("u1")
+            assert poller.workflow.received == [f"RFQ {n}" for n in range(1, 6)]
+            assert result["history_id"] == str(simulator.mailbox("u1").history_id)
+            assert "history_more" not in result
+
+        asyncio.run(scenario())
+
+
+    def test_notification_for_another_replicas_user_is_refused(self):
+        async def scenario():
+            simulator, poller, push = make_push()
+            await push.ensure_watch("u1")
+            simulator.deliver("u1", rfq(1))
+            # Replica b shares the lease store but holds no partition
+            b = PollLeaseManager(poller.leases.store, partitions=1, lease_ttl=30, heartbeat_interval=10, owner="b")
+            b.rebalance()
+            poller_b = GmailPoller(FakeWorkflow(), leases=b)
+            push_b = GmailPushHandler(poller_b, topic_name=simulator.TOPIC)
+            assert (await push_b.handle_envelope(simulator.push_envelope("u1")))["status"] == "not_owner"
+            assert not push_b.sync_running("u1")
+            assert (await push.handle_envelope(simulator.push_envelope("u1")))["status"] == "scheduled"
+            await push.wait_for_sync("u1")
+            assert poller.workflow.received == ["RFQ 1"] and poller_b.workflow.received == []
+
+        asyncio.run(scenario())
+
+
+class TestFallbackAndRenewal:
+    def test_idle_mailbox_costs_one_history_call(self):
+        async def scenario():
+            simulator, poller, push = make_push()
+            simulator.deliver("u1", rfq(1))
+            await push.ensure_watch("u1")
+            service = simulator.service_for("u1")
+
+            # First loop after start-up: full catch-up poll
+            await push.fallback_sync("u1")
+            assert poller.workflow.received == ["RFQ 1"]
+            assert "messages.list" in service.calls
+
+            assert await push.fallback_sync("u1", now=time.monotonic() + 60) is None
+            service.calls.clear()
+            result = await push.fallback_sync("u1", now=time.monotonic() + 3601)
+            assert service.calls == ["history.list"]
+            assert result["emails_fetched"] == 0
+
+        asyncio.run(scenario())
+
+    def test_watch_is_renewed_ahead_of_expiry_keeping_the_cursor(self):
+        async def scenario():
+            simulator, poller, push = make_push()
+            watch = await push.ensure_watch("u1")
+            simulator.deliver("u1", rfq(1))
+            service = simulator.service_for("u1")
+            service.calls.clear()
+
+            assert await push.ensure_watch("u1") == watch
+            assert service.calls == []
+
+            renewed = await push.ensure_watch("u1", now=watch["expiration"] / 1000 - 3600)
+            assert service.calls == ["watch"]
+            assert renewed["history_id"] == watch["history_id"]
+            assert poller.leases.find_watch_user("U1@simulator.local") == "u1"
+
+            poller.forget_user("u1")
+            assert poller.leases.find_watch_user("u1@simulator.local") is None
+
+        asyncio.run(scenario())
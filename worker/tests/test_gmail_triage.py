@@ -0,0 +1,147 @@
+import asyncio
+import base64
+
+from src.services.gmail_poller import GmailPoller
+from src.services.gmail_triage import AUTOMATED, DUPLICATE, SENDER_RULE, TOO_LARGE, GmailTriage
+from src.services.poll_leases import InMemoryLeaseStore, PollLeaseManager
+
+
+def metadata(message_id, sender, thread_id=None, size=5000, **headers):
+    header_list = [{"name": "From", "value": sender}, {"name": "Subject", "value": f"Message {message_id}"}]
+    header_list += [{"name": name.replace("_", "-"), "value": value} for name, value in headers.items()]
+    return {"id": message_id, "threadId": thread_id or message_id, "sizeEstimate": size, "payload": {"headers": header_list}}
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service, self.callback, self.requests = service, callback, []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches += 1
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+
+class FakeGmailService:
+    def __init__(self, messages):
+        self.messages_by_id = {message["id"]: message for message in messages}
+        self.full_fetches = []
+        self.metadata_fetches = []
+        self.batches = 0
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, **kwargs):
+        return FakeRequest({"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in self.messages_by_id.values()]})
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def get(self, userId, id, format, fields=None, metadataHeaders=None):
+        message = self.messages_by_id[id]
+        if format == "metadata":
+            self.metadata_fetches.append(id)
+            return FakeRequest(message)
+        self.full_fetches.append(id)
+        body = base64.urlsafe_b64encode(b"Please send a quote for 200 units.").decode()
+        payload = {"mimeType": "text/plain", "headers": message["payload"]["headers"], "body": {"data": body}}
+        return FakeRequest({"id": id, "threadId": message["threadId"], "payload": payload})
+
+
+class FakeWorkflow:
+    db_client = None
+
+    def __init__(self):
+        self.received = []
+
+    async def process_emails_batch(self, contents, source="gmail", user_id=None):
+        self.received.extend(content.subject for content in contents)
+        return [{"status": "success", "results": {"tasks_created": 1, "deals_created": 0}} for _ in contents]
+
+
+def make_poller(service):
+    leases = PollLeaseManager(InMemoryLeaseStore(), partitions=1, lease_ttl=30, heartbeat_interval=10, owner="a")
+    poller = GmailPoller(FakeWorkflow(), leases=leases)
+    poller.triage = GmailTriage(max_size_bytes=1_000_000, skip_senders=["@spam.example"])
+    poller.gmail_client.get_service = lambda user_id: service
+    poller.gmail_client.fetch_format = "full"
+    return poller
+
+
+class TestGmailTriage:
+    def test_header_rules(self):
+        triage = GmailTriage(max_size_bytes=1000, skip_senders=["spam.example", "boss@corp.example"])
+        assert triage.check("u", metadata("1", "Buyer <buyer@customer.com>", size=500)) is None
+        assert triage.check("u", metadata("2", "buyer@customer.com", size=5000)) == TOO_LARGE
+        assert triage.check("u", metadata("3", "GitHub <noreply@github.com>", size=500)) == SENDER_RULE
+        assert triage.check("u", metadata("4", "x@spam.example", size=500)) == SENDER_RULE
+        assert triage.check("u", metadata("5", "boss@corp.example", size=500)) == SENDER_RULE
+        assert triage.check("u", metadata("6", "team@saas.example", size=500, List_Unsubscribe="<mailto:u@x>")) == AUTOMATED
+        assert triage.check("u", metadata("7", "me@corp.example", size=500, Auto_Submitted="auto-replied")) == AUTOMATED
+        assert triage.check("u", metadata("8", "me@corp.example", size=500, Precedence="bulk")) is None
+        assert triage.check("u", metadata("9", "me@corp.example", size=500, Auto_Submitted="no")) is None
+
+    def test_google_group_deliveries_are_kept(self):
+        triage = GmailTriage(skip_senders=[])
+        # A customer writing to a sales@ group alias: Google Groups adds list headers
+        group = {
+            "List_Id": "<sales.corp.example>", "Precedence": "list", "Mailing_List": "list sales@corp.example",
+            "X_Google_Group_Id": "123456", "List_Unsubscribe": "<mailto:sales+unsubscribe@corp.example>",
+        }
+        assert triage.check("u", metadata("1", "buyer@customer.com", **group)) is None
+        assert triage.check("u", metadata("2", "buyer@customer.com", List_Id="<sales.corp.example>")) is None
+        # No size limit by default - attachments don't make a lead less worth reading
+        assert triage.check("u", metadata("3", "buyer@customer.com", size=40 * 1024 * 1024)) is None
+
+    def test_seen_messages_and_sales_threads(self):
+        triage = GmailTriage(max_size_bytes=0, skip_senders=[], max_seen=2)
+        triage.mark_seen("u", "1", "t1", sales_lead=True)
+        assert triage.check("u", metadata("1", "buyer@customer.com")) == DUPLICATE
+        assert not triage.is_seen("other", "1")
+        # A ticketing-tool reply in a sales thread still gets through
+        reply = metadata("2", "support@customer.com", thread_id="t1", List_Id="<tickets.customer.com>")
+        assert triage.check("u", reply) is None
+        triage.mark_seen("u", "3")
+        triage.mark_seen("u", "4")
+        assert not triage.is_seen("u", "1")
+
+
+class TestTriagedPolling:
+    def test_only_survivors_are_downloaded(self):
+        service = FakeGmailService([
+            metadata("m1", "Buyer <buyer@customer.com>"),
+            metadata("m2", "Vendor <hello@vendor.example>", List_Unsubscribe="<https://vendor.example/u>"),
+            metadata("m3", "alerts@bank.example"),
+            metadata("m4", "someone@spam.example"),
+            metadata("m5", "Buyer <buyer2@customer.com>", size=5_000_000),
+        ])
+        poller = make_poller(service)
+
+        result = asyncio.run(poller.poll_user("u1"))
+        assert service.full_fetches == ["m1"]
+        assert service.batches == 1
+        assert poller.workflow.received == ["Message m1"]
+        assert result["emails_triaged"] == {AUTOMATED: 1, SENDER_RULE: 2, TOO_LARGE: 1}
+
+        # Next poll lists the same messages: nothing is downloaded again, not even metadata
+        service.metadata_fetches.clear()
+        result = asyncio.run(poller.poll_user("u1"))
+        assert service.metadata_fetches == []
+        assert service.full_fetches == ["m1"]
+        assert result["emails_triaged"] == {DUPLICATE: 5}
+        assert poller.triage.get_stats()["skipped_ratio"] == 0.9
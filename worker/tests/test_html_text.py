@@ -0,0 +1,52 @@
+from src.utils import LazyMessage
+from src.utils.html_text import html_to_text
+
+
+class TestHtmlToText:
+    def test_drops_scripts_styles_and_hidden_content(self):
+        html = (
+            "<html><head><title>Offer</title><style>p{color:red}</style></head><body>"
+            '<div style="display: none; max-height: 0">Preheader&zwnj;&nbsp;&zwnj;</div>'
+            "<span hidden>hidden</span><script>var p = '<p>no</p>';</script>"
+            '<p>Please <a href="https://click.example.com/track?id=123">quote</a>&nbsp;200 units.</p>'
+            '<img src="https://open.example.com/pixel.gif" width="1" height="1"></body></html>'
+        )
+        assert html_to_text(html) == "Please quote 200 units."
+
+    def test_keeps_paragraph_list_and_table_structure(self):
+        html = (
+            "<p>Hi team,<br>please quote:</p>"
+            "<table><tr><th><p>Item</p></th><th><p>Qty</p></th></tr><tr><td>Steel  pipe<td>200</table>"
+            "<ul><li>Delivery to Pune<ul><li>by March</li></ul></li><li>Net 30</li></ul>"
+            "<ol><li>one</li><li>two</li></ol>"
+        )
+        assert html_to_text(html) == (
+            "Hi team,\nplease quote:\n\nItem | Qty\nSteel pipe | 200\n\n"
+            "- Delivery to Pune\n  - by March\n- Net 30\n\n1. one\n2. two"
+        )
+
+    def test_layout_table_rows_are_paragraphs(self):
+        html = (
+            '<table width="600"><tr><td><table><tr><td><h2>News</h2><p>We shipped it.</p></td></tr>'
+            "<tr><td>You are receiving this because you signed up.</td></tr></table></td></tr></table>"
+        )
+        assert html_to_text(html) == "News\n\nWe shipped it.\n\nYou are receiving this because you signed up."
+
+    def test_output_is_capped(self):
+        html = "<table>" + "<tr><td>item</td><td>1</td></tr>" * 1000 + "</table>"
+        text = html_to_text(html, max_chars=50)
+        assert len(text) <= 50
+        assert text.startswith("item | 1\nitem | 1")
+
+    def test_html_only_email_uses_converted_text(self):
+        message = LazyMessage.from_content(
+            "From: a@b.com\nContent-Type: multipart/alternative; boundary=b\n\n"
+            "--b\nContent-Type: text/html; charset=iso-8859-1\nContent-Transfer-Encoding: quoted-printable\n\n"
+            "<p>Gr=FC=DFe</p><style>.x{}</style>\n--b--\n"
+        )
+        assert message.text_content() == "Grüße"
+        plain = LazyMessage.from_content(
+            "Content-Type: multipart/alternative; boundary=b\n\n"
+            "--b\nContent-Type: text/plain\n\nPlain\n--b\nContent-Type: text/html\n\n<p>Html</p>\n--b--\n"
+        )
+        assert plain.text_content() == "Plain"
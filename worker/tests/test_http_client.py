@@ -0,0 +1,34 @@
+from src.services.http_client import ConnectionStats, SharedHTTPClients, get_http_clients
+from src.services.openrouter_llm import OpenRouterLLM
+
+
+class TestConnectionStats:
+    def test_reuse_ratio(self):
+        stats = ConnectionStats()
+        stats.requests = 4
+        stats.trace("connection.connect_tcp.complete", {})
+        stats.trace("connection.start_tls.complete", {})
+        stats.trace("http2.send_request_headers.started", {})
+        data = stats.to_dict()
+        assert data["new_connections"] == 1
+        assert data["tls_handshakes"] == 1
+        assert data["reused_connections"] == 3
+        assert data["reuse_ratio"] == 0.75
+
+    def test_no_requests(self):
+        assert ConnectionStats().to_dict()["reuse_ratio"] is None
+
+
+class TestSharedHTTPClients:
+    def test_pool_limits(self):
+        clients = SharedHTTPClients(max_connections=8, max_keepalive_connections=4, http2=False)
+        assert clients.async_client is clients.async_client
+        assert clients.get_stats()["max_connections"] == 8
+        assert clients.get_stats()["http2"] is False
+
+    def test_llm_wrappers_share_clients(self):
+        first = OpenRouterLLM(model="model-a", api_key="test")
+        second = OpenRouterLLM(model="model-b", api_key="test", json_mode=False)
+        assert first.http_async_client is get_http_clients().async_client
+        assert first.http_async_client is second.http_async_client
+        assert first.http_client is second.http_client
@@ -0,0 +1,150 @@
+import asyncio
+
+from src.services.llm_rate_controller import (
+    TokenBucket, LLMRateController, is_rate_limit_error, is_retryable_error, retry_after_seconds
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+def make_controller(**overrides):
+    options = dict(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        initial_concurrency=4,
+        min_concurrency=1,
+        max_concurrency=8,
+        target_latency_seconds=10,
+        max_retries=2,
+        base_backoff_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+    options.update(overrides)
+    return LLMRateController(**options)
+
+
+class TestTokenBucket:
+    def test_consume_and_wait(self):
+        bucket = TokenBucket(rate_per_minute=60)
+        assert bucket.time_until_available(60) == 0
+        bucket.consume(60)
+        # One token per second
+        assert 0.9 < bucket.time_until_available(1) <= 1.0
+
+    def test_refund_capped_at_capacity(self):
+        bucket = TokenBucket(rate_per_minute=60)
+        bucket.refund(100)
+        assert bucket.tokens == 60
+
+    def test_oversized_request_waits_for_full_bucket(self):
+        bucket = TokenBucket(rate_per_minute=60)
+        assert bucket.time_until_available(500) == 0
+
+
+class TestErrorDetection:
+    def test_rate_limit(self):
+        assert is_rate_limit_error(FakeAPIError(429))
+        assert is_rate_limit_error(Exception("Rate limit exceeded"))
+        assert not is_rate_limit_error(FakeAPIError(400))
+        assert is_rate_limit_error(Exception("Error code: 429 - provider returned error"))
+        assert is_rate_limit_error(Exception("HTTP/1.1 429"))
+        assert not is_rate_limit_error(Exception("Request req_84291 failed after 1429 tokens"))
+        assert not is_rate_limit_error(ValueError("expected 4290 characters"))
+
+    def test_retryable(self):
+        assert is_retryable_error(FakeAPIError(503))
+        assert is_retryable_error(asyncio.TimeoutError())
+        assert not is_retryable_error(FakeAPIError(401))
+        assert not is_retryable_error(ValueError("bad json"))
+
+    def test_retry_after(self):
+        assert retry_after_seconds(FakeAPIError(429, {"retry-after": "3"})) == 3.0
+        assert retry_after_seconds(FakeAPIError(429)) is None
+        assert retry_after_seconds(ValueError("no response")) is None
+
+
+class TestLLMRateController:
+    def test_retries_rate_limit_and_shrinks_window(self):
+        controller = make_controller()
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise FakeAPIError(429, {"retry-after": "0"})
+            return "ok"
+
+        assert asyncio.run(controller.run(call, estimated_tokens=100)) == "ok"
+        assert len(attempts) == 2
+        # Halved to 2 by the 429, then +1/window for the success
+        assert controller.window == 2.5
+        stats = controller.get_stats()
+        assert stats["rate_limited"] == 1
+        assert stats["retries"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_non_retryable_error_raises(self):
+        controller = make_controller()
+
+        async def call():
+            raise FakeAPIError(401)
+
+        try:
+            asyncio.run(controller.run(call))
+            assert False, "expected error"
+        except FakeAPIError:
+            pass
+        assert controller.get_stats()["failures"] == 1
+
+    def test_window_limits_concurrency(self):
+        controller = make_controller(initial_concurrency=2, max_concurrency=2)
+        peak = {"current": 0, "max": 0}
+
+        async def call():
+            peak["current"] += 1
+            peak["max"] = max(peak["max"], peak["current"])
+            await asyncio.sleep(0.01)
+            peak["current"] -= 1
+            return True
+
+        async def run_all():
+            return await asyncio.gather(*[controller.run(call) for _ in range(6)])
+
+        assert all(asyncio.run(run_all()))
+        assert peak["max"] == 2
+
+    def test_cancelled_call_releases_its_slot(self):
+        controller = make_controller(initial_concurrency=1, max_concurrency=1)
+
+        async def hung():
+            await asyncio.sleep(10)
+
+        async def quick():
+            return "ok"
+
+        async def scenario():
+            task = asyncio.create_task(controller.run(hung))
+            await asyncio.sleep(0.01)
+            assert controller.in_flight == 1
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            assert controller.in_flight == 0
+            # The single slot is usable again
+            return await asyncio.wait_for(controller.run(quick), timeout=1)
+
+        assert asyncio.run(scenario()) == "ok"
+        assert controller.get_stats()["in_flight"] == 0
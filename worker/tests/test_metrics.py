@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+from prometheus_client import REGISTRY
+
+from src.services import metrics
+from src.services.gmail_poller import GmailPoller
+from src.services.poll_leases import InMemoryLeaseStore, PollLeaseManager
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestLLMCalls:
+    def test_status_by_outcome(self):
+        model = "test/llm-metrics"
+
+        async def scenario():
+            with metrics.track_llm_call(model):
+                await asyncio.sleep(0)
+            with pytest.raises(RuntimeError):
+                with metrics.track_llm_call(model):
+                    raise RuntimeError("Error code: 429 - rate limit exceeded")
+            with pytest.raises(RuntimeError):
+                with metrics.track_llm_call(model):
+                    raise RuntimeError("Error code: 500")
+
+            async def hung():
+                with metrics.track_llm_call(model):
+                    await asyncio.sleep(10)
+
+            task = asyncio.create_task(hung())
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+        for status in ("ok", "rate_limited", "error", "cancelled"):
+            assert sample("worker_llm_request_duration_seconds_count", model=model, status=status) == 1
+
+
+class TestDynamoDBCalls:
+    def test_operations_and_error_codes(self):
+        client = boto3.client("dynamodb", region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="x")
+        metrics.instrument_dynamodb_client(client)
+        before_get = sample("worker_dynamodb_request_duration_seconds_count", operation="GetItem", status="ok")
+        before_put = sample(
+            "worker_dynamodb_request_duration_seconds_count", operation="PutItem", status="ConditionalCheckFailedException"
+        )
+
+        with Stubber(client) as stubber:
+            stubber.add_response("get_item", {})
+            stubber.add_client_error("put_item", "ConditionalCheckFailedException")
+            client.get_item(TableName="t", Key={"k": {"S": "a"}})
+            with pytest.raises(client.exceptions.ConditionalCheckFailedException):
+                client.put_item(TableName="t", Item={"k": {"S": "a"}})
+
+        assert sample("worker_dynamodb_request_duration_seconds_count", operation="GetItem", status="ok") == before_get + 1
+        assert sample(
+            "worker_dynamodb_request_duration_seconds_count", operation="PutItem", status="ConditionalCheckFailedException"
+        ) == before_put + 1
+
+
+class TestGmailCalls:
+    def test_calls_bytes_and_errors(self):
+        listing = json.dumps({"messages": [{"id": "m1", "threadId": "t1"}]})
+        http = HttpMockSequence([({"status": "200"}, listing), ({"status": "404"}, '{"error": {"code": 404}}')])
+        service = build("gmail", "v1", http=http, requestBuilder=metrics.InstrumentedHttpRequest, static_discovery=True)
+        before = {
+            "ok": sample("worker_gmail_api_requests_total", method="messages.list", status="200"),
+            "bytes": sample("worker_gmail_api_response_bytes_total", method="messages.list"),
+            "missing": sample("worker_gmail_api_requests_total", method="history.list", status="404"),
+            "timed": sample("worker_gmail_api_request_duration_seconds_count", method="history.list"),
+        }
+
+        assert service.users().messages().list(userId="me").execute()["messages"][0]["id"] == "m1"
+        with pytest.raises(HttpError):
+            service.users().history().list(userId="me", startHistoryId="1").execute()
+
+        assert sample("worker_gmail_api_requests_total", method="messages.list", status="200") == before["ok"] + 1
+        assert sample("worker_gmail_api_response_bytes_total", method="messages.list") == before["bytes"] + len(listing)
+        assert sample("worker_gmail_api_requests_total", method="history.list", status="404") == before["missing"] + 1
+        assert sample("worker_gmail_api_request_duration_seconds_count", method="history.list") == before["timed"] + 1
+
+
+class FakeWorkflow:
+    db_client = None
+
+    def __init__(self):
+        self.backlog_seen = []
+
+    async def process_emails_batch(self, contents, source="gmail", user_id=None):
+        self.backlog_seen.append(sample("worker_gmail_backlog_emails"))
+        return [{"status": "skipped"} for _ in contents]
+
+
+class TestStateGauges:
+    def test_poll_lag_and_queue_depth(self):
+        synced = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+        metrics.observe_state(
+            jobs={"pending": 3, "running": 1},
+            llm={"in_flight": 2, "waiting": 5, "concurrency_window": 4.5},
+            last_poll={"u1": synced.timestamp(), "u2": synced.timestamp()},
+            now=synced.timestamp() + 90
+        )
+        assert sample("worker_job_queue_jobs", status="pending") == 3
+        assert sample("worker_llm_waiting") == 5
+        assert sample("worker_gmail_poll_lag_seconds", user_id="u1") == 90
+
+        # Users no longer synced drop out
+        metrics.observe_state(last_poll={"u1": synced.timestamp()}, now=synced.timestamp() + 120)
+        assert sample("worker_gmail_poll_lag_seconds", user_id="u1") == 120
+        assert REGISTRY.get_sample_value("worker_gmail_poll_lag_seconds", {"user_id": "u2"}) is None
+
+    def test_gmail_backlog_drains(self):
+        leases = PollLeaseManager(InMemoryLeaseStore(), partitions=1, lease_ttl=30, heartbeat_interval=10, owner="a")
+        poller = GmailPoller(FakeWorkflow(), leases=leases)
+        poller.triage = None
+        poller.batch_size = 2
+        emails = [{"gmail_id": str(n), "mime_content": "From: a@b.com\n\nHi"} for n in range(5)]
+        before = sample("worker_gmail_backlog_emails")
+
+        asyncio.run(poller._process_emails("u1", emails, {}))
+        assert poller.workflow.backlog_seen == [before + 5, before + 3, before + 1]
+        assert sample("worker_gmail_backlog_emails") == before
+
+    def test_poll_lag_counts_empty_polls_of_owned_users_only(self):
+        leases = PollLeaseManager(InMemoryLeaseStore(), partitions=1, lease_ttl=30, heartbeat_interval=10, owner="a")
+        poller = GmailPoller(FakeWorkflow(), leases=leases)
+        started = time.time()
+
+        async def scenario():
+            # A poll that finds nothing still counts
+            await poller._process_emails("u1", [], {})
+            assert poller.last_poll["u1"] >= started
+            assert "u1" not in poller.last_sync
+
+            # Exported only while this replica holds the user's lease
+            assert poller.owned_poll_times() == {}
+            await leases.start()
+            assert set(poller.owned_poll_times()) == {"u1"}
+            await leases.stop()
+            assert poller.owned_poll_times() == {}
+
+        asyncio.run(scenario())
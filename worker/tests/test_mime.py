@@ -0,0 +1,98 @@
+import base64
+
+from src.utils import BodyPart, LazyMessage, StructuredMessage, decode_header_value
+
+
+def multipart_email(attachment=b"%PDF-1.4 binary"):
+    return (
+        b"From: =?utf-8?q?J=C3=BCrgen?= <j@example.de>\r\n"
+        b"Subject: =?iso-8859-1?q?Angebot_f=FCr_Sie?=\r\n"
+        b"Message-ID: <m1@example.de>\r\n"
+        b'Content-Type: multipart/mixed; boundary="outer"\r\n'
+        b"\r\n"
+        b"preamble\r\n"
+        b"--outer\r\n"
+        b'Content-Type: multipart/alternative; boundary="inner"\r\n'
+        b"\r\n"
+        b"--inner\r\n"
+        b"Content-Type: text/plain; charset=iso-8859-1\r\n"
+        b"Content-Transfer-Encoding: quoted-printable\r\n"
+        b"\r\n"
+        b"Gr=FC=DFe aus M=FCnchen\r\n"
+        b"--inner\r\n"
+        b"Content-Type: text/html; charset=utf-8\r\n"
+        b"\r\n"
+        b"<p>ignored</p>\r\n"
+        b"--inner--\r\n"
+        b"--outer\r\n"
+        b"Content-Type: text/plain; charset=utf-8\r\n"
+        b"Content-Transfer-Encoding: base64\r\n"
+        b"\r\n" + base64.encodebytes("Preis: 100 €".encode()) +
+        b"--outer\r\n"
+        b"Content-Type: application/pdf\r\n"
+        b'Content-Disposition: attachment; filename="quote.pdf"\r\n'
+        b"Content-Transfer-Encoding: base64\r\n"
+        b"\r\n" + base64.encodebytes(attachment) +
+        b"--outer--\r\n"
+        b"epilogue\r\n"
+    )
+
+
+class TestLazyMessage:
+    def test_headers_are_decoded(self):
+        message = LazyMessage.from_content(multipart_email())
+        assert message.message_id == "<m1@example.de>"
+        assert message.subject == "Angebot für Sie"
+        assert message.from_header == "Jürgen <j@example.de>"
+        assert decode_header_value(None) == ""
+
+    def test_text_parts_honour_charset_and_encoding(self):
+        message = LazyMessage.from_content(multipart_email())
+        assert message.text_parts() == ["Grüße aus München", "Preis: 100 €"]
+        assert message.has_attachments()
+        assert [part.content_type for part in message.walk()] == [
+            "multipart/mixed", "multipart/alternative", "text/plain", "text/html", "text/plain", "application/pdf"
+        ]
+
+    def test_single_part_and_str_input(self):
+        message = LazyMessage.from_content("From: a@b.com\nSubject: Hi\n\nPlease send a quote.\n")
+        assert message.text_content() == "Please send a quote.\n"
+        assert not message.has_attachments()
+
+    def test_undeclared_charset_falls_back_to_utf8(self):
+        raw = b"Subject: x\nContent-Type: text/plain; charset=x-unknown\n\nna\xefve caf\xc3\xa9"
+        assert LazyMessage.from_content(raw).text_content() == "na�ve café"
+
+    def test_text_is_capped_per_part(self):
+        raw = b"Content-Type: text/plain\nContent-Transfer-Encoding: base64\n\n" + base64.encodebytes(b"a" * 10000)
+        assert LazyMessage.from_content(raw).text_content(max_chars=100) == "a" * 100
+
+    def test_body_digest_ignores_line_endings_and_attachments(self):
+        crlf = LazyMessage.from_content(multipart_email())
+        lf = LazyMessage.from_content(multipart_email().replace(b"\r\n", b"\n"))
+        assert crlf.body_digest() == lf.body_digest()
+        assert crlf.body_digest() == LazyMessage.from_content(multipart_email(b"other")).body_digest()
+        changed = multipart_email().replace(b"M=FCnchen", b"Berlin")
+        assert crlf.body_digest() != LazyMessage.from_content(changed).body_digest()
+
+    def test_body_digest_is_the_same_for_every_source(self):
+        raw = LazyMessage.from_content(multipart_email())
+        # The same email as Gmail format=full delivers it: decoded leaf parts, attachment not downloaded
+        structured = StructuredMessage(
+            [("From", "j@example.de"), ("Message-ID", "<m1@example.de>")],
+            [
+                BodyPart("text/plain", "Grüße aus München\r\n".encode("iso-8859-1"), charset="iso-8859-1"),
+                BodyPart("text/html", b"<p>ignored</p>\r\n", charset="utf-8"),
+                BodyPart("text/plain", "Preis: 100 €".encode(), charset="utf-8"),
+                BodyPart("application/pdf", is_attachment=True, size=1000),
+            ]
+        )
+        assert structured.body_digest() == raw.body_digest()
+        # ... and the text-only MIME rebuilt from it
+        assert LazyMessage.from_content(structured.to_mime()).body_digest() == raw.body_digest()
+
+    def test_body_digest_covers_text_past_the_decoding_cap(self, monkeypatch):
+        raw = b"Content-Type: text/plain\n\n" + b"a" * 100
+        digest = LazyMessage.from_content(raw).body_digest()
+        assert digest != LazyMessage.from_content(raw + b"b").body_digest()
+        assert digest == StructuredMessage([], [BodyPart("text/plain", b"a" * 100)]).body_digest()
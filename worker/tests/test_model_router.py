@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+from src.services.llm_rate_controller import LLMRateController
+from src.services.model_router import CircuitBreaker, ModelRouter, model_candidates, percentile
+
+
+def make_router(models, **overrides):
+    options = dict(
+        hedging=True,
+        max_hedges=1,
+        initial_hedge_delay_seconds=0.05,
+        min_hedge_delay_seconds=0.01,
+        breaker_options=dict(min_requests=2, error_rate_threshold=0.5, cooldown_seconds=60),
+    )
+    options.update(overrides)
+    return ModelRouter("classify", models, **options)
+
+
+def fake_upstream(latency, failing=()):
+    """Coroutine factory simulating per-model latency and failures"""
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        await asyncio.sleep(latency.get(model, 0))
+        if model in failing:
+            raise RuntimeError(f"{model} unavailable")
+        return f"answer from {model}"
+
+    return call, calls
+
+
+class TestModelCandidates:
+    def test_primary_and_fallbacks(self, monkeypatch):
+        monkeypatch.delenv("CLASSIFY_MODELS", raising=False)
+        monkeypatch.setenv("OPENROUTER_MODEL", "model-a")
+        monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", "model-b, model-a ,model-c")
+        assert model_candidates("classify") == ["model-a", "model-b", "model-c"]
+
+    def test_node_specific_list(self, monkeypatch):
+        monkeypatch.setenv("EXTRACT_MODELS", "model-x,model-y")
+        assert model_candidates("extract") == ["model-x", "model-y"]
+        assert model_candidates("extract", primary="model-z") == ["model-z", "model-x", "model-y"]
+
+
+class TestCircuitBreaker:
+    def test_opens_on_errors_and_half_opens_after_cooldown(self):
+        breaker = CircuitBreaker("m", min_requests=2, error_rate_threshold=0.5, cooldown_seconds=0.01)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+        time.sleep(0.02)
+        # Only one trial call while half-open
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_opens_on_slow_calls(self):
+        breaker = CircuitBreaker("m", min_requests=2, slow_rate_threshold=0.5, latency_threshold_seconds=1)
+        breaker.record_success(5)
+        breaker.record_slow()
+        assert breaker.state == CircuitBreaker.OPEN
+
+
+class TestModelRouter:
+    def test_percentile(self):
+        assert percentile([], 95) == 0
+        assert percentile(list(range(1, 101)), 95) == 95
+
+    def test_failover_on_error(self):
+        router = make_router(["model-a", "model-b"], hedging=False)
+        call, calls = fake_upstream({}, failing={"model-a"})
+        result, model = asyncio.run(router.invoke(call))
+        assert model == "model-b"
+        assert calls == ["model-a", "model-b"]
+        assert router.get_stats()["failovers"] == 1
+
+    def test_hedge_bounds_tail_latency(self):
+        router = make_router(["slow", "fast"])
+        call, calls = fake_upstream({"slow": 2.0, "fast": 0.01})
+
+        started = time.monotonic()
+        result, model = asyncio.run(router.invoke(call))
+        assert model == "fast"
+        assert time.monotonic() - started < 1.0
+        stats = router.get_stats()
+        assert stats["hedges"] == 1
+        assert stats["hedge_wins"] == 1
+        assert stats["breakers"]["slow"]["recent_slow"] == 1
+
+    def test_hedge_loser_releases_its_controller_slot(self):
+        controller = LLMRateController(
+            requests_per_minute=6000, tokens_per_minute=1_000_000, initial_concurrency=2,
+            min_concurrency=1, max_concurrency=2, target_latency_seconds=10
+        )
+        router = make_router(["slow", "fast"])
+        upstream, _ = fake_upstream({"slow": 2.0, "fast": 0.01})
+
+        async def call(model):
+            return await controller.run(lambda: upstream(model))
+
+        async def scenario():
+            for _ in range(3):
+                result, model = await router.invoke(call)
+                assert model == "fast"
+                assert controller.in_flight == 0
+            # Every slot is free again
+            return await asyncio.wait_for(call("fast"), timeout=1)
+
+        assert asyncio.run(scenario()) == "answer from fast"
+        assert router.get_stats()["hedges"] >= 1
+
+    def test_open_breaker_is_skipped(self):
+        router = make_router(["model-a", "model-b"], hedging=False)
+        call, calls = fake_upstream({}, failing={"model-a"})
+        for _ in range(2):
+            asyncio.run(router.invoke(call))
+        assert router.breakers["model-a"].state == CircuitBreaker.OPEN
+
+        calls.clear()
+        asyncio.run(router.invoke(call))
+        assert calls == ["model-b"]
+
+    def test_all_models_failing_raises(self):
+        router = make_router(["model-a", "model-b"], hedging=False)
+        call, _ = fake_upstream({}, failing={"model-a", "model-b"})
+        try:
+            asyncio.run(router.invoke(call))
+            assert False, "expected error"
+        except RuntimeError as e:
+            assert "model-b" in str(e)
+        assert router.get_stats()["failures"] == 1
+
+    def test_half_open_fallback_recovers(self):
+        router = make_router(
+            ["model-a", "model-b"], hedging=False,
+            breaker_options=dict(min_requests=2, error_rate_threshold=0.5, cooldown_seconds=0.01)
+        )
+        fallback = router.breakers["model-b"]
+        fallback.record_failure()
+        fallback.record_failure()
+        assert fallback.state == CircuitBreaker.OPEN
+        time.sleep(0.02)
+
+        # Calls served by the primary don't use up the fallback's trial
+        call, calls = fake_upstream({})
+        for _ in range(3):
+            asyncio.run(router.invoke(call))
+        assert calls == ["model-a"] * 3
+        assert fallback.is_available()
+
+        # The first failover is the trial, and its success closes the breaker
+        call, calls = fake_upstream({}, failing={"model-a"})
+        assert asyncio.run(router.invoke(call))[1] == "model-b"
+        assert fallback.state == CircuitBreaker.CLOSED
+
+    def test_cancelled_trial_is_released(self):
+        router = make_router(["model-a"], hedging=False, breaker_options=dict(cooldown_seconds=0.01))
+        breaker = router.breakers["model-a"]
+        breaker._open()
+        time.sleep(0.02)
+        call, _ = fake_upstream({"model-a": 1})
+
+        async def scenario():
+            task = asyncio.ensure_future(router.invoke(call))
+            await asyncio.sleep(0.01)
+            assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.is_available()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert breaker.is_available()
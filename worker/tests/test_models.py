@@ -1,5 +1,6 @@
 import pytest
 from datetime import datetime, timedelta
+from decimal import Decimal
 from src.models import (
     Task, TaskStatus, TaskPriority,
     Deal, DealStatus, DealStage,
@@ -179,4 +180,74 @@ class TestCompany:
             domain="test.com",
             website="test.com"  # Missing protocol
         )
-        assert company.website == "https://test.com"
\ No newline at end of file
+        assert company.website == "https://test.com"
+
+def legacy_dynamodb_item(model) -> dict:
+    """Previous model_dump + per-field loop conversion, for comparison"""
+    item = model.model_dump()
+    for key, value in item.items():
+        if isinstance(value, datetime):
+            item[key] = value.isoformat()
+        elif isinstance(value, float):
+            item[key] = Decimal(str(value))
+    return item
+
+
+class TestDynamoDBItems:
+    def make_deal(self, **overrides):
+        data = dict(
+            user_id="user-1",
+            title="Fleet contract",
+            description="Annual fleet contract",
+            value=1234.56,
+            currency="USD",
+            stage=DealStage.PROPOSAL,
+            probability=60,
+            source_email_id="email-123",
+            confidence=0.85,
+            agent="gpt-4",
+            audit_snippet="fleet",
+            expected_close_date=datetime(2026, 3, 5, 12, 30)
+        )
+        data.update(overrides)
+        return data
+
+    def test_matches_legacy_conversion(self):
+        deal = Deal(**self.make_deal())
+        assert deal.to_dynamodb_item() == legacy_dynamodb_item(deal)
+
+        task = Task(
+            user_id="user-1", title="Call back", description="Call back", source_email_id="email-123",
+            confidence=0.7, agent="gpt-4", audit_snippet="call", due_date=datetime(2026, 3, 5)
+        )
+        assert task.to_dynamodb_item() == legacy_dynamodb_item(task)
+
+    def test_decimal_and_string_types(self):
+        item = Deal(**self.make_deal()).to_dynamodb_item()
+        assert item["value"] == Decimal("1234.56")
+        assert item["confidence"] == Decimal("0.85")
+        assert item["stage"] == "proposal" and type(item["stage"]) is str
+        assert item["expected_close_date"] == "2026-03-05T12:30:00"
+
+        item = Deal(**self.make_deal(value=None)).to_dynamodb_item()
+        assert item["value"] is None
+
+    def test_email_log_item(self):
+        log = EmailLog(
+            message_id_hash="abc", original_message_id="msg-1", user_id="user-1", subject="Hi",
+            sender_email="A@Example.com", prefilter_result=PrefilterResult.PASSED,
+            processed_at=datetime(2026, 1, 2, 3, 4, 5)
+        )
+        item = log.to_dynamodb_item()
+        assert item["processed_at"] == "2026-01-02T03:04:05"
+        assert item["sender_email"] == "a@example.com"
+        assert item["status"] == "processed"
+
+    def test_trusted_construction_matches_validated(self):
+        data = self.make_deal()
+        validated = Deal(**data).to_dynamodb_item()
+        trusted = Deal.from_trusted(**data).to_dynamodb_item()
+        for key in ("id", "created_at", "updated_at"):
+            validated.pop(key)
+            assert trusted.pop(key)
+        assert trusted == validated
@@ -0,0 +1,68 @@
+import asyncio
+
+from src.graph.nodes import ConfidenceGateNode, PreFilterNode
+from src.graph.payload_store import (
+    PayloadStore, get_payload_store, RAW_CONTENT, TEXT_CONTENT, FILTERED_CONTENT
+)
+from src.models import PrefilterResult
+
+MIME = (
+    "From: Buyer <buyer@customer.com>\r\n"
+    "Subject: Pricing proposal for the annual contract\r\n"
+    "Message-ID: <lean-1@customer.com>\r\n"
+    "Content-Type: text/plain\r\n\r\n"
+    "Hi, please send a pricing proposal and quote for the annual logistics contract. "
+    "Our budget is 50 lakh and we want to sign this quarter.\r\n"
+)
+
+
+class TestPayloadStore:
+    def test_put_get_pop_release(self):
+        store = PayloadStore()
+        store.put("k", "a", "x" * 100)
+        store.put("k", "b", 1)
+        assert store.get("k", "a") == "x" * 100
+        assert store.get("missing", "a", "default") == "default"
+        assert store.get_stats()["payloads"] == 2
+
+        assert store.pop("k", "a") == "x" * 100
+        assert store.get("k", "a") is None
+        store.release("k")
+        assert store.get_stats() == {"runs": 0, "payloads": 0, "string_bytes": 0}
+
+    def test_last_pop_drops_run(self):
+        store = PayloadStore()
+        store.put("k", "a", "value")
+        store.pop("k", "a")
+        assert store.get_stats()["runs"] == 0
+
+    def test_new_keys_are_unique(self):
+        assert PayloadStore.new_key("abc") != PayloadStore.new_key("abc")
+
+
+class TestLeanState:
+    def test_prefilter_releases_raw_content(self):
+        store = get_payload_store()
+        key = store.new_key("prefilter-test")
+        store.put(key, RAW_CONTENT, MIME)
+        store.put(key, TEXT_CONTENT, MIME.split("\r\n\r\n", 1)[1])
+
+        updates = asyncio.run(PreFilterNode()({"payload_key": key}))
+
+        assert updates["prefilter_result"] == PrefilterResult.PASSED
+        assert "filtered_content" not in updates
+        assert store.get(key, RAW_CONTENT) is None
+        assert store.get(key, TEXT_CONTENT) is None
+        assert "pricing proposal" in store.get(key, FILTERED_CONTENT)
+        store.release(key)
+
+    def test_confidence_gate_drops_items_from_extraction_result(self):
+        extraction = {
+            "tasks": [{"title": "Send quote", "confidence": 0.9}],
+            "deals": [{"title": "Contract", "confidence": 0.5}],
+            "agent": "model", "tokens_used": 42
+        }
+        updates = ConfidenceGateNode(0.8)({"extraction_result": extraction})
+        assert updates["high_confidence_tasks"] == extraction["tasks"]
+        assert updates["draft_deals"] == extraction["deals"]
+        assert updates["extraction_result"] == {"agent": "model", "tokens_used": 42}
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timezone
+
+from src.services.poll_leases import InMemoryLeaseStore, PollLeaseManager, partition_of
+
+
+def make_manager(store, owner, partitions=8):
+    return PollLeaseManager(store, partitions=partitions, lease_ttl=30, heartbeat_interval=10, owner=owner)
+
+
+def assert_disjoint(*managers, now):
+    held = [manager.held_partitions(now) for manager in managers]
+    for i, first in enumerate(held):
+        for second in held[i + 1:]:
+            assert not first & second
+
+
+class TestPartitioning:
+    def test_partition_is_stable_and_in_range(self):
+        assert partition_of("alice@example.com", 16) == partition_of("alice@example.com", 16)
+        assert all(0 <= partition_of(f"user{i}", 16) < 16 for i in range(100))
+        assert len({partition_of(f"user{i}", 16) for i in range(100)}) > 8
+
+
+class TestPollLeaseManager:
+    def test_single_replica_holds_everything(self):
+        manager = make_manager(InMemoryLeaseStore(), "a")
+        assert manager.rebalance() == set(range(8))
+        assert manager.owns("anyone@example.com")
+
+    def test_replicas_split_partitions(self):
+        store = InMemoryLeaseStore()
+        a, b = make_manager(store, "a"), make_manager(store, "b")
+        a.rebalance(now=1000)
+        # b joins: nothing free yet, but a hands back its extras on its next heartbeat
+        assert b.rebalance(now=1001) == set()
+        assert len(a.rebalance(now=1010)) == 4
+        assert len(b.rebalance(now=1011)) == 4
+        assert_disjoint(a, b, now=1011)
+
+    def test_dead_replica_partitions_are_reassigned(self):
+        store = InMemoryLeaseStore()
+        a, b, c = (make_manager(store, owner) for owner in "abc")
+        for now in (1000, 1010):
+            a.rebalance(now=now)
+            b.rebalance(now=now + 1)
+            c.rebalance(now=now + 2)
+        assert sum(len(m.held_partitions(1012)) for m in (a, b, c)) == 8
+        assert_disjoint(a, b, c, now=1012)
+
+        # c stops heartbeating; once its leases and membership expire a and b take over
+        for now in range(1020, 1080, 10):
+            a.rebalance(now=now)
+            b.rebalance(now=now + 1)
+        assert len(a.held_partitions(1071)) + len(b.held_partitions(1071)) == 8
+        assert_disjoint(a, b, now=1071)
+        assert c.held_partitions(1071) == set()
+
+    def test_stop_releases_leases(self):
+        store = InMemoryLeaseStore()
+        a, b = make_manager(store, "a"), make_manager(store, "b")
+
+        async def scenario():
+            await a.start()
+            await a.stop()
+
+        asyncio.run(scenario())
+        assert store.get_leases(8) == {}
+        assert b.rebalance() == set(range(8))
+
+    def test_cursor_round_trip(self):
+        manager = make_manager(InMemoryLeaseStore(), "a")
+        last_sync = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        manager.save_cursor("u1", last_sync)
+        assert manager.get_cursor("u1") == last_sync
+        manager.delete_cursor("u1")
+        assert manager.get_cursor("u1") is None
+
+    def test_watch_cursor_is_only_overwritten_if_unchanged(self):
+        manager = make_manager(InMemoryLeaseStore(), "a")
+        watch = {"email_address": "u1@example.com", "history_id": "100", "expiration": 0}
+        assert manager.save_watch("u1", watch)
+        assert manager.save_watch("u1", {**watch, "history_id": "120"}, if_history_id="100")
+        # A sync that read the watch before that write must not move the cursor back
+        assert not manager.save_watch("u1", {**watch, "history_id": "110"}, if_history_id="100")
+        assert manager.get_watch("u1")["history_id"] == "120"
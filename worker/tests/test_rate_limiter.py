@@ -0,0 +1,102 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from src.services.rate_limiter import DynamoDBRateLimitStore, InMemoryRateLimitStore, RateLimiter
+
+
+class FakeTable:
+    """rate-limits table with conditional puts; `interfere` simulates another replica writing first"""
+
+    def __init__(self):
+        self.items = {}
+        self.interfere = 0
+        self.fail = False
+
+    def get_item(self, Key, ConsistentRead=False):
+        if self.fail:
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "GetItem")
+        item = self.items.get(Key["rate_key"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues=None):
+        if self.interfere:
+            self.interfere -= 1
+            current = self.items.get(Item["rate_key"])
+            self.items[Item["rate_key"]] = {**(current or Item), "tat": "0.5"}
+        current = self.items.get(Item["rate_key"])
+        if ConditionExpression == "attribute_not_exists(rate_key)":
+            ok = current is None
+        else:
+            ok = current is not None and current["tat"] == ExpressionAttributeValues[":tat"]
+        if not ok:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+        self.items[Item["rate_key"]] = Item
+
+
+class FakeDB:
+    def __init__(self):
+        self.tables = {"rate_limits": FakeTable()}
+
+
+class TestGcra:
+    def test_burst_then_one_per_interval(self):
+        limiter = RateLimiter("demo", limit=5, window_seconds=3600)
+        decisions = [limiter.check("1.2.3.4", now=1000) for _ in range(6)]
+        assert [d.allowed for d in decisions] == [True] * 5 + [False]
+        assert [d.remaining for d in decisions] == [4, 3, 2, 1, 0, 0]
+        assert decisions[-1].retry_after == pytest.approx(720)
+        assert decisions[-1].headers()["Retry-After"] == "720"
+
+        # Denied requests do not push the limit further out
+        assert not limiter.check("1.2.3.4", now=1700).allowed
+        assert limiter.check("1.2.3.4", now=1720).allowed
+        assert not limiter.check("1.2.3.4", now=1721).allowed
+        # Other keys are independent
+        assert limiter.check("5.6.7.8", now=1721).remaining == 4
+        # cost=0 reports without counting
+        assert limiter.check("5.6.7.8", cost=0, now=1721).remaining == 4
+        assert limiter.check("5.6.7.8", now=1721).remaining == 3
+        # Back to a full burst after a window
+        assert limiter.check("1.2.3.4", now=1720 + 3600).remaining == 4
+
+    def test_idle_keys_are_evicted(self):
+        store = InMemoryRateLimitStore(max_keys=1000)
+        limiter = RateLimiter("demo", limit=5, window_seconds=60, store=store)
+        for i in range(500):
+            limiter.check(f"10.0.{i // 256}.{i % 256}", now=1000 + i * 0.01)
+        assert len(store) == 500
+        # Every key has fully recovered a window later: one request leaves only itself
+        limiter.check("10.9.9.9", now=2000)
+        assert len(store) == 1
+
+    def test_memory_is_capped(self):
+        store = InMemoryRateLimitStore(max_keys=100)
+        limiter = RateLimiter("demo", limit=5, window_seconds=3600, store=store)
+        for i in range(1000):
+            limiter.check(f"ip{i}", now=1000)
+        assert len(store) == 100
+        assert limiter.get_stats()["evicted_keys"] == 900
+
+
+class TestDynamoDBStore:
+    def test_limit_is_shared_and_conflicts_retry(self):
+        db = FakeDB()
+        first = RateLimiter("demo", limit=2, window_seconds=60, store=DynamoDBRateLimitStore(db))
+        second = RateLimiter("demo", limit=2, window_seconds=60, store=DynamoDBRateLimitStore(db))
+        assert first.check("ip", now=1000).allowed
+        assert second.check("ip", now=1000).allowed
+        assert not first.check("ip", now=1000).allowed
+        assert db.tables["rate_limits"].items["demo#ip"]["expires_at"] == 1060
+
+        # Another replica wrote in between: re-read and apply on top of its value
+        db.tables["rate_limits"].interfere = 1
+        assert first.check("other", now=1000).allowed
+        assert first.check("other", now=1000).allowed
+
+    def test_store_outage_limits_per_replica(self):
+        db = FakeDB()
+        limiter = RateLimiter("demo", limit=1, window_seconds=60, store=DynamoDBRateLimitStore(db))
+        db.tables["rate_limits"].fail = True
+        assert limiter.check("ip", now=1000).allowed
+        assert not limiter.check("ip", now=1001).allowed
+        assert limiter.get_stats()["store_errors"] == 2
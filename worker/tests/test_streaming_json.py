@@ -0,0 +1,53 @@
+import json
+
+from src.services.streaming_json import IncrementalJSONParser
+
+
+RESPONSE = json.dumps({
+    "tasks": [
+        {"title": "Send proposal {v2}", "snippet": "quote: \"by Friday\" [urgent]", "confidence": 0.9},
+        {"title": "Schedule call", "confidence": 0.6}
+    ],
+    "deals": [
+        {"title": "Annual contract", "value": 5000000, "tags": [{"name": "logistics"}]}
+    ]
+})
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+class TestIncrementalJSONParser:
+    def test_elements_emitted_in_order(self):
+        for size in (1, 3, 16, len(RESPONSE)):
+            parser = IncrementalJSONParser()
+            completed = feed_in_chunks(parser, RESPONSE, size)
+            assert [key for key, _ in completed] == ["tasks", "tasks", "deals"]
+            assert completed[0][1]["title"] == "Send proposal {v2}"
+            assert completed[2][1]["tags"] == [{"name": "logistics"}]
+            assert parser.done
+
+    def test_element_emitted_before_response_finishes(self):
+        parser = IncrementalJSONParser()
+        cut = RESPONSE.index('{"title": "Schedule call"')
+        completed = parser.feed(RESPONSE[:cut])
+        assert len(completed) == 1
+        assert not parser.done
+
+    def test_fenced_output_and_trailing_text(self):
+        parser = IncrementalJSONParser()
+        completed = parser.feed("```json\n" + RESPONSE + "\n```\nHope this helps!")
+        assert len(completed) == 3
+        assert parser.done
+        # Nothing after the top-level object is parsed
+        assert parser.feed('{"tasks": [{"title": "late"}]}') == []
+
+    def test_malformed_element_skipped(self):
+        parser = IncrementalJSONParser()
+        completed = parser.feed('{"tasks": [{"title": "ok"}, {"title": bad}], "deals": []}')
+        assert completed == [("tasks", {"title": "ok"})]
+        assert parser.done
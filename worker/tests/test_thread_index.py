@@ -0,0 +1,78 @@
+import asyncio
+
+from src.services.thread_index import ThreadIndex, thread_keys
+from src.utils import extract_new_content, parse_message_ids
+
+
+class TestExtractNewContent:
+    def test_gmail_reply(self):
+        body = (
+            "Sounds good, let's lock the 3-year contract at 40L per year.\n"
+            "\n"
+            "On Mon, 15 Jan 2024 at 10:02, Priya Nair <priya@smile.com>\n"
+            "wrote:\n"
+            "> Attached is the revised proposal.\n"
+            "> Let us know.\n"
+        )
+        assert extract_new_content(body) == "Sounds good, let's lock the 3-year contract at 40L per year."
+
+    def test_outlook_reply(self):
+        body = (
+            "Please send the signed copy by Friday.\n"
+            "\n"
+            "________________________________\n"
+            "From: Priya Nair <priya@smile.com>\n"
+            "Sent: Monday, January 15, 2024 10:02 AM\n"
+            "To: Rahul\n"
+            "Subject: Proposal\n"
+            "\n"
+            "Attached is the revised proposal.\n"
+        )
+        assert extract_new_content(body) == "Please send the signed copy by Friday."
+
+    def test_original_message_block(self):
+        body = "Confirmed.\n-----Original Message-----\nFrom: a@b.com\nOld text"
+        assert extract_new_content(body) == "Confirmed."
+
+    def test_not_a_reply(self):
+        body = "From: the warehouse team we need 20 trucks.\nThanks"
+        assert extract_new_content(body) == body
+
+
+class TestThreadKeys:
+    def test_parse_message_ids(self):
+        assert parse_message_ids("<a@x.com>\n <b@x.com>") == ["<a@x.com>", "<b@x.com>"]
+        assert parse_message_ids(None) == []
+
+    def test_key_priority(self):
+        keys = thread_keys(
+            "<c@x.com>",
+            references="<a@x.com> <b@x.com>",
+            in_reply_to="<b@x.com>",
+            gmail_thread_id="18c2f"
+        )
+        assert keys == ["gmail:18c2f", "<a@x.com>", "<b@x.com>", "<c@x.com>"]
+
+    def test_new_conversation(self):
+        assert thread_keys("<a@x.com>") == ["<a@x.com>"]
+
+
+class TestThreadIndex:
+    def test_reply_finds_thread(self):
+        index = ThreadIndex(max_entries=100)
+        asyncio.run(index.update("user-1", thread_keys("<a@x.com>"), "<a@x.com>", "sales_lead", 0.9, "Pricing inquiry"))
+
+        reply_keys = thread_keys("<b@x.com>", in_reply_to="<a@x.com>")
+        thread = asyncio.run(index.get("user-1", reply_keys))
+        assert thread["category"] == "sales_lead"
+        assert thread["message_count"] == 1
+
+        # Threads are per mailbox
+        assert asyncio.run(index.get("user-2", reply_keys)) is None
+
+    def test_lru_bound(self):
+        index = ThreadIndex(max_entries=2)
+        for i in range(5):
+            asyncio.run(index.update("u", [f"<{i}@x.com>"], f"<{i}@x.com>", "spam_noise", 0.5, ""))
+        assert len(index._threads) == 2
+        assert asyncio.run(index.get("u", ["<0@x.com>"])) is None
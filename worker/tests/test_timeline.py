@@ -0,0 +1,137 @@
+import asyncio
+import inspect
+import operator
+import time
+from typing import Annotated, Any, Dict, List, TypedDict
+
+import pytest
+from langgraph.graph import END
+
+from src.graph.direct_runner import DirectRunner, PipelineSpec
+from src.graph.timeline import stage_durations, stage_node, timeline_summary
+from src.models import EmailLog, PrefilterResult
+from src.services.llm_rate_controller import LLMRateController
+
+
+class TimedState(TypedDict):
+    start_time: float
+    text: str
+    stage_timeline: Annotated[List[Dict[str, Any]], operator.add]
+
+
+def make_controller():
+    return LLMRateController(
+        requests_per_minute=6000,
+        tokens_per_minute=10_000_000,
+        initial_concurrency=1,
+        min_concurrency=1,
+        max_concurrency=1,
+        target_latency_seconds=60,
+        base_backoff_seconds=0.01,
+        max_backoff_seconds=0.05
+    )
+
+
+class TestStageNode:
+    def test_sync_nodes_stay_sync(self):
+        def gate(state):
+            return {"text": "gated"}
+
+        timed = stage_node("gate", gate)
+        assert not inspect.iscoroutinefunction(timed)
+        update = timed({"start_time": 0.0})
+        assert update["text"] == "gated"
+        assert update["stage_timeline"][0]["stage"] == "gate"
+        assert "llm_calls" not in update["stage_timeline"][0]
+
+    def test_llm_queue_wait_is_separated_from_service_time(self):
+        controller = make_controller()
+
+        async def call():
+            await asyncio.sleep(0.1)
+            return "ok"
+
+        async def llm_node(state):
+            await controller.run(call)
+            return {"text": "done"}
+
+        async def scenario():
+            # One concurrency slot: the second stage queues behind the first
+            first, second = await asyncio.gather(
+                stage_node("classify", llm_node)({"start_time": 0.0}),
+                stage_node("extract_local", llm_node)({"start_time": 0.0}),
+            )
+            return first["stage_timeline"][0], second["stage_timeline"][0]
+
+        first, second = asyncio.run(scenario())
+        assert first["llm_calls"] == second["llm_calls"] == 1
+        assert first["llm_queue_ms"] < 50
+        assert second["llm_queue_ms"] >= 80
+        assert second["llm_service_ms"] >= 90
+        assert second["duration_ms"] >= second["llm_queue_ms"] + second["llm_service_ms"] - 5
+
+    def test_retries_are_counted(self):
+        controller = make_controller()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise asyncio.TimeoutError()
+            return "ok"
+
+        async def llm_node(state):
+            await controller.run(flaky)
+            return {}
+
+        entry = asyncio.run(stage_node("extract_local", llm_node)({"start_time": 0.0}))["stage_timeline"][0]
+        assert entry["llm_calls"] == 2
+        assert "llm_backoff_ms" in entry
+
+
+class TestPipelineTimeline:
+    @pytest.mark.parametrize("runner", ["langgraph", "direct"])
+    def test_entries_in_execution_order(self, runner):
+        async def classify(state):
+            await asyncio.sleep(0.01)
+            return {"text": state["text"].upper()}
+
+        def emit(state):
+            return {}
+
+        spec = PipelineSpec(
+            state_schema=TimedState,
+            entry_point="classify",
+            nodes={name: stage_node(name, node) for name, node in {"classify": classify, "emit_event": emit}.items()},
+            edges={"classify": "emit_event", "emit_event": END},
+        )
+        initial = {"start_time": time.time(), "text": "hi", "stage_timeline": []}
+        if runner == "direct":
+            final = asyncio.run(DirectRunner(spec).ainvoke(initial))
+        else:
+            final = asyncio.run(spec.build_graph().compile().ainvoke(initial))
+
+        timeline = final["stage_timeline"]
+        assert [entry["stage"] for entry in timeline] == ["classify", "emit_event"]
+        assert timeline[0]["duration_ms"] >= 10
+        assert timeline[1]["start_ms"] >= timeline[0]["start_ms"] + timeline[0]["duration_ms"]
+        assert final["text"] == "HI"
+
+    def test_summary_and_storage(self):
+        timeline = [
+            {"stage": "prepare", "start_ms": 0, "duration_ms": 40},
+            {"stage": "classify", "start_ms": 40, "duration_ms": 12000, "llm_calls": 1,
+             "llm_queue_ms": 9000, "llm_service_ms": 2950},
+            {"stage": "extract_local", "start_ms": 12050, "duration_ms": 27000, "llm_calls": 2,
+             "llm_queue_ms": 1000, "llm_service_ms": 24000, "llm_backoff_ms": 1900},
+        ]
+        assert stage_durations(timeline)["classify"] == 12000
+        assert timeline_summary(timeline, 40000) == {
+            "stage_ms": 39040, "llm_queue_ms": 10000, "llm_service_ms": 26950, "llm_backoff_ms": 1900, "other_ms": 960
+        }
+
+        log = EmailLog(
+            message_id_hash="h", original_message_id="<m@x.com>", user_id="u", subject="RFQ",
+            sender_email="a@b.com", prefilter_result=PrefilterResult.PASSED, stage_timeline=timeline
+        )
+        assert log.to_dynamodb_item()["stage_timeline"] == timeline
@@ -0,0 +1,75 @@
+import asyncio
+from langchain_core.messages import AIMessage
+
+from src.services.token_usage import (
+    LLMUsage, TokenUsageTracker, usage_from_message, summarize_usage
+)
+
+
+class TestUsageFromMessage:
+    def test_usage_metadata(self):
+        message = AIMessage(
+            content="{}",
+            usage_metadata={
+                "input_tokens": 120,
+                "output_tokens": 30,
+                "total_tokens": 150,
+                "input_token_details": {"cache_read": 40}
+            },
+            response_metadata={"model_name": "mistralai/mistral-small"}
+        )
+        usage = usage_from_message(message, node="extract")
+        assert usage.node == "extract"
+        assert usage.model == "mistralai/mistral-small"
+        assert usage.prompt_tokens == 120
+        assert usage.completion_tokens == 30
+        assert usage.cached_tokens == 40
+        assert usage.total_tokens == 150
+
+    def test_response_metadata_fallback(self):
+        message = AIMessage(
+            content="{}",
+            response_metadata={
+                "token_usage": {
+                    "prompt_tokens": 80,
+                    "completion_tokens": 20,
+                    "prompt_tokens_details": {"cached_tokens": 10}
+                }
+            }
+        )
+        usage = usage_from_message(message, node="classify", default_model="fallback-model")
+        assert usage.model == "fallback-model"
+        assert usage.to_dict()["total_tokens"] == 100
+        assert usage.cached_tokens == 10
+
+    def test_missing_metadata(self):
+        usage = usage_from_message(None, node="classify")
+        assert usage.total_tokens == 0
+
+
+class TestTokenUsageTracker:
+    def test_record_and_summarize(self):
+        tracker = TokenUsageTracker(daily_budget=0)
+        usages = [
+            LLMUsage("classify", "model-a", 100, 10).to_dict(),
+            LLMUsage("extract", "model-b", 200, 50, cached_tokens=20).to_dict()
+        ]
+        assert summarize_usage(usages)["total_tokens"] == 360
+
+        totals = asyncio.run(tracker.record("user-1", usages))
+        assert totals["total_tokens"] == 360
+        assert totals["llm_calls"] == 2
+        assert totals["by_node"] == {"classify": 110, "extract": 250}
+        assert totals["by_model"]["model-b"] == 250
+        assert asyncio.run(tracker.check_budget("user-1")) == TokenUsageTracker.BUDGET_OK
+
+    def test_budget_exhausted(self):
+        tracker = TokenUsageTracker(daily_budget=300, budget_mode="degrade")
+        asyncio.run(tracker.record("user-1", [LLMUsage("extract", "m", 250, 60).to_dict()]))
+        assert asyncio.run(tracker.check_budget("user-1")) == TokenUsageTracker.BUDGET_DEGRADE
+        # Budgets are per user
+        assert asyncio.run(tracker.check_budget("user-2")) == TokenUsageTracker.BUDGET_OK
+
+        usage = asyncio.run(tracker.get_usage("user-1"))
+        assert usage["budget_remaining"] == 0
+        assert usage["budget_status"] == "degrade"